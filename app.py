@@ -1,8 +1,57 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
+from core import config
+from core.database import MongoConnection
+from core.migracoes import executar_migracoes
+from core.ranking import carregar_ranking
+from core.indice_espacial import carregar_indice_servicos
+from core.services.proximidade_service import ProximidadeService
+from core.services.importacao_service import encerrar_importacoes, recuperar_importacoes
+from core.execucao import executar
 from routes import usuario_routes, pergunta_routes, totem_routes, interacao_routes, thanos_routes, servico_routes
 
+logger = logging.getLogger(__name__)
+
+async def atualizar_rollups_periodicamente():
+    """
+    Atualiza os rollups por hora/dia das interações a cada ROLLUPS_INTERVALO_S segundos.
+    """
+    while True:
+        await asyncio.sleep(config.ROLLUPS_INTERVALO_S)
+        try:
+            await executar(interacao_routes.service.atualizar_rollups)
+        except Exception:
+            logger.exception("Falha ao atualizar os rollups de interações")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Ciclo de vida da aplicação: aplica migrações/índices na inicialização,
+    carrega o ranking e o índice espacial de serviços em memória (se ativos), monta a
+    tabela de proximidade totem -> serviços (se ainda não existe), marca como interrompidas as
+    importações deixadas pendentes por uma queda, agenda a atualização dos rollups;
+    no shutdown, interrompe as importações em segundo plano e fecha as conexões com o MongoDB.
+    """
+    if config.MONGODB_CRIAR_INDICES:
+        await run_in_threadpool(executar_migracoes)
+    await run_in_threadpool(carregar_ranking)
+    await run_in_threadpool(carregar_indice_servicos)
+    await run_in_threadpool(ProximidadeService().garantir_tabela)
+    await run_in_threadpool(recuperar_importacoes)
+    rollups = asyncio.create_task(atualizar_rollups_periodicamente()) if config.ROLLUPS_INTERVALO_S > 0 else None
+    yield
+    if rollups:
+        rollups.cancel()
+    await executar(interacao_routes.service.encerrar)
+    await run_in_threadpool(encerrar_importacoes)
+    await MongoConnection().close()
+
 app = FastAPI(
+    lifespan=lifespan,
     title="API de Interações - Projeto Big Data",
     description="""
     ## 🚀 API para Coleta de Dados de Interações
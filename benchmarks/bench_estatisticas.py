@@ -0,0 +1,73 @@
+"""
+Benchmark de GET /usuarios/estatisticas: agregação única ($facet) contra o cálculo antigo
+(2 count_documents + get_all() duas vezes + um Usuario pydantic por documento para a idade).
+
+Uso (requer MONGODB_URI e MONGODB_DB_NAME no .env):
+    python -m benchmarks.bench_estatisticas --usuarios 1000000
+"""
+import argparse
+import time
+from datetime import date
+
+from core.database import MongoConnection
+from core.repositories.usuario_repo import UsuarioRepository
+from models.usuario import Usuario
+
+COLECAO = "bench_estatisticas_usuarios"
+
+
+def _popular(collection, total):
+    collection.drop()
+    lote = []
+    for i in range(total):
+        documento = {"vem_hash": f"hash_{i:09d}", "pontuacao": i % 500, "cadastro_completo": bool(i % 2)}
+        if i % 2:
+            documento["data_nascimento"] = date(1950 + i % 60, 1 + i % 12, 1 + i % 28).isoformat()
+        lote.append(documento)
+        if len(lote) == 10000:
+            collection.insert_many(lote, ordered=False)
+            lote = []
+    if lote:
+        collection.insert_many(lote, ordered=False)
+
+
+def _estatisticas_antigas(collection):
+    total = collection.count_documents({})
+    completos = collection.count_documents({"cadastro_completo": True})
+    pontuacoes = [u.get("pontuacao", 0) for u in collection.find({}, {"_id": 0})]
+    idades = []
+    for usuario in collection.find({}, {"_id": 0}):
+        if usuario.get("data_nascimento"):
+            idade = Usuario(**usuario).calcular_idade()
+            if idade:
+                idades.append(idade)
+    return total, completos, sum(pontuacoes), max(pontuacoes, default=0), len(idades)
+
+
+def _medir(funcao):
+    inicio = time.perf_counter()
+    funcao()
+    return time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark das estatísticas de usuários")
+    parser.add_argument("--usuarios", type=int, default=1000000)
+    args = parser.parse_args()
+
+    collection = MongoConnection().get_collection(COLECAO)
+    print(f"Populando {args.usuarios} usuários...")
+    _popular(collection, args.usuarios)
+
+    repo = UsuarioRepository()
+    repo.collection = collection
+
+    print(f"=== Estatísticas de {args.usuarios} usuários ===")
+    print(f"Antigo (get_all + pydantic): {_medir(lambda: _estatisticas_antigas(collection)):.2f}s")
+    print(f"$facet (uma agregação):      {_medir(lambda: repo.get_statistics(date.today())):.2f}s")
+
+    collection.drop()
+
+
+if __name__ == "__main__":
+    main()
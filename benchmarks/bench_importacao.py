@@ -0,0 +1,156 @@
+"""
+Benchmark da importação de serviços (POST /servicos/importar-csv) com uma planilha grande.
+
+Compara o caminho antigo (planilha inteira carregada com openpyxl no modo normal e um
+upsert por linha) com a importação em streaming (XLSX em modo read_only, validação em
+lotes e um bulk_write por lote). Mede tempo e pico de memória (tracemalloc) da leitura
+e, com MongoDB, o tempo da gravação e de uma reimportação do mesmo arquivo (todas as
+linhas inalteradas, nada é regravado).
+
+Uso (a gravação requer MONGODB_URI e MONGODB_DB_NAME no .env):
+    python -m benchmarks.bench_importacao --linhas 500000
+    python -m benchmarks.bench_importacao --linhas 500000 --so-leitura
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from itertools import islice
+
+import openpyxl
+
+from core import config
+from core.importacao import em_lotes, ler_linhas, validar_linha
+
+COLUNAS = ["nome", "tipo", "latitude", "longitude", "endereco", "telefone", "horario_funcionamento", "descricao"]
+TIPOS = ["Saúde", "Transporte", "Educação", "Segurança", "Assistência Social"]
+PREFIXO = "bench_imp_"
+
+
+def _gerar_planilha(caminho, linhas, aleatorio):
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(COLUNAS)
+    for i in range(linhas):
+        sheet.append([
+            f"{PREFIXO}{i}",
+            aleatorio.choice(TIPOS),
+            round(aleatorio.uniform(-8.20, -7.90), 6),
+            round(aleatorio.uniform(-35.05, -34.85), 6),
+            f"Rua {i}, {aleatorio.randint(1, 999)}",
+            "(81) 3184-0000",
+            "Seg-Sex: 8h-17h",
+            "Serviço gerado pelo benchmark",
+        ])
+    workbook.save(caminho)
+
+
+def _leitura_antiga(caminho):
+    with open(caminho, "rb") as arquivo:
+        workbook = openpyxl.load_workbook(arquivo)
+    sheet = workbook.active
+    cabecalho = [cell.value for cell in sheet[1]]
+    total = 0
+    for row in sheet.iter_rows(min_row=2, values_only=True):
+        validar_linha(dict(zip(cabecalho, row)))
+        total += 1
+    return total
+
+
+def _leitura_streaming(caminho):
+    total = 0
+    with open(caminho, "rb") as arquivo:
+        for lote in em_lotes(ler_linhas(arquivo, caminho), config.IMPORTACAO_TAMANHO_LOTE):
+            for _, linha in lote:
+                validar_linha(linha)
+            total += len(lote)
+    return total
+
+
+def _medir_leitura(titulo, funcao, caminho):
+    inicio = time.perf_counter()
+    total = funcao(caminho)
+    duracao = time.perf_counter() - inicio
+    # Memória medida numa segunda passada: o tracemalloc deixa a leitura bem mais lenta
+    tracemalloc.start()
+    funcao(caminho)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{titulo}: {duracao:.2f}s | pico de memória {pico / 1024 / 1024:.1f} MB | {total} linhas")
+
+
+def _limpar(service):
+    ids = service.repo.collection.distinct("servico_id", {"nome": {"$regex": f"^{PREFIXO}"}})
+    service.repo.collection.delete_many({"servico_id": {"$in": ids}})
+    service.proximidade.repo.collection.delete_many({"servico_id": {"$in": ids}})
+
+
+def _gravacao(caminho, linhas_um_a_um):
+    from core.services.importacao_service import ImportacaoService
+    from core.services.servico_service import ServicoService
+
+    service = ServicoService()
+    importacoes = ImportacaoService()
+    _limpar(service)
+
+    with open(caminho, "rb") as arquivo:
+        linhas = [linha for _, linha in islice(ler_linhas(arquivo, caminho), linhas_um_a_um)]
+    inicio = time.perf_counter()
+    for linha in linhas:
+        service.criar_servico(validar_linha(linha))
+    duracao = time.perf_counter() - inicio
+    print(f"Um upsert por linha ({len(linhas)} linhas): {duracao:.2f}s -> {len(linhas) / duracao:.0f} linhas/s")
+    _limpar(service)
+
+    inicio = time.perf_counter()
+    with open(caminho, "rb") as arquivo:
+        resumo = importacoes.importar_agora(arquivo, caminho)
+    duracao = time.perf_counter() - inicio
+    print(
+        f"bulk_write por lote ({resumo['total_linhas']} linhas): {duracao:.2f}s -> "
+        f"{resumo['total_linhas'] / duracao:.0f} linhas/s | erros: {resumo['com_erros']}"
+    )
+
+    # Mesmo arquivo de novo: o hash de conteúdo não mudou, nenhuma linha é regravada
+    inicio = time.perf_counter()
+    with open(caminho, "rb") as arquivo:
+        resumo = importacoes.importar_agora(arquivo, caminho)
+    duracao = time.perf_counter() - inicio
+    print(
+        f"Reimportação sem mudanças ({resumo['total_linhas']} linhas): {duracao:.2f}s -> "
+        f"{resumo['total_linhas'] / duracao:.0f} linhas/s | inalterados: {resumo['inalterados']}"
+    )
+    _limpar(service)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da importação de serviços")
+    parser.add_argument("--linhas", type=int, default=500000)
+    parser.add_argument("--linhas-um-a-um", type=int, default=5000, help="O caminho antigo é lento: menos linhas")
+    parser.add_argument("--so-leitura", action="store_true", help="Mede só a leitura/validação (sem MongoDB)")
+    parser.add_argument("--semente", type=int, default=42)
+    args = parser.parse_args()
+
+    descritor, caminho = tempfile.mkstemp(suffix=".xlsx")
+    os.close(descritor)
+    try:
+        inicio = time.perf_counter()
+        _gerar_planilha(caminho, args.linhas, random.Random(args.semente))
+        tamanho = os.path.getsize(caminho) / 1024 / 1024
+        print(f"=== {args.linhas} linhas | planilha de {tamanho:.1f} MB gerada em {time.perf_counter() - inicio:.1f}s ===")
+
+        print("--- Leitura e validação ---")
+        _medir_leitura("load_workbook normal", _leitura_antiga, caminho)
+        _medir_leitura("Streaming read_only ", _leitura_streaming, caminho)
+
+        if not args.so_leitura:
+            print("--- Gravação ---")
+            _gravacao(caminho, args.linhas_um_a_um)
+    finally:
+        os.remove(caminho)
+
+
+if __name__ == "__main__":
+    main()
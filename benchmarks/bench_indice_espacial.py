@@ -0,0 +1,184 @@
+"""
+Benchmark da busca de serviços próximos (raio e k mais próximos): varredura linear antiga
+(um Servico pydantic e um Haversine por serviço ativo), varredura vetorizada (core.distancias,
+NumPy) e o índice espacial em memória (core.indice_espacial). Com --mongo, mede também o
+$geoNear + $limit k de GET /servicos/mais-proximos numa coleção temporária.
+
+Usa serviços sintéticos espalhados pela Região Metropolitana do Recife e confere se os
+métodos retornam os mesmos serviços e distâncias.
+
+Uso:
+    python -m benchmarks.bench_indice_espacial --servicos 100000 --consultas 200 --raio-km 2 --k 5
+    python -m benchmarks.bench_indice_espacial --servicos 100000 --k 5 --mongo   # requer o .env
+"""
+import argparse
+import random
+import statistics
+import time
+
+import numpy as np
+
+from core.distancias import Coordenadas
+from core.indice_espacial import IndiceEspacial
+from models.servico import Servico
+
+# Caixa aproximada da RMR (lat, lon)
+LATITUDES = (-8.20, -7.90)
+LONGITUDES = (-35.05, -34.85)
+TIPOS = ["Saúde", "Transporte", "Educação", "Segurança", "Assistência Social"]
+
+
+def _gerar_servicos(total, aleatorio):
+    servicos = []
+    for i in range(total):
+        latitude = aleatorio.uniform(*LATITUDES)
+        longitude = aleatorio.uniform(*LONGITUDES)
+        servicos.append({
+            "servico_id": f"srv_{i:06d}",
+            "nome": f"Serviço {i}",
+            "tipo": aleatorio.choice(TIPOS),
+            "latitude": latitude,
+            "longitude": longitude,
+            "ativo": True,
+        })
+    return servicos
+
+
+def _linear(servicos, latitude, longitude, raio_km):
+    resultado = []
+    for servico_dict in servicos:
+        servico = Servico(**servico_dict)
+        distancia = servico.calcular_distancia(latitude, longitude)
+        if distancia <= raio_km:
+            resultado.append((distancia, servico.servico_id))
+    resultado.sort(key=lambda item: item[0])
+    return resultado
+
+
+def _linear_k(servicos, latitude, longitude, k):
+    distancias = sorted(
+        (Servico(**servico).calcular_distancia(latitude, longitude), servico["servico_id"])
+        for servico in servicos
+    )
+    return distancias[:k]
+
+
+def _geo_near_k(servicos, consultas, k):
+    """
+    $geoNear + $limit k (mesmo pipeline do repositório) numa coleção temporária com 2dsphere.
+    """
+    from pymongo import GEOSPHERE
+    from core.database import MongoConnection
+    from core.repositories.servico_repo import _pipeline_proximos
+
+    collection = MongoConnection().get_collection("bench_servicos_proximos")
+    collection.drop()
+    try:
+        documentos = [
+            {**servico, "location": {"type": "Point", "coordinates": [servico["longitude"], servico["latitude"]]}}
+            for servico in servicos
+        ]
+        for posicao in range(0, len(documentos), 10000):
+            collection.insert_many(documentos[posicao:posicao + 10000], ordered=False)
+        collection.create_index([("location", GEOSPHERE), ("ativo", 1), ("tipo", 1)])
+
+        def k_geo_near(latitude, longitude):
+            pipeline = _pipeline_proximos(latitude, longitude, None, None, k)
+            return [(Servico(**s).calcular_distancia(latitude, longitude), s["servico_id"]) for s in collection.aggregate(pipeline)]
+
+        return _medir(k_geo_near, consultas)
+    finally:
+        collection.drop()
+
+
+def _medir(funcao, consultas):
+    latencias = []
+    resultados = []
+    for consulta in consultas:
+        inicio = time.perf_counter()
+        resultados.append(funcao(*consulta))
+        latencias.append((time.perf_counter() - inicio) * 1000)
+    return latencias, resultados
+
+
+def _imprimir(titulo, latencias):
+    print(f"{titulo}: média {statistics.mean(latencias):.3f}ms | mediana {statistics.median(latencias):.3f}ms")
+
+
+def _mesmas_distancias(a, b):
+    return [distancia for distancia, _ in a] == [distancia for distancia, _ in b]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do índice espacial de serviços")
+    parser.add_argument("--servicos", type=int, default=100000)
+    parser.add_argument("--consultas", type=int, default=200)
+    parser.add_argument("--consultas-lineares", type=int, default=5, help="A varredura linear é lenta: menos consultas")
+    parser.add_argument("--raio-km", type=float, default=2.0)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--mongo", action="store_true", help="Mede também o $geoNear (requer MongoDB)")
+    args = parser.parse_args()
+
+    aleatorio = random.Random(args.semente)
+    servicos = _gerar_servicos(args.servicos, aleatorio)
+    consultas = [(aleatorio.uniform(*LATITUDES), aleatorio.uniform(*LONGITUDES)) for _ in range(args.consultas)]
+
+    indice = IndiceEspacial()
+    inicio = time.perf_counter()
+    indice.carregar(servicos)
+    print(f"=== {args.servicos} serviços | carga do índice: {time.perf_counter() - inicio:.2f}s ===")
+
+    coordenadas = Coordenadas([s["latitude"] for s in servicos], [s["longitude"] for s in servicos])
+
+    def raio_vetorizado(latitude, longitude):
+        return [(d, servicos[i]["servico_id"]) for d, i in coordenadas.no_raio(latitude, longitude, args.raio_km)]
+
+    def raio_indice(latitude, longitude):
+        return [(d, s["servico_id"]) for d, s in indice.no_raio(latitude, longitude, args.raio_km)]
+
+    def k_indice(latitude, longitude):
+        return [(d, s["servico_id"]) for d, s in indice.mais_proximos(latitude, longitude, args.k)]
+
+    def k_vetorizado(latitude, longitude):
+        # Heap limitado à la NumPy: distância de todos + argpartition (sem ordenar tudo)
+        distancias = coordenadas.distancias_km(latitude, longitude)
+        melhores = np.argpartition(distancias, args.k - 1)[:args.k]
+        pares = zip(coordenadas.arredondar(distancias, melhores, latitude, longitude), melhores)
+        return sorted((d, servicos[i]["servico_id"]) for d, i in pares)
+
+    amostra = consultas[:args.consultas_lineares]
+    print(f"--- Raio de {args.raio_km} km ---")
+    latencias_linear, esperados = _medir(lambda la, lo: _linear(servicos, la, lo, args.raio_km), amostra)
+    _imprimir(f"Linear ({len(amostra)} consultas)", latencias_linear)
+    latencias_vetorizado, _ = _medir(raio_vetorizado, consultas)
+    _imprimir(f"NumPy  ({len(consultas)} consultas)", latencias_vetorizado)
+    latencias_indice, _ = _medir(raio_indice, consultas)
+    _imprimir(f"Índice ({len(consultas)} consultas)", latencias_indice)
+    for titulo, funcao in (("NumPy", raio_vetorizado), ("Índice", raio_indice)):
+        obtidos = [funcao(*consulta) for consulta in amostra]
+        print(f"Mesmo resultado ({titulo}):", all(
+            _mesmas_distancias(e, o) and {s for _, s in e} == {s for _, s in o} for e, o in zip(esperados, obtidos)
+        ))
+
+    print(f"--- {args.k} mais próximos ---")
+    latencias_linear, esperados = _medir(lambda la, lo: _linear_k(servicos, la, lo, args.k), amostra)
+    _imprimir(f"Linear ({len(amostra)} consultas)", latencias_linear)
+    latencias_vetorizado, _ = _medir(k_vetorizado, consultas)
+    _imprimir(f"NumPy  ({len(consultas)} consultas)", latencias_vetorizado)
+    latencias_indice, _ = _medir(k_indice, consultas)
+    _imprimir(f"Índice ({len(consultas)} consultas)", latencias_indice)
+    for titulo, funcao in (("NumPy", k_vetorizado), ("Índice", k_indice)):
+        obtidos = [funcao(*consulta) for consulta in amostra]
+        print(f"Mesmas distâncias ({titulo}):", all(_mesmas_distancias(e, o) for e, o in zip(esperados, obtidos)))
+
+    if args.mongo:
+        latencias_mongo, obtidos = _geo_near_k(servicos, consultas, args.k)
+        _imprimir(f"$geoNear + $limit ({len(consultas)} consultas)", latencias_mongo)
+        print("Mesmas distâncias ($geoNear):", all(
+            _mesmas_distancias(e, sorted(o)) for e, o in zip(esperados, obtidos[:len(amostra)])
+        ))
+
+
+if __name__ == "__main__":
+    main()
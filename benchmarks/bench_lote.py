@@ -0,0 +1,59 @@
+"""
+Benchmark de POST /interacoes/lote contra POST /interacoes/ (um voto por requisição).
+
+Simula um totem reenviando votos acumulados offline: um a um (uma escrita por voto)
+ou em lotes (um bulk_write por lote).
+
+Uso (requer MONGODB_URI e MONGODB_DB_NAME no .env):
+    python -m benchmarks.bench_lote --votos 20000 --tamanho-lote 1000
+"""
+import argparse
+import time
+import uuid
+
+from core.services.interacao_service import InteracaoService
+from models.interacao import InteracaoEntrada
+
+
+def _votos(n, pergunta_id):
+    return [
+        InteracaoEntrada(
+            vem_hash=f"bench_user_{i}",
+            pergunta_id=pergunta_id,
+            totem_id=f"bench_totem_{i % 20}",
+            resposta="sim" if i % 3 else "nao"
+        )
+        for i in range(n)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de votos em lote")
+    parser.add_argument("--votos", type=int, default=20000)
+    parser.add_argument("--tamanho-lote", type=int, default=1000)
+    args = parser.parse_args()
+
+    service = InteracaoService()
+    print(f"=== Benchmark de lote ({args.votos} votos) ===")
+
+    pergunta_id = f"bench_{uuid.uuid4().hex[:8]}"
+    votos = _votos(args.votos, pergunta_id)
+    inicio = time.perf_counter()
+    for voto in votos:
+        service.registrar_interacao(voto.vem_hash, voto.pergunta_id, voto.totem_id, voto.resposta)
+    duracao = time.perf_counter() - inicio
+    service.excluir_interacoes_por_pergunta(pergunta_id)
+    print(f"Um a um:             {duracao:.2f}s -> {args.votos / duracao:.0f} votos/s")
+
+    pergunta_id = f"bench_{uuid.uuid4().hex[:8]}"
+    votos = _votos(args.votos, pergunta_id)
+    inicio = time.perf_counter()
+    for i in range(0, len(votos), args.tamanho_lote):
+        service.registrar_lote(votos[i:i + args.tamanho_lote])
+    duracao = time.perf_counter() - inicio
+    service.excluir_interacoes_por_pergunta(pergunta_id)
+    print(f"Lotes de {args.tamanho_lote:<6}:     {duracao:.2f}s -> {args.votos / duracao:.0f} votos/s")
+
+
+if __name__ == "__main__":
+    main()
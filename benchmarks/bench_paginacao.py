@@ -0,0 +1,68 @@
+"""
+Benchmark da paginação por keyset (limite/cursor) contra skip/offset.
+
+Mede a latência da página 1 e de uma página profunda (padrão: 10.000) nos dois
+modelos. Com keyset a latência deve ficar constante; com skip cresce com a página.
+
+Uso (requer MONGODB_URI e MONGODB_DB_NAME no .env):
+    python -m benchmarks.bench_paginacao --usuarios 1000000 --limite 50 --pagina 10000
+"""
+import argparse
+import time
+
+from core.database import MongoConnection
+from core.paginacao import buscar_pagina, codificar_cursor
+
+COLECAO = "bench_paginacao_usuarios"
+
+
+def _popular(collection, total):
+    collection.drop()
+    lote = []
+    for i in range(total):
+        lote.append({"vem_hash": f"hash_{i:09d}", "pontuacao": i % 500, "cadastro_completo": bool(i % 2)})
+        if len(lote) == 10000:
+            collection.insert_many(lote, ordered=False)
+            lote = []
+    if lote:
+        collection.insert_many(lote, ordered=False)
+    collection.create_index("vem_hash", unique=True)
+
+
+def _medir(funcao, repeticoes=20):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    tempos.sort()
+    return tempos[len(tempos) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de paginação")
+    parser.add_argument("--usuarios", type=int, default=1000000)
+    parser.add_argument("--limite", type=int, default=50)
+    parser.add_argument("--pagina", type=int, default=10000)
+    args = parser.parse_args()
+
+    collection = MongoConnection().get_collection(COLECAO)
+    print(f"Populando {args.usuarios} usuários...")
+    _popular(collection, args.usuarios)
+
+    # Cursor da página profunda (obtido uma vez, fora da medição)
+    deslocamento = (args.pagina - 1) * args.limite
+    ultimo = collection.find({}, {"vem_hash": 1}).sort("vem_hash", 1).skip(deslocamento - 1).limit(1).next()
+    cursor_profundo = codificar_cursor(ultimo["vem_hash"])
+
+    print(f"=== Mediana de latência (limite={args.limite}) ===")
+    print(f"Keyset página 1:           {_medir(lambda: buscar_pagina(collection, {}, 'vem_hash', args.limite)):.2f} ms")
+    print(f"Keyset página {args.pagina}:     {_medir(lambda: buscar_pagina(collection, {}, 'vem_hash', args.limite, cursor_profundo)):.2f} ms")
+    print(f"Skip   página 1:           {_medir(lambda: list(collection.find({}, {'_id': 0}).sort('vem_hash', 1).limit(args.limite))):.2f} ms")
+    print(f"Skip   página {args.pagina}:     {_medir(lambda: list(collection.find({}, {'_id': 0}).sort('vem_hash', 1).skip(deslocamento).limit(args.limite))):.2f} ms")
+
+    collection.drop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark de POST /usuarios/verificar com scans simultâneos do mesmo QR Code.
+
+Fluxo antigo: get_by_vem_hash -> save (se não existe) -> Usuario pydantic do documento inteiro
+Fluxo novo:   get_or_create (find_one_and_update com $setOnInsert e projeção enxuta)
+
+Para cada fluxo, N threads verificam o mesmo hash novo ao mesmo tempo; o script mede
+a latência e confere quantos documentos existem para o hash no fim (o correto é 1).
+
+Uso (requer MONGODB_URI e MONGODB_DB_NAME no .env):
+    python -m benchmarks.bench_verificar_usuario --scans 2000 --concorrencia 50
+"""
+import argparse
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from core.database import MongoConnection
+from core.repositories.usuario_repo import UsuarioRepository
+from core.services.usuario_service import UsuarioService
+from models.usuario import Usuario
+
+COLECAO = "bench_verificar_usuarios"
+
+
+def _percentil(amostras, p):
+    ordenadas = sorted(amostras)
+    return ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * p))]
+
+
+def _verificar_antigo(collection, vem_hash):
+    usuario_dict = collection.find_one({"vem_hash": vem_hash}, {"_id": 0})
+    if not usuario_dict:
+        usuario = Usuario(vem_hash=vem_hash)
+        collection.insert_one(usuario.model_dump(mode='json'))
+        usuario_dict = usuario.model_dump()
+    return Usuario(**usuario_dict).calcular_idade()
+
+
+def _medir(verificar, hashes, concorrencia):
+    def cronometrar(vem_hash):
+        inicio = time.perf_counter()
+        try:
+            verificar(vem_hash)
+        except Exception:
+            return None
+        return (time.perf_counter() - inicio) * 1000
+
+    with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+        resultados = list(executor.map(cronometrar, hashes))
+    latencias = [r for r in resultados if r is not None]
+    return latencias, len(resultados) - len(latencias)
+
+
+def _imprimir(titulo, latencias, erros, collection, hashes):
+    duplicados = sum(1 for vem_hash in set(hashes) if collection.count_documents({"vem_hash": vem_hash}) != 1)
+    print(f"{titulo}: média {statistics.mean(latencias):.2f}ms | p50 {_percentil(latencias, 0.50):.2f}ms | "
+          f"p95 {_percentil(latencias, 0.95):.2f}ms | erros {erros} | hashes com != 1 documento: {duplicados}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da verificação de usuário por QR Code")
+    parser.add_argument("--scans", type=int, default=2000)
+    parser.add_argument("--concorrencia", type=int, default=50)
+    parser.add_argument("--hashes", type=int, default=20, help="Hashes distintos disputados pelas threads")
+    parser.add_argument("--sem-indice", action="store_true", help="Não cria o índice único (mostra as duplicatas do fluxo antigo)")
+    args = parser.parse_args()
+
+    collection = MongoConnection().get_collection(COLECAO)
+    collection.drop()
+    if not args.sem_indice:
+        collection.create_indexes(UsuarioRepository.INDICES)
+
+    service = UsuarioService()
+    service.repo.collection = collection
+
+    prefixo = uuid.uuid4().hex[:8]
+    print(f"=== Verificação de usuário ({args.scans} scans, {args.concorrencia} threads, {args.hashes} hashes) ===")
+    try:
+        hashes = [f"{prefixo}_antigo_{i % args.hashes}" for i in range(args.scans)]
+        latencias, erros = _medir(lambda h: _verificar_antigo(collection, h), hashes, args.concorrencia)
+        _imprimir("get + save     ", latencias, erros, collection, hashes)
+
+        hashes = [f"{prefixo}_novo_{i % args.hashes}" for i in range(args.scans)]
+        latencias, erros = _medir(service.verificar_usuario, hashes, args.concorrencia)
+        _imprimir("upsert atômico ", latencias, erros, collection, hashes)
+    finally:
+        collection.drop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Benchmark de latência do voto: fluxo em duas chamadas vs. POST /interacoes/votar.
+
+Fluxo antigo: InteracaoService.registrar_interacao + UsuarioService.adicionar_pontos_por_voto
+Fluxo novo:   InteracaoService.registrar_voto (voto + pontos idempotentes)
+
+Mede só o tempo de banco de cada fluxo (o fluxo antigo ainda paga uma requisição HTTP a mais).
+
+Uso (requer MONGODB_URI e MONGODB_DB_NAME no .env):
+    python -m benchmarks.bench_voto_combinado --votos 2000
+"""
+import argparse
+import statistics
+import time
+import uuid
+
+from core.services.interacao_service import InteracaoService
+from core.services.usuario_service import UsuarioService
+
+
+def _percentil(amostras, p):
+    ordenadas = sorted(amostras)
+    return ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * p))]
+
+
+def _medir(votar, votos):
+    latencias = []
+    for voto in votos:
+        inicio = time.perf_counter()
+        votar(*voto)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+    return latencias
+
+
+def _imprimir(titulo, latencias):
+    print(f"{titulo}: média {statistics.mean(latencias):.2f}ms | "
+          f"p50 {_percentil(latencias, 0.50):.2f}ms | p95 {_percentil(latencias, 0.95):.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do voto combinado")
+    parser.add_argument("--votos", type=int, default=2000)
+    parser.add_argument("--usuarios", type=int, default=200)
+    args = parser.parse_args()
+
+    interacoes = InteracaoService()
+    usuarios = UsuarioService()
+    prefixo = f"bench_{uuid.uuid4().hex[:8]}"
+    hashes = [f"{prefixo}_user_{i}" for i in range(args.usuarios)]
+    for vem_hash in hashes:
+        usuarios.criar_usuario(vem_hash)
+
+    def votos(pergunta_id):
+        return [
+            (hashes[i % len(hashes)], f"{pergunta_id}_{i // len(hashes)}", "bench_totem", "sim" if i % 3 else "nao")
+            for i in range(args.votos)
+        ]
+
+    def fluxo_antigo(vem_hash, pergunta_id, totem_id, resposta):
+        interacoes.registrar_interacao(vem_hash, pergunta_id, totem_id, resposta)
+        usuarios.adicionar_pontos_por_voto(vem_hash)
+
+    print(f"=== Benchmark de voto combinado ({args.votos} votos, {args.usuarios} usuários) ===")
+    perguntas = (f"{prefixo}_antigo", f"{prefixo}_novo")
+    try:
+        _imprimir("Duas chamadas", _medir(fluxo_antigo, votos(perguntas[0])))
+        _imprimir("Combinado    ", _medir(interacoes.registrar_voto, votos(perguntas[1])))
+        _imprimir("Reenvio      ", _medir(interacoes.registrar_voto, votos(perguntas[1])[:args.usuarios]))
+    finally:
+        for indice in range((args.votos - 1) // len(hashes) + 1):
+            for pergunta_id in perguntas:
+                interacoes.excluir_interacoes_por_pergunta(f"{pergunta_id}_{indice}")
+        for vem_hash in hashes:
+            usuarios.excluir_usuario(vem_hash)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Benchmark do caminho de voto (POST /interacoes/) nos modos síncrono e assíncrono.
+
+O modo síncrono reproduz o threadpool padrão do Starlette (40 threads);
+o modo assíncrono dispara as corrotinas no event loop com a mesma concorrência.
+
+Uso (requer MONGODB_URI e MONGODB_DB_NAME no .env):
+    python -m benchmarks.bench_votos --votos 5000 --concorrencia 200
+"""
+import argparse
+import asyncio
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from core.services.interacao_service import InteracaoService, InteracaoServiceAsync
+
+THREADS_STARLETTE = 40
+
+
+def _votos(n, pergunta_id):
+    for i in range(n):
+        yield (f"bench_user_{i}", pergunta_id, f"bench_totem_{i % 20}", "sim" if i % 3 else "nao")
+
+
+def bench_sync(n, pergunta_id):
+    service = InteracaoService()
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=THREADS_STARLETTE) as pool:
+        list(pool.map(lambda v: service.registrar_interacao(*v), _votos(n, pergunta_id)))
+    duracao = time.perf_counter() - inicio
+    service.excluir_interacoes_por_pergunta(pergunta_id)
+    return duracao
+
+
+async def bench_async(n, pergunta_id, concorrencia):
+    service = InteracaoServiceAsync()
+    limite = asyncio.Semaphore(concorrencia)
+
+    async def votar(voto):
+        async with limite:
+            await service.registrar_interacao(*voto)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(votar(v) for v in _votos(n, pergunta_id)))
+    duracao = time.perf_counter() - inicio
+    await service.excluir_interacoes_por_pergunta(pergunta_id)
+    return duracao
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do caminho de voto")
+    parser.add_argument("--votos", type=int, default=5000)
+    parser.add_argument("--concorrencia", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"=== Benchmark de votos ({args.votos} votos) ===")
+
+    duracao = bench_sync(args.votos, f"bench_{uuid.uuid4().hex[:8]}")
+    print(f"Síncrono  ({THREADS_STARLETTE} threads): {duracao:.2f}s -> {args.votos / duracao:.0f} votos/s")
+
+    duracao = asyncio.run(bench_async(args.votos, f"bench_{uuid.uuid4().hex[:8]}", args.concorrencia))
+    print(f"Assíncrono ({args.concorrencia} concorrentes): {duracao:.2f}s -> {args.votos / duracao:.0f} votos/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# Fakes em memória compartilhados pelos testes (sem MongoDB): o resultado das escritas,
+# o cursor das leituras e coleções que registram os bulk_write. Os testes os importam
+# com `from conftest import ...`; o que é específico de um módulo fica no próprio módulo.
+
+
+class Resultado:
+    """Resultado de bulk_write / update_one / update_many / delete_many."""
+    def __init__(self, upserted_ids=None, modified_count=0, deleted_count=0):
+        self.upserted_ids = upserted_ids or {}
+        self.modified_count = modified_count
+        self.matched_count = modified_count
+        self.deleted_count = deleted_count
+
+
+class Cursor:
+    """Cursor de find/aggregate: sort, limit, to_list e iteração sobre cópias dos documentos."""
+    def __init__(self, documentos=()):
+        self.documentos = list(documentos)
+
+    def sort(self, chave, direcao=1):
+        return Cursor(sorted(self.documentos, key=lambda documento: documento[chave], reverse=direcao < 0))
+
+    def limit(self, limite):
+        return Cursor(self.documentos[:limite])
+
+    def to_list(self, _=None):
+        return [dict(documento) for documento in self.documentos]
+
+    def __iter__(self):
+        return iter(self.to_list())
+
+
+class ColecaoLotes:
+    """
+    Coleção que devolve `documentos` em find/aggregate e guarda cada lote de bulk_write
+    (as operações UpdateOne expõem `_filter` e `_doc`).
+    """
+    def __init__(self, documentos=()):
+        self.documentos = list(documentos)
+        self.lotes = []
+
+    def find(self, filtro=None, projecao=None):
+        return Cursor(self.documentos)
+
+    def aggregate(self, pipeline, allowDiskUse=False):
+        return Cursor(self.documentos)
+
+    def bulk_write(self, operacoes, ordered=True):
+        self.lotes.append(list(operacoes))
+        return Resultado(modified_count=len(operacoes))
+
+
+class ColecaoContadores(ColecaoLotes):
+    """Contadores "sim"/"nao" por filtro, aplicando o $inc de cada operação do bulk_write."""
+    def __init__(self):
+        super().__init__()
+        self.contadores = {}
+
+    def bulk_write(self, operacoes, ordered=True):
+        for operacao in operacoes:
+            chave = tuple(sorted(operacao._filter.items()))
+            contador = self.contadores.setdefault(chave, {"sim": 0, "nao": 0})
+            for resposta, valor in operacao._doc["$inc"].items():
+                contador[resposta] += valor
+        return super().bulk_write(operacoes, ordered)
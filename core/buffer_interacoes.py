@@ -0,0 +1,290 @@
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from core import config
+
+logger = logging.getLogger(__name__)
+
+# Buffer write-behind para o caminho quente de votos: os upserts são acumulados
+# em memória e gravados com um único bulk_write a cada N ms ou M itens.
+#
+# Modos (BUFFER_INTERACOES_MODO):
+#   - "rapido":  confirma o voto assim que entra na fila (um flush com falha perde os votos pendentes)
+#   - "duravel": a requisição espera o flush do lote em que o voto entrou
+
+
+class BufferCheio(Exception):
+    """Fila do buffer cheia por mais tempo que o timeout configurado (backpressure)."""
+
+
+class _MetricasBuffer:
+    def __init__(self, capacidade):
+        self.capacidade = capacidade
+        self.enfileiradas = 0
+        self.rejeitadas = 0
+        self.gravadas = 0
+        self.com_erro = 0
+        self.flushes = 0
+        self.flush_total_ms = 0.0
+        self.flush_max_ms = 0.0
+        self.ultimo_flush_ms = None
+        self.ultimo_lote = 0
+        self._lock = threading.Lock()
+
+    def registrar_enfileirada(self):
+        with self._lock:
+            self.enfileiradas += 1
+
+    def registrar_rejeitada(self):
+        with self._lock:
+            self.rejeitadas += 1
+
+    def registrar_flush(self, tamanho, erros, duracao_ms):
+        with self._lock:
+            self.flushes += 1
+            self.gravadas += tamanho - erros
+            self.com_erro += erros
+            self.ultimo_lote = tamanho
+            self.ultimo_flush_ms = round(duracao_ms, 2)
+            self.flush_total_ms += duracao_ms
+            self.flush_max_ms = max(self.flush_max_ms, duracao_ms)
+
+    def como_dict(self, profundidade, modo):
+        with self._lock:
+            return {
+                "modo": modo,
+                "profundidade_fila": profundidade,
+                "capacidade": self.capacidade,
+                "enfileiradas": self.enfileiradas,
+                "rejeitadas": self.rejeitadas,
+                "gravadas": self.gravadas,
+                "com_erro": self.com_erro,
+                "flushes": self.flushes,
+                "ultimo_lote": self.ultimo_lote,
+                "ultimo_flush_ms": self.ultimo_flush_ms,
+                "flush_medio_ms": round(self.flush_total_ms / self.flushes, 2) if self.flushes else None,
+                "flush_max_ms": round(self.flush_max_ms, 2)
+            }
+
+
+def _chave(interacao):
+    return (interacao.vem_hash, interacao.pergunta_id, interacao.totem_id)
+
+
+def _deduplicar(lote):
+    """
+    Mantém só o último voto de cada (vem_hash, pergunta_id, totem_id) do lote,
+    já que o bulk_write não ordenado não garante a ordem de aplicação.
+    """
+    ultimos = {}
+    for interacao, _ in lote:
+        ultimos[_chave(interacao)] = interacao
+    return list(ultimos.values())
+
+
+def _erros_por_chave(interacoes, status):
+    return {
+        _chave(interacao): item["erro"]
+        for interacao, item in zip(interacoes, status)
+        if item["status"] == "erro"
+    }
+
+
+class BufferInteracoes:
+    """
+    Buffer write-behind síncrono: uma thread em segundo plano faz os flushes.
+    """
+    def __init__(self, repo):
+        self.repo = repo
+        self.intervalo = config.BUFFER_INTERACOES_INTERVALO_MS / 1000
+        self.max_itens = config.BUFFER_INTERACOES_MAX_ITENS
+        self.timeout = config.BUFFER_INTERACOES_TIMEOUT_S
+        self.duravel = config.BUFFER_INTERACOES_MODO == "duravel"
+        self.fila = queue.Queue(maxsize=config.BUFFER_INTERACOES_CAPACIDADE)
+        self.metricas = _MetricasBuffer(config.BUFFER_INTERACOES_CAPACIDADE)
+        self._thread = threading.Thread(target=self._loop, name="buffer-interacoes", daemon=True)
+        self._thread.start()
+
+    def enfileirar(self, interacao):
+        """
+        Coloca o voto na fila. Bloqueia até `timeout` se a fila estiver cheia
+        e, no modo durável, até o flush do lote ser confirmado pelo MongoDB.
+        """
+        confirmacao = Future() if self.duravel else None
+        try:
+            self.fila.put((interacao, confirmacao), timeout=self.timeout)
+        except queue.Full:
+            self.metricas.registrar_rejeitada()
+            raise BufferCheio("Fila de votos cheia, tente novamente em instantes")
+        self.metricas.registrar_enfileirada()
+
+        if confirmacao is not None:
+            confirmacao.result()
+
+    def obter_metricas(self):
+        return self.metricas.como_dict(self.fila.qsize(), "duravel" if self.duravel else "rapido")
+
+    def parar(self):
+        """
+        Grava o que ainda estiver na fila e encerra a thread (chamado no shutdown).
+        """
+        self.fila.put((None, None))
+        self._thread.join()
+
+    def _loop(self):
+        while True:
+            item = self.fila.get()
+            if item[0] is None:
+                return
+            lote = [item]
+            prazo = time.monotonic() + self.intervalo
+            encerrar = False
+
+            while len(lote) < self.max_itens:
+                restante = prazo - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    item = self.fila.get(timeout=restante)
+                except queue.Empty:
+                    break
+                if item[0] is None:
+                    encerrar = True
+                    break
+                lote.append(item)
+
+            self._gravar(lote)
+            if encerrar:
+                return
+
+    def _gravar(self, lote):
+        interacoes = _deduplicar(lote)
+        inicio = time.perf_counter()
+        try:
+            erros = _erros_por_chave(interacoes, self.repo.save_many(interacoes))
+            falha = None
+        except Exception as e:
+            logger.exception("Falha no flush do buffer de interações (%d votos)", len(lote))
+            erros = {}
+            falha = e
+        duracao_ms = (time.perf_counter() - inicio) * 1000
+        self.metricas.registrar_flush(len(lote), len(lote) if falha else len(erros), duracao_ms)
+
+        for interacao, confirmacao in lote:
+            if confirmacao is None:
+                continue
+            erro = falha or erros.get(_chave(interacao))
+            if erro:
+                confirmacao.set_exception(erro if isinstance(erro, Exception) else RuntimeError(erro))
+            else:
+                confirmacao.set_result(None)
+
+
+class BufferInteracoesAsync:
+    """
+    Buffer write-behind assíncrono: uma task no event loop faz os flushes.
+    A fila e a task são criadas no primeiro voto, já dentro do loop.
+    """
+    def __init__(self, repo):
+        self.repo = repo
+        self.intervalo = config.BUFFER_INTERACOES_INTERVALO_MS / 1000
+        self.max_itens = config.BUFFER_INTERACOES_MAX_ITENS
+        self.timeout = config.BUFFER_INTERACOES_TIMEOUT_S
+        self.duravel = config.BUFFER_INTERACOES_MODO == "duravel"
+        self.metricas = _MetricasBuffer(config.BUFFER_INTERACOES_CAPACIDADE)
+        self.fila = None
+        self._chegou = None
+        self._tarefa = None
+
+    def _iniciar(self):
+        if self._tarefa is None:
+            self.fila = asyncio.Queue(maxsize=config.BUFFER_INTERACOES_CAPACIDADE)
+            # Sinalizado a cada item colocado na fila: o loop espera por ele, sem polling
+            self._chegou = asyncio.Event()
+            self._tarefa = asyncio.create_task(self._loop())
+
+    async def enfileirar(self, interacao):
+        self._iniciar()
+        confirmacao = asyncio.get_running_loop().create_future() if self.duravel else None
+        try:
+            await asyncio.wait_for(self.fila.put((interacao, confirmacao)), self.timeout)
+        except asyncio.TimeoutError:
+            self.metricas.registrar_rejeitada()
+            raise BufferCheio("Fila de votos cheia, tente novamente em instantes")
+        self._chegou.set()
+        self.metricas.registrar_enfileirada()
+
+        if confirmacao is not None:
+            await confirmacao
+
+    def obter_metricas(self):
+        profundidade = self.fila.qsize() if self.fila is not None else 0
+        return self.metricas.como_dict(profundidade, "duravel" if self.duravel else "rapido")
+
+    async def parar(self):
+        if self._tarefa is None:
+            return
+        await self.fila.put((None, None))
+        self._chegou.set()
+        await self._tarefa
+
+    async def _loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self.fila.get()
+            if item[0] is None:
+                return
+            lote = [item]
+            prazo = loop.time() + self.intervalo
+            encerrar = False
+
+            # Esvazia a fila sem cancelar um get() pendente (evita perder itens no timeout)
+            while len(lote) < self.max_itens and not encerrar:
+                try:
+                    item = self.fila.get_nowait()
+                except asyncio.QueueEmpty:
+                    restante = prazo - loop.time()
+                    if restante <= 0:
+                        break
+                    # Dorme até o próximo put() ou o fim do prazo. Entre o get_nowait() e o
+                    # clear() não há await, então nenhum put() fica sem acordar o loop.
+                    self._chegou.clear()
+                    try:
+                        await asyncio.wait_for(self._chegou.wait(), restante)
+                    except asyncio.TimeoutError:
+                        break
+                    continue
+                if item[0] is None:
+                    encerrar = True
+                else:
+                    lote.append(item)
+
+            await self._gravar(lote)
+            if encerrar:
+                return
+
+    async def _gravar(self, lote):
+        interacoes = _deduplicar(lote)
+        inicio = time.perf_counter()
+        try:
+            erros = _erros_por_chave(interacoes, await self.repo.save_many(interacoes))
+            falha = None
+        except Exception as e:
+            logger.exception("Falha no flush do buffer de interações (%d votos)", len(lote))
+            erros = {}
+            falha = e
+        duracao_ms = (time.perf_counter() - inicio) * 1000
+        self.metricas.registrar_flush(len(lote), len(lote) if falha else len(erros), duracao_ms)
+
+        for interacao, confirmacao in lote:
+            if confirmacao is None or confirmacao.done():
+                continue
+            erro = falha or erros.get(_chave(interacao))
+            if erro:
+                confirmacao.set_exception(erro if isinstance(erro, Exception) else RuntimeError(erro))
+            else:
+                confirmacao.set_result(None)
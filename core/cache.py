@@ -0,0 +1,160 @@
+import threading
+import time
+from collections import OrderedDict
+
+# Cache em memória de resultados caros (ex.: estatísticas agregadas).
+# Cada entrada expira `ttl_s` segundos após ser guardada; ttl_s <= 0 desativa o cache.
+
+_AUSENTE = object()
+
+
+class CacheTTL:
+    def __init__(self, ttl_s: float):
+        self.ttl_s = ttl_s
+        self._entradas = {}
+        self._lock = threading.Lock()
+
+    @property
+    def ativo(self) -> bool:
+        return self.ttl_s > 0
+
+    def obter(self, chave, padrao=None):
+        if not self.ativo:
+            return padrao
+        with self._lock:
+            entrada = self._entradas.get(chave, _AUSENTE)
+            if entrada is _AUSENTE:
+                return padrao
+            expira_em, valor = entrada
+            if expira_em <= time.monotonic():
+                del self._entradas[chave]
+                return padrao
+            return valor
+
+    def guardar(self, chave, valor):
+        if not self.ativo:
+            return
+        with self._lock:
+            self._entradas[chave] = (time.monotonic() + self.ttl_s, valor)
+
+    def invalidar(self, chave=None):
+        """
+        Remove uma entrada (ou todas, sem `chave`).
+        """
+        with self._lock:
+            if chave is None:
+                self._entradas.clear()
+            else:
+                self._entradas.pop(chave, None)
+
+
+class CacheLRU:
+    """
+    Cache limitado a `capacidade` entradas (remove a menos usada ao encher), com expiração
+    opcional por `ttl_s` (<= 0: sem expiração). Conta acertos, faltas e remoções por capacidade.
+
+    Leitura com carga (read-through) sem gravar valor velho: pegue `marca()` antes de ler
+    do banco e passe-a para `guardar`; se houve invalidação no meio, o valor é descartado.
+    """
+
+    def __init__(self, capacidade: int, ttl_s: float = 0):
+        self.capacidade = capacidade
+        self.ttl_s = ttl_s
+        self._entradas = OrderedDict()
+        self._invalidacoes = 0
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.faltas = 0
+        self.remocoes = 0
+
+    @property
+    def ativo(self) -> bool:
+        return self.capacidade > 0
+
+    def obter(self, chave, padrao=None):
+        if not self.ativo:
+            return padrao
+        with self._lock:
+            entrada = self._entradas.get(chave, _AUSENTE)
+            if entrada is not _AUSENTE and entrada[0] is not None and entrada[0] <= time.monotonic():
+                del self._entradas[chave]
+                entrada = _AUSENTE
+            if entrada is _AUSENTE:
+                self.faltas += 1
+                return padrao
+            self._entradas.move_to_end(chave)
+            self.acertos += 1
+            return entrada[1]
+
+    def marca(self) -> int:
+        return self._invalidacoes
+
+    def guardar(self, chave, valor, marca=None):
+        if not self.ativo:
+            return
+        expira_em = time.monotonic() + self.ttl_s if self.ttl_s > 0 else None
+        with self._lock:
+            if marca is not None and marca != self._invalidacoes:
+                return
+            self._entradas[chave] = (expira_em, valor)
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.capacidade:
+                self._entradas.popitem(last=False)
+                self.remocoes += 1
+
+    def invalidar(self, chave=None):
+        """
+        Remove uma entrada (ou todas, sem `chave`).
+        """
+        with self._lock:
+            self._invalidacoes += 1
+            if chave is None:
+                self._entradas.clear()
+            else:
+                self._entradas.pop(chave, None)
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            consultas = self.acertos + self.faltas
+            return {
+                "ativo": self.ativo,
+                "capacidade": self.capacidade,
+                "ttl_s": self.ttl_s,
+                "entradas": len(self._entradas),
+                "acertos": self.acertos,
+                "faltas": self.faltas,
+                "remocoes": self.remocoes,
+                "taxa_acerto": round(self.acertos / consultas, 4) if consultas else None,
+            }
+
+
+class CanalInvalidacao:
+    """
+    Canal publish/subscribe de invalidações de cache. Esta implementação é local (entrega
+    às assinaturas do próprio processo); para vários workers, um canal com a mesma
+    interface sobre um broker (ex.: Redis pub/sub) entrega a chave a todos os processos.
+    """
+
+    def __init__(self):
+        self._assinaturas = {}
+        self._lock = threading.Lock()
+
+    def assinar(self, topico: str, callback):
+        with self._lock:
+            self._assinaturas.setdefault(topico, []).append(callback)
+
+    def publicar(self, topico: str, chave=None):
+        """
+        Publica a invalidação de `chave` (None = todas as entradas do tópico).
+        """
+        with self._lock:
+            callbacks = list(self._assinaturas.get(topico, ()))
+        for callback in callbacks:
+            callback(chave)
+
+
+_canal = CanalInvalidacao()
+
+
+def obter_canal() -> CanalInvalidacao:
+    return _canal
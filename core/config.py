@@ -0,0 +1,93 @@
+from dotenv import load_dotenv
+import os
+
+load_dotenv()
+
+# Configurações da aplicação lidas do .env (com valores padrão seguros)
+
+
+def _env_bool(nome: str, padrao: bool = False) -> bool:
+    valor = os.getenv(nome)
+    if valor is None:
+        return padrao
+    return valor.strip().lower() in ("1", "true", "sim", "yes", "on")
+
+
+def _env_int(nome: str, padrao: int) -> int:
+    valor = os.getenv(nome)
+    return int(valor) if valor else padrao
+
+
+def _env_float(nome: str, padrao: float) -> float:
+    valor = os.getenv(nome)
+    return float(valor) if valor else padrao
+
+
+MONGODB_URI = os.getenv("MONGODB_URI")
+MONGODB_DB_NAME = os.getenv("MONGODB_DB_NAME")
+
+# Camada de dados assíncrona (PyMongo Async). Com False, mantém o MongoClient síncrono.
+MONGODB_ASYNC = _env_bool("MONGODB_ASYNC", False)
+
+# Executa migrações pendentes e cria os índices declarados na inicialização da API
+MONGODB_CRIAR_INDICES = _env_bool("MONGODB_CRIAR_INDICES", True)
+
+# Quantidade máxima de votos aceitos em POST /interacoes/lote
+INTERACOES_LOTE_MAXIMO = _env_int("INTERACOES_LOTE_MAXIMO", 10000)
+
+# Buffer write-behind de votos (POST /interacoes/): acumula upserts e grava em lote
+BUFFER_INTERACOES_ATIVO = _env_bool("BUFFER_INTERACOES_ATIVO", False)
+BUFFER_INTERACOES_INTERVALO_MS = _env_int("BUFFER_INTERACOES_INTERVALO_MS", 50)
+BUFFER_INTERACOES_MAX_ITENS = _env_int("BUFFER_INTERACOES_MAX_ITENS", 500)
+BUFFER_INTERACOES_CAPACIDADE = _env_int("BUFFER_INTERACOES_CAPACIDADE", 10000)
+BUFFER_INTERACOES_TIMEOUT_S = _env_float("BUFFER_INTERACOES_TIMEOUT_S", 2.0)
+# "rapido" confirma ao enfileirar; "duravel" espera o flush ser confirmado pelo MongoDB
+BUFFER_INTERACOES_MODO = os.getenv("BUFFER_INTERACOES_MODO", "rapido")
+
+# Documentos lidos do cursor por lote na exportação em streaming (limita a memória usada)
+EXPORTACAO_TAMANHO_LOTE = _env_int("EXPORTACAO_TAMANHO_LOTE", 1000)
+
+# Linhas validadas e gravadas por bulk_write na importação de serviços (CSV/XLSX)
+IMPORTACAO_TAMANHO_LOTE = _env_int("IMPORTACAO_TAMANHO_LOTE", 1000)
+# Importações em segundo plano executadas ao mesmo tempo (por instância); as demais esperam na fila.
+# Cada importação usa uma conexão por vez, então o limite protege o pool usado pelos votos.
+IMPORTACAO_MAX_CONCORRENTES = _env_int("IMPORTACAO_MAX_CONCORRENTES", 1)
+# Linhas com erro devolvidas na resposta da importação com aguardar=true (as demais ficam na listagem paginada)
+IMPORTACAO_ERROS_NO_RESUMO = _env_int("IMPORTACAO_ERROS_NO_RESUMO", 100)
+
+# Fuso horário dos horários de funcionamento dos serviços (filtros aberto_agora/aberto_em)
+SERVICOS_FUSO_HORARIO = os.getenv("SERVICOS_FUSO_HORARIO", "America/Recife")
+
+# Paginação por keyset (limite/cursor) nas listagens
+PAGINACAO_LIMITE_PADRAO = _env_int("PAGINACAO_LIMITE_PADRAO", 100)
+PAGINACAO_LIMITE_MAXIMO = _env_int("PAGINACAO_LIMITE_MAXIMO", 1000)
+
+# Intervalo (s) da atualização incremental dos rollups por hora/dia das interações; 0 desativa
+ROLLUPS_INTERVALO_S = _env_float("ROLLUPS_INTERVALO_S", 60.0)
+
+# Pontos concedidos no primeiro voto de um usuário em cada pergunta (POST /interacoes/votar)
+PONTOS_POR_VOTO = _env_int("PONTOS_POR_VOTO", 10)
+
+# Ranking em memória (árvore de Fenwick) para "qual a minha posição" em O(log P).
+# Só com um worker: com WEB_CONCURRENCY > 1 ele não é carregado e a posição é contada pelo
+# índice de pontuação, em O(posição).
+RANKING_MEMORIA_ATIVO = _env_bool("RANKING_MEMORIA_ATIVO", False)
+
+# Número de workers da API (a mesma variável lida pelo uvicorn/gunicorn para --workers)
+WEB_CONCURRENCY = _env_int("WEB_CONCURRENCY", 1)
+
+# Cache (s) do resultado de GET /usuarios/estatisticas; 0 desativa
+USUARIOS_ESTATISTICAS_CACHE_TTL_S = _env_float("USUARIOS_ESTATISTICAS_CACHE_TTL_S", 0)
+
+# Cache LRU dos usuários buscados por vem_hash: máximo de entradas (0 desativa) e validade (s, 0 = sem expiração).
+# A invalidação é local ao processo: com vários workers, mantenha o TTL curto.
+USUARIOS_CACHE_CAPACIDADE = _env_int("USUARIOS_CACHE_CAPACIDADE", 0)
+USUARIOS_CACHE_TTL_S = _env_float("USUARIOS_CACHE_TTL_S", 30)
+
+# Índice espacial em memória dos serviços ativos (busca por raio / k mais próximos sem ir ao banco).
+# Só com uma instância/worker da API; sem ele a proximidade usa $geoNear no índice 2dsphere.
+SERVICOS_INDICE_MEMORIA_ATIVO = _env_bool("SERVICOS_INDICE_MEMORIA_ATIVO", False)
+
+# Raio máximo (km) da tabela materializada totem -> serviços próximos; 0 desativa.
+# Buscas por totem com raio maior que este são calculadas na hora.
+PROXIMIDADE_RAIO_MAXIMO_KM = _env_float("PROXIMIDADE_RAIO_MAXIMO_KM", 10)
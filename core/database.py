@@ -1,16 +1,13 @@
-from pymongo import MongoClient
-from dotenv import load_dotenv
-import os
-
-load_dotenv()
+from pymongo import MongoClient, AsyncMongoClient
+from core import config
 
 class MongoConnection:
     _instance = None
 
     def __new__(cls):
         if cls._instance is None:
-            uri = os.getenv("MONGODB_URI")
-            db_name = os.getenv("MONGODB_DB_NAME")
+            uri = config.MONGODB_URI
+            db_name = config.MONGODB_DB_NAME
 
             if not uri or not db_name:
                 raise ValueError("As variáveis MONGODB_URI e MONGODB_DB_NAME precisam estar definidas no .env")
@@ -18,7 +15,32 @@ class MongoConnection:
             cls._instance = super().__new__(cls)
             cls._instance.client = MongoClient(uri)
             cls._instance.db = cls._instance.client[db_name]
+            # Cliente assíncrono é criado sob demanda (só quando MONGODB_ASYNC estiver ativo)
+            cls._instance.async_client = None
+            cls._instance.async_db = None
         return cls._instance
 
-    def get_collection(self, name: str):
+    def get_collection(self, name: str, assincrono: bool = False):
+        """
+        Retorna a coleção do cliente síncrono ou, com `assincrono`, do assíncrono.
+        """
+        if assincrono:
+            return self.get_async_collection(name)
         return self.db[name]
+
+    def get_async_collection(self, name: str):
+        """
+        Retorna a coleção do cliente assíncrono (PyMongo Async API).
+        """
+        if self.async_client is None:
+            self.async_client = AsyncMongoClient(config.MONGODB_URI)
+            self.async_db = self.async_client[config.MONGODB_DB_NAME]
+        return self.async_db[name]
+
+    async def close(self):
+        """
+        Fecha as conexões abertas (chamado no shutdown da aplicação).
+        """
+        if self.async_client is not None:
+            await self.async_client.close()
+        self.client.close()
@@ -0,0 +1,90 @@
+import numpy as np
+
+from models.servico import RAIO_TERRA_KM, distancia_haversine
+
+# Haversine vetorizado (NumPy) para calcular de uma vez as distâncias de um ou vários
+# pontos até um conjunto de coordenadas guardado em arrays float64 contíguos.
+# As operações seguem a mesma ordem de models.servico.distancia_haversine, e o
+# arredondamento em 2 casas dá o mesmo double que o round() do Python: os valores saem
+# idênticos aos do cálculo escalar (perto de um empate de arredondamento, onde uma diferença
+# de último bit do seno/cosseno vetorizado mudaria o resultado, o valor é refeito no escalar).
+
+# Distância relativa de um empate (x,xx5) abaixo da qual o valor é recalculado no escalar
+_TOLERANCIA_EMPATE = 1e-6
+
+
+class Coordenadas:
+    """
+    Conjunto de pontos (graus) com latitude/longitude já em radianos e o cosseno da latitude.
+    """
+
+    def __init__(self, latitudes, longitudes):
+        self.latitudes = np.ascontiguousarray(latitudes, dtype=np.float64)
+        self.longitudes = np.ascontiguousarray(longitudes, dtype=np.float64)
+        self.lat_rad = np.radians(self.latitudes)
+        self.lon_rad = np.radians(self.longitudes)
+        self.cos_lat = np.cos(self.lat_rad)
+
+    def __len__(self):
+        return len(self.latitudes)
+
+    def distancias_km(self, latitude: float, longitude: float) -> np.ndarray:
+        """
+        Distâncias (km, sem arredondar) de cada ponto do conjunto até (latitude, longitude).
+        """
+        lat2 = np.radians(latitude)
+        lon2 = np.radians(longitude)
+        dlon = lon2 - self.lon_rad
+        dlat = lat2 - self.lat_rad
+        a = np.sin(dlat / 2) ** 2 + self.cos_lat * np.cos(lat2) * np.sin(dlon / 2) ** 2
+        return RAIO_TERRA_KM * (2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a)))
+
+    def matriz_km(self, origens: "Coordenadas") -> np.ndarray:
+        """
+        Matriz (len(origens) x len(self)) de distâncias sem arredondar, numa única passada.
+        """
+        lat2 = origens.lat_rad[:, None]
+        lon2 = origens.lon_rad[:, None]
+        dlon = lon2 - self.lon_rad[None, :]
+        dlat = lat2 - self.lat_rad[None, :]
+        a = np.sin(dlat / 2) ** 2 + self.cos_lat[None, :] * origens.cos_lat[:, None] * np.sin(dlon / 2) ** 2
+        return RAIO_TERRA_KM * (2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a)))
+
+    def arredondar(self, distancias: np.ndarray, indices, latitude: float, longitude: float) -> list:
+        """
+        Distâncias dos `indices` arredondadas em 2 casas, idênticas a distancia_haversine.
+        """
+        indices = np.asarray(indices, dtype=np.intp)
+        centesimos = distancias[indices] * 100
+        # Longe de um empate, rint(x*100)/100 é o mesmo double que round(x, 2)
+        arredondadas = (np.rint(centesimos) / 100).tolist()
+        empates = np.flatnonzero(np.abs(centesimos - np.floor(centesimos) - 0.5) < _TOLERANCIA_EMPATE)
+        for posicao in empates:
+            indice = indices[posicao]
+            arredondadas[posicao] = distancia_haversine(
+                float(self.latitudes[indice]), float(self.longitudes[indice]), latitude, longitude
+            )
+        return arredondadas
+
+    def no_raio(self, latitude: float, longitude: float, raio_km: float, mascara=None):
+        """
+        Índices e distâncias arredondadas dos pontos com distância <= raio_km,
+        em ordem crescente de distância (estável na ordem original em empates).
+        `mascara` (array de bool) restringe os pontos considerados (ex.: por tipo).
+        """
+        return self.selecionar_no_raio(self.distancias_km(latitude, longitude), latitude, longitude, raio_km, mascara)
+
+    def selecionar_no_raio(self, distancias: np.ndarray, latitude: float, longitude: float, raio_km: float, mascara=None):
+        """
+        Como no_raio(), a partir de distâncias já calculadas até (latitude, longitude)
+        (ex.: uma linha de matriz_km).
+        """
+        # Folga de meio centésimo: o corte é feito no valor já arredondado
+        candidatos = distancias <= raio_km + 0.005
+        if mascara is not None:
+            candidatos &= mascara
+        indices = np.flatnonzero(candidatos)
+        arredondadas = self.arredondar(distancias, indices, latitude, longitude)
+        pares = [(d, int(i)) for d, i in zip(arredondadas, indices) if d <= raio_km]
+        pares.sort(key=lambda par: par[0])
+        return pares
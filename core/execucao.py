@@ -0,0 +1,128 @@
+import asyncio
+import functools
+import inspect
+from starlette.concurrency import run_in_threadpool
+
+# Repositórios e services escrevem cada método uma única vez, como gerador: toda chamada
+# ao banco (ou a outro método @operacao) é feita com `yield` e o resultado volta pelo
+# próprio `yield`. Na classe síncrona o gerador é conduzido na hora (as chamadas do
+# MongoClient já devolvem o resultado); na classe assíncrona (assincrono = True) o método
+# vira uma corrotina que aguarda cada passo do AsyncMongoClient. Assim as versões
+# síncrona e assíncrona não têm lógica duplicada:
+#
+#     class TotemRepository:
+#         assincrono = False
+#
+#         @operacao
+#         def get_by_id(self, totem_id):
+#             return (yield self.collection.find_one({"totem_id": totem_id}, {"_id": 0}))
+#
+#     class TotemRepositoryAsync(TotemRepository):
+#         assincrono = True
+#
+# Geradores auxiliares (como agregar) entram com `yield from`.
+
+
+async def executar(func, *args, **kwargs):
+    """
+    Executa um método de service respeitando o modo configurado (MONGODB_ASYNC).
+    Métodos assíncronos são aguardados direto no event loop; métodos síncronos
+    rodam no threadpool, como o FastAPI já fazia com as rotas `def`.
+    """
+    if inspect.iscoroutinefunction(func):
+        return await func(*args, **kwargs)
+    return await run_in_threadpool(func, *args, **kwargs)
+
+
+class operacao:
+    """
+    Decorador de métodos escritos como gerador de passos (ver o comentário do módulo).
+    Métodos sem passos de banco (que só montam um gerador de streaming, por exemplo)
+    ficam sem o decorador.
+    """
+    def __init__(self, passos):
+        self.passos = passos
+        functools.update_wrapper(self, passos)
+
+    def __get__(self, objeto, classe=None):
+        if objeto is None:
+            return self
+        passos = self.passos.__get__(objeto, classe)
+        if getattr(objeto, "assincrono", False):
+            @functools.wraps(passos)
+            async def metodo_async(*args, **kwargs):
+                return await conduzir_async(passos(*args, **kwargs))
+            return metodo_async
+
+        @functools.wraps(passos)
+        def metodo(*args, **kwargs):
+            return conduzir(passos(*args, **kwargs))
+        return metodo
+
+
+def conduzir(passos):
+    """
+    Conduz os passos com chamadas síncronas: cada valor produzido já é o resultado.
+    """
+    resultado = None
+    try:
+        while True:
+            resultado = passos.send(resultado)
+    except StopIteration as fim:
+        return fim.value
+
+
+async def conduzir_async(passos):
+    """
+    Conduz os passos aguardando cada um; exceções voltam para dentro do gerador
+    (try/except em torno de um `yield` funciona como na versão síncrona).
+    """
+    resultado, erro = None, None
+    while True:
+        try:
+            pendente = passos.throw(erro) if erro is not None else passos.send(resultado)
+        except StopIteration as fim:
+            return fim.value
+        try:
+            resultado, erro = (await pendente if inspect.isawaitable(pendente) else pendente), None
+        except Exception as e:
+            resultado, erro = None, e
+
+
+def bloqueante(objeto, func, *args):
+    """
+    Passo de trabalho bloqueante (leitura de arquivo, CPU): roda direto na versão
+    síncrona e no threadpool na assíncrona, para não travar o event loop.
+    """
+    if getattr(objeto, "assincrono", False):
+        return run_in_threadpool(func, *args)
+    return func(*args)
+
+
+def em_paralelo(objeto, passos):
+    """
+    Passo que junta vários passos independentes (ex.: escritas em coleções diferentes):
+    na versão assíncrona eles vão ao banco ao mesmo tempo (asyncio.gather); na síncrona
+    já foram executados ao montar a lista. Retorna a lista de resultados.
+    """
+    if getattr(objeto, "assincrono", False):
+        return asyncio.gather(*passos)
+    return list(passos)
+
+
+def aguardar_futuro(objeto, futuro):
+    """
+    Passo que espera um concurrent.futures.Future (trabalho entregue a um pool próprio):
+    bloqueia na versão síncrona e, na assíncrona, espera sem travar o event loop.
+    """
+    if getattr(objeto, "assincrono", False):
+        return asyncio.wrap_future(futuro)
+    return futuro.result()
+
+
+def agregar(collection, pipeline, **kwargs):
+    """
+    Passos de um aggregate lido por inteiro (use com `yield from`).
+    """
+    cursor = yield collection.aggregate(pipeline, **kwargs)
+    return (yield cursor.to_list(None))
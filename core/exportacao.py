@@ -0,0 +1,93 @@
+import csv
+import io
+import json
+import zlib
+
+# Exportação em streaming: os documentos são lidos do cursor em lotes e cada lote
+# é serializado (e opcionalmente comprimido) antes de ser enviado, então o uso de
+# memória fica limitado ao tamanho de um lote, não ao tamanho da coleção.
+
+FORMATOS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+class _Codificador:
+    def __init__(self, formato: str, colunas: list, comprimir: bool):
+        if formato not in FORMATOS:
+            raise ValueError(f"Formato inválido, use um de: {', '.join(FORMATOS)}")
+        self.formato = formato
+        self.colunas = colunas
+        # wbits=31 gera o cabeçalho gzip (arquivo .gz válido)
+        self.compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if comprimir else None
+
+    def _saida(self, texto: str) -> bytes:
+        dados = texto.encode("utf-8")
+        if self.compressor:
+            return self.compressor.compress(dados)
+        return dados
+
+    def cabecalho(self) -> bytes:
+        if self.formato != "csv":
+            return b""
+        return self._saida(",".join(self.colunas) + "\r\n")
+
+    def codificar(self, documentos: list) -> bytes:
+        if self.formato == "ndjson":
+            texto = "".join(json.dumps(doc, ensure_ascii=False, default=str) + "\n" for doc in documentos)
+        else:
+            buffer = io.StringIO()
+            writer = csv.DictWriter(buffer, fieldnames=self.colunas, extrasaction="ignore")
+            writer.writerows(documentos)
+            texto = buffer.getvalue()
+        return self._saida(texto)
+
+    def finalizar(self) -> bytes:
+        return self.compressor.flush() if self.compressor else b""
+
+
+def nome_arquivo(base: str, formato: str, comprimir: bool) -> str:
+    return f"{base}.{formato}" + (".gz" if comprimir else "")
+
+
+def tipo_conteudo(formato: str, comprimir: bool) -> str:
+    return "application/gzip" if comprimir else FORMATOS[formato]
+
+
+def exportar(cursor, formato: str, colunas: list, comprimir: bool = False, tamanho_lote: int = 1000):
+    """
+    Gera os bytes da exportação a partir de um cursor síncrono do PyMongo.
+    """
+    codificador = _Codificador(formato, colunas, comprimir)
+    yield codificador.cabecalho()
+
+    lote = []
+    for documento in cursor:
+        lote.append(documento)
+        if len(lote) >= tamanho_lote:
+            yield codificador.codificar(lote)
+            lote = []
+
+    if lote:
+        yield codificador.codificar(lote)
+    yield codificador.finalizar()
+
+
+async def exportar_async(cursor, formato: str, colunas: list, comprimir: bool = False, tamanho_lote: int = 1000):
+    """
+    Versão assíncrona de exportar() para cursores do PyMongo Async.
+    """
+    codificador = _Codificador(formato, colunas, comprimir)
+    yield codificador.cabecalho()
+
+    lote = []
+    async for documento in cursor:
+        lote.append(documento)
+        if len(lote) >= tamanho_lote:
+            yield codificador.codificar(lote)
+            lote = []
+
+    if lote:
+        yield codificador.codificar(lote)
+    yield codificador.finalizar()
@@ -0,0 +1,168 @@
+import re
+from datetime import datetime
+from typing import List, Optional
+from zoneinfo import ZoneInfo
+
+from core import config
+from core.texto import normalizar
+
+# Horário de funcionamento estruturado: o texto livre de "horario_funcionamento"
+# ("24 horas", "Seg-Sex: 8h-17h", "Segunda a Sexta: 8h às 12h, 14h às 18h; Sáb: 8h-12h")
+# é convertido ao gravar em intervalos semanais [inicio, fim) em minutos a partir de
+# segunda 00:00 (0 a 10080), guardados no campo "horarios" do serviço. "Aberto às X" vira
+# uma comparação de inteiros no banco, sem reler o texto a cada consulta. Texto que não é
+# reconhecido fica sem intervalos (None): o serviço não entra nos filtros de aberto.
+
+MINUTOS_DIA = 24 * 60
+MINUTOS_SEMANA = 7 * MINUTOS_DIA
+
+_DIAS = {
+    "seg": 0, "segunda": 0, "ter": 1, "terca": 1, "qua": 2, "quarta": 2, "qui": 3, "quinta": 3,
+    "sex": 4, "sexta": 4, "sab": 5, "sabado": 5, "dom": 6, "domingo": 6,
+}
+_TODOS_OS_DIAS = ("todos os dias", "diariamente", "diario", "todo dia")
+# Palavras aceitas junto dos dias ("segunda a sexta", "sab e dom", "segunda-feira", "atendimento 24h")
+_CONECTORES = {
+    "a", "ate", "e", "de", "das", "as", "feira", "aos", "nos", "atendimento", "aberto", "funcionamento", "horario",
+}
+
+_HORA = r"(\d{1,2})\s*(?:h|:|hs)\s*(\d{2})?\s*(?:h|hs|min)?"
+# Uma faixa de horário ("8h às 17h", "07:30-19:00") ou o dia inteiro ("24 horas")
+_HORARIO = re.compile(_HORA + r"\s*(?:-|–|a|as|ate)\s*" + _HORA + r"|(\b24\s*(?:h|hs|horas)\b)")
+_SEPARADORES = re.compile(r"[;,|\n]")
+_OBSERVACOES = re.compile(r"\(.*?\)")
+
+
+def intervalos_semanais(texto: Optional[str]) -> Optional[List[dict]]:
+    """
+    Intervalos [{"inicio": m, "fim": m}] da semana em que o serviço abre, ordenados e sem
+    sobreposição ([] se só há dias fechados). None se o texto está vazio ou não foi reconhecido.
+
+    Cada horário vale para os dias citados logo antes dele; sem dias, para os mesmos do
+    horário anterior ("Seg-Sex 8h-12h, 14h-18h") ou, no primeiro, para todos os dias.
+    """
+    if not texto:
+        return None
+    texto = _OBSERVACOES.sub(" ", normalizar(texto))
+    intervalos = []
+    dias = list(range(7))
+    posicao = 0
+    fechado = False
+    for horario in _HORARIO.finditer(texto):
+        citados = _dias_antes(texto[posicao:horario.start()])
+        if citados is None:
+            return None
+        dias = citados or dias
+        posicao = horario.end()
+        faixa = (0, MINUTOS_DIA) if horario.group(5) else _minutos_da_faixa(horario.groups()[:4])
+        if faixa is None:
+            return None
+        for dia in dias:
+            intervalos.extend(_na_semana(dia * MINUTOS_DIA + faixa[0], dia * MINUTOS_DIA + faixa[1]))
+
+    # Depois do último horário só podem vir dias fechados ("Dom: fechado")
+    for trecho in _SEPARADORES.split(texto[posicao:]):
+        citados = _dias(trecho.replace("fechado", " "))
+        if citados is None or (citados and "fechado" not in trecho):
+            return None
+        fechado = fechado or "fechado" in trecho
+    if not intervalos and not fechado:
+        return None
+    return _unir(intervalos)
+
+
+def minuto_da_semana(momento: Optional[datetime] = None) -> int:
+    """
+    Minuto da semana (segunda 00:00 = 0) de `momento` no fuso dos serviços
+    (SERVICOS_FUSO_HORARIO); sem `momento`, agora. Datas sem fuso já são locais.
+    """
+    fuso = ZoneInfo(config.SERVICOS_FUSO_HORARIO)
+    if momento is None:
+        momento = datetime.now(fuso)
+    elif momento.tzinfo is not None:
+        momento = momento.astimezone(fuso)
+    return momento.weekday() * MINUTOS_DIA + momento.hour * 60 + momento.minute
+
+
+def aberto(horarios: Optional[List[dict]], minuto: int) -> bool:
+    """
+    Se algum intervalo contém o minuto (mesma regra do filtro do banco).
+    """
+    return any(intervalo["inicio"] <= minuto < intervalo["fim"] for intervalo in horarios or ())
+
+
+def filtro_aberto(minuto: int) -> dict:
+    """
+    Filtro do MongoDB para serviços abertos no minuto da semana (índice "horarios_semana").
+    """
+    return {"horarios": {"$elemMatch": {"inicio": {"$lte": minuto}, "fim": {"$gt": minuto}}}}
+
+
+def _dias_antes(texto: str):
+    """
+    Dias do trecho que precede um horário: os do último pedaço entre separadores que cita
+    algum dia (pedaços com "fechado" não contam). None se há palavras desconhecidas.
+    """
+    citados = []
+    for trecho in _SEPARADORES.split(texto):
+        dias = _dias(trecho.replace("fechado", " "))
+        if dias is None:
+            return None
+        if dias and "fechado" not in trecho:
+            citados = dias
+    return citados
+
+
+def _dias(texto: str):
+    """
+    Dias da semana (0 = segunda) citados no texto; [] se não cita nenhum, None se há
+    palavras desconhecidas.
+    """
+    if any(expressao in texto for expressao in _TODOS_OS_DIAS):
+        return list(range(7))
+    dias = []
+    anterior = None
+    faixa = False
+    for palavra in re.findall(r"[a-z]+|-|/", texto):
+        if palavra in _DIAS:
+            dia = _DIAS[palavra]
+            if faixa and anterior is not None:
+                dias.extend((anterior + passo) % 7 for passo in range(1, (dia - anterior) % 7 + 1))
+            else:
+                dias.append(dia)
+            anterior = dia
+            faixa = False
+        elif palavra in ("-", "a", "ate"):
+            faixa = anterior is not None
+        elif palavra not in _CONECTORES and palavra != "/":
+            return None
+    return sorted(set(dias))
+
+
+def _minutos_da_faixa(grupos) -> Optional[tuple]:
+    hora_inicio, minuto_inicio, hora_fim, minuto_fim = grupos
+    inicio = int(hora_inicio) * 60 + int(minuto_inicio or 0)
+    fim = int(hora_fim) * 60 + int(minuto_fim or 0)
+    if inicio >= MINUTOS_DIA or fim > MINUTOS_DIA or int(minuto_inicio or 0) >= 60 or int(minuto_fim or 0) >= 60:
+        return None
+    if fim <= inicio:
+        # Passa da meia-noite ("18h-2h"; "0h" no fim é meia-noite)
+        fim += MINUTOS_DIA
+    return inicio, fim
+
+
+def _na_semana(inicio: int, fim: int) -> List[tuple]:
+    # Domingo à noite que passa da meia-noite continua na segunda (início da semana)
+    if fim <= MINUTOS_SEMANA:
+        return [(inicio, fim)]
+    return [(inicio, MINUTOS_SEMANA), (0, fim - MINUTOS_SEMANA)]
+
+
+def _unir(intervalos: List[tuple]) -> List[dict]:
+    unidos = []
+    for inicio, fim in sorted(intervalos):
+        if unidos and inicio <= unidos[-1][1]:
+            unidos[-1][1] = max(unidos[-1][1], fim)
+        else:
+            unidos.append([inicio, fim])
+    return [{"inicio": inicio, "fim": fim} for inicio, fim in unidos]
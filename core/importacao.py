@@ -0,0 +1,143 @@
+import csv
+import io
+from itertools import islice
+
+import openpyxl
+from pydantic import ValidationError
+
+from models.servico import ServicoCreate
+
+# Importação em streaming de serviços: o arquivo enviado (já num SpooledTemporaryFile do
+# UploadFile, que vai para o disco acima de 1 MB) é lido linha a linha — CSV decodificado
+# de forma incremental, XLSX com openpyxl em modo read_only — e as linhas são entregues
+# em lotes. A memória usada fica limitada a um lote, não ao tamanho do arquivo.
+
+CAMPOS_OBRIGATORIOS = ("nome", "tipo", "latitude", "longitude")
+CAMPOS_OPCIONAIS = ("endereco", "telefone", "horario_funcionamento", "descricao")
+
+EXTENSOES_CSV = (".csv",)
+EXTENSOES_EXCEL = (".xlsx",)
+
+
+def ler_linhas(arquivo, nome_arquivo: str):
+    """
+    Gera (numero_da_linha, dict) do arquivo, conforme a extensão (.csv ou .xlsx).
+    A linha 1 é o cabeçalho; colunas obrigatórias ausentes geram ValueError antes de tudo.
+    """
+    nome = (nome_arquivo or "").lower()
+    if nome.endswith(EXTENSOES_CSV):
+        return _linhas_csv(arquivo)
+    if nome.endswith(EXTENSOES_EXCEL):
+        return _linhas_xlsx(arquivo)
+    raise ValueError("Formato de arquivo não suportado. Use .csv ou .xlsx")
+
+
+def validar_arquivo(arquivo, nome_arquivo: str) -> None:
+    """
+    Confere extensão e cabeçalho sem importar nada (ValueError se inválido).
+    """
+    linhas = ler_linhas(arquivo, nome_arquivo)
+    next(linhas, None)
+    linhas.close()
+
+
+def em_lotes(linhas, tamanho: int):
+    """
+    Agrupa o iterador de linhas em listas de até `tamanho` itens.
+    """
+    linhas = iter(linhas)
+    while True:
+        lote = list(islice(linhas, tamanho))
+        if not lote:
+            return
+        yield lote
+
+
+def validar_linha(linha: dict) -> ServicoCreate:
+    """
+    Converte uma linha do arquivo em ServicoCreate (ValueError com mensagem curta se inválida).
+    """
+    valores = {campo: _texto(linha.get(campo)) for campo in CAMPOS_OBRIGATORIOS + CAMPOS_OPCIONAIS}
+    vazios = [campo for campo in CAMPOS_OBRIGATORIOS if not valores[campo]]
+    if vazios:
+        raise ValueError(f"Campos obrigatórios vazios: {', '.join(vazios)}")
+
+    try:
+        return ServicoCreate(
+            nome=valores["nome"],
+            tipo=valores["tipo"],
+            latitude=_numero(valores["latitude"], "latitude"),
+            longitude=_numero(valores["longitude"], "longitude"),
+            **{campo: valores[campo] or None for campo in CAMPOS_OPCIONAIS}
+        )
+    except ValidationError as e:
+        raise ValueError(mensagem_validacao(e))
+
+
+def _linhas_csv(arquivo):
+    arquivo.seek(0)
+    # utf-8-sig descarta o BOM que o Excel grava ao salvar CSV
+    texto = io.TextIOWrapper(arquivo, encoding="utf-8-sig", newline="")
+    leitor = csv.DictReader(texto)
+    try:
+        _validar_cabecalho(leitor.fieldnames or [])
+    except ValueError:
+        texto.detach()
+        raise
+    return _linhas_texto(texto, leitor)
+
+
+def _linhas_xlsx(arquivo):
+    arquivo.seek(0)
+    workbook = openpyxl.load_workbook(arquivo, read_only=True, data_only=True)
+    linhas = workbook.active.iter_rows(values_only=True)
+    cabecalho = [_texto(valor) for valor in next(linhas, ())]
+    try:
+        _validar_cabecalho(cabecalho)
+    except ValueError:
+        workbook.close()
+        raise
+    return _linhas_planilha(workbook, linhas, cabecalho)
+
+
+def _linhas_planilha(workbook, linhas, cabecalho):
+    try:
+        for numero, valores in enumerate(linhas, start=2):
+            if any(valor is not None for valor in valores):
+                yield numero, dict(zip(cabecalho, valores))
+    finally:
+        workbook.close()
+
+
+def _linhas_texto(texto, leitor):
+    try:
+        for numero, linha in enumerate(leitor, start=2):
+            yield numero, linha
+    finally:
+        # Solta o arquivo binário sem fechá-lo (quem fecha é o UploadFile)
+        texto.detach()
+
+
+def _validar_cabecalho(colunas):
+    faltando = [campo for campo in CAMPOS_OBRIGATORIOS if campo not in colunas]
+    if faltando:
+        raise ValueError(f"Colunas obrigatórias ausentes no cabeçalho: {', '.join(faltando)}")
+
+
+def _texto(valor) -> str:
+    return "" if valor is None else str(valor).strip()
+
+
+def _numero(valor: str, campo: str) -> float:
+    try:
+        # Aceita vírgula decimal ("-8,0476"), comum em planilhas em português
+        return float(valor if "." in valor else valor.replace(",", "."))
+    except ValueError:
+        raise ValueError(f"{campo} inválida: {valor!r}")
+
+
+def mensagem_validacao(erro: ValidationError) -> str:
+    """
+    Resume os erros do pydantic numa linha ("campo: mensagem; ...").
+    """
+    return "; ".join(f"{'.'.join(str(p) for p in item['loc'])}: {item['msg']}" for item in erro.errors())
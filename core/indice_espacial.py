@@ -0,0 +1,265 @@
+import logging
+import threading
+from math import cos, floor, radians, pi
+
+import numpy as np
+
+from core import config
+from core.database import MongoConnection
+from core.distancias import Coordenadas
+from core.horarios import aberto
+from models.servico import CAMPOS_RESPOSTA, RAIO_TERRA_KM, distancia_haversine
+
+logger = logging.getLogger(__name__)
+
+# Índice espacial em memória dos serviços ativos (opcional, SERVICOS_INDICE_MEMORIA_ATIVO):
+# uma grade de células de `passo` graus (0.01° ≈ 1,1 km) guarda os serviços de cada célula.
+# Busca no raio só visita as células que o raio alcança; k mais próximos expande anéis de
+# células a partir do ponto até que nenhuma célula não visitada possa ter serviço mais perto.
+# As distâncias das células visitadas são calculadas de uma vez (core.distancias) e saem
+# iguais às da API (Haversine arredondado em 2 casas). É mantido pelo repositório a cada
+# escrita de serviço; vale para uma instância (cada worker tem sua cópia).
+
+KM_POR_GRAU = pi * RAIO_TERRA_KM / 180
+# Distâncias comparadas já arredondadas: o corte do raio precisa de folga de meio centésimo
+_FOLGA_ARREDONDAMENTO_KM = 0.005
+# Campos guardados por serviço: os da resposta e os intervalos do filtro de aberto
+CAMPOS_INDICE = CAMPOS_RESPOSTA + ("horarios",)
+
+
+class IndiceEspacial:
+    def __init__(self, passo: float = 0.01):
+        self.passo = passo
+        self.celulas = {}
+        self.servicos = {}
+        self._vetores = {}
+        self.carregado = False
+        self._limites = None
+        self._lock = threading.Lock()
+
+    def carregar(self, servicos):
+        """
+        Recria o índice a partir dos documentos de serviço (os inativos são ignorados).
+        """
+        with self._lock:
+            self.celulas = {}
+            self.servicos = {}
+            self._vetores = {}
+            self._limites = None
+            for servico in servicos:
+                self._inserir(servico)
+            self.carregado = True
+
+    def atualizar(self, servico):
+        """
+        Insere, move ou remove (se inativo) um serviço a partir do documento atual.
+        """
+        if not self.carregado:
+            return
+        with self._lock:
+            self._retirar(servico["servico_id"])
+            self._inserir(servico)
+
+    def remover(self, servico_id):
+        if not self.carregado:
+            return
+        with self._lock:
+            self._retirar(servico_id)
+
+    def no_raio(self, latitude, longitude, raio_km, tipo=None, limite=None, aberto_minuto=None):
+        """
+        Lista de (distancia_km, servico) dentro do raio, do mais próximo ao mais distante.
+        Com `aberto_minuto` (minuto da semana), só os serviços abertos nesse momento.
+        """
+        alcance = raio_km + _FOLGA_ARREDONDAMENTO_KM
+        dlat = alcance / KM_POR_GRAU
+        cosseno = cos(radians(min(90.0, abs(latitude) + dlat)))
+        dlon = 180.0 if cosseno < 1e-9 else min(180.0, dlat / cosseno)
+
+        with self._lock:
+            i0, j0 = self._celula(latitude - dlat, longitude - dlon)
+            i1, j1 = self._celula(latitude + dlat, longitude + dlon)
+            if (i1 - i0 + 1) * (j1 - j0 + 1) > len(self.celulas):
+                # Raio maior que a área ocupada: percorre só as células com serviços
+                chaves = [(i, j) for (i, j) in self.celulas if i0 <= i <= i1 and j0 <= j <= j1]
+            else:
+                chaves = [
+                    (i, j)
+                    for i in range(i0, i1 + 1) for j in range(j0, j1 + 1)
+                    if (i, j) in self.celulas
+                ]
+            servicos, coordenadas, tipos = self._reunir(chaves)
+
+        mascara = _mascara(servicos, tipos, tipo, aberto_minuto)
+        pares = coordenadas.no_raio(latitude, longitude, raio_km, mascara)
+        resultado = [(distancia, servicos[indice]) for distancia, indice in pares]
+        return resultado[:limite] if limite else resultado
+
+    def mais_proximos(self, latitude, longitude, k, tipo=None, aberto_minuto=None):
+        """
+        Os k serviços mais próximos, como (distancia_km, servico), sem limite de raio.
+        """
+        if k <= 0:
+            return []
+        i0, j0 = self._celula(latitude, longitude)
+        # Os k melhores até aqui: distâncias sem arredondar e serviços correspondentes
+        melhores = np.empty(0)
+        servicos_melhores = []
+
+        with self._lock:
+            if not self.celulas:
+                return []
+            anel_maximo = max(
+                abs(self._limites[0] - i0), abs(self._limites[1] - i0),
+                abs(self._limites[2] - j0), abs(self._limites[3] - j0)
+            )
+            for anel in range(anel_maximo + 1):
+                if 8 * anel > len(self.celulas):
+                    # Anéis maiores que o número de células ocupadas: calcula o restante de uma vez
+                    chaves = [(i, j) for (i, j) in self.celulas if max(abs(i - i0), abs(j - j0)) >= anel]
+                    ultimo = True
+                else:
+                    chaves = [chave for chave in _anel(i0, j0, anel) if chave in self.celulas]
+                    ultimo = False
+
+                if chaves:
+                    servicos, coordenadas, tipos = self._reunir(chaves)
+                    distancias = coordenadas.distancias_km(latitude, longitude)
+                    mascara = _mascara(servicos, tipos, tipo, aberto_minuto)
+                    if mascara is not None:
+                        selecionados = np.flatnonzero(mascara)
+                        distancias = distancias[selecionados]
+                        servicos = [servicos[indice] for indice in selecionados]
+                    melhores = np.concatenate((melhores, distancias))
+                    servicos_melhores.extend(servicos)
+                    if len(melhores) > k:
+                        manter = np.argpartition(melhores, k - 1)[:k]
+                        melhores = melhores[manter]
+                        servicos_melhores = [servicos_melhores[indice] for indice in manter]
+
+                if ultimo or (len(melhores) == k and melhores.max() + _FOLGA_ARREDONDAMENTO_KM <= self._distancia_minima(latitude, anel)):
+                    break
+
+        # Só k distâncias: arredondadas no cálculo escalar, idênticas às da API
+        resultado = [
+            (distancia_haversine(servico["latitude"], servico["longitude"], latitude, longitude), servico)
+            for servico in servicos_melhores
+        ]
+        resultado.sort(key=lambda item: item[0])
+        return resultado
+
+    def _reunir(self, chaves):
+        """
+        Serviços das células `chaves` com suas coordenadas (arrays contíguos) e tipos.
+        Os arrays de cada célula ficam guardados até a célula mudar.
+        """
+        servicos = []
+        latitudes = []
+        longitudes = []
+        tipos = []
+        for chave in chaves:
+            vetores = self._vetores.get(chave)
+            if vetores is None:
+                lista = list(self.celulas[chave].values())
+                vetores = (
+                    lista,
+                    np.array([servico["latitude"] for servico in lista], dtype=np.float64),
+                    np.array([servico["longitude"] for servico in lista], dtype=np.float64),
+                    np.array([servico["tipo"] or "" for servico in lista], dtype=object),
+                )
+                self._vetores[chave] = vetores
+            servicos.extend(vetores[0])
+            latitudes.append(vetores[1])
+            longitudes.append(vetores[2])
+            tipos.append(vetores[3])
+        if not chaves:
+            return [], Coordenadas([], []), np.empty(0, dtype=object)
+        return servicos, Coordenadas(np.concatenate(latitudes), np.concatenate(longitudes)), np.concatenate(tipos)
+
+    def _distancia_minima(self, latitude, anel):
+        # Qualquer célula fora dos anéis 0..anel está a pelo menos `anel` células do ponto
+        cosseno = cos(radians(min(90.0, abs(latitude) + (anel + 1) * self.passo)))
+        return anel * self.passo * KM_POR_GRAU * min(1.0, cosseno)
+
+    def _celula(self, latitude, longitude):
+        return floor(latitude / self.passo), floor(longitude / self.passo)
+
+    def _inserir(self, servico):
+        if not servico.get("ativo", True):
+            return
+        try:
+            chave = self._celula(float(servico["latitude"]), float(servico["longitude"]))
+        except (KeyError, TypeError, ValueError):
+            return
+        compacto = {campo: servico.get(campo) for campo in CAMPOS_INDICE}
+        self.celulas.setdefault(chave, {})[servico["servico_id"]] = compacto
+        self._vetores.pop(chave, None)
+        self.servicos[servico["servico_id"]] = chave
+        i, j = chave
+        if self._limites is None:
+            self._limites = [i, i, j, j]
+        else:
+            self._limites = [min(self._limites[0], i), max(self._limites[1], i),
+                             min(self._limites[2], j), max(self._limites[3], j)]
+
+    def _retirar(self, servico_id):
+        chave = self.servicos.pop(servico_id, None)
+        if chave is None:
+            return
+        celula = self.celulas[chave]
+        celula.pop(servico_id, None)
+        self._vetores.pop(chave, None)
+        if not celula:
+            del self.celulas[chave]
+
+
+def _mascara(servicos, tipos, tipo, aberto_minuto):
+    """
+    Seleção dos candidatos por tipo e por horário de funcionamento (None = todos).
+    Os intervalos já vêm prontos do documento: só comparações de inteiros por serviço.
+    """
+    mascara = tipos == tipo if tipo else None
+    if aberto_minuto is not None:
+        abertos = np.fromiter(
+            (aberto(servico.get("horarios"), aberto_minuto) for servico in servicos), dtype=bool, count=len(servicos)
+        )
+        mascara = abertos if mascara is None else mascara & abertos
+    return mascara
+
+
+def _anel(i0, j0, anel):
+    """
+    Células a exatamente `anel` células (distância de Chebyshev) de (i0, j0).
+    """
+    if anel == 0:
+        yield i0, j0
+        return
+    for j in range(j0 - anel, j0 + anel + 1):
+        yield i0 - anel, j
+        yield i0 + anel, j
+    for i in range(i0 - anel + 1, i0 + anel):
+        yield i, j0 - anel
+        yield i, j0 + anel
+
+
+_indice = IndiceEspacial() if config.SERVICOS_INDICE_MEMORIA_ATIVO else None
+
+
+def obter_indice_servicos():
+    """
+    Índice espacial em memória já carregado, ou None (desativado ou ainda não carregado).
+    """
+    if _indice is not None and _indice.carregado:
+        return _indice
+    return None
+
+
+def carregar_indice_servicos():
+    """
+    Carrega os serviços ativos no índice (chamado na inicialização da API).
+    """
+    if _indice is None:
+        return
+    collection = MongoConnection().get_collection("servicos")
+    _indice.carregar(collection.find({"ativo": True}, {"_id": 0, "location": 0, "termos": 0, "hash_conteudo": 0}))
+    logger.info("Índice espacial de serviços carregado com %d serviços", len(_indice.servicos))
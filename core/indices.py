@@ -0,0 +1,139 @@
+"""
+Registro e aplicação dos índices declarados pelos repositórios.
+
+Uso via linha de comando:
+    python -m core.indices --relatorio   # índices faltando / não usados
+    python -m core.indices --aplicar     # cria os índices declarados
+"""
+import argparse
+import logging
+from typing import Dict, List
+
+from pymongo.errors import OperationFailure
+
+from core.database import MongoConnection
+from core.repositories.importacao_repo import ImportacaoRepository
+from core.repositories.interacao_repo import InteracaoRepository
+from core.repositories.pergunta_repo import PerguntaRepository
+from core.repositories.proximidade_repo import ProximidadeRepository
+from core.repositories.rollup_repo import RollupRepository
+from core.repositories.servico_repo import ServicoRepository
+from core.repositories.totem_repo import TotemRepository
+from core.repositories.usuario_repo import UsuarioRepository
+
+logger = logging.getLogger(__name__)
+
+# Coleção -> repositório que declara os índices (atributo INDICES)
+REGISTRO = {
+    "usuarios": UsuarioRepository,
+    "perguntas": PerguntaRepository,
+    "totens": TotemRepository,
+    "servicos": ServicoRepository,
+    "interacoes": InteracaoRepository,
+    "contagens_perguntas": InteracaoRepository,
+    "contagens_totens": InteracaoRepository,
+    "interacoes_por_hora": RollupRepository,
+    "interacoes_por_dia": RollupRepository,
+    "totem_servicos_proximos": ProximidadeRepository,
+    "importacoes": ImportacaoRepository,
+    "importacoes_erros": ImportacaoRepository,
+}
+
+# Coleções auxiliares cujos índices ficam em outro atributo do repositório
+ATRIBUTOS = {
+    "contagens_perguntas": "INDICES_CONTAGENS",
+    "contagens_totens": "INDICES_CONTAGENS_TOTENS",
+    "importacoes_erros": "INDICES_ERROS",
+}
+
+
+def indices_declarados() -> Dict[str, list]:
+    """
+    Retorna os IndexModel declarados, agrupados por coleção.
+    """
+    return {
+        colecao: list(getattr(repo, ATRIBUTOS.get(colecao, "INDICES")))
+        for colecao, repo in REGISTRO.items()
+    }
+
+
+def aplicar_indices() -> Dict[str, dict]:
+    """
+    Cria os índices declarados de forma idempotente.
+    Falhas (ex.: duplicatas impedindo um índice único) são registradas e não
+    interrompem as demais coleções.
+    """
+    conexao = MongoConnection()
+    resultado = {}
+
+    for colecao, indices in indices_declarados().items():
+        try:
+            criados = conexao.get_collection(colecao).create_indexes(indices)
+            resultado[colecao] = {"ok": True, "indices": criados}
+        except OperationFailure as e:
+            logger.error("Falha ao criar índices em '%s': %s", colecao, e)
+            resultado[colecao] = {"ok": False, "erro": str(e)}
+
+    return resultado
+
+
+def relatorio_indices() -> Dict[str, dict]:
+    """
+    Compara os índices declarados com os existentes no banco.
+
+    - faltando: declarados mas não criados
+    - nao_declarados: existem no banco mas não estão no registro
+    - sem_uso: existentes sem nenhum acesso desde o último restart do servidor ($indexStats)
+    """
+    conexao = MongoConnection()
+    relatorio = {}
+
+    for colecao, indices in indices_declarados().items():
+        collection = conexao.get_collection(colecao)
+        existentes = collection.index_information()
+        declarados = {indice.document["name"] for indice in indices}
+
+        try:
+            estatisticas = list(collection.aggregate([{"$indexStats": {}}]))
+        except OperationFailure:
+            estatisticas = []
+
+        sem_uso = sorted(
+            item["name"] for item in estatisticas
+            if item["name"] != "_id_" and item.get("accesses", {}).get("ops", 0) == 0
+        )
+
+        relatorio[colecao] = {
+            "faltando": sorted(declarados - set(existentes)),
+            "nao_declarados": sorted(set(existentes) - declarados - {"_id_"}),
+            "sem_uso": sem_uso,
+        }
+
+    return relatorio
+
+
+def _imprimir_relatorio(relatorio: Dict[str, dict]) -> None:
+    for colecao, info in relatorio.items():
+        print(f"\n📁 {colecao}")
+        for chave, titulo in (("faltando", "Faltando"), ("nao_declarados", "Não declarados"), ("sem_uso", "Sem uso")):
+            nomes: List[str] = info[chave]
+            print(f"   {titulo}: {', '.join(nomes) if nomes else '-'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gerencia os índices do MongoDB")
+    parser.add_argument("--aplicar", action="store_true", help="Cria os índices declarados")
+    parser.add_argument("--relatorio", action="store_true", help="Mostra índices faltando ou sem uso")
+    args = parser.parse_args()
+
+    if args.aplicar:
+        for colecao, info in aplicar_indices().items():
+            status = "✅" if info["ok"] else f"❌ {info['erro']}"
+            print(f"{colecao}: {status}")
+
+    if args.relatorio or not args.aplicar:
+        _imprimir_relatorio(relatorio_indices())
+
+
+if __name__ == "__main__":
+    main()
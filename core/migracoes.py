@@ -0,0 +1,201 @@
+import logging
+from datetime import datetime
+
+from core.database import MongoConnection
+from core.indices import aplicar_indices
+from core.repositories.interacao_repo import InteracaoRepository
+from core.repositories.rollup_repo import COLECOES, RollupRepository
+from core.repositories.servico_repo import PIPELINE_LOCALIZACAO, ServicoRepository
+from core.horarios import intervalos_semanais
+from core.texto import CAMPOS_BUSCA, termos_do_servico
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+# Migrações de dados executadas uma única vez, na ordem da lista.
+# O estado fica registrado na coleção "migracoes".
+
+
+def _deduplicar_interacoes(db) -> dict:
+    """
+    Remove interações duplicadas por (vem_hash, pergunta_id, totem_id),
+    mantendo a mais recente. Sem isso o índice único "voto_unico" não pode ser criado.
+    """
+    pipeline = [
+        {"$group": {
+            "_id": {"vem_hash": "$vem_hash", "pergunta_id": "$pergunta_id", "totem_id": "$totem_id"},
+            "ids": {"$push": "$_id"},
+            "total": {"$sum": 1}
+        }},
+        {"$match": {"total": {"$gt": 1}}}
+    ]
+    removidos = 0
+    for grupo in db["interacoes"].aggregate(pipeline, allowDiskUse=True):
+        ids = sorted(grupo["ids"])
+        removidos += db["interacoes"].delete_many({"_id": {"$in": ids[:-1]}}).deleted_count
+    return {"removidos": removidos}
+
+
+def _indices_contagens(db) -> None:
+    # A reconciliação faz $merge nas duas coleções de contadores, e o $merge exige os
+    # índices únicos das chaves (pergunta_id; totem_id + pergunta_id) já criados
+    db["contagens_perguntas"].create_indexes(InteracaoRepository.INDICES_CONTAGENS)
+    db["contagens_totens"].create_indexes(InteracaoRepository.INDICES_CONTAGENS_TOTENS)
+
+
+def _popular_contagens_perguntas(db) -> dict:
+    """
+    Preenche "contagens_perguntas" (e "contagens_totens") a partir das interações já
+    existentes. Os índices únicos são criados antes, pois o $merge depende deles.
+    """
+    _indices_contagens(db)
+    return InteracaoRepository().reconciliar_contagens()
+
+
+def _datas_interacoes(db) -> dict:
+    """
+    Preenche data_criacao/ultima_atualizacao das interações antigas com o horário
+    embutido no _id e gera os rollups por hora e por dia do histórico.
+    """
+    atualizadas = db["interacoes"].update_many(
+        {"data_criacao": {"$exists": False}},
+        [{"$set": {"data_criacao": {"$toDate": "$_id"}, "ultima_atualizacao": {"$toDate": "$_id"}}}]
+    ).modified_count
+    db["interacoes"].create_indexes(InteracaoRepository.INDICES)
+    for colecao in COLECOES.values():
+        db[colecao].create_indexes(RollupRepository.INDICES)
+    RollupRepository().atualizar(completo=True)
+    return {"interacoes_atualizadas": atualizadas}
+
+
+def _popular_contagens_totens(db) -> dict:
+    """
+    Preenche "contagens_totens" (votos por totem e pergunta) a partir das interações existentes.
+    Em bancos que já tinham rodado a 0002 antes dos contadores por totem.
+    """
+    _indices_contagens(db)
+    return InteracaoRepository().reconciliar_contagens()
+
+
+def _localizacao_servicos(db) -> dict:
+    """
+    Preenche o ponto GeoJSON "location" dos serviços já cadastrados e cria o índice
+    2dsphere usado pelo $geoNear. Serviços com coordenadas inválidas ficam sem o campo
+    (e fora das buscas por proximidade) e são contados no resultado.
+    """
+    coordenadas_validas = {
+        "latitude": {"$type": "number", "$gte": -90, "$lte": 90},
+        "longitude": {"$type": "number", "$gte": -180, "$lte": 180},
+    }
+    atualizados = db["servicos"].update_many(
+        {"location": {"$exists": False}, **coordenadas_validas},
+        PIPELINE_LOCALIZACAO
+    ).modified_count
+    invalidos = db["servicos"].count_documents({"location": {"$exists": False}})
+    db["servicos"].create_indexes(ServicoRepository.INDICES)
+    return {"servicos_atualizados": atualizados, "servicos_sem_coordenadas_validas": invalidos}
+
+
+def _termos_busca_servicos(db) -> dict:
+    """
+    Preenche os termos normalizados (busca por texto) dos serviços já cadastrados e cria
+    o índice "termos_busca".
+    """
+    atualizados = _preencher_servicos(db, "termos", CAMPOS_BUSCA, termos_do_servico)
+    db["servicos"].create_indexes(ServicoRepository.INDICES)
+    return {"servicos_atualizados": atualizados}
+
+
+def _horarios_servicos(db) -> dict:
+    """
+    Converte o horario_funcionamento dos serviços já cadastrados nos intervalos semanais
+    do filtro de aberto e cria o índice "horarios_semana". Os textos não reconhecidos
+    ficam com horarios nulo e são contados no resultado.
+    """
+    atualizados = _preencher_servicos(
+        db, "horarios", ("horario_funcionamento",),
+        lambda servico: intervalos_semanais(servico.get("horario_funcionamento"))
+    )
+    nao_reconhecidos = db["servicos"].count_documents({"horarios": None, "horario_funcionamento": {"$nin": [None, ""]}})
+    db["servicos"].create_indexes(ServicoRepository.INDICES)
+    return {"servicos_atualizados": atualizados, "horarios_nao_reconhecidos": nao_reconhecidos}
+
+
+def _preencher_servicos(db, campo: str, origem, calcular) -> int:
+    """
+    Grava `campo` = calcular(servico) nos serviços que ainda não o têm, em lotes de
+    1000 atualizações. Retorna quantos foram atualizados.
+    """
+    projecao = {"_id": 1, **{nome: 1 for nome in origem}}
+    operacoes = []
+    atualizados = 0
+    for servico in db["servicos"].find({campo: {"$exists": False}}, projecao):
+        operacoes.append(UpdateOne({"_id": servico["_id"]}, {"$set": {campo: calcular(servico)}}))
+        if len(operacoes) == 1000:
+            atualizados += db["servicos"].bulk_write(operacoes, ordered=False).modified_count
+            operacoes = []
+    if operacoes:
+        atualizados += db["servicos"].bulk_write(operacoes, ordered=False).modified_count
+    return atualizados
+
+
+def _perguntas_pontuadas(db) -> dict:
+    """
+    Preenche "perguntas_pontuadas" dos usuários a partir das interações já gravadas, para
+    que votos anteriores ao POST /interacoes/votar não pontuem de novo. Atualiza em lotes
+    de 1000 usuários.
+    """
+    pipeline = [{"$group": {"_id": "$vem_hash", "perguntas": {"$addToSet": "$pergunta_id"}}}]
+    operacoes = []
+    atualizados = 0
+    for grupo in db["interacoes"].aggregate(pipeline, allowDiskUse=True):
+        operacoes.append(UpdateOne(
+            {"vem_hash": grupo["_id"]},
+            {"$addToSet": {"perguntas_pontuadas": {"$each": grupo["perguntas"]}}}
+        ))
+        if len(operacoes) == 1000:
+            atualizados += db["usuarios"].bulk_write(operacoes, ordered=False).modified_count
+            operacoes = []
+    if operacoes:
+        atualizados += db["usuarios"].bulk_write(operacoes, ordered=False).modified_count
+    return {"usuarios_atualizados": atualizados}
+
+
+MIGRACOES = [
+    ("0001_deduplicar_interacoes", _deduplicar_interacoes),
+    ("0002_contagens_perguntas", _popular_contagens_perguntas),
+    ("0003_datas_interacoes", _datas_interacoes),
+    ("0004_contagens_totens", _popular_contagens_totens),
+    ("0005_localizacao_servicos", _localizacao_servicos),
+    ("0006_termos_busca_servicos", _termos_busca_servicos),
+    ("0007_horarios_servicos", _horarios_servicos),
+    ("0008_perguntas_pontuadas", _perguntas_pontuadas),
+]
+
+
+def executar_migracoes() -> dict:
+    """
+    Executa as migrações pendentes e aplica os índices declarados.
+    Idempotente: pode ser chamada a cada inicialização da aplicação.
+    """
+    db = MongoConnection().db
+    estado = db["migracoes"]
+    executadas = []
+
+    for migracao_id, funcao in MIGRACOES:
+        if estado.count_documents({"migracao_id": migracao_id}, limit=1):
+            continue
+
+        logger.info("Executando migração %s", migracao_id)
+        resultado = funcao(db)
+        estado.insert_one({
+            "migracao_id": migracao_id,
+            "executada_em": datetime.utcnow().isoformat(),
+            "resultado": resultado
+        })
+        executadas.append(migracao_id)
+
+    return {
+        "migracoes_executadas": executadas,
+        "indices": aplicar_indices()
+    }
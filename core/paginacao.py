@@ -0,0 +1,104 @@
+import base64
+import json
+from typing import Any, List, Optional
+
+from bson import ObjectId
+
+from core import config
+
+# Paginação por keyset: em vez de skip/offset, cada página continua a partir do
+# último valor da chave de ordenação (indexada e única). O custo de uma página
+# não depende de quantas páginas vieram antes.
+
+
+def codificar_cursor(valor: Any) -> str:
+    """
+    Gera o cursor opaco (base64 url-safe) a partir do último valor da chave.
+    """
+    if isinstance(valor, ObjectId):
+        dados = {"oid": str(valor)}
+    else:
+        dados = {"v": valor}
+    return base64.urlsafe_b64encode(json.dumps(dados).encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor: str) -> Any:
+    try:
+        preenchimento = "=" * (-len(cursor) % 4)
+        dados = json.loads(base64.urlsafe_b64decode(cursor + preenchimento))
+        if "oid" in dados:
+            return ObjectId(dados["oid"])
+        return dados["v"]
+    except Exception:
+        raise ValueError("Cursor de paginação inválido")
+
+
+def _campos(campos: Optional[str]) -> Optional[List[str]]:
+    if not campos:
+        return None
+    lista = [campo.strip() for campo in campos.split(",") if campo.strip() and campo.strip() != "_id"]
+    if any(campo.startswith("$") for campo in lista):
+        raise ValueError("Nome de campo inválido em 'campos'")
+    return lista or None
+
+
+def _projecao(chave: str, campos: Optional[List[str]], ocultar=()) -> dict:
+    projecao = {} if chave == "_id" else {"_id": 0}
+    if campos:
+        projecao.update({campo: 1 for campo in campos})
+        projecao[chave] = 1
+    else:
+        # Campos internos só saem quando pedidos explicitamente em `campos`
+        projecao.update({campo: 0 for campo in ocultar})
+    return projecao
+
+
+def _preparar(filtro: dict, chave: str, limite: Optional[int], cursor: Optional[str], campos: Optional[str], ocultar=()):
+    if limite is None:
+        limite = config.PAGINACAO_LIMITE_PADRAO
+    if limite < 1 or limite > config.PAGINACAO_LIMITE_MAXIMO:
+        raise ValueError(f"Limite deve estar entre 1 e {config.PAGINACAO_LIMITE_MAXIMO}")
+
+    filtro = dict(filtro)
+    if cursor:
+        filtro[chave] = {"$gt": decodificar_cursor(cursor)}
+    return filtro, _projecao(chave, _campos(campos), ocultar), limite
+
+
+def _montar_pagina(documentos: list, chave: str, limite: int) -> dict:
+    tem_mais = len(documentos) > limite
+    documentos = documentos[:limite]
+    proximo = codificar_cursor(documentos[-1][chave]) if tem_mais else None
+
+    if chave == "_id":
+        for documento in documentos:
+            documento.pop("_id", None)
+
+    return {"itens": documentos, "proximo_cursor": proximo}
+
+
+def buscar_pagina(collection, filtro: dict, chave: str, limite: Optional[int] = None,
+                  cursor: Optional[str] = None, campos: Optional[str] = None, ocultar=()):
+    """
+    Busca uma página ordenada por `chave`, a partir do cursor recebido.
+    Retorna {"itens": [...], "proximo_cursor": "..." ou None na última página}.
+    Passos para métodos @operacao (use com `yield from`).
+    """
+    filtro, projecao, limite = _preparar(filtro, chave, limite, cursor, campos, ocultar)
+    # limite + 1 indica se existe próxima página sem precisar de count
+    documentos = yield collection.find(filtro, projecao).sort(chave, 1).limit(limite + 1).to_list(None)
+    return _montar_pagina(documentos, chave, limite)
+
+
+def buscar_todos(collection, filtro: dict, campos: Optional[str], ocultar=()):
+    """
+    Listagem sem paginação, apenas com a projeção de `campos` (coleções pequenas).
+    Passos para métodos @operacao (use com `yield from`).
+    """
+    projecao = {"_id": 0}
+    lista = _campos(campos)
+    if lista:
+        projecao.update({campo: 1 for campo in lista})
+    else:
+        projecao.update({campo: 0 for campo in ocultar})
+    return (yield collection.find(filtro, projecao).to_list(None))
@@ -0,0 +1,135 @@
+import logging
+import threading
+
+from core import config
+from core.database import MongoConnection
+
+logger = logging.getLogger(__name__)
+
+# Ranking em memória (opcional, RANKING_MEMORIA_ATIVO): uma árvore de Fenwick indexada
+# pela pontuação conta quantos usuários há em cada pontuação, então a posição de um
+# usuário (1 + usuários com pontuação maior) sai em O(log P), P = maior pontuação.
+# É mantido pelos próprios repositórios a cada escrita de pontuação, só vê as escritas do
+# próprio processo e por isso só é carregado com um único worker (WEB_CONCURRENCY=1).
+
+
+class _ArvoreFenwick:
+    def __init__(self, tamanho):
+        self.tamanho = tamanho
+        self.arvore = [0] * (tamanho + 1)
+
+    def somar(self, indice, valor):
+        indice += 1
+        while indice <= self.tamanho:
+            self.arvore[indice] += valor
+            indice += indice & -indice
+
+    def prefixo(self, indice):
+        """Soma das posições 0..indice (inclusive)."""
+        indice = min(indice + 1, self.tamanho)
+        total = 0
+        while indice > 0:
+            total += self.arvore[indice]
+            indice -= indice & -indice
+        return total
+
+
+class RankingMemoria:
+    def __init__(self):
+        self.pontuacoes = {}
+        self.carregado = False
+        self._minimo = 0
+        self._arvore = _ArvoreFenwick(1024)
+        self._lock = threading.Lock()
+
+    def carregar(self, documentos):
+        """
+        Recria a estrutura a partir de documentos {vem_hash, pontuacao}.
+        """
+        with self._lock:
+            self.pontuacoes = {doc["vem_hash"]: int(doc.get("pontuacao") or 0) for doc in documentos}
+            self._reconstruir()
+            self.carregado = True
+
+    def atualizar(self, vem_hash, pontuacao):
+        if not self.carregado or pontuacao is None:
+            return
+        pontuacao = int(pontuacao)
+        with self._lock:
+            anterior = self.pontuacoes.get(vem_hash)
+            if anterior == pontuacao:
+                return
+            self.pontuacoes[vem_hash] = pontuacao
+            if pontuacao < self._minimo or pontuacao - self._minimo >= self._arvore.tamanho:
+                self._reconstruir()
+                return
+            if anterior is not None:
+                self._arvore.somar(anterior - self._minimo, -1)
+            self._arvore.somar(pontuacao - self._minimo, 1)
+
+    def remover(self, vem_hash):
+        if not self.carregado:
+            return
+        with self._lock:
+            anterior = self.pontuacoes.pop(vem_hash, None)
+            if anterior is not None:
+                self._arvore.somar(anterior - self._minimo, -1)
+
+    def limpar(self):
+        if self.carregado:
+            self.carregar([])
+
+    def posicao(self, vem_hash):
+        """
+        Retorna {"pontuacao", "posicao", "total_usuarios"} ou None se o usuário não está no ranking.
+        Empates dividem a posição (1, 2, 2, 4...).
+        """
+        with self._lock:
+            pontuacao = self.pontuacoes.get(vem_hash)
+            if pontuacao is None:
+                return None
+            total = len(self.pontuacoes)
+            acima = total - self._arvore.prefixo(pontuacao - self._minimo)
+            return {"pontuacao": pontuacao, "posicao": acima + 1, "total_usuarios": total}
+
+    def _reconstruir(self):
+        self._minimo = min(0, min(self.pontuacoes.values(), default=0))
+        maximo = max(self.pontuacoes.values(), default=0)
+        tamanho = 1024
+        while tamanho <= maximo - self._minimo:
+            tamanho *= 2
+        # Folga para as próximas pontuações não forçarem outra reconstrução
+        self._arvore = _ArvoreFenwick(tamanho * 2)
+        for pontuacao in self.pontuacoes.values():
+            self._arvore.somar(pontuacao - self._minimo, 1)
+
+
+_ranking = RankingMemoria() if config.RANKING_MEMORIA_ATIVO else None
+
+
+def obter_ranking():
+    """
+    Ranking em memória já carregado, ou None (desativado ou ainda não carregado).
+    """
+    if _ranking is not None and _ranking.carregado:
+        return _ranking
+    return None
+
+
+def carregar_ranking():
+    """
+    Carrega as pontuações de todos os usuários (chamado na inicialização da API).
+    Com vários workers o ranking não é carregado: cada um teria uma cópia que não vê as
+    escritas dos outros, e a posição continua vindo do índice de pontuação.
+    """
+    if _ranking is None:
+        return
+    if config.WEB_CONCURRENCY > 1:
+        logger.warning(
+            "RANKING_MEMORIA_ATIVO ignorado com WEB_CONCURRENCY=%d: a posição será contada pelo índice",
+            config.WEB_CONCURRENCY
+        )
+        return
+    collection = MongoConnection().get_collection("usuarios")
+    _ranking.carregar(collection.find({}, {"_id": 0, "vem_hash": 1, "pontuacao": 1}))
+    logger.info("Ranking em memória carregado com %d usuários", len(_ranking.pontuacoes))
@@ -0,0 +1,124 @@
+from datetime import datetime
+
+from core.database import MongoConnection
+from core.execucao import operacao
+from core.paginacao import buscar_pagina
+from pymongo import IndexModel, ASCENDING, ReturnDocument
+
+# Estado das importações de serviços em segundo plano ("importacoes"): um documento por
+# job com status e contadores de progresso, atualizado a cada lote. As linhas com erro
+# ficam em "importacoes_erros" (um documento por linha), lidas com paginação.
+
+# Status de um job: na_fila -> executando -> concluida | cancelada | falhou | interrompida
+STATUS_FINAIS = ("concluida", "cancelada", "falhou", "interrompida")
+
+_PROJECAO = {"_id": 0}
+
+
+class ImportacaoRepository:
+    INDICES = [
+        IndexModel([("job_id", ASCENDING)], name="job_id_unico", unique=True),
+        IndexModel([("criado_em", ASCENDING)], name="criado_em"),
+    ]
+    INDICES_ERROS = [
+        IndexModel([("job_id", ASCENDING), ("linha", ASCENDING)], name="job_linha"),
+    ]
+
+    assincrono = False
+
+    def __init__(self):
+        conexao = MongoConnection()
+        self.collection = conexao.get_collection("importacoes", self.assincrono)
+        self.erros = conexao.get_collection("importacoes_erros", self.assincrono)
+
+    @operacao
+    def criar(self, job: dict) -> None:
+        yield self.collection.insert_one(dict(job))
+
+    @operacao
+    def get_by_id(self, job_id: str):
+        return (yield self.collection.find_one({"job_id": job_id}, _PROJECAO))
+
+    @operacao
+    def iniciar(self, job_id: str) -> bool:
+        """
+        Passa o job de na_fila para executando (False se foi cancelado enquanto esperava).
+        """
+        resultado = yield self.collection.update_one(
+            {"job_id": job_id, "status": "na_fila"},
+            {"$set": {"status": "executando", "iniciado_em": datetime.utcnow()}}
+        )
+        return resultado.modified_count > 0
+
+    @operacao
+    def registrar_lote(self, job_id: str, incrementos: dict, erros: list, linhas_por_segundo: float) -> bool:
+        """
+        Soma o progresso de um lote e grava as linhas com erro.
+        Retorna True se o cancelamento foi pedido (o job deve parar).
+        """
+        if erros:
+            yield self.erros.insert_many([{"job_id": job_id, **erro} for erro in erros], ordered=False)
+        job = yield self.collection.find_one_and_update(
+            {"job_id": job_id},
+            {
+                "$inc": incrementos,
+                "$set": {"linhas_por_segundo": linhas_por_segundo, "atualizado_em": datetime.utcnow()}
+            },
+            projection={"cancelamento_solicitado": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        return bool(job and job.get("cancelamento_solicitado"))
+
+    @operacao
+    def registrar_desativados(self, job_id: str, desativados: int) -> None:
+        yield self.collection.update_one(
+            {"job_id": job_id},
+            {"$set": {"desativados": desativados, "atualizado_em": datetime.utcnow()}}
+        )
+
+    @operacao
+    def finalizar(self, job_id: str, status: str, erro: str = None) -> None:
+        campos = {"status": status, "concluido_em": datetime.utcnow()}
+        if erro:
+            campos["erro"] = erro
+        yield self.collection.update_one({"job_id": job_id, "status": {"$nin": list(STATUS_FINAIS)}}, {"$set": campos})
+
+    @operacao
+    def interromper_pendentes(self) -> int:
+        """
+        Finaliza como "interrompida" todos os jobs ainda na_fila/executando.
+        """
+        resultado = yield self.collection.update_many(
+            {"status": {"$nin": list(STATUS_FINAIS)}},
+            {"$set": {"status": "interrompida", "concluido_em": datetime.utcnow()}}
+        )
+        return resultado.modified_count
+
+    @operacao
+    def solicitar_cancelamento(self, job_id: str):
+        """
+        Marca o pedido de cancelamento; um job ainda na fila é cancelado na hora.
+        Retorna o job atualizado (None se não existe).
+        """
+        yield self.collection.update_one(
+            {"job_id": job_id, "status": "na_fila"},
+            {"$set": {"status": "cancelada", "concluido_em": datetime.utcnow()}}
+        )
+        job = yield self.collection.find_one_and_update(
+            {"job_id": job_id, "status": {"$nin": list(STATUS_FINAIS)}},
+            {"$set": {"cancelamento_solicitado": True}},
+            projection=_PROJECAO,
+            return_document=ReturnDocument.AFTER
+        )
+        return job or (yield self.get_by_id(job_id))
+
+    @operacao
+    def listar_erros(self, job_id: str, limite=None, cursor=None) -> dict:
+        return (yield from buscar_pagina(self.erros, {"job_id": job_id}, "linha", limite, cursor, "linha,nome,erro"))
+
+
+class ImportacaoRepositoryAsync(ImportacaoRepository):
+    """
+    Versão assíncrona (MONGODB_ASYNC=true): as mesmas operações sobre o AsyncMongoClient.
+    """
+    assincrono = True
@@ -1,69 +1,417 @@
 from core.database import MongoConnection
+from core.execucao import em_paralelo, operacao
+from core.paginacao import buscar_pagina, buscar_todos
+from pymongo import IndexModel, ASCENDING, UpdateOne, ReturnDocument
+from pymongo.errors import BulkWriteError
 
 class InteracaoRepository:
+    # Índices declarados da coleção (aplicados na inicialização por core.indices).
+    # O índice único garante que o upsert por (vem_hash, pergunta_id, totem_id) não duplique votos.
+    INDICES = [
+        IndexModel(
+            [("vem_hash", ASCENDING), ("pergunta_id", ASCENDING), ("totem_id", ASCENDING)],
+            name="voto_unico",
+            unique=True
+        ),
+        IndexModel([("pergunta_id", ASCENDING), ("resposta", ASCENDING)], name="pergunta_resposta"),
+        # Rollups incrementais: votos alterados desde a última execução e recálculo de um bucket
+        IndexModel([("ultima_atualizacao", ASCENDING)], name="ultima_atualizacao"),
+        IndexModel([("data_criacao", ASCENDING)], name="data_criacao"),
+    ]
+    # Contadores pré-agregados de respostas por pergunta (coleção "contagens_perguntas")
+    INDICES_CONTAGENS = [
+        IndexModel([("pergunta_id", ASCENDING)], name="pergunta_id_unico", unique=True),
+    ]
+    # Contadores por totem e pergunta (coleção "contagens_totens"), usados no mapa de satisfação
+    INDICES_CONTAGENS_TOTENS = [
+        IndexModel([("totem_id", ASCENDING), ("pergunta_id", ASCENDING)], name="totem_pergunta_unico", unique=True),
+        IndexModel([("atualizado_em", ASCENDING)], name="atualizado_em"),
+    ]
+
+    assincrono = False
+
     def __init__(self):
-        self.collection = MongoConnection().get_collection("interacoes")
+        self.collection = MongoConnection().get_collection("interacoes", self.assincrono)
+        self.contagens = MongoConnection().get_collection("contagens_perguntas", self.assincrono)
+        self.contagens_totens = MongoConnection().get_collection("contagens_totens", self.assincrono)
 
+    @operacao
     def save(self, interacao):
         """
         Salva uma interação no banco. Atualiza se já existir, caso contrário cria uma nova.
+        Também atualiza os contadores da pergunta e retorna a resposta anterior
+        do usuário (None se o voto é novo).
+        A resposta anterior vem da própria escrita (ReturnDocument.BEFORE), então o delta
+        dos contadores é exato mesmo com escritas concorrentes. Resta uma janela: o voto e
+        o $inc dos contadores são duas escritas; uma falha entre elas deixa os contadores
+        defasados até a próxima reconciliação (reconciliar_contagens).
         """
-        data = interacao.to_dict()
-        if "_id" in data:
-            del data["_id"]  # Evita conflito de _id no MongoDB
-
-        self.collection.update_one(
-            {
-                "vem_hash": interacao.vem_hash,
-                "pergunta_id": interacao.pergunta_id,
-                "totem_id": interacao.totem_id
-            },
-            {"$set": data},
-            upsert=True
+        anterior = yield self.collection.find_one_and_update(
+            _chave_voto(interacao),
+            _atualizacao_voto(interacao),
+            projection={"_id": 0, "resposta": 1},
+            upsert=True,
+            return_document=ReturnDocument.BEFORE
         )
+        resposta_anterior = anterior.get("resposta") if anterior else None
+
+        yield self._atualizar_contagens([(interacao, resposta_anterior)])
+        return resposta_anterior
+
+    @operacao
+    def listar(self, limite=None, cursor=None, campos=None):
+        """
+        Lista com projeção opcional de `campos`.
+        Com `limite`/`cursor`, retorna uma página ordenada por _id (paginação por keyset).
+        """
+        filtro = {}
+        if limite is None and cursor is None:
+            return (yield from buscar_todos(self.collection, filtro, campos))
+        return (yield from buscar_pagina(self.collection, filtro, "_id", limite, cursor, campos))
+
+    @operacao
+    def save_many(self, interacoes):
+        """
+        Salva várias interações com um único bulk_write não ordenado de upserts.
+        Retorna o status de cada interação, na mesma ordem recebida.
+        Cada upsert é condicionado à resposta lida antes (compare-and-set): se outro
+        processo mudou o voto entre a leitura e a escrita, o upsert esbarra no índice
+        "voto_unico" e só esses votos são relidos e regravados (até
+        _TENTATIVAS_CONFLITO vezes). Assim o delta dos contadores corresponde ao que foi
+        de fato gravado. Resta a mesma janela de save(): uma falha entre o bulk_write e
+        o $inc dos contadores só é corrigida pela reconciliação.
+        """
+        if not interacoes:
+            return []
 
+        status = [None] * len(interacoes)
+        mudancas = []
+        pendentes = list(range(len(interacoes)))
+        for tentativa in range(1, _TENTATIVAS_CONFLITO + 1):
+            if not pendentes:
+                break
+            lote = [interacoes[posicao] for posicao in pendentes]
+            anteriores = _respostas_anteriores(
+                lote,
+                (yield self.collection.find(_filtro_anteriores(lote), _PROJECAO_ANTERIORES).to_list(None))
+            )
+            try:
+                resultado = yield self.collection.bulk_write(_operacoes_upsert(lote, anteriores), ordered=False)
+                detalhes = {"upserted": [{"index": i} for i in resultado.upserted_ids], "writeErrors": []}
+            except BulkWriteError as e:
+                detalhes = e.details
+
+            conflitos = []
+            for posicao, interacao, item in zip(pendentes, lote, _status_por_operacao(len(lote), detalhes)):
+                if item.get("conflito") and tentativa < _TENTATIVAS_CONFLITO:
+                    conflitos.append(posicao)
+                    continue
+                status[posicao] = _sem_conflito(item)
+                if item["status"] != "erro":
+                    mudancas.append((interacao, _resposta_anterior(interacao, item, anteriores)))
+            pendentes = conflitos
+
+        yield self._atualizar_contagens(mudancas)
+        return status
+
+    @operacao
+    def _atualizar_contagens(self, mudancas):
+        """
+        Aplica com $inc as variações de "sim"/"nao" causadas pelos votos gravados,
+        nos contadores por pergunta e por totem/pergunta. Os dois bulk_write são
+        independentes e saem juntos num único passo (em paralelo no modo assíncrono).
+        """
+        escritas = []
+        for collection, chave in ((self.contagens, _chave_pergunta), (self.contagens_totens, _chave_totem)):
+            operacoes = _operacoes_contagem(mudancas, chave)
+            if operacoes:
+                escritas.append(collection.bulk_write(operacoes, ordered=False))
+        if escritas:
+            yield em_paralelo(self, escritas)
+
+    @operacao
+    def reconciliar_contagens(self):
+        """
+        Reconstrói os contadores a partir das interações brutas ($group + $merge)
+        e remove contadores de perguntas sem interações.
+        """
+        yield self.collection.aggregate(_PIPELINE_RECONCILIACAO, allowDiskUse=True)
+        yield self.collection.aggregate(_PIPELINE_RECONCILIACAO_TOTENS, allowDiskUse=True)
+        perguntas = yield self.collection.distinct("pergunta_id")
+        resultado = yield self.contagens.delete_many({"pergunta_id": {"$nin": perguntas}})
+        yield self.contagens_totens.delete_many({"pergunta_id": {"$nin": perguntas}})
+        return {"perguntas_reconciliadas": len(perguntas), "contadores_removidos": resultado.deleted_count}
+
+    @operacao
+    def contagens_por_totem(self, pergunta_id=None, desde=None):
+        """
+        Contadores por totem/pergunta. Com `desde`, retorna todos os contadores
+        dos totens que tiveram algum contador alterado a partir desse instante.
+        """
+        filtro = _filtro_contagens_totens(pergunta_id)
+        if desde:
+            alterados = yield self.contagens_totens.distinct("totem_id", {**filtro, "atualizado_em": {"$gte": desde}})
+            if not alterados:
+                return []
+            filtro["totem_id"] = {"$in": alterados}
+        return (yield self.contagens_totens.find(filtro, {"_id": 0}).to_list(None))
+
+    @operacao
     def get_all(self):
         """
         Retorna todas as interações do banco.
         """
-        return list(self.collection.find({}, {"_id": 0}))
+        return (yield self.collection.find({}, {"_id": 0}).to_list(None))
     
+    def iterar(self, pergunta_id=None, totem_id=None, inicio=None, fim=None, tamanho_lote=1000):
+        """
+        Retorna um cursor (sem materializar a lista) com as interações filtradas.
+        O cursor busca os documentos do servidor em lotes de `tamanho_lote`
+        (percorrido com `for` na versão síncrona e `async for` na assíncrona).
+        """
+        filtro = _filtro_interacoes(pergunta_id, totem_id, inicio, fim)
+        return self.collection.find(filtro, {"_id": 0}).batch_size(tamanho_lote)
+    
+    @operacao
     def get_score(self, pergunta_id):
         """
         Retorna o percentual de respostas "sim" e "nao" para a pergunta especificada.
+        Lê o contador pré-agregado da pergunta (uma leitura indexada, sem varrer as interações).
         Protegido contra divisão por zero.
         """
-        pipeline = [
-            {"$match": {"pergunta_id": pergunta_id}},
-            {
-                "$group": {
-                    "_id": "$resposta",
-                    "count": {"$sum": 1}
-                }
-            }
-        ]
-        results = list(self.collection.aggregate(pipeline))
-        total = sum(item['count'] for item in results)
-
-        score = {"sim": 0, "nao": 0}
-        if total > 0:
-            for item in results:
-                if item['_id'] == "sim":
-                    score["sim"] = round((item['count'] / total) * 100, 2)
-                elif item['_id'] == "nao":
-                    score["nao"] = round((item['count'] / total) * 100, 2)
-        return score
+        contagem = yield self.contagens.find_one({"pergunta_id": pergunta_id}, {"_id": 0})
+        return _calcular_score(contagem)
     
+    @operacao
     def delete_by_pergunta_id(self, pergunta_id):
         """
         Exclui todas as interações relacionadas a uma pergunta.
         """
-        self.collection.delete_many({"pergunta_id": pergunta_id})
+        yield self.collection.delete_many({"pergunta_id": pergunta_id})
+        yield self.contagens.delete_one({"pergunta_id": pergunta_id})
+        yield self.contagens_totens.delete_many({"pergunta_id": pergunta_id})
 
+    @operacao
     def has_interacted(self, vem_hash, pergunta_id):
         """
         Verifica se o usuário já interagiu com uma pergunta específica.
         """
-        return self.collection.find_one(
+        return (yield self.collection.find_one(
             {"vem_hash": vem_hash, "pergunta_id": pergunta_id}
-        ) is not None
+        )) is not None
+
+
+class InteracaoRepositoryAsync(InteracaoRepository):
+    """
+    Versão assíncrona (MONGODB_ASYNC=true): as mesmas operações sobre o AsyncMongoClient.
+    """
+    assincrono = True
+
+
+# Pipeline da reconciliação: recalcula sim/nao por pergunta e grava em "contagens_perguntas"
+_PIPELINE_RECONCILIACAO = [
+    {"$group": {
+        "_id": "$pergunta_id",
+        "sim": {"$sum": {"$cond": [{"$eq": ["$resposta", "sim"]}, 1, 0]}},
+        "nao": {"$sum": {"$cond": [{"$eq": ["$resposta", "nao"]}, 1, 0]}}
+    }},
+    {"$project": {"_id": 0, "pergunta_id": "$_id", "sim": 1, "nao": 1}},
+    {"$merge": {
+        "into": "contagens_perguntas",
+        "on": "pergunta_id",
+        "whenMatched": "replace",
+        "whenNotMatched": "insert"
+    }}
+]
+
+# Mesmo recálculo por (totem_id, pergunta_id), gravado em "contagens_totens"
+_PIPELINE_RECONCILIACAO_TOTENS = [
+    {"$group": {
+        "_id": {"totem_id": "$totem_id", "pergunta_id": "$pergunta_id"},
+        "sim": {"$sum": {"$cond": [{"$eq": ["$resposta", "sim"]}, 1, 0]}},
+        "nao": {"$sum": {"$cond": [{"$eq": ["$resposta", "nao"]}, 1, 0]}}
+    }},
+    {"$project": {
+        "_id": 0,
+        "totem_id": "$_id.totem_id",
+        "pergunta_id": "$_id.pergunta_id",
+        "sim": 1,
+        "nao": 1,
+        "atualizado_em": "$$NOW"
+    }},
+    {"$merge": {
+        "into": "contagens_totens",
+        "on": ["totem_id", "pergunta_id"],
+        "whenMatched": "replace",
+        "whenNotMatched": "insert"
+    }}
+]
+
+# Regravações de um voto alterado por outra escrita entre a leitura e o bulk_write
+_TENTATIVAS_CONFLITO = 3
+_CHAVE_DUPLICADA = 11000
+
+_PROJECAO_ANTERIORES = {"_id": 0, "vem_hash": 1, "pergunta_id": 1, "totem_id": 1, "resposta": 1}
+
+
+def _chave_voto(interacao):
+    return {
+        "vem_hash": interacao.vem_hash,
+        "pergunta_id": interacao.pergunta_id,
+        "totem_id": interacao.totem_id
+    }
+
+
+def _atualizacao_voto(interacao):
+    """
+    Update do upsert de um voto: data_criacao só é gravada na inserção,
+    então trocar a resposta atualiza apenas resposta e ultima_atualizacao.
+    """
+    data = interacao.to_dict()
+    data.pop("_id", None)  # Evita conflito de _id no MongoDB
+    data_criacao = data.pop("data_criacao")
+    return {"$set": data, "$setOnInsert": {"data_criacao": data_criacao}}
+
+
+def _tupla_voto(item):
+    if isinstance(item, dict):
+        return (item["vem_hash"], item["pergunta_id"], item["totem_id"])
+    return (item.vem_hash, item.pergunta_id, item.totem_id)
+
+
+def _filtro_anteriores(interacoes):
+    """
+    Filtro (superconjunto) dos votos já gravados para as interações do lote,
+    resolvido pelo índice "voto_unico". O recorte exato é feito em _respostas_anteriores.
+    """
+    return {
+        "vem_hash": {"$in": list({i.vem_hash for i in interacoes})},
+        "pergunta_id": {"$in": list({i.pergunta_id for i in interacoes})}
+    }
+
+
+def _respostas_anteriores(interacoes, documentos):
+    chaves = {_tupla_voto(i) for i in interacoes}
+    anteriores = {}
+    for documento in documentos:
+        chave = _tupla_voto(documento)
+        if chave in chaves:
+            anteriores[chave] = documento.get("resposta")
+    return anteriores
+
+
+def _resposta_anterior(interacao, item, anteriores):
+    # Voto inserido pelo upsert não existia; atualizado, tinha a resposta do filtro
+    if item["status"] == "inserida":
+        return None
+    return anteriores.get(_tupla_voto(interacao))
+
+
+def _chave_pergunta(interacao):
+    return (("pergunta_id", interacao.pergunta_id),)
+
+
+def _chave_totem(interacao):
+    return (("totem_id", interacao.totem_id), ("pergunta_id", interacao.pergunta_id))
+
+
+def _operacoes_contagem(mudancas, chave):
+    """
+    Converte (interação, resposta anterior) em operações $inc por contador (definido por `chave`).
+    Voto novo soma 1 na resposta; troca de resposta tira 1 da antiga e soma 1 na nova.
+    """
+    deltas = {}
+    for interacao, anterior in mudancas:
+        if anterior == interacao.resposta:
+            continue
+        delta = deltas.setdefault(chave(interacao), {"sim": 0, "nao": 0})
+        delta[interacao.resposta] += 1
+        if anterior in delta:
+            delta[anterior] -= 1
+
+    operacoes = []
+    for contador, delta in deltas.items():
+        incrementos = {resposta: valor for resposta, valor in delta.items() if valor}
+        if incrementos:
+            operacoes.append(UpdateOne(
+                dict(contador),
+                {"$inc": incrementos, "$currentDate": {"atualizado_em": True}},
+                upsert=True
+            ))
+    return operacoes
+
+
+def _filtro_contagens_totens(pergunta_id):
+    return {"pergunta_id": pergunta_id} if pergunta_id else {}
+
+
+def _calcular_score(contagem):
+    sim = contagem.get("sim", 0) if contagem else 0
+    nao = contagem.get("nao", 0) if contagem else 0
+    total = sim + nao
+
+    score = {"sim": 0, "nao": 0}
+    if total > 0:
+        score["sim"] = round((sim / total) * 100, 2)
+        score["nao"] = round((nao / total) * 100, 2)
+    return score
+
+
+def _operacoes_upsert(interacoes, anteriores):
+    """
+    Monta os UpdateOne (upsert pela chave do voto) usados no bulk_write, condicionados
+    à resposta lida antes: se ela mudou, o filtro não casa e o upsert tenta inserir um
+    voto duplicado (erro de chave no índice "voto_unico").
+    """
+    return [
+        UpdateOne(_filtro_resposta(interacao, anteriores.get(_tupla_voto(interacao))), _atualizacao_voto(interacao), upsert=True)
+        for interacao in interacoes
+    ]
+
+
+def _filtro_resposta(interacao, anterior):
+    filtro = _chave_voto(interacao)
+    filtro["resposta"] = anterior if anterior is not None else {"$exists": False}
+    return filtro
+
+
+def _status_por_operacao(total, detalhes):
+    """
+    Converte o resultado do bulk_write em um status por operação:
+    "inserida", "atualizada" ou "erro" (com a mensagem do MongoDB).
+    Erros de chave duplicada são marcados como conflito (o voto mudou desde a leitura).
+    """
+    status = [{"status": "atualizada"} for _ in range(total)]
+    for item in detalhes.get("upserted", []):
+        status[item["index"]] = {"status": "inserida"}
+    for erro in detalhes.get("writeErrors", []):
+        status[erro["index"]] = {
+            "status": "erro",
+            "erro": erro.get("errmsg", "Erro de escrita"),
+            "conflito": erro.get("code") == _CHAVE_DUPLICADA
+        }
+    return status
+
+
+def _sem_conflito(item):
+    if not item.pop("conflito", False):
+        return item
+    return {"status": "erro", "erro": "Voto alterado por outra escrita simultânea, tente novamente"}
+
+
+def _filtro_interacoes(pergunta_id=None, totem_id=None, inicio=None, fim=None):
+    """
+    Monta o filtro de pergunta, totem e intervalo de tempo (data_criacao do voto).
+    """
+    filtro = {}
+    if pergunta_id:
+        filtro["pergunta_id"] = pergunta_id
+    if totem_id:
+        filtro["totem_id"] = totem_id
+    if inicio or fim:
+        filtro["data_criacao"] = {}
+        if inicio:
+            filtro["data_criacao"]["$gte"] = inicio
+        if fim:
+            filtro["data_criacao"]["$lt"] = fim
+    return filtro
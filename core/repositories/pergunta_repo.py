@@ -1,24 +1,57 @@
 from core.database import MongoConnection
+from core.execucao import operacao
+from core.paginacao import buscar_pagina, buscar_todos
+from pymongo import IndexModel, ASCENDING, DESCENDING
 
 class PerguntaRepository:
+    # Índices declarados da coleção (aplicados na inicialização por core.indices)
+    INDICES = [
+        IndexModel([("pergunta_id", ASCENDING)], name="pergunta_id_unico", unique=True),
+        IndexModel([("data_criacao", DESCENDING)], name="data_criacao_desc"),
+    ]
+    assincrono = False
+
     def __init__(self):
-        self.collection = MongoConnection().get_collection("perguntas")
+        self.collection = MongoConnection().get_collection("perguntas", self.assincrono)
 
+    @operacao
     def save(self, pergunta):
-        self.collection.update_one(
+        yield self.collection.update_one(
             {"pergunta_id": pergunta.pergunta_id},
             {"$set": pergunta.to_dict()},
             upsert=True
         )
 
+    @operacao
     def get_all(self):
-        return list(self.collection.find({}, {"_id": 0}))
+        return (yield self.collection.find({}, {"_id": 0}).to_list(None))
+
+    @operacao
+    def listar(self, limite=None, cursor=None, campos=None):
+        """
+        Lista com projeção opcional de `campos`.
+        Com `limite`/`cursor`, retorna uma página ordenada por pergunta_id (paginação por keyset).
+        """
+        filtro = {}
+        if limite is None and cursor is None:
+            return (yield from buscar_todos(self.collection, filtro, campos))
+        return (yield from buscar_pagina(self.collection, filtro, "pergunta_id", limite, cursor, campos))
 
+    @operacao
     def get_last(self):
-        return self.collection.find_one(sort=[("data_criacao", -1)], projection={"_id": 0})
+        return (yield self.collection.find_one(sort=[("data_criacao", -1)], projection={"_id": 0}))
 
+    @operacao
     def get_by_id(self, pergunta_id):
-        return self.collection.find_one({"pergunta_id": pergunta_id}, {"_id": 0})
+        return (yield self.collection.find_one({"pergunta_id": pergunta_id}, {"_id": 0}))
 
+    @operacao
     def delete(self, pergunta_id):
-        self.collection.delete_one({"pergunta_id": pergunta_id})
+        yield self.collection.delete_one({"pergunta_id": pergunta_id})
+
+
+class PerguntaRepositoryAsync(PerguntaRepository):
+    """
+    Versão assíncrona (MONGODB_ASYNC=true): as mesmas operações sobre o AsyncMongoClient.
+    """
+    assincrono = True
@@ -0,0 +1,131 @@
+from datetime import datetime
+
+from core.database import MongoConnection
+from core.execucao import operacao
+from pymongo import IndexModel, ASCENDING, DeleteMany, InsertOne
+
+# Tabela materializada totem -> serviços próximos ("totem_servicos_proximos"): um documento
+# por par (totem, serviço ativo) a até o raio máximo configurado, com a distância e os
+# campos de resposta do serviço. "Serviços perto do totem X" vira uma leitura no índice
+# (totem_id, distancia_km). O estado (raio com que a tabela foi montada) fica em
+# "proximidade_estado".
+
+COLECAO = "totem_servicos_proximos"
+# A reconstrução completa é montada aqui e só então trocada pela tabela em uso
+COLECAO_RECONSTRUCAO = "totem_servicos_proximos_reconstrucao"
+
+# Pares gravados por insert_many na reconstrução completa
+_PARES_POR_LOTE = 1000
+
+
+class ProximidadeRepository:
+    INDICES = [
+        IndexModel([("totem_id", ASCENDING), ("distancia_km", ASCENDING)], name="totem_distancia"),
+        IndexModel([("servico_id", ASCENDING)], name="servico_id"),
+    ]
+
+    assincrono = False
+
+    def __init__(self):
+        conexao = MongoConnection()
+        self.collection = conexao.get_collection(COLECAO, self.assincrono)
+        self.estado = conexao.get_collection("proximidade_estado", self.assincrono)
+
+    @operacao
+    def get_proximos(self, totem_id, raio_km, tipo=None, limite=None):
+        """
+        Serviços do totem a até `raio_km`, do mais próximo ao mais distante.
+        """
+        cursor = self.collection.find(_filtro(totem_id, raio_km, tipo), _PROJECAO).sort(_ORDEM)
+        if limite:
+            cursor = cursor.limit(limite)
+        return (yield cursor.to_list(None))
+
+    def iterar_proximos(self, totem_ids, raio_km, tipo=None):
+        """
+        Pares de vários totens (ou de todos, com `totem_ids` None) a até `raio_km`, num único
+        cursor ordenado por (totem_id, distancia_km) no índice totem_distancia.
+        """
+        return self.collection.find(_filtro_lote(totem_ids, raio_km, tipo), {"_id": 0}).sort(_ORDEM_LOTE)
+
+    @operacao
+    def substituir(self, campo, valor, pares):
+        """
+        Troca todos os pares de um totem ou serviço (`campo` = totem_id/servico_id) pelos novos.
+        """
+        operacoes = [DeleteMany({campo: valor})] + [InsertOne(par) for par in pares]
+        yield self.collection.bulk_write(operacoes, ordered=True)
+
+    @operacao
+    def substituir_varios(self, campo, valores, pares):
+        """
+        Como substituir(), para vários totens ou serviços de uma vez (importação em lote).
+        """
+        operacoes = [DeleteMany({campo: {"$in": list(valores)}})] + [InsertOne(par) for par in pares]
+        yield self.collection.bulk_write(operacoes, ordered=True)
+
+    @operacao
+    def remover(self, campo, valor):
+        yield self.collection.delete_many({campo: valor})
+
+    @operacao
+    def reconstruir(self, pares):
+        """
+        Grava a tabela inteira numa coleção temporária (já com os índices) e a troca pela
+        atual com rename(dropTarget=True): as leituras veem a tabela antiga até a troca,
+        e uma queda no meio deixa a tabela em uso intacta.
+        """
+        temporaria = self.collection.database[COLECAO_RECONSTRUCAO]
+        yield temporaria.drop()
+        yield temporaria.create_indexes(self.INDICES)
+        for posicao in range(0, len(pares), _PARES_POR_LOTE):
+            yield temporaria.insert_many(pares[posicao:posicao + _PARES_POR_LOTE], ordered=False)
+        yield temporaria.rename(COLECAO, dropTarget=True)
+
+    @operacao
+    def limpar_raio_construido(self):
+        yield self.estado.delete_one({"_id": COLECAO})
+
+    @operacao
+    def get_raio_construido(self):
+        """
+        Raio máximo com que a tabela foi montada pela última vez (None se nunca foi).
+        """
+        estado = yield self.estado.find_one({"_id": COLECAO})
+        return estado["raio_maximo_km"] if estado else None
+
+    @operacao
+    def set_raio_construido(self, raio_maximo_km):
+        yield self.estado.update_one(
+            {"_id": COLECAO},
+            {"$set": {"raio_maximo_km": raio_maximo_km, "construida_em": datetime.utcnow()}},
+            upsert=True
+        )
+
+
+class ProximidadeRepositoryAsync(ProximidadeRepository):
+    """
+    Versão assíncrona (MONGODB_ASYNC=true): as mesmas operações sobre o AsyncMongoClient.
+    """
+    assincrono = True
+
+
+_PROJECAO = {"_id": 0, "totem_id": 0}
+_ORDEM = [("distancia_km", ASCENDING)]
+_ORDEM_LOTE = [("totem_id", ASCENDING), ("distancia_km", ASCENDING)]
+
+
+def _filtro(totem_id, raio_km, tipo):
+    filtro = {"totem_id": totem_id, "distancia_km": {"$lte": raio_km}}
+    if tipo:
+        filtro["tipo"] = tipo
+    return filtro
+
+
+def _filtro_lote(totem_ids, raio_km, tipo):
+    filtro = {"distancia_km": {"$lte": raio_km}}
+    if totem_ids is not None:
+        filtro["totem_id"] = {"$in": list(totem_ids)}
+    if tipo:
+        filtro["tipo"] = tipo
+    return filtro
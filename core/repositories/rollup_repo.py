@@ -0,0 +1,211 @@
+from datetime import datetime, timedelta
+
+from core.database import MongoConnection
+from core.execucao import agregar, operacao
+from pymongo import IndexModel, ASCENDING
+
+# Rollups das interações em buckets por hora e por dia (UTC), por pergunta e totem.
+# Cada bucket guarda {pergunta_id, totem_id, inicio, sim, nao, total} e é recalculado
+# inteiro a partir das interações ($group + $merge), então reprocessar é idempotente.
+# O rollup diário é derivado do horário, sem voltar às interações brutas.
+
+COLECOES = {
+    "hora": "interacoes_por_hora",
+    "dia": "interacoes_por_dia",
+}
+
+# Reprocessa também os votos gravados pouco antes da última execução
+# (escritas que ainda estavam em andamento naquele instante)
+_MARGEM = timedelta(seconds=30)
+# Buckets recalculados por aggregate (tamanho do $or no $match)
+_BUCKETS_POR_CONSULTA = 500
+
+
+class RollupRepository:
+    # Índices das coleções de rollup; o índice único é exigido pelo $merge (on: bucket)
+    INDICES = [
+        IndexModel(
+            [("pergunta_id", ASCENDING), ("totem_id", ASCENDING), ("inicio", ASCENDING)],
+            name="bucket_unico",
+            unique=True
+        ),
+        IndexModel([("totem_id", ASCENDING), ("inicio", ASCENDING)], name="totem_inicio"),
+    ]
+
+    assincrono = False
+
+    def __init__(self):
+        conexao = MongoConnection()
+        self.interacoes = conexao.get_collection("interacoes", self.assincrono)
+        self.colecoes = {
+            granularidade: conexao.get_collection(nome, self.assincrono)
+            for granularidade, nome in COLECOES.items()
+        }
+        self.estado = conexao.get_collection("rollups_estado", self.assincrono)
+
+    @operacao
+    def atualizar(self, completo=False):
+        """
+        Atualiza os rollups com os votos criados ou alterados desde a última execução.
+        Só os buckets afetados são recalculados; com `completo=True` tudo é reconstruído.
+        """
+        agora = datetime.utcnow()
+        marca = None if completo else (yield self.estado.find_one({"_id": "interacoes"}))
+
+        # Pipelines com $merge não retornam documentos; agregar() consome o cursor vazio
+        if marca is None:
+            yield from agregar(self.interacoes, _pipeline_hora({"data_criacao": {"$exists": True}}), allowDiskUse=True)
+            yield from agregar(self.colecoes["hora"], _pipeline_dia({}), allowDiskUse=True)
+            horas = dias = None
+        else:
+            desde = marca["ate"] - _MARGEM
+            afetadas = yield from agregar(self.interacoes, _pipeline_horas_afetadas(desde))
+            horas = sorted(documento["_id"] for documento in afetadas)
+            dias = _dias(horas)
+            for filtro in _filtros_buckets("data_criacao", horas, timedelta(hours=1)):
+                yield from agregar(self.interacoes, _pipeline_hora(filtro), allowDiskUse=True)
+            for filtro in _filtros_buckets("inicio", dias, timedelta(days=1)):
+                yield from agregar(self.colecoes["hora"], _pipeline_dia(filtro))
+
+        yield self.estado.update_one({"_id": "interacoes"}, {"$set": {"ate": agora}}, upsert=True)
+        return _resumo_atualizacao(agora, horas, dias)
+
+    @operacao
+    def serie(self, granularidade, pergunta_id=None, totem_id=None, inicio=None, fim=None):
+        """
+        Série temporal de votos lida dos rollups (somando os totens quando totem_id não é informado).
+        """
+        pipeline = _pipeline_serie(pergunta_id, totem_id, inicio, fim)
+        return (yield from agregar(self.colecoes[granularidade], pipeline))
+
+    @operacao
+    def delete_by_pergunta_id(self, pergunta_id):
+        for collection in self.colecoes.values():
+            yield collection.delete_many({"pergunta_id": pergunta_id})
+
+
+class RollupRepositoryAsync(RollupRepository):
+    """
+    Versão assíncrona (MONGODB_ASYNC=true): as mesmas operações sobre o AsyncMongoClient.
+    """
+    assincrono = True
+
+
+def _inicio_bucket(campo, com_hora):
+    partes = {
+        "year": {"$year": campo},
+        "month": {"$month": campo},
+        "day": {"$dayOfMonth": campo},
+    }
+    if com_hora:
+        partes["hour"] = {"$hour": campo}
+    return {"$dateFromParts": partes}
+
+
+def _merge(colecao):
+    return {"$merge": {
+        "into": colecao,
+        "on": ["pergunta_id", "totem_id", "inicio"],
+        "whenMatched": "replace",
+        "whenNotMatched": "insert"
+    }}
+
+
+_PROJECAO_BUCKET = {
+    "$project": {
+        "_id": 0,
+        "pergunta_id": "$_id.pergunta_id",
+        "totem_id": "$_id.totem_id",
+        "inicio": "$_id.inicio",
+        "sim": 1,
+        "nao": 1,
+        "total": {"$add": ["$sim", "$nao"]}
+    }
+}
+
+
+def _pipeline_horas_afetadas(desde):
+    """
+    Horas (de criação) dos votos criados ou alterados a partir de `desde`.
+    """
+    return [
+        {"$match": {"ultima_atualizacao": {"$gte": desde}, "data_criacao": {"$exists": True}}},
+        {"$group": {"_id": _inicio_bucket("$data_criacao", True)}}
+    ]
+
+
+def _pipeline_hora(filtro):
+    return [
+        {"$match": filtro},
+        {"$group": {
+            "_id": {
+                "pergunta_id": "$pergunta_id",
+                "totem_id": "$totem_id",
+                "inicio": _inicio_bucket("$data_criacao", True)
+            },
+            "sim": {"$sum": {"$cond": [{"$eq": ["$resposta", "sim"]}, 1, 0]}},
+            "nao": {"$sum": {"$cond": [{"$eq": ["$resposta", "nao"]}, 1, 0]}}
+        }},
+        _PROJECAO_BUCKET,
+        _merge(COLECOES["hora"])
+    ]
+
+
+def _pipeline_dia(filtro):
+    return [
+        {"$match": filtro},
+        {"$group": {
+            "_id": {
+                "pergunta_id": "$pergunta_id",
+                "totem_id": "$totem_id",
+                "inicio": _inicio_bucket("$inicio", False)
+            },
+            "sim": {"$sum": "$sim"},
+            "nao": {"$sum": "$nao"}
+        }},
+        _PROJECAO_BUCKET,
+        _merge(COLECOES["dia"])
+    ]
+
+
+def _pipeline_serie(pergunta_id, totem_id, inicio, fim):
+    filtro = {}
+    if pergunta_id:
+        filtro["pergunta_id"] = pergunta_id
+    if totem_id:
+        filtro["totem_id"] = totem_id
+    if inicio or fim:
+        filtro["inicio"] = {}
+        if inicio:
+            filtro["inicio"]["$gte"] = inicio
+        if fim:
+            filtro["inicio"]["$lt"] = fim
+
+    return [
+        {"$match": filtro},
+        {"$group": {"_id": "$inicio", "sim": {"$sum": "$sim"}, "nao": {"$sum": "$nao"}}},
+        {"$sort": {"_id": 1}},
+        {"$project": {"_id": 0, "inicio": "$_id", "sim": 1, "nao": 1, "total": {"$add": ["$sim", "$nao"]}}}
+    ]
+
+
+def _dias(horas):
+    return sorted({hora.replace(hour=0, minute=0, second=0, microsecond=0) for hora in horas})
+
+
+def _filtros_buckets(campo, inicios, duracao):
+    """
+    Agrupa os buckets afetados em filtros $or de intervalos [inicio, inicio + duracao).
+    """
+    for posicao in range(0, len(inicios), _BUCKETS_POR_CONSULTA):
+        lote = inicios[posicao:posicao + _BUCKETS_POR_CONSULTA]
+        yield {"$or": [{campo: {"$gte": inicio, "$lt": inicio + duracao}} for inicio in lote]}
+
+
+def _resumo_atualizacao(agora, horas, dias):
+    return {
+        "completo": horas is None,
+        "horas_recalculadas": None if horas is None else len(horas),
+        "dias_recalculados": None if dias is None else len(dias),
+        "ate": agora.isoformat()
+    }
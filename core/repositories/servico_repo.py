@@ -1,130 +1,277 @@
+import re
+from datetime import datetime
+
 from core.database import MongoConnection
-from models.servico import Servico
-from typing import Optional, List
+from core.execucao import agregar, operacao
+from core.paginacao import buscar_pagina, buscar_todos
+from core.indice_espacial import obter_indice_servicos
+from core.horarios import filtro_aberto, intervalos_semanais
+from core.texto import termos_do_servico
+from pymongo import IndexModel, ASCENDING, GEOSPHERE, UpdateOne
+from pymongo.errors import BulkWriteError
+from models.servico import CAMPOS_CONTEUDO, Servico, RAIO_TERRA_KM
+from typing import Optional, List, Union
 
 class ServicoRepository:
+    # Índices declarados da coleção (aplicados na inicialização por core.indices)
+    INDICES = [
+        IndexModel([("servico_id", ASCENDING)], name="servico_id_unico", unique=True),
+        IndexModel([("ativo", ASCENDING), ("tipo", ASCENDING)], name="ativo_tipo"),
+        # Busca por proximidade ($geoNear) no ponto GeoJSON derivado de latitude/longitude
+        IndexModel([("location", GEOSPHERE), ("ativo", ASCENDING), ("tipo", ASCENDING)], name="location_2dsphere"),
+        # Busca por texto (prefixo) nos termos normalizados de nome, endereço e descrição
+        IndexModel([("termos", ASCENDING), ("ativo", ASCENDING)], name="termos_busca"),
+        # Filtro aberto_agora/aberto_em: intervalos semanais de funcionamento (em minutos)
+        IndexModel([("horarios.inicio", ASCENDING), ("horarios.fim", ASCENDING)], name="horarios_semana"),
+    ]
+
+    assincrono = False
+
     def __init__(self):
-        self.collection = MongoConnection().get_collection("servicos")
+        self.collection = MongoConnection().get_collection("servicos", self.assincrono)
 
+    @operacao
     def save(self, servico: Servico) -> None:
         """
         Salva ou atualiza um serviço no banco de dados
         """
-        servico_dict = servico.model_dump(mode='json')
+        servico_dict = _documento(servico)
         
-        self.collection.update_one(
+        yield self.collection.update_one(
             {"servico_id": servico.servico_id},
-            {"$set": servico_dict},
+            _upsert(servico_dict),
             upsert=True
         )
+        _sincronizar_indice(servico_dict)
+
+    @operacao
+    def save_many(self, servicos: List[Servico]) -> List[dict]:
+        """
+        Salva vários serviços comparando antes o hash de conteúdo com o gravado (uma leitura
+        por servico_id do lote): só os novos e os alterados vão num único bulk_write não
+        ordenado de upserts. Retorna o status de cada serviço ("inserido", "atualizado",
+        "inalterado" ou "erro"), na ordem recebida.
+        """
+        if not servicos:
+            return []
+        documentos = [_documento(servico) for servico in servicos]
+        gravados = yield self.collection.find(_filtro_ids(documentos), _PROJECAO_ESTADO).to_list(None)
+        posicoes = _posicoes_alteradas(documentos, gravados)
+        detalhes = {}
+        if posicoes:
+            try:
+                resultado = yield self.collection.bulk_write(_operacoes_upsert(documentos, posicoes), ordered=False)
+                detalhes = {"upserted": [{"index": i} for i in resultado.upserted_ids], "writeErrors": []}
+            except BulkWriteError as e:
+                detalhes = e.details
+        status = _status_por_operacao(len(documentos), posicoes, detalhes)
+        _sincronizar_gravados(documentos, status)
+        return status
 
+    @operacao
     def get_all(self) -> List[dict]:
         """
         Retorna todos os serviços cadastrados
         """
-        return list(self.collection.find({}, {"_id": 0}))
+        return (yield self.collection.find({}, _PROJECAO).to_list(None))
 
+    @operacao
+    def listar(self, apenas_ativos: bool = True, limite: Optional[int] = None, cursor: Optional[str] = None, campos: Optional[str] = None, aberto_minuto: Optional[int] = None) -> Union[List[dict], dict]:
+        """
+        Lista com projeção opcional de `campos`.
+        Com `limite`/`cursor`, retorna uma página ordenada por servico_id (paginação por keyset).
+        Com `aberto_minuto` (minuto da semana), só os serviços abertos nesse momento.
+        """
+        filtro = _filtro_listagem(apenas_ativos, aberto_minuto)
+        if limite is None and cursor is None:
+            return (yield from buscar_todos(self.collection, filtro, campos, _OCULTOS))
+        return (yield from buscar_pagina(self.collection, filtro, "servico_id", limite, cursor, campos, _OCULTOS))
+
+    @operacao
     def get_ativos(self) -> List[dict]:
         """
         Retorna apenas serviços ativos
         """
-        return list(self.collection.find({"ativo": True}, {"_id": 0}))
+        return (yield self.collection.find({"ativo": True}, _PROJECAO).to_list(None))
 
+    @operacao
     def get_by_id(self, servico_id: str) -> Optional[dict]:
         """
         Busca um serviço específico pelo ID
         """
-        return self.collection.find_one({"servico_id": servico_id}, {"_id": 0})
+        return (yield self.collection.find_one({"servico_id": servico_id}, _PROJECAO))
 
+    @operacao
     def get_by_tipo(self, tipo: str) -> List[dict]:
         """
         Busca serviços por tipo (Saúde, Transporte, Educação, etc)
         """
-        return list(self.collection.find(
+        return (yield self.collection.find(
             {"tipo": tipo, "ativo": True},
-            {"_id": 0}
-        ))
-
-    def get_por_localizacao(self, latitude: float, longitude: float, raio_km: float = 5.0) -> List[dict]:
-        """
-        Busca serviços próximos a uma localização usando índice geoespacial do MongoDB
-        Nota: Requer índice 2dsphere criado no campo de localização
-        """
-        # MongoDB usa GeoJSON, então precisamos estruturar assim
-        servicos = list(self.collection.find(
-            {
-                "ativo": True,
-                "latitude": {"$exists": True},
-                "longitude": {"$exists": True}
-            },
-            {"_id": 0}
-        ))
-        
-        # Como não estamos usando GeoJSON completo, vamos filtrar manualmente
-        # (Isso será otimizado no service com o método calcular_distancia)
-        return servicos
+            _PROJECAO
+        ).to_list(None))
+
+    @operacao
+    def get_por_localizacao(
+        self,
+        latitude: float,
+        longitude: float,
+        raio_km: float = 5.0,
+        tipo: Optional[str] = None,
+        limite: Optional[int] = None,
+        aberto_minuto: Optional[int] = None
+    ) -> List[dict]:
+        """
+        Serviços ativos dentro do raio, do mais próximo ao mais distante ($geoNear no
+        índice 2dsphere): só os serviços do resultado são lidos, não o catálogo inteiro.
+        """
+        filtro = _filtro_proximos(aberto_minuto)
+        return (yield from agregar(self.collection, _pipeline_proximos(latitude, longitude, raio_km, tipo, limite, filtro)))
+
+    @operacao
+    def get_mais_proximos(self, latitude: float, longitude: float, k: int, tipo: Optional[str] = None, aberto_minuto: Optional[int] = None) -> List[dict]:
+        """
+        Os k serviços ativos mais próximos, sem limite de raio: $geoNear percorre o índice
+        2dsphere do ponto para fora e o $limit encerra a busca no k-ésimo.
+        """
+        filtro = _filtro_proximos(aberto_minuto)
+        return (yield from agregar(self.collection, _pipeline_proximos(latitude, longitude, None, tipo, k, filtro)))
+
+    @operacao
+    def buscar_por_termos(
+        self,
+        termos: List[str],
+        tipo: Optional[str] = None,
+        limite: int = 20,
+        latitude: Optional[float] = None,
+        longitude: Optional[float] = None,
+        raio_km: Optional[float] = None
+    ) -> List[dict]:
+        """
+        Serviços ativos com um termo começando por cada termo da busca (índice "termos_busca"),
+        ordenados por nome. Com coordenadas, a busca vira um $geoNear filtrado pelos termos,
+        do mais próximo ao mais distante dentro do raio.
+        """
+        filtro = _filtro_termos(termos, tipo)
+        if latitude is not None:
+            return (yield from agregar(
+                self.collection,
+                _pipeline_proximos(latitude, longitude, raio_km, tipo, limite, filtro)
+            ))
+        return (yield self.collection.find(filtro, _PROJECAO_INDICE).sort("nome", ASCENDING).limit(limite).to_list(None))
 
+    @operacao
     def delete(self, servico_id: str) -> None:
         """
         Remove um serviço do banco de dados
         """
-        self.collection.delete_one({"servico_id": servico_id})
+        yield self.collection.delete_one({"servico_id": servico_id})
+        _remover_do_indice(servico_id)
 
+    @operacao
     def desativar(self, servico_id: str) -> bool:
         """
         Desativa um serviço ao invés de deletá-lo (soft delete)
         """
-        result = self.collection.update_one(
+        result = yield self.collection.update_one(
             {"servico_id": servico_id},
             {"$set": {"ativo": False}}
         )
+        _remover_do_indice(servico_id)
         return result.modified_count > 0
 
+    @operacao
+    def desativar_ausentes(self, servico_ids: set) -> List[str]:
+        """
+        Desativa os serviços ativos cujo servico_id não está em `servico_ids` (os que saíram
+        da planilha importada). Retorna os IDs desativados.
+        """
+        ativos = yield self.collection.find({"ativo": True}, {"_id": 0, "servico_id": 1}).to_list(None)
+        ausentes = [servico["servico_id"] for servico in ativos if servico["servico_id"] not in servico_ids]
+        for posicao in range(0, len(ausentes), _IDS_POR_LOTE):
+            yield self.collection.update_many(
+                {"servico_id": {"$in": ausentes[posicao:posicao + _IDS_POR_LOTE]}, "ativo": True},
+                {"$set": {"ativo": False}}
+            )
+        _remover_varios_do_indice(ausentes)
+        return ausentes
+
+    @operacao
     def ativar(self, servico_id: str) -> bool:
         """
         Reativa um serviço
         """
-        result = self.collection.update_one(
+        result = yield self.collection.update_one(
             {"servico_id": servico_id},
             {"$set": {"ativo": True}}
         )
+        yield self._recarregar_no_indice(servico_id)
         return result.modified_count > 0
 
+    @operacao
     def update_partial(self, servico_id: str, campos: dict) -> bool:
         """
-        Atualiza campos específicos de um serviço
+        Atualiza campos específicos de um serviço num único update_one com pipeline.
+        Quando o conteúdo muda, os derivados (termos, hash, horários) são calculados do
+        documento já mesclado e a escrita é condicionada ao hash lido: se outra escrita
+        alterou o serviço no meio, a leitura é refeita. O ponto GeoJSON sai do próprio
+        pipeline, a partir de latitude/longitude já atualizadas.
         """
-        from datetime import datetime
-        
         if not campos:
             return False
         
         campos["ultima_atualizacao"] = datetime.utcnow().isoformat()
         
-        result = self.collection.update_one(
-            {"servico_id": servico_id},
-            {"$set": campos}
-        )
+        filtro = {"servico_id": servico_id}
+        for _ in range(_TENTATIVAS_CONFLITO):
+            valores = dict(campos)
+            if _muda_conteudo(campos):
+                atual = yield self.collection.find_one(filtro, _PROJECAO_MESCLAGEM)
+                if atual is None:
+                    return False
+                valores.update(_derivados({**atual, **campos}))
+                filtro = {"servico_id": servico_id, "hash_conteudo": atual.get("hash_conteudo")}
+            result = yield self.collection.update_one(filtro, _pipeline_atualizacao(valores, _move_servico(campos)))
+            if result.matched_count or not _muda_conteudo(campos):
+                break
+            filtro = {"servico_id": servico_id}
+        yield self._recarregar_no_indice(servico_id)
         return result.modified_count > 0
 
+    @operacao
+    def _recarregar_no_indice(self, servico_id: str) -> None:
+        """
+        Relê o serviço e atualiza o índice espacial em memória (se ativo).
+        """
+        if obter_indice_servicos():
+            servico = yield self.collection.find_one({"servico_id": servico_id}, _PROJECAO_INDICE)
+            if servico:
+                _sincronizar_indice(servico)
+            else:
+                _remover_do_indice(servico_id)
+
+    @operacao
     def exists(self, servico_id: str) -> bool:
         """
         Verifica se um serviço existe
         """
-        return self.collection.count_documents({"servico_id": servico_id}, limit=1) > 0
+        return (yield self.collection.count_documents({"servico_id": servico_id}, limit=1)) > 0
 
+    @operacao
     def count_total(self) -> int:
         """
         Conta o total de serviços cadastrados
         """
-        return self.collection.count_documents({})
+        return (yield self.collection.count_documents({}))
 
+    @operacao
     def count_ativos(self) -> int:
         """
         Conta quantos serviços estão ativos
         """
-        return self.collection.count_documents({"ativo": True})
+        return (yield self.collection.count_documents({"ativo": True}))
 
+    @operacao
     def count_por_tipo(self) -> dict:
         """
         Retorna contagem de serviços agrupados por tipo
@@ -138,5 +285,199 @@ class ServicoRepository:
             {"$sort": {"total": -1}}
         ]
         
-        resultado = list(self.collection.aggregate(pipeline))
-        return {item["_id"]: item["total"] for item in resultado}
\ No newline at end of file
+        resultado = yield from agregar(self.collection, pipeline)
+        return {item["_id"]: item["total"] for item in resultado}
+
+class ServicoRepositoryAsync(ServicoRepository):
+    """
+    Versão assíncrona (MONGODB_ASYNC=true): as mesmas operações sobre o AsyncMongoClient.
+    """
+    assincrono = True
+
+
+# O $geoNear mede distâncias com raio da Terra de 6378,1 km; as distâncias da API usam
+# Haversine com RAIO_TERRA_KM. O raio é convertido para a escala do MongoDB (com folga
+# para o arredondamento em 2 casas) e o corte final (distancia_km <= raio_km) fica com
+# o Haversine, como antes.
+_RAIO_TERRA_MONGO_KM = 6378.1
+_FOLGA_ARREDONDAMENTO_KM = 0.005
+
+# Recalcula o ponto GeoJSON a partir de latitude/longitude (update com pipeline).
+# Usado quando as coordenadas mudam e na migração que preenche os serviços antigos.
+PIPELINE_LOCALIZACAO = [
+    {"$set": {"location": {"type": "Point", "coordinates": ["$longitude", "$latitude"]}}}
+]
+
+
+# Campos derivados ("termos" da busca por texto, "hash_conteudo" da importação, "horarios"
+# do filtro de aberto) são internos e não saem nas respostas
+_OCULTOS = ("termos", "hash_conteudo", "horarios")
+_PROJECAO = {"_id": 0, **{campo: 0 for campo in _OCULTOS}}
+# O índice em memória e o $geoNear mantêm "horarios" (filtro de aberto no índice em memória)
+_PROJECAO_INDICE = {"_id": 0, "location": 0, "termos": 0, "hash_conteudo": 0}
+_PROJECAO_CONTEUDO = {"_id": 0, **{campo: 1 for campo in CAMPOS_CONTEUDO}}
+_PROJECAO_MESCLAGEM = {**_PROJECAO_CONTEUDO, "hash_conteudo": 1}
+_PROJECAO_ESTADO = {"_id": 0, "servico_id": 1, "hash_conteudo": 1, "ativo": 1}
+
+# Tamanho máximo das listas de servico_id em filtros $in
+_IDS_POR_LOTE = 10000
+
+# Releituras do update_partial quando outra escrita muda o serviço entre a leitura e o update
+_TENTATIVAS_CONFLITO = 3
+
+
+def _sincronizar_indice(servico: dict) -> None:
+    indice = obter_indice_servicos()
+    if indice:
+        indice.atualizar(servico)
+
+
+def _remover_do_indice(servico_id: str) -> None:
+    indice = obter_indice_servicos()
+    if indice:
+        indice.remover(servico_id)
+
+
+def _remover_varios_do_indice(servico_ids: List[str]) -> None:
+    indice = obter_indice_servicos()
+    if indice:
+        for servico_id in servico_ids:
+            indice.remover(servico_id)
+
+
+def _documento(servico: Servico) -> dict:
+    servico_dict = servico.model_dump(mode='json')
+    servico_dict["location"] = _ponto(servico.latitude, servico.longitude)
+    servico_dict.update(_derivados(servico_dict))
+    return servico_dict
+
+
+def _derivados(servico: dict) -> dict:
+    """
+    Campos calculados a partir dos cadastrais: termos da busca por texto, hash de conteúdo
+    e intervalos semanais de funcionamento.
+    """
+    return {
+        "termos": termos_do_servico(servico),
+        "hash_conteudo": Servico.gerar_hash_conteudo(servico),
+        "horarios": intervalos_semanais(servico.get("horario_funcionamento")),
+    }
+
+
+def _upsert(documento: dict) -> dict:
+    # data_criacao só é gravada na inserção: regravar um serviço não muda a data de cadastro
+    campos = {campo: valor for campo, valor in documento.items() if campo != "data_criacao"}
+    return {"$set": campos, "$setOnInsert": {"data_criacao": documento["data_criacao"]}}
+
+
+def _filtro_ids(documentos: List[dict]) -> dict:
+    return {"servico_id": {"$in": [documento["servico_id"] for documento in documentos]}}
+
+
+def _posicoes_alteradas(documentos: List[dict], gravados) -> List[int]:
+    """
+    Posições dos documentos que precisam ser gravados: novos, com hash de conteúdo
+    diferente do gravado ou inativos (a importação reativa o serviço).
+    """
+    estado = {gravado["servico_id"]: gravado for gravado in gravados}
+    posicoes = []
+    for posicao, documento in enumerate(documentos):
+        gravado = estado.get(documento["servico_id"])
+        if not gravado or gravado.get("hash_conteudo") != documento["hash_conteudo"] or not gravado.get("ativo"):
+            posicoes.append(posicao)
+    return posicoes
+
+
+def _operacoes_upsert(documentos: List[dict], posicoes: List[int]) -> List[UpdateOne]:
+    return [
+        UpdateOne({"servico_id": documentos[posicao]["servico_id"]}, _upsert(documentos[posicao]), upsert=True)
+        for posicao in posicoes
+    ]
+
+
+def _status_por_operacao(total: int, posicoes: List[int], detalhes: dict) -> List[dict]:
+    """
+    Converte o resultado do bulk_write em um status por serviço (com a mensagem do MongoDB
+    nos erros). Os índices do bulk_write se referem às `posicoes` gravadas; as demais
+    ficam "inalterado".
+    """
+    status = [{"status": "inalterado"} for _ in range(total)]
+    for posicao in posicoes:
+        status[posicao] = {"status": "atualizado"}
+    for item in detalhes.get("upserted", []):
+        status[posicoes[item["index"]]] = {"status": "inserido"}
+    for erro in detalhes.get("writeErrors", []):
+        status[posicoes[erro["index"]]] = {"status": "erro", "erro": erro.get("errmsg", "Erro de escrita")}
+    return status
+
+
+def _sincronizar_gravados(documentos: List[dict], status: List[dict]) -> None:
+    if obter_indice_servicos():
+        for documento, item in zip(documentos, status):
+            if item["status"] in ("inserido", "atualizado"):
+                _sincronizar_indice(documento)
+
+
+def _ponto(latitude: float, longitude: float) -> dict:
+    # GeoJSON usa a ordem [longitude, latitude]
+    return {"type": "Point", "coordinates": [longitude, latitude]}
+
+
+def _pipeline_atualizacao(valores: dict, move: bool) -> list:
+    # $literal: valores vindos da requisição não são interpretados como expressões
+    pipeline = [{"$set": {campo: {"$literal": valor} for campo, valor in valores.items()}}]
+    if move:
+        pipeline += PIPELINE_LOCALIZACAO
+    return pipeline
+
+
+def _move_servico(campos: dict) -> bool:
+    return "latitude" in campos or "longitude" in campos
+
+
+def _muda_conteudo(campos: dict) -> bool:
+    return any(campo in campos for campo in CAMPOS_CONTEUDO)
+
+
+def _filtro_proximos(aberto_minuto: Optional[int]) -> dict:
+    return {"ativo": True, **filtro_aberto(aberto_minuto)} if aberto_minuto is not None else {"ativo": True}
+
+
+def _filtro_listagem(apenas_ativos: bool, aberto_minuto: Optional[int]) -> dict:
+    filtro = {"ativo": True} if apenas_ativos else {}
+    if aberto_minuto is not None:
+        filtro.update(filtro_aberto(aberto_minuto))
+    return filtro
+
+
+def _filtro_termos(termos: List[str], tipo: Optional[str]) -> dict:
+    """
+    Cada termo da busca precisa ser prefixo de algum termo do serviço. A regex ancorada
+    em ^ e sem opções vira uma faixa no índice "termos_busca".
+    """
+    filtro = {"ativo": True, "$and": [{"termos": {"$regex": "^" + re.escape(termo)}} for termo in termos]}
+    if tipo:
+        filtro["tipo"] = tipo
+    return filtro
+
+
+def _pipeline_proximos(latitude, longitude, raio_km, tipo, limite, filtro=None) -> list:
+    filtro = dict(filtro) if filtro else {"ativo": True}
+    if tipo:
+        filtro["tipo"] = tipo
+
+    geo_near = {
+        "near": _ponto(latitude, longitude),
+        "key": "location",
+        "distanceField": "distancia_m",
+        "query": filtro,
+        "spherical": True
+    }
+    # Sem raio (k mais próximos) o $limit seguinte é quem encerra a busca
+    if raio_km is not None:
+        geo_near["maxDistance"] = (raio_km + _FOLGA_ARREDONDAMENTO_KM) * 1000 * _RAIO_TERRA_MONGO_KM / RAIO_TERRA_KM
+    pipeline = [{"$geoNear": geo_near}]
+    if limite:
+        pipeline.append({"$limit": limite})
+    pipeline.append({"$project": _PROJECAO_INDICE})
+    return pipeline
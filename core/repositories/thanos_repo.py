@@ -1,16 +1,35 @@
 from core.database import MongoConnection
+from core.execucao import operacao
+from core.ranking import obter_ranking
+from core.cache import obter_canal
 
 # Repositório para operações relacionadas ao Thanos (remoção de todos os dados), simbolizando o "estalo" do Thanos.
 
+# Coleções esvaziadas pelo estalo (dados, contadores, rollups e a tabela de proximidade)
+COLECOES = (
+    "perguntas", "usuarios", "totens", "interacoes", "contagens_perguntas", "contagens_totens",
+    "interacoes_por_hora", "interacoes_por_dia", "rollups_estado", "totem_servicos_proximos",
+)
+
 class ThanosRepository:
+    assincrono = False
+
     def __init__(self):
-        self.pergunta_collection = MongoConnection().get_collection("perguntas")
-        self.usuario_collection = MongoConnection().get_collection("usuarios")
-        self.totem_collection = MongoConnection().get_collection("totens")
-        self.interacao_collection = MongoConnection().get_collection("interacoes")
+        conexao = MongoConnection()
+        self.collections = [conexao.get_collection(nome, self.assincrono) for nome in COLECOES]
 
+    @operacao
     def delete_all_data(self):
-        self.pergunta_collection.delete_many({})
-        self.usuario_collection.delete_many({})
-        self.totem_collection.delete_many({})
-        self.interacao_collection.delete_many({})
\ No newline at end of file
+        for collection in self.collections:
+            yield collection.delete_many({})
+        _limpar_ranking()
+        obter_canal().publicar("usuarios")
+
+class ThanosRepositoryAsync(ThanosRepository):
+    assincrono = True
+
+
+def _limpar_ranking():
+    ranking = obter_ranking()
+    if ranking:
+        ranking.limpar()
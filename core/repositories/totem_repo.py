@@ -1,21 +1,63 @@
 from core.database import MongoConnection
+from core.execucao import operacao
+from core.paginacao import buscar_pagina, buscar_todos
+from pymongo import IndexModel, ASCENDING
 
 class TotemRepository:
+    # Índices declarados da coleção (aplicados na inicialização por core.indices)
+    INDICES = [
+        IndexModel([("totem_id", ASCENDING)], name="totem_id_unico", unique=True),
+    ]
+    assincrono = False
+
     def __init__(self):
-        self.collection = MongoConnection().get_collection("totens")
+        self.collection = MongoConnection().get_collection("totens", self.assincrono)
 
+    @operacao
     def save(self, totem):
-        self.collection.update_one(
+        yield self.collection.update_one(
             {"totem_id": totem.totem_id},
             {"$set": totem.to_dict()},
             upsert=True
         )
 
+    @operacao
     def get_all(self):
-        return list(self.collection.find({}, {"_id": 0}))
+        return (yield self.collection.find({}, {"_id": 0}).to_list(None))
+
+    @operacao
+    def listar(self, limite=None, cursor=None, campos=None):
+        """
+        Lista com projeção opcional de `campos`.
+        Com `limite`/`cursor`, retorna uma página ordenada por totem_id (paginação por keyset).
+        """
+        filtro = {}
+        if limite is None and cursor is None:
+            return (yield from buscar_todos(self.collection, filtro, campos))
+        return (yield from buscar_pagina(self.collection, filtro, "totem_id", limite, cursor, campos))
 
+    @operacao
     def get_by_id(self, totem_id):
-        return self.collection.find_one({"totem_id": totem_id}, {"_id": 0})
+        return (yield self.collection.find_one({"totem_id": totem_id}, {"_id": 0}))
 
+    @operacao
+    def get_coordenadas(self, totem_ids=None):
+        """
+        Retorna totem_id, latitude e longitude (de todos os totens ou só dos `totem_ids`).
+        """
+        filtro = {"totem_id": {"$in": list(totem_ids)}} if totem_ids is not None else {}
+        return (yield self.collection.find(filtro, _PROJECAO_COORDENADAS).to_list(None))
+
+    @operacao
     def delete(self, totem_id):
-        self.collection.delete_one({"totem_id": totem_id})
+        yield self.collection.delete_one({"totem_id": totem_id})
+
+
+class TotemRepositoryAsync(TotemRepository):
+    """
+    Versão assíncrona (MONGODB_ASYNC=true): as mesmas operações sobre o AsyncMongoClient.
+    """
+    assincrono = True
+
+
+_PROJECAO_COORDENADAS = {"_id": 0, "totem_id": 1, "latitude": 1, "longitude": 1}
@@ -1,12 +1,28 @@
 from core.database import MongoConnection
+from core.execucao import agregar, operacao
+from core.paginacao import buscar_pagina, buscar_todos, codificar_cursor, decodificar_cursor
+from core.ranking import obter_ranking
+from core.cache import CacheLRU, obter_canal
+from core import config
+from pymongo import IndexModel, ASCENDING, DESCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from models.usuario import Usuario
-from typing import Optional, List
-from datetime import datetime
+from typing import Optional, List, Union
+from datetime import date, datetime
 
 class UsuarioRepository:
+    # Índices declarados da coleção (aplicados na inicialização por core.indices)
+    INDICES = [
+        IndexModel([("vem_hash", ASCENDING)], name="vem_hash_unico", unique=True),
+        # Ranking: ordenação por pontuação (empates por vem_hash) e contagem de quem está acima
+        IndexModel([("pontuacao", DESCENDING), ("vem_hash", ASCENDING)], name="ranking"),
+    ]
+    assincrono = False
+
     def __init__(self):
-        self.collection = MongoConnection().get_collection("usuarios")
+        self.collection = MongoConnection().get_collection("usuarios", self.assincrono)
 
+    @operacao
     def save(self, usuario: Usuario) -> None:
         """
         Salva ou atualiza um usuário no banco de dados.
@@ -15,59 +31,112 @@ class UsuarioRepository:
         # CORREÇÃO: usar model_dump(mode='json') ao invés de to_dict()
         usuario_dict = usuario.model_dump(mode='json')
         
-        self.collection.update_one(
+        yield self.collection.update_one(
             {"vem_hash": usuario.vem_hash},
             {"$set": usuario_dict},
             upsert=True
         )
+        _invalidar_cache(usuario.vem_hash)
+        _sincronizar_ranking(usuario.vem_hash, usuario.pontuacao)
 
+    @operacao
+    def get_or_create(self, vem_hash: str) -> dict:
+        """
+        Retorna o usuário (só os campos de UsuarioResposta), criando-o se não existir,
+        numa única operação atômica: scans simultâneos do mesmo QR Code não duplicam
+        nem sobrescrevem o usuário.
+        """
+        try:
+            usuario = yield self.collection.find_one_and_update(
+                {"vem_hash": vem_hash},
+                _insercao_usuario(vem_hash),
+                projection=_PROJECAO_RESPOSTA,
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Outro scan inseriu o mesmo usuário entre a busca e a inserção do upsert
+            usuario = yield self.collection.find_one({"vem_hash": vem_hash}, _PROJECAO_RESPOSTA)
+        _sincronizar_ranking(vem_hash, usuario.get("pontuacao"))
+        return usuario
+
+    @operacao
     def get_all(self) -> List[dict]:
         """
         Retorna todos os usuários cadastrados
         """
-        return list(self.collection.find({}, {"_id": 0}))
+        return (yield self.collection.find({}, _PROJECAO).to_list(None))
 
+    @operacao
+    def listar(self, limite: Optional[int] = None, cursor: Optional[str] = None, campos: Optional[str] = None) -> Union[List[dict], dict]:
+        """
+        Lista com projeção opcional de `campos`.
+        Com `limite`/`cursor`, retorna uma página ordenada por vem_hash (paginação por keyset).
+        """
+        filtro = {}
+        if limite is None and cursor is None:
+            return (yield from buscar_todos(self.collection, filtro, campos, _OCULTOS))
+        return (yield from buscar_pagina(self.collection, filtro, "vem_hash", limite, cursor, campos, _OCULTOS))
+
+    @operacao
     def get_by_vem_hash(self, vem_hash: str) -> Optional[dict]:
         """
-        Busca um usuário específico pelo hash único
+        Busca um usuário específico pelo hash único (lido do cache quando ativo)
         """
-        return self.collection.find_one({"vem_hash": vem_hash}, {"_id": 0})
+        usuario = _cache.obter(vem_hash)
+        if usuario is not None:
+            return dict(usuario)
+        marca = _cache.marca()
+        usuario = yield self.collection.find_one({"vem_hash": vem_hash}, _PROJECAO)
+        _guardar_no_cache(vem_hash, usuario, marca)
+        return usuario
 
+    @operacao
     def delete(self, vem_hash: str) -> None:
         """
         Remove um usuário do banco de dados
         """
-        self.collection.delete_one({"vem_hash": vem_hash})
+        yield self.collection.delete_one({"vem_hash": vem_hash})
+        _invalidar_cache(vem_hash)
+        _remover_do_ranking(vem_hash)
 
+    @operacao
     def set_points(self, vem_hash: str, points: int) -> None:
         """
         Atualiza apenas a pontuação de um usuário
         """
-        self.collection.update_one(
+        yield self.collection.update_one(
             {"vem_hash": vem_hash},
             {"$set": {"pontuacao": points}}
         )
+        _invalidar_cache(vem_hash)
+        _sincronizar_ranking(vem_hash, points)
     
+    @operacao
     def update(self, vem_hash: str, usuario_data: dict) -> bool:
         """
         Atualiza os dados completos de um usuário.
         Retorna True se atualizou com sucesso, False se usuário não existe.
         """
-        result = self.collection.update_one(
+        result = yield self.collection.update_one(
             {"vem_hash": vem_hash},
             {"$set": usuario_data}
         )
+        _invalidar_cache(vem_hash)
         return result.modified_count > 0 or result.matched_count > 0
     
+    @operacao
     def update_timestamp(self, vem_hash: str) -> None:
         """
         Atualiza apenas o timestamp de última atualização
         """
-        self.collection.update_one(
+        yield self.collection.update_one(
             {"vem_hash": vem_hash},
             {"$set": {"ultima_atualizacao": datetime.utcnow().isoformat()}}
         )
+        _invalidar_cache(vem_hash)
     
+    @operacao
     def update_partial(self, vem_hash: str, fields: dict) -> bool:
         """
         Atualiza campos específicos de um usuário.
@@ -79,18 +148,20 @@ class UsuarioRepository:
         # Adiciona timestamp de atualização automaticamente
         fields["ultima_atualizacao"] = datetime.utcnow().isoformat()
         
-        result = self.collection.update_one(
+        result = yield self.collection.update_one(
             {"vem_hash": vem_hash},
             {"$set": fields}
         )
+        _invalidar_cache(vem_hash)
         return result.modified_count > 0
     
+    @operacao
     def increment_points(self, vem_hash: str, points: int) -> Optional[int]:
         """
         Incrementa (ou decrementa) pontos usando operador atômico do MongoDB.
         Retorna a nova pontuação ou None se usuário não existe.
         """
-        result = self.collection.find_one_and_update(
+        result = yield self.collection.find_one_and_update(
             {"vem_hash": vem_hash},
             {
                 "$inc": {"pontuacao": points},
@@ -99,43 +170,315 @@ class UsuarioRepository:
             projection={"pontuacao": 1, "_id": 0},
             return_document=True
         )
+        _invalidar_cache(vem_hash)
         
         if result:
+            _sincronizar_ranking(vem_hash, result.get("pontuacao"))
             return result.get("pontuacao")
         return None
     
+    @operacao
+    def award_vote_points(self, vem_hash: str, pergunta_id: str, points: int) -> Optional[dict]:
+        """
+        Concede os pontos do voto uma única vez por pergunta (idempotente), numa única
+        escrita: o pipeline só soma os pontos se a pergunta ainda não está em
+        "perguntas_pontuadas" e a registra ali na mesma operação atômica. O documento de
+        antes (com a pergunta, se já pontuou) diz se os pontos foram concedidos.
+        Retorna {"pontuacao", "concedido"} ou None se o usuário não existe.
+        """
+        antes = yield self.collection.find_one_and_update(
+            {"vem_hash": vem_hash},
+            _pipeline_pontos_voto(pergunta_id, points),
+            projection={"_id": 0, "pontuacao": 1, "perguntas_pontuadas": {"$elemMatch": {"$eq": pergunta_id}}},
+            return_document=ReturnDocument.BEFORE
+        )
+        if antes is None:
+            return None
+        pontuacao = antes.get("pontuacao", 0)
+        concedido = not antes.get("perguntas_pontuadas")
+        if concedido:
+            pontuacao += points
+            _invalidar_cache(vem_hash)
+            _sincronizar_ranking(vem_hash, pontuacao)
+        return {"pontuacao": pontuacao, "concedido": concedido}
+
+    @operacao
+    def get_ranking(self, limit: int, order: str = "desc") -> List[dict]:
+        """
+        Top-K por pontuação, lido em ordem do índice "ranking" (sem ordenar em memória).
+        """
+        return (yield self.collection.find({}, _PROJECAO).sort(_ordenacao_ranking(order)).limit(limit).to_list(None))
+
+    @operacao
+    def get_ranking_page(self, limit: int, cursor: Optional[str] = None) -> dict:
+        """
+        Página do ranking (maior pontuação primeiro) com a posição de cada usuário.
+        Paginação por keyset em (pontuacao, vem_hash): o custo não cresce com a página.
+        """
+        anterior = _cursor_ranking(cursor)
+        documentos = yield (
+            self.collection.find(_filtro_apos(anterior), _PROJECAO_RANKING)
+            .sort(_ordenacao_ranking("desc"))
+            .limit(limit + 1)
+            .to_list(None)
+        )
+        return _pagina_ranking(documentos, limit, anterior)
+
+    @operacao
+    def get_rank(self, vem_hash: str) -> Optional[dict]:
+        """
+        Posição do usuário: 1 + usuários com pontuação maior. Com o ranking em memória
+        carregado (só com um worker) a contagem sai da árvore de Fenwick (O(log P), fonte
+        "memoria"). Sem ele, e sempre com vários workers, count_documents percorre o índice
+        "ranking" até a pontuação do usuário: O(posição), barato no topo e caro para quem
+        está no fim de um ranking grande.
+        """
+        ranking = obter_ranking()
+        posicao = ranking.posicao(vem_hash) if ranking else None
+        if posicao is not None:
+            return {**posicao, "fonte": "memoria"}
+
+        usuario = yield self.collection.find_one({"vem_hash": vem_hash}, {"_id": 0, "pontuacao": 1})
+        if usuario is None:
+            return None
+        pontuacao = usuario.get("pontuacao", 0)
+        acima = yield self.collection.count_documents({"pontuacao": {"$gt": pontuacao}})
+        total = yield self.collection.estimated_document_count()
+        return {"pontuacao": pontuacao, "posicao": acima + 1, "total_usuarios": total, "fonte": "indice"}
+
+    @operacao
     def exists(self, vem_hash: str) -> bool:
         """
         Verifica se um usuário existe no banco
         """
-        return self.collection.count_documents({"vem_hash": vem_hash}, limit=1) > 0
+        return (yield self.collection.count_documents({"vem_hash": vem_hash}, limit=1)) > 0
     
+    @operacao
     def get_usuarios_com_cadastro_completo(self) -> List[dict]:
         """
         Retorna apenas usuários que completaram o cadastro
         """
-        return list(self.collection.find(
+        return (yield self.collection.find(
             {"cadastro_completo": True},
-            {"_id": 0}
-        ))
+            _PROJECAO
+        ).to_list(None))
     
+    @operacao
     def get_usuarios_sem_cadastro_completo(self) -> List[dict]:
         """
         Retorna usuários que ainda não completaram o cadastro
         """
-        return list(self.collection.find(
+        return (yield self.collection.find(
             {"cadastro_completo": False},
-            {"_id": 0}
-        ))
+            _PROJECAO
+        ).to_list(None))
     
+    @operacao
     def count_total(self) -> int:
         """
         Conta o total de usuários cadastrados
         """
-        return self.collection.count_documents({})
+        return (yield self.collection.count_documents({}))
     
+    @operacao
     def count_cadastros_completos(self) -> int:
         """
         Conta quantos usuários completaram o cadastro
         """
-        return self.collection.count_documents({"cadastro_completo": True})
\ No newline at end of file
+        return (yield self.collection.count_documents({"cadastro_completo": True}))
+
+    @operacao
+    def get_statistics(self, today: date) -> dict:
+        """
+        Contagens, pontuações e idades calculadas no banco numa única passada ($facet).
+        """
+        resultado = yield from agregar(self.collection, _pipeline_estatisticas(today), allowDiskUse=True)
+        return resultado[0] if resultado else {}
+
+class UsuarioRepositoryAsync(UsuarioRepository):
+    """
+    Versão assíncrona (MONGODB_ASYNC=true): as mesmas operações sobre o AsyncMongoClient.
+    """
+    assincrono = True
+
+
+def _pipeline_pontos_voto(pergunta_id: str, points: int) -> list:
+    # Voto repetido não altera nada: pontuação e ultima_atualizacao ficam como estão
+    pontuadas = {"$ifNull": ["$perguntas_pontuadas", []]}
+    nova = {"$not": [{"$in": [{"$literal": pergunta_id}, pontuadas]}]}
+    return [{"$set": {
+        "pontuacao": {"$cond": [nova, {"$add": [{"$ifNull": ["$pontuacao", 0]}, points]}, "$pontuacao"]},
+        "ultima_atualizacao": {"$cond": [nova, datetime.utcnow().isoformat(), "$ultima_atualizacao"]},
+        "perguntas_pontuadas": {"$setUnion": [pontuadas, [{"$literal": pergunta_id}]]},
+    }}]
+
+
+# Perguntas que já renderam pontos: campo interno, fora das leituras
+_OCULTOS = ("perguntas_pontuadas",)
+_PROJECAO = {"_id": 0, **{campo: 0 for campo in _OCULTOS}}
+
+_PROJECAO_RANKING = {"_id": 0, "vem_hash": 1, "nome": 1, "pontuacao": 1}
+
+# Campos usados para montar UsuarioResposta (data_nascimento para a idade)
+_PROJECAO_RESPOSTA = {"_id": 0, "vem_hash": 1, "nome": 1, "pontuacao": 1, "cadastro_completo": 1, "data_nascimento": 1}
+
+
+def _insercao_usuario(vem_hash: str) -> dict:
+    """
+    Documento de um usuário novo (só com o hash), aplicado apenas na inserção.
+    """
+    novo = Usuario(vem_hash=vem_hash).model_dump(mode='json')
+    novo.pop("vem_hash")  # já vem do filtro do upsert
+    return {"$setOnInsert": novo}
+
+
+def _ordenacao_ranking(order: str) -> list:
+    # "asc" percorre o mesmo índice ao contrário (por isso o desempate também inverte)
+    if order == "asc":
+        return [("pontuacao", ASCENDING), ("vem_hash", DESCENDING)]
+    return [("pontuacao", DESCENDING), ("vem_hash", ASCENDING)]
+
+
+def _cursor_ranking(cursor: Optional[str]) -> Optional[dict]:
+    if not cursor:
+        return None
+    anterior = decodificar_cursor(cursor)
+    if not isinstance(anterior, dict) or not {"p", "h", "n", "r"} <= anterior.keys():
+        raise ValueError("Cursor de paginação inválido")
+    return anterior
+
+
+def _filtro_apos(anterior: Optional[dict]) -> dict:
+    if not anterior:
+        return {}
+    return {"$or": [
+        {"pontuacao": {"$lt": anterior["p"]}},
+        {"pontuacao": anterior["p"], "vem_hash": {"$gt": anterior["h"]}}
+    ]}
+
+
+def _pagina_ranking(documentos: List[dict], limit: int, anterior: Optional[dict]) -> dict:
+    """
+    Numera a página: empates dividem a posição (1, 2, 2, 4...).
+    O cursor carrega a última pontuação, o total já percorrido e a última posição.
+    """
+    tem_mais = len(documentos) > limit
+    documentos = documentos[:limit]
+
+    percorridos = anterior["n"] if anterior else 0
+    ultima_pontuacao = anterior["p"] if anterior else None
+    ultima_posicao = anterior["r"] if anterior else 0
+
+    itens = []
+    for documento in documentos:
+        percorridos += 1
+        pontuacao = documento.get("pontuacao", 0)
+        if pontuacao != ultima_pontuacao:
+            ultima_posicao = percorridos
+            ultima_pontuacao = pontuacao
+        itens.append({"posicao": ultima_posicao, **documento})
+
+    proximo = None
+    if tem_mais:
+        proximo = codificar_cursor({
+            "p": ultima_pontuacao, "h": documentos[-1]["vem_hash"], "n": percorridos, "r": ultima_posicao
+        })
+    return {"itens": itens, "proximo_cursor": proximo}
+
+
+# Cache LRU dos documentos lidos por get_by_vem_hash (capacidade 0 desativa). Toda escrita
+# publica a invalidação do hash no canal "usuarios", ao qual o cache deste processo assina.
+_cache = CacheLRU(config.USUARIOS_CACHE_CAPACIDADE, config.USUARIOS_CACHE_TTL_S)
+obter_canal().assinar("usuarios", _cache.invalidar)
+
+
+def estatisticas_cache() -> dict:
+    return _cache.estatisticas()
+
+
+def _guardar_no_cache(vem_hash: str, usuario: Optional[dict], marca: int) -> None:
+    # Usuário inexistente não é guardado: o upsert que o cria não precisaria invalidar nada
+    if usuario is not None:
+        _cache.guardar(vem_hash, dict(usuario), marca)
+
+
+def _invalidar_cache(vem_hash: str) -> None:
+    if _cache.ativo:
+        obter_canal().publicar("usuarios", vem_hash)
+
+
+def _sincronizar_ranking(vem_hash: str, pontuacao: Optional[int]) -> None:
+    ranking = obter_ranking()
+    if ranking:
+        ranking.atualizar(vem_hash, pontuacao)
+
+
+def _remover_do_ranking(vem_hash: str) -> None:
+    ranking = obter_ranking()
+    if ranking:
+        ranking.remover(vem_hash)
+
+
+# Limites inferiores das faixas do histograma de idade (a última faixa é "60+")
+FAIXAS_IDADE = [13, 18, 25, 35, 45, 60]
+
+
+def _idade(today: date) -> dict:
+    """
+    Idade em anos completos a partir de data_nascimento (string ISO ou data).
+    Datas inválidas viram null e ficam fora das estatísticas de idade.
+    """
+    nascimento = {"$convert": {"input": "$data_nascimento", "to": "date", "onError": None, "onNull": None}}
+    ainda_nao_fez_aniversario = {"$or": [
+        {"$lt": [today.month, {"$month": "$$nascimento"}]},
+        {"$and": [
+            {"$eq": [today.month, {"$month": "$$nascimento"}]},
+            {"$lt": [today.day, {"$dayOfMonth": "$$nascimento"}]}
+        ]}
+    ]}
+    return {"$let": {
+        "vars": {"nascimento": nascimento},
+        "in": {"$cond": [
+            {"$eq": ["$$nascimento", None]},
+            None,
+            {"$subtract": [
+                {"$subtract": [today.year, {"$year": "$$nascimento"}]},
+                {"$cond": [ainda_nao_fez_aniversario, 1, 0]}
+            ]}
+        ]}
+    }}
+
+
+def _pipeline_estatisticas(today: date) -> list:
+    # Mesma regra do modelo Usuario: idades abaixo de 13 anos (ou datas futuras) são ignoradas
+    idades_validas = {"$match": {"idade": {"$gte": FAIXAS_IDADE[0]}}}
+    return [
+        {"$project": {
+            "_id": 0,
+            "cadastro_completo": 1,
+            "pontuacao": {"$ifNull": ["$pontuacao", 0]},
+            "idade": _idade(today)
+        }},
+        {"$facet": {
+            "geral": [{"$group": {
+                "_id": None,
+                "total_usuarios": {"$sum": 1},
+                "cadastros_completos": {"$sum": {"$cond": [{"$eq": ["$cadastro_completo", True]}, 1, 0]}},
+                "pontuacao_total": {"$sum": "$pontuacao"},
+                "pontuacao_maxima": {"$max": "$pontuacao"}
+            }}],
+            "idade": [idades_validas, {"$group": {
+                "_id": None,
+                "total_usuarios_com_idade": {"$sum": 1},
+                "idade_media": {"$avg": "$idade"},
+                "idade_minima": {"$min": "$idade"},
+                "idade_maxima": {"$max": "$idade"}
+            }}],
+            "histograma_idade": [idades_validas, {"$bucket": {
+                "groupBy": "$idade",
+                "boundaries": FAIXAS_IDADE,
+                "default": "ultima",
+                "output": {"total": {"$sum": 1}}
+            }}]
+        }}
+    ]
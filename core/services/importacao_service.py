@@ -0,0 +1,291 @@
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from core import config
+from core.execucao import aguardar_futuro, bloqueante, operacao
+from core.importacao import validar_arquivo
+from core.repositories.importacao_repo import ImportacaoRepository, ImportacaoRepositoryAsync
+from core.services.servico_service import ServicoService
+
+logger = logging.getLogger(__name__)
+
+# Importações de serviços em segundo plano: o upload é copiado para um arquivo temporário,
+# o job é registrado na coleção "importacoes" e executado num pool próprio de
+# IMPORTACAO_MAX_CONCORRENTES threads (os demais esperam na fila). O job grava lote a lote
+# com o mesmo caminho da importação síncrona (ServicoService.importar_em_lotes), atualiza o
+# progresso a cada lote e confere ali se o cancelamento foi pedido. O pool usa sempre o
+# cliente síncrono do MongoDB, também com MONGODB_ASYNC=true. A importação na própria
+# requisição (aguardar=true) registra o mesmo job, passa pelo mesmo pool (a requisição espera
+# a vez dela) e grava os erros do mesmo jeito.
+
+_executor = ThreadPoolExecutor(max_workers=max(1, config.IMPORTACAO_MAX_CONCORRENTES), thread_name_prefix="importacao")
+# job_id -> (future, arquivo temporário) dos jobs agendados nesta instância
+_agendados = {}
+_lock = threading.Lock()
+_encerrando = threading.Event()
+
+# Bytes copiados por vez do upload para o arquivo temporário
+_BLOCO_COPIA = 1024 * 1024
+
+
+class ImportacaoService:
+    assincrono = False
+
+    def __init__(self):
+        self.repo = ImportacaoRepositoryAsync() if self.assincrono else ImportacaoRepository()
+
+    @operacao
+    def criar(self, arquivo, nome_arquivo: str, desativar_ausentes: bool = False) -> dict:
+        """
+        Registra e agenda a importação do arquivo (ValueError se o arquivo é inválido).
+        """
+        caminho = yield bloqueante(self, _copiar_upload, arquivo, nome_arquivo)
+        job = _novo_job(nome_arquivo, desativar_ausentes)
+        try:
+            yield self.repo.criar(job)
+        except Exception:
+            os.remove(caminho)
+            raise
+        _agendar(job["job_id"], caminho, nome_arquivo, desativar_ausentes)
+        return _resposta_criacao(job)
+
+    @operacao
+    def importar_agora(self, arquivo, nome_arquivo: str, desativar_ausentes: bool = False) -> dict:
+        """
+        Importa e espera o resultado (aguardar=true), registrada como um job que entra no
+        mesmo pool de IMPORTACAO_MAX_CONCORRENTES: as linhas com erro vão para
+        "importacoes_erros" a cada lote, sem acumular na memória. O resultado traz só as
+        primeiras IMPORTACAO_ERROS_NO_RESUMO e o link da listagem paginada.
+        """
+        yield bloqueante(self, validar_arquivo, arquivo, nome_arquivo)
+        job = _novo_job(nome_arquivo, desativar_ausentes)
+        yield self.repo.criar(job)
+        futuro = _submeter(job["job_id"], None, _executar_agora, job["job_id"], arquivo, nome_arquivo, desativar_ausentes)
+        yield aguardar_futuro(self, futuro)
+        job = yield self.repo.get_by_id(job["job_id"])
+        erros = {"itens": []}
+        limite = min(config.IMPORTACAO_ERROS_NO_RESUMO, config.PAGINACAO_LIMITE_MAXIMO)
+        if limite > 0 and job["com_erros"]:
+            erros = yield self.repo.listar_erros(job["job_id"], limite)
+        return _resumo_importacao(job, erros["itens"])
+
+    @operacao
+    def consultar(self, job_id: str):
+        return (yield self.repo.get_by_id(job_id))
+
+    @operacao
+    def cancelar(self, job_id: str):
+        """
+        Pede o cancelamento: na fila, o job é cancelado na hora; em execução, para ao fim do
+        lote atual (os lotes já gravados permanecem).
+        """
+        return (yield self.repo.solicitar_cancelamento(job_id))
+
+    @operacao
+    def listar_erros(self, job_id: str, limite=None, cursor=None):
+        if not (yield self.repo.get_by_id(job_id)):
+            return None
+        return (yield self.repo.listar_erros(job_id, limite, cursor))
+
+
+class ImportacaoServiceAsync(ImportacaoService):
+    assincrono = True
+
+
+def encerrar_importacoes():
+    """
+    Para as importações desta instância (chamado no shutdown da aplicação) e espera as
+    em execução pararem ao fim do lote atual: cada job grava o próprio status final
+    ("interrompida"). Os da fila que nem começaram são marcados aqui e têm o arquivo
+    temporário removido.
+    """
+    _encerrando.set()
+    with _lock:
+        agendados = dict(_agendados)
+    _executor.shutdown(wait=True, cancel_futures=True)
+    repo = ImportacaoRepository()
+    for job_id, (futuro, caminho) in agendados.items():
+        if futuro.cancelled():
+            repo.finalizar(job_id, "interrompida")
+            if caminho:
+                _remover_arquivo(caminho)
+
+
+def recuperar_importacoes() -> int:
+    """
+    Marca como "interrompida" os jobs que ficaram na_fila/executando porque o processo caiu
+    sem passar pelo encerrar_importacoes (chamado na inicialização da aplicação). Os jobs
+    só rodam no pool do processo que os criou: assume uma única instância da API.
+    """
+    interrompidos = ImportacaoRepository().interromper_pendentes()
+    if interrompidos:
+        logger.warning("%d importações pendentes de uma execução anterior marcadas como interrompidas", interrompidos)
+    return interrompidos
+
+
+def _agendar(job_id: str, caminho: str, nome_arquivo: str, desativar_ausentes: bool) -> None:
+    _submeter(job_id, caminho, _executar_job, job_id, caminho, nome_arquivo, desativar_ausentes)
+
+
+def _submeter(job_id: str, caminho, func, *args):
+    # Sob o lock: o finally do job (que remove a entrada) não roda antes de ela existir
+    with _lock:
+        futuro = _executor.submit(func, *args)
+        _agendados[job_id] = (futuro, caminho)
+    return futuro
+
+
+def _executar_job(job_id: str, caminho: str, nome_arquivo: str, desativar_ausentes: bool) -> None:
+    try:
+        with open(caminho, "rb") as arquivo:
+            _executar(job_id, arquivo, nome_arquivo, desativar_ausentes)
+    except Exception:
+        logger.exception("Falha na importação %s", job_id)
+    finally:
+        _remover_arquivo(caminho)
+
+
+def _executar_agora(job_id: str, arquivo, nome_arquivo: str, desativar_ausentes: bool) -> None:
+    # A falha volta para a requisição que está esperando (aguardar=true)
+    _executar(job_id, arquivo, nome_arquivo, desativar_ausentes)
+
+
+def _executar(job_id: str, arquivo, nome_arquivo: str, desativar_ausentes: bool) -> None:
+    """
+    Roda o job no pool: não começa se a aplicação está encerrando ou se o cancelamento
+    chegou enquanto ele esperava na fila; grava o status final (ou "falhou").
+    """
+    repo = ImportacaoRepository()
+    try:
+        if _encerrando.is_set():
+            repo.finalizar(job_id, "interrompida")
+            return
+        if not repo.iniciar(job_id):
+            return
+        repo.finalizar(job_id, _importar(repo, job_id, arquivo, nome_arquivo, desativar_ausentes))
+    except Exception as e:
+        repo.finalizar(job_id, "falhou", str(e))
+        raise
+    finally:
+        with _lock:
+            _agendados.pop(job_id, None)
+
+
+def _importar(repo: ImportacaoRepository, job_id: str, arquivo, nome_arquivo: str, desativar_ausentes: bool) -> str:
+    """
+    Importa o arquivo lote a lote, registrando o progresso. Retorna o status final.
+    A desativação dos ausentes só acontece se o arquivo foi importado até o fim e sem
+    linhas com erro: uma linha rejeitada pode ser de um serviço existente, que não deve
+    ser desativado por não ter sido "visto".
+    """
+    inicio = time.perf_counter()
+    linhas_lidas = 0
+    com_erros = 0
+    servicos = ServicoService()
+    vistos = set() if desativar_ausentes else None
+    lotes = servicos.importar_em_lotes(arquivo, nome_arquivo, vistos)
+    for resumo in lotes:
+        linhas_lidas += resumo["total_linhas"]
+        com_erros += len(resumo["erros"])
+        vazao = round(linhas_lidas / max(time.perf_counter() - inicio, 1e-6), 1)
+        cancelar = repo.registrar_lote(job_id, _incrementos(resumo), resumo["erros"], vazao)
+        if cancelar or _encerrando.is_set():
+            lotes.close()
+            return "cancelada" if cancelar else "interrompida"
+    if desativar_ausentes and not com_erros:
+        repo.registrar_desativados(job_id, servicos.desativar_ausentes(vistos))
+    return "concluida"
+
+
+def _remover_arquivo(caminho: str) -> None:
+    try:
+        os.remove(caminho)
+    except FileNotFoundError:
+        pass
+
+
+def _copiar_upload(arquivo, nome_arquivo: str) -> str:
+    """
+    Copia o upload para um arquivo temporário próprio (o do UploadFile é fechado ao fim da
+    requisição) e confere extensão e cabeçalho antes de aceitar o job.
+    """
+    _, extensao = os.path.splitext(nome_arquivo or "")
+    descritor, caminho = tempfile.mkstemp(prefix="importacao_", suffix=extensao.lower())
+    try:
+        arquivo.seek(0)
+        with os.fdopen(descritor, "wb") as destino:
+            shutil.copyfileobj(arquivo, destino, _BLOCO_COPIA)
+        with open(caminho, "rb") as copia:
+            validar_arquivo(copia, nome_arquivo)
+    except Exception:
+        os.remove(caminho)
+        raise
+    return caminho
+
+
+def _novo_job(nome_arquivo: str, desativar_ausentes: bool) -> dict:
+    return {
+        "job_id": uuid.uuid4().hex,
+        "status": "na_fila",
+        "arquivo": nome_arquivo,
+        "desativar_ausentes": desativar_ausentes,
+        "criado_em": datetime.utcnow(),
+        "iniciado_em": None,
+        "concluido_em": None,
+        "linhas_lidas": 0,
+        "gravadas": 0,
+        "inseridos": 0,
+        "atualizados": 0,
+        "inalterados": 0,
+        "desativados": 0,
+        "com_erros": 0,
+        "linhas_por_segundo": None,
+        "cancelamento_solicitado": False,
+    }
+
+
+def _incrementos(resumo: dict) -> dict:
+    return {
+        "linhas_lidas": resumo["total_linhas"],
+        "gravadas": resumo["inseridos"] + resumo["atualizados"],
+        "inseridos": resumo["inseridos"],
+        "atualizados": resumo["atualizados"],
+        "inalterados": resumo["inalterados"],
+        "com_erros": len(resumo["erros"]),
+    }
+
+
+def _resumo_importacao(job: dict, erros: list) -> dict:
+    total = job["linhas_lidas"]
+    importados = job["gravadas"] + job["inalterados"]
+    return {
+        "mensagem": "Importação concluída" if job["status"] == "concluida" else f"Importação {job['status']}",
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "total_linhas": total,
+        "importados_com_sucesso": importados,
+        "inseridos": job["inseridos"],
+        "atualizados": job["atualizados"],
+        "inalterados": job["inalterados"],
+        "desativados": job["desativados"],
+        "com_erros": job["com_erros"],
+        "taxa_sucesso": round((importados / total * 100), 2) if total > 0 else 0,
+        "detalhes_erros": erros,
+        "erros": f"/servicos/importacoes/{job['job_id']}/erros",
+    }
+
+
+def _resposta_criacao(job: dict) -> dict:
+    return {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "acompanhar": f"/servicos/importacoes/{job['job_id']}",
+        "erros": f"/servicos/importacoes/{job['job_id']}/erros",
+    }
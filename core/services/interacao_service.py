@@ -1,51 +1,247 @@
-from core.repositories.interacao_repo import InteracaoRepository
+from core.execucao import operacao
+from core.repositories.interacao_repo import InteracaoRepository, InteracaoRepositoryAsync
+from core.repositories.rollup_repo import RollupRepository, RollupRepositoryAsync, COLECOES
+from core.repositories.usuario_repo import UsuarioRepository, UsuarioRepositoryAsync
 from models.interacao import Interacao
+from core import config
+from core.buffer_interacoes import BufferInteracoes, BufferInteracoesAsync
+from core.exportacao import exportar, exportar_async, FORMATOS
+
+# Colunas do CSV exportado (NDJSON exporta o documento completo)
+COLUNAS_EXPORTACAO = ["vem_hash", "pergunta_id", "totem_id", "resposta", "data_criacao"]
 
 class InteracaoService:
+    assincrono = False
+
     def __init__(self):
-        self.repo = InteracaoRepository()
+        if self.assincrono:
+            self.repo = InteracaoRepositoryAsync()
+            self.rollups = RollupRepositoryAsync()
+            self.usuario_repo = UsuarioRepositoryAsync()
+            buffer = BufferInteracoesAsync
+        else:
+            self.repo = InteracaoRepository()
+            self.rollups = RollupRepository()
+            self.usuario_repo = UsuarioRepository()
+            buffer = BufferInteracoes
+        self.buffer = buffer(self.repo) if config.BUFFER_INTERACOES_ATIVO else None
 
-    def listar_interacoes(self):
+    @operacao
+    def listar_interacoes(self, limite=None, cursor=None, campos=None):
         """
         Retorna todas as interações registradas no sistema.
+        Com `limite`/`cursor`, retorna uma página (paginação por keyset).
+        """
+        return (yield self.repo.listar(limite, cursor, campos))
+    
+    def exportar_interacoes(self, formato="ndjson", comprimir=False, pergunta_id=None,
+                            totem_id=None, inicio=None, fim=None):
+        """
+        Exporta as interações em streaming (NDJSON ou CSV, opcionalmente gzip).
+        Retorna um gerador de bytes; o cursor é percorrido em lotes com memória limitada.
         """
-        return self.repo.get_all()
+        _validar_exportacao(formato, inicio, fim)
+        cursor = self.repo.iterar(pergunta_id, totem_id, inicio, fim, config.EXPORTACAO_TAMANHO_LOTE)
+        gerador = exportar_async if self.assincrono else exportar
+        return gerador(cursor, formato, COLUNAS_EXPORTACAO, comprimir, config.EXPORTACAO_TAMANHO_LOTE)
     
+    @operacao
     def obter_score(self, pergunta_id):
         """
         Retorna o percentual de respostas 'sim' e 'nao' para uma pergunta específica.
         """
         if not pergunta_id:
             raise ValueError("pergunta_id inválido")
-        return self.repo.get_score(pergunta_id)
+        return (yield self.repo.get_score(pergunta_id))
 
+    @operacao
     def registrar_interacao(self, vem_hash, pergunta_id, totem_id, resposta):
         """
         Registra uma nova interação no sistema.
         Valida resposta e parâmetros.
         """
-        if not vem_hash or not pergunta_id or not totem_id:
-            raise ValueError("vem_hash, pergunta_id e totem_id são obrigatórios")
-        if resposta not in ["sim", "nao"]:
-            raise ValueError("Resposta inválida, deve ser 'sim' ou 'nao'")
-        
-        interacao = Interacao(vem_hash, pergunta_id, totem_id, resposta)
-        self.repo.save(interacao)
+        interacao = _validar_interacao(vem_hash, pergunta_id, totem_id, resposta)
+        if self.buffer:
+            yield self.buffer.enfileirar(interacao)
+        else:
+            yield self.repo.save(interacao)
         return interacao.to_dict()
+
+    @operacao
+    def registrar_voto(self, vem_hash, pergunta_id, totem_id, resposta):
+        """
+        Registra o voto e concede os pontos de gamificação numa única chamada: a escrita
+        do voto (com os contadores) e uma escrita no usuário, sem leituras antes.
+        Os pontos são concedidos só no primeiro voto do usuário em cada pergunta;
+        reenviar o mesmo voto (ou mudar a resposta) não soma pontos de novo.
+        Retorna None se o usuário não existe (o voto fica gravado, como no POST /interacoes/).
+        """
+        interacao = _validar_interacao(vem_hash, pergunta_id, totem_id, resposta)
+
+        # Voto primeiro, pontos depois: se a gravação falhar nenhum ponto é concedido,
+        # e o reenvio grava o voto e pontua. No buffer "rapido" o voto conta como
+        # gravado ao entrar na fila (mesma garantia do POST /interacoes/).
+        if self.buffer:
+            yield self.buffer.enfileirar(interacao)
+        else:
+            yield self.repo.save(interacao)
+
+        pontos = yield self.usuario_repo.award_vote_points(vem_hash, pergunta_id, config.PONTOS_POR_VOTO)
+        if pontos is None:
+            return None
+        return _resumo_voto(interacao, pontos)
+    
+    @operacao
+    def registrar_lote(self, itens):
+        """
+        Registra um lote de interações (votos acumulados offline pelos totens)
+        com um único bulk_write. Retorna o resultado de cada item do lote.
+        """
+        interacoes, posicoes, resultados = _preparar_lote(itens)
+        status = yield self.repo.save_many(interacoes)
+        return _resumo_lote(resultados, posicoes, status)
+    
+    def obter_metricas_buffer(self):
+        """
+        Retorna as métricas do buffer write-behind (ou None se estiver desativado).
+        """
+        return self.buffer.obter_metricas() if self.buffer else None
+
+    @operacao
+    def reconciliar_contagens(self):
+        """
+        Recalcula os contadores de votos por pergunta a partir das interações
+        (corrige divergências causadas por escritas interrompidas).
+        """
+        return (yield self.repo.reconciliar_contagens())
+
+    @operacao
+    def atualizar_rollups(self, completo=False):
+        """
+        Atualiza os rollups por hora/dia com os votos novos ou alterados
+        desde a última execução (ou reconstrói tudo com `completo=True`).
+        """
+        return (yield self.rollups.atualizar(completo))
+
+    @operacao
+    def obter_serie_temporal(self, granularidade="hora", pergunta_id=None, totem_id=None, inicio=None, fim=None):
+        """
+        Retorna a série de votos por hora ou dia, lida dos rollups (sem varrer as interações).
+        """
+        _validar_serie(granularidade, inicio, fim)
+        return (yield self.rollups.serie(granularidade, pergunta_id, totem_id, inicio, fim))
+
+    @operacao
+    def encerrar(self):
+        """
+        Grava os votos pendentes no buffer (chamado no shutdown da aplicação).
+        """
+        if self.buffer:
+            yield self.buffer.parar()
     
+    @operacao
     def excluir_interacoes_por_pergunta(self, pergunta_id):
         """
         Remove todas as interações associadas a uma pergunta específica.
         """
         if not pergunta_id:
             raise ValueError("pergunta_id inválido")
-        self.repo.delete_by_pergunta_id(pergunta_id)
+        yield self.repo.delete_by_pergunta_id(pergunta_id)
+        yield self.rollups.delete_by_pergunta_id(pergunta_id)
         return {"mensagem": "Interações removidas com sucesso"}
     
+    @operacao
     def verificar_interacao(self, vem_hash, pergunta_id):
         """
         Verifica se o usuário já interagiu com uma pergunta específica.
         """
         if not vem_hash or not pergunta_id:
             raise ValueError("vem_hash e pergunta_id são obrigatórios")
-        return self.repo.has_interacted(vem_hash, pergunta_id)
+        return (yield self.repo.has_interacted(vem_hash, pergunta_id))
+
+
+class InteracaoServiceAsync(InteracaoService):
+    """
+    Versão assíncrona do InteracaoService (usada com MONGODB_ASYNC=true).
+    """
+    assincrono = True
+
+
+def _validar_interacao(vem_hash, pergunta_id, totem_id, resposta):
+    if not vem_hash or not pergunta_id or not totem_id:
+        raise ValueError("vem_hash, pergunta_id e totem_id são obrigatórios")
+    if resposta not in ["sim", "nao"]:
+        raise ValueError("Resposta inválida, deve ser 'sim' ou 'nao'")
+    return Interacao(vem_hash, pergunta_id, totem_id, resposta)
+
+
+def _resumo_voto(interacao, pontos):
+    return {
+        "mensagem": "Voto registrado com sucesso!",
+        "interacao": interacao.to_dict(),
+        "pontos_ganhos": config.PONTOS_POR_VOTO if pontos["concedido"] else 0,
+        "pontuacao_atual": pontos["pontuacao"],
+        "primeiro_voto_na_pergunta": pontos["concedido"]
+    }
+
+
+def _preparar_lote(itens):
+    """
+    Valida os itens do lote e monta as interações a gravar.
+    Votos repetidos no mesmo lote (mesmo usuário, pergunta e totem) ficam com o último,
+    igual ao que aconteceria reenviando um a um.
+    """
+    if len(itens) > config.INTERACOES_LOTE_MAXIMO:
+        raise ValueError(f"O lote deve ter no máximo {config.INTERACOES_LOTE_MAXIMO} interações")
+
+    resultados = [None] * len(itens)
+    por_chave = {}
+
+    for indice, item in enumerate(itens):
+        try:
+            interacao = _validar_interacao(item.vem_hash, item.pergunta_id, item.totem_id, item.resposta)
+        except ValueError as e:
+            resultados[indice] = {"indice": indice, "status": "erro", "erro": str(e)}
+            continue
+
+        chave = (interacao.vem_hash, interacao.pergunta_id, interacao.totem_id)
+        if chave in por_chave:
+            anterior = por_chave[chave][0]
+            resultados[anterior] = {"indice": anterior, "status": "substituida"}
+        por_chave[chave] = (indice, interacao)
+
+    posicoes = [indice for indice, _ in por_chave.values()]
+    interacoes = [interacao for _, interacao in por_chave.values()]
+    return interacoes, posicoes, resultados
+
+
+def _resumo_lote(resultados, posicoes, status):
+    for indice, item_status in zip(posicoes, status):
+        resultados[indice] = {"indice": indice, **item_status}
+
+    contagem = {}
+    for item in resultados:
+        contagem[item["status"]] = contagem.get(item["status"], 0) + 1
+
+    return {
+        "total": len(resultados),
+        "inseridas": contagem.get("inserida", 0),
+        "atualizadas": contagem.get("atualizada", 0),
+        "substituidas": contagem.get("substituida", 0),
+        "erros": contagem.get("erro", 0),
+        "resultados": resultados
+    }
+
+
+def _validar_exportacao(formato, inicio, fim):
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato inválido, use um de: {', '.join(FORMATOS)}")
+    if inicio and fim and inicio >= fim:
+        raise ValueError("'inicio' deve ser anterior a 'fim'")
+
+
+def _validar_serie(granularidade, inicio, fim):
+    if granularidade not in COLECOES:
+        raise ValueError(f"Granularidade inválida, use uma de: {', '.join(COLECOES)}")
+    if inicio and fim and inicio >= fim:
+        raise ValueError("'inicio' deve ser anterior a 'fim'")
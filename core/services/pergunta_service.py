@@ -1,25 +1,36 @@
-from core.repositories.pergunta_repo import PerguntaRepository
+from core.execucao import operacao
+from core.repositories.pergunta_repo import PerguntaRepository, PerguntaRepositoryAsync
 from models.pergunta import Pergunta
 
 class PerguntaService:
+    assincrono = False
+
     def __init__(self):
-        self.repo = PerguntaRepository()
+        self.repo = PerguntaRepositoryAsync() if self.assincrono else PerguntaRepository()
 
+    @operacao
     def criar_pergunta(self, texto):
         pergunta = Pergunta(texto)
-        self.repo.save(pergunta)
+        yield self.repo.save(pergunta)
         return pergunta.to_dict()
 
-    def listar_perguntas(self):
-        return self.repo.get_all()
+    @operacao
+    def listar_perguntas(self, limite=None, cursor=None, campos=None):
+        return (yield self.repo.listar(limite, cursor, campos))
 
+    @operacao
     def buscar_ultima_pergunta(self):
-        return self.repo.get_last()
+        return (yield self.repo.get_last())
     
+    @operacao
     def buscar_pergunta(self, pergunta_id):
-        return self.repo.get_by_id(pergunta_id)
+        return (yield self.repo.get_by_id(pergunta_id))
 
+    @operacao
     def excluir_pergunta(self, pergunta_id):
-        self.repo.delete(pergunta_id)
+        yield self.repo.delete(pergunta_id)
         return {"mensagem": "Pergunta removida com sucesso"}
-    
+
+
+class PerguntaServiceAsync(PerguntaService):
+    assincrono = True
@@ -0,0 +1,347 @@
+import logging
+
+from starlette.concurrency import run_in_threadpool
+
+from core import config
+from core.execucao import bloqueante, operacao
+from core.distancias import Coordenadas
+from core.repositories.proximidade_repo import ProximidadeRepository, ProximidadeRepositoryAsync
+from core.repositories.servico_repo import ServicoRepository, ServicoRepositoryAsync
+from core.repositories.totem_repo import TotemRepository, TotemRepositoryAsync
+from models.servico import CAMPOS_RESPOSTA
+
+logger = logging.getLogger(__name__)
+
+# Mantém a tabela materializada totem -> serviços próximos (core.repositories.proximidade_repo).
+# Só os pares afetados são recalculados: um serviço criado/alterado/reativado recalcula as
+# distâncias dele até todos os totens; um totem criado recalcula os serviços no raio dele
+# ($geoNear); exclusões e desativações só removem os pares. PROXIMIDADE_RAIO_MAXIMO_KM = 0
+# desativa a tabela (a busca volta a ser feita na hora).
+
+
+class ProximidadeService:
+    assincrono = False
+
+    def __init__(self):
+        if self.assincrono:
+            self.repo = ProximidadeRepositoryAsync()
+            self.servico_repo = ServicoRepositoryAsync()
+            self.totem_repo = TotemRepositoryAsync()
+        else:
+            self.repo = ProximidadeRepository()
+            self.servico_repo = ServicoRepository()
+            self.totem_repo = TotemRepository()
+
+    @property
+    def ativo(self) -> bool:
+        return config.PROXIMIDADE_RAIO_MAXIMO_KM > 0
+
+    @operacao
+    def buscar(self, totem_id, raio_km, tipo=None, limite=None):
+        """
+        Serviços próximos do totem lidos da tabela, ou None quando a tabela não cobre o
+        raio pedido (desativada ou raio maior que o máximo materializado).
+        """
+        if not self.cobre(raio_km):
+            return None
+        return (yield self.repo.get_proximos(totem_id, raio_km, tipo, limite))
+
+    def cobre(self, raio_km) -> bool:
+        """
+        Se a tabela materializada responde buscas com este raio.
+        """
+        return self.ativo and raio_km <= config.PROXIMIDADE_RAIO_MAXIMO_KM
+
+    def proximos_por_totem(self, totem_ids=None, raio_km=5.0, tipo=None, limite=None):
+        """
+        Gera, totem a totem (ordem de totem_id), os serviços ativos a até `raio_km` de cada
+        um dos `totem_ids` (ou de todos os totens). Com a tabela cobrindo o raio, é um único
+        cursor ordenado por (totem_id, distancia_km); senão, uma matriz de distâncias
+        totens x serviços ativos calculada em blocos.
+        Na versão assíncrona retorna um gerador assíncrono (percorrido com `async for`).
+        """
+        totem_ids = _sem_repetidos(totem_ids)
+        if self.assincrono:
+            return self._proximos_por_totem_async(totem_ids, raio_km, tipo, limite)
+        return self._proximos_por_totem(totem_ids, raio_km, tipo, limite)
+
+    def _proximos_por_totem(self, totem_ids, raio_km, tipo, limite):
+        totens = _ordenar_totens(self.totem_repo.get_coordenadas(totem_ids))
+        yield from _totens_nao_encontrados(totem_ids, totens)
+        if self.cobre(raio_km):
+            agrupador = _AgrupadorPorTotem(totens, limite)
+            for par in self.repo.iterar_proximos(totem_ids, raio_km, tipo):
+                yield from agrupador.adicionar(par)
+            yield from agrupador.finalizar()
+        else:
+            servicos = _do_tipo(self.servico_repo.get_ativos(), tipo)
+            yield from _linhas_da_matriz(totens, servicos, raio_km, limite)
+
+    async def _proximos_por_totem_async(self, totem_ids, raio_km, tipo, limite):
+        totens = _ordenar_totens(await self.totem_repo.get_coordenadas(totem_ids))
+        for linha in _totens_nao_encontrados(totem_ids, totens):
+            yield linha
+        if self.cobre(raio_km):
+            agrupador = _AgrupadorPorTotem(totens, limite)
+            async for par in self.repo.iterar_proximos(totem_ids, raio_km, tipo):
+                for linha in agrupador.adicionar(par):
+                    yield linha
+            for linha in agrupador.finalizar():
+                yield linha
+        else:
+            servicos = _do_tipo(await self.servico_repo.get_ativos(), tipo)
+            # A matriz é CPU: cada totem é calculado no threadpool para não travar o event loop
+            linhas = _linhas_da_matriz(totens, servicos, raio_km, limite)
+            while (linha := await run_in_threadpool(next, linhas, None)) is not None:
+                yield linha
+
+    @operacao
+    def recalcular_servico(self, servico_id):
+        if not self.ativo:
+            return
+        servico = yield self.servico_repo.get_by_id(servico_id)
+        if not servico or not servico.get("ativo", True):
+            yield self.repo.remover("servico_id", servico_id)
+            return
+        totens = yield self.totem_repo.get_coordenadas()
+        yield self.repo.substituir("servico_id", servico_id, _pares_do_servico(servico, totens))
+
+    @operacao
+    def recalcular_servicos(self, servicos):
+        """
+        Recalcula os pares de vários serviços (documentos já gravados) com uma leitura dos
+        totens e uma matriz de distâncias; usado na importação em lote.
+        """
+        if not self.ativo or not servicos:
+            return
+        totens = yield self.totem_repo.get_coordenadas()
+        ids = [servico["servico_id"] for servico in servicos]
+        yield self.repo.substituir_varios("servico_id", ids, _pares_dos_servicos(servicos, totens))
+
+    @operacao
+    def remover_servico(self, servico_id):
+        if self.ativo:
+            yield self.repo.remover("servico_id", servico_id)
+
+    @operacao
+    def remover_servicos(self, servico_ids):
+        """
+        Remove os pares de vários serviços (desativados na importação).
+        """
+        if self.ativo and servico_ids:
+            yield self.repo.substituir_varios("servico_id", servico_ids, [])
+
+    @operacao
+    def recalcular_totem(self, totem_id):
+        if not self.ativo:
+            return
+        totem = yield self.totem_repo.get_by_id(totem_id)
+        if not totem:
+            yield self.repo.remover("totem_id", totem_id)
+            return
+        servicos = yield self.servico_repo.get_por_localizacao(
+            totem["latitude"], totem["longitude"], config.PROXIMIDADE_RAIO_MAXIMO_KM
+        )
+        yield self.repo.substituir("totem_id", totem_id, _pares_do_totem(totem, servicos))
+
+    @operacao
+    def remover_totem(self, totem_id):
+        if self.ativo:
+            yield self.repo.remover("totem_id", totem_id)
+
+    @operacao
+    def reconstruir(self):
+        """
+        Recria a tabela inteira: uma passada vetorizada sobre os serviços ativos por totem,
+        gravada à parte e trocada pela tabela em uso no fim. O raio registrado é apagado
+        antes, então uma queda no meio faz a próxima inicialização reconstruir de novo.
+        Alterações incrementais feitas durante a reconstrução se perdem na troca (rode-a
+        na inicialização ou com pouca escrita).
+        """
+        if not self.ativo:
+            return {"ativo": False}
+        yield self.repo.limpar_raio_construido()
+        servicos = yield self.servico_repo.get_ativos()
+        totens = yield self.totem_repo.get_coordenadas()
+        pares = yield bloqueante(self, _todos_os_pares, servicos, totens)
+        yield self.repo.reconstruir(pares)
+        yield self.repo.set_raio_construido(config.PROXIMIDADE_RAIO_MAXIMO_KM)
+        return _resumo_reconstrucao(servicos, totens, pares)
+
+    @operacao
+    def garantir_tabela(self):
+        """
+        Reconstrói a tabela se ela nunca foi montada ou foi montada com outro raio máximo
+        (chamado na inicialização da API).
+        """
+        if self.ativo and (yield self.repo.get_raio_construido()) != config.PROXIMIDADE_RAIO_MAXIMO_KM:
+            resumo = yield self.reconstruir()
+            logger.info("Tabela de proximidade totem -> serviços reconstruída: %s", resumo)
+
+
+class ProximidadeServiceAsync(ProximidadeService):
+    assincrono = True
+
+
+# Elementos por bloco da matriz totens x serviços (~8 MB em float64 por bloco)
+_ELEMENTOS_POR_BLOCO = 1_000_000
+
+
+class _AgrupadorPorTotem:
+    """
+    Junta os pares do cursor (ordenados por totem_id) com a lista ordenada de totens,
+    emitindo uma linha por totem, inclusive os sem serviços no raio.
+    """
+
+    def __init__(self, totens, limite=None):
+        self.totens = totens
+        self.limite = limite
+        self.posicao = 0
+        self.servicos = []
+
+    def adicionar(self, par):
+        totem_id = par.pop("totem_id")
+        while self.posicao < len(self.totens) and self.totens[self.posicao]["totem_id"] < totem_id:
+            yield self._fechar()
+        atual = self.totens[self.posicao] if self.posicao < len(self.totens) else None
+        if atual and atual["totem_id"] == totem_id and not (self.limite and len(self.servicos) >= self.limite):
+            self.servicos.append(par)
+
+    def finalizar(self):
+        while self.posicao < len(self.totens):
+            yield self._fechar()
+
+    def _fechar(self):
+        linha = _linha_totem(self.totens[self.posicao], self.servicos)
+        self.posicao += 1
+        self.servicos = []
+        return linha
+
+
+def _linhas_da_matriz(totens, servicos, raio_km, limite=None):
+    """
+    Linhas por totem calculadas a partir dos serviços: uma matriz de distâncias por bloco
+    de totens (uma passada vetorizada sobre os serviços a cada bloco).
+    """
+    if not servicos:
+        for totem in totens:
+            yield _linha_totem(totem, [])
+        return
+    coordenadas = Coordenadas([s["latitude"] for s in servicos], [s["longitude"] for s in servicos])
+    tamanho_bloco = max(1, _ELEMENTOS_POR_BLOCO // len(servicos))
+    for inicio in range(0, len(totens), tamanho_bloco):
+        bloco = totens[inicio:inicio + tamanho_bloco]
+        matriz = coordenadas.matriz_km(Coordenadas([t["latitude"] for t in bloco], [t["longitude"] for t in bloco]))
+        for linha, totem in enumerate(bloco):
+            proximos = coordenadas.selecionar_no_raio(matriz[linha], totem["latitude"], totem["longitude"], raio_km)
+            if limite:
+                proximos = proximos[:limite]
+            yield _linha_totem(totem, [_resposta(servicos[indice], distancia) for distancia, indice in proximos])
+
+
+def _linha_totem(totem, servicos):
+    por_tipo = {}
+    for servico in servicos:
+        por_tipo[servico.get("tipo")] = por_tipo.get(servico.get("tipo"), 0) + 1
+    return {
+        "totem_id": totem["totem_id"],
+        "latitude": totem["latitude"],
+        "longitude": totem["longitude"],
+        "total": len(servicos),
+        "por_tipo": por_tipo,
+        "servicos": servicos,
+    }
+
+
+def _totens_nao_encontrados(totem_ids, totens):
+    if totem_ids is None:
+        return
+    encontrados = {totem["totem_id"] for totem in totens}
+    for totem_id in totem_ids:
+        if totem_id not in encontrados:
+            yield {"totem_id": totem_id, "erro": "Totem não encontrado"}
+
+
+def _sem_repetidos(totem_ids):
+    return None if totem_ids is None else list(dict.fromkeys(totem_ids))
+
+
+def _ordenar_totens(totens):
+    # Mesma ordem do cursor da tabela (totem_id crescente) para o agrupamento
+    return sorted(totens, key=lambda totem: totem["totem_id"])
+
+
+def _do_tipo(servicos, tipo):
+    return [servico for servico in servicos if servico.get("tipo") == tipo] if tipo else servicos
+
+
+def _resposta(servico, distancia):
+    resposta = {campo: servico.get(campo) for campo in CAMPOS_RESPOSTA}
+    resposta["distancia_km"] = distancia
+    return resposta
+
+
+def _par(totem_id, servico, distancia):
+    par = _resposta(servico, distancia)
+    par["totem_id"] = totem_id
+    return par
+
+
+def _pares_do_servico(servico, totens):
+    """
+    Pares do serviço com cada totem a até o raio máximo (distâncias de uma vez, em NumPy).
+    """
+    if not totens:
+        return []
+    coordenadas = Coordenadas([t["latitude"] for t in totens], [t["longitude"] for t in totens])
+    pares = coordenadas.no_raio(servico["latitude"], servico["longitude"], config.PROXIMIDADE_RAIO_MAXIMO_KM)
+    return [_par(totens[indice]["totem_id"], servico, distancia) for distancia, indice in pares]
+
+
+def _pares_dos_servicos(servicos, totens):
+    """
+    Pares de vários serviços com os totens: uma matriz (serviços x totens) de distâncias.
+    Inativos não geram pares.
+    """
+    servicos = [servico for servico in servicos if servico.get("ativo", True)]
+    if not servicos or not totens:
+        return []
+    coordenadas = Coordenadas([t["latitude"] for t in totens], [t["longitude"] for t in totens])
+    origens = Coordenadas([s["latitude"] for s in servicos], [s["longitude"] for s in servicos])
+    matriz = coordenadas.matriz_km(origens)
+    pares = []
+    for linha, servico in enumerate(servicos):
+        proximos = coordenadas.selecionar_no_raio(
+            matriz[linha], servico["latitude"], servico["longitude"], config.PROXIMIDADE_RAIO_MAXIMO_KM
+        )
+        pares.extend(_par(totens[indice]["totem_id"], servico, distancia) for distancia, indice in proximos)
+    return pares
+
+
+def _pares_do_totem(totem, servicos):
+    if not servicos:
+        return []
+    coordenadas = Coordenadas([s["latitude"] for s in servicos], [s["longitude"] for s in servicos])
+    pares = coordenadas.no_raio(totem["latitude"], totem["longitude"], config.PROXIMIDADE_RAIO_MAXIMO_KM)
+    return [_par(totem["totem_id"], servicos[indice], distancia) for distancia, indice in pares]
+
+
+def _todos_os_pares(servicos, totens):
+    if not servicos:
+        return []
+    coordenadas = Coordenadas([s["latitude"] for s in servicos], [s["longitude"] for s in servicos])
+    pares = []
+    for totem in totens:
+        for distancia, indice in coordenadas.no_raio(totem["latitude"], totem["longitude"], config.PROXIMIDADE_RAIO_MAXIMO_KM):
+            pares.append(_par(totem["totem_id"], servicos[indice], distancia))
+    return pares
+
+
+def _resumo_reconstrucao(servicos, totens, pares):
+    return {
+        "ativo": True,
+        "raio_maximo_km": config.PROXIMIDADE_RAIO_MAXIMO_KM,
+        "totens": len(totens),
+        "servicos_ativos": len(servicos),
+        "pares": len(pares),
+    }
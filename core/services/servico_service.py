@@ -1,149 +1,246 @@
-from core.repositories.servico_repo import ServicoRepository
+from core import config
+from core.execucao import bloqueante, operacao
+from core.repositories.servico_repo import ServicoRepository, ServicoRepositoryAsync
+from core.exportacao import exportar, exportar_async
+from core.importacao import em_lotes, ler_linhas, mensagem_validacao, validar_linha
+from core.indice_espacial import obter_indice_servicos
+from core.distancias import Coordenadas
+from core.services.proximidade_service import ProximidadeService, ProximidadeServiceAsync
+from core.texto import termos_da_consulta
+from core.horarios import minuto_da_semana
+from datetime import datetime
 from models.servico import Servico, ServicoCreate, ServicoResposta
-from typing import List, Dict, Optional
+from pydantic import ValidationError
+from typing import List, Dict, Optional, Union
 
 class ServicoService:
+    assincrono = False
+
     def __init__(self):
-        self.repo = ServicoRepository()
+        if self.assincrono:
+            self.repo = ServicoRepositoryAsync()
+            self.proximidade = ProximidadeServiceAsync()
+        else:
+            self.repo = ServicoRepository()
+            self.proximidade = ProximidadeService()
 
+    @operacao
     def criar_servico(self, dados: ServicoCreate) -> dict:
         """
         Cria um novo serviço público
         """
-        # Gera ID único baseado no nome e coordenadas
-        servico_id = Servico.gerar_id(
-            nome=dados.nome,
-            latitude=dados.latitude,
-            longitude=dados.longitude
-        )
-        
-        # Cria o objeto Servico
-        servico = Servico(
-            servico_id=servico_id,
-            nome=dados.nome,
-            tipo=dados.tipo,
-            latitude=dados.latitude,
-            longitude=dados.longitude,
-            endereco=dados.endereco,
-            telefone=dados.telefone,
-            horario_funcionamento=dados.horario_funcionamento,
-            descricao=dados.descricao
-        )
+        # ID único baseado no nome e coordenadas
+        servico = _novo_servico(dados)
         
         # Salva no banco
-        self.repo.save(servico)
+        yield self.repo.save(servico)
+        yield self.proximidade.recalcular_servico(servico.servico_id)
         
         return servico.model_dump(mode='json')
 
-    def listar_servicos(self, apenas_ativos: bool = True) -> List[dict]:
+    def importar_em_lotes(self, arquivo, nome_arquivo: str, vistos: Optional[set] = None):
+        """
+        Gera o resumo de cada lote importado (linhas, inseridos, atualizados, inalterados,
+        erros). Parar de consumir o gerador interrompe a importação entre dois lotes.
+        Os servico_id das linhas válidas são acrescentados a `vistos`, se informado.
+        Só na versão síncrona (usado pelas importações, fora do event loop).
+        """
+        for lote in em_lotes(ler_linhas(arquivo, nome_arquivo), config.IMPORTACAO_TAMANHO_LOTE):
+            yield self._importar_lote(lote, vistos)
+
+    @operacao
+    def _importar_lote(self, lote, vistos: Optional[set] = None):
+        resumo = _novo_resumo_importacao()
+        servicos, numeros = yield bloqueante(self, _preparar_lote_importacao, lote, resumo, vistos)
+        status = yield self.repo.save_many(servicos)
+        yield self.proximidade.recalcular_servicos(_registrar_lote_importacao(resumo, servicos, numeros, status))
+        return resumo
+
+    @operacao
+    def desativar_ausentes(self, vistos: set) -> int:
         """
-        Lista todos os serviços (ou apenas ativos)
+        Desativa os serviços ativos fora de `vistos` e retorna quantos foram desativados.
+        Um arquivo sem nenhuma linha válida não desativa nada.
         """
-        if apenas_ativos:
-            return self.repo.get_ativos()
-        return self.repo.get_all()
+        if not vistos:
+            return 0
+        ausentes = yield self.repo.desativar_ausentes(vistos)
+        yield self.proximidade.remover_servicos(ausentes)
+        return len(ausentes)
 
+    @operacao
+    def listar_servicos(
+        self,
+        apenas_ativos: bool = True,
+        limite: Optional[int] = None,
+        cursor: Optional[str] = None,
+        campos: Optional[str] = None,
+        aberto_agora: bool = False,
+        aberto_em: Optional[datetime] = None
+    ) -> Union[List[dict], dict]:
+        """
+        Lista todos os serviços (ou apenas ativos).
+        Com `limite`/`cursor`, retorna uma página (paginação por keyset).
+        Com `aberto_agora`/`aberto_em`, só os serviços abertos no momento.
+        """
+        return (yield self.repo.listar(apenas_ativos, limite, cursor, campos, _minuto_aberto(aberto_agora, aberto_em)))
+
+    @operacao
     def buscar_servico(self, servico_id: str) -> Optional[dict]:
         """
         Busca um serviço específico por ID
         """
-        return self.repo.get_by_id(servico_id)
+        return (yield self.repo.get_by_id(servico_id))
 
+    @operacao
     def buscar_por_tipo(self, tipo: str) -> List[dict]:
         """
         Busca serviços por tipo
         """
-        return self.repo.get_by_tipo(tipo)
+        return (yield self.repo.get_by_tipo(tipo))
 
+    @operacao
     def buscar_proximos_ao_totem(
         self, 
         totem_latitude: float, 
         totem_longitude: float, 
-        raio_km: float = 5.0
+        raio_km: float = 5.0,
+        tipo: Optional[str] = None,
+        limite: Optional[int] = None,
+        aberto_agora: bool = False,
+        aberto_em: Optional[datetime] = None
     ) -> List[ServicoResposta]:
         """
         Busca serviços próximos a um totem dentro de um raio em km.
         Retorna lista ordenada por distância (mais próximo primeiro).
         """
-        # Busca todos os serviços ativos
-        servicos = self.repo.get_ativos()
-        
-        # Lista para armazenar serviços com distância calculada
-        servicos_com_distancia = []
-        
-        for servico_dict in servicos:
-            # Converte dict para objeto Servico para usar o método calcular_distancia
-            servico = Servico(**servico_dict)
-            
-            # Calcula distância do totem até o serviço
-            distancia = servico.calcular_distancia(totem_latitude, totem_longitude)
-            
-            # Se estiver dentro do raio, adiciona na lista
-            if distancia <= raio_km:
-                servicos_com_distancia.append({
-                    "servico": servico,
-                    "distancia_km": distancia
-                })
-        
-        # Ordena por distância (mais próximo primeiro)
-        servicos_com_distancia.sort(key=lambda x: x["distancia_km"])
-        
-        # Converte para ServicoResposta
-        resultado = []
-        for item in servicos_com_distancia:
-            servico = item["servico"]
-            resposta = ServicoResposta(
-                servico_id=servico.servico_id,
-                nome=servico.nome,
-                tipo=servico.tipo,
-                latitude=servico.latitude,
-                longitude=servico.longitude,
-                endereco=servico.endereco,
-                telefone=servico.telefone,
-                horario_funcionamento=servico.horario_funcionamento,
-                descricao=servico.descricao,
-                ativo=servico.ativo,
-                distancia_km=item["distancia_km"]
-            )
-            resultado.append(resposta)
-        
-        return resultado
+        minuto = _minuto_aberto(aberto_agora, aberto_em)
+        # Índice espacial em memória quando ativo; senão $geoNear no índice 2dsphere
+        indice = obter_indice_servicos()
+        if indice:
+            return _respostas(indice.no_raio(totem_latitude, totem_longitude, raio_km, tipo, limite, minuto))
+        servicos = yield self.repo.get_por_localizacao(totem_latitude, totem_longitude, raio_km, tipo, limite, minuto)
+        return _filtrar_por_distancia(servicos, totem_latitude, totem_longitude, raio_km)
+
+    def exportar_proximos_totens(
+        self,
+        totem_ids: Optional[List[str]] = None,
+        raio_km: float = 5.0,
+        tipo: Optional[str] = None,
+        limite: Optional[int] = None,
+        comprimir: bool = False
+    ):
+        """
+        Serviços próximos de vários totens (ou de todos) numa única passada, em NDJSON:
+        uma linha por totem, enviada assim que calculada.
+        """
+        linhas = self.proximidade.proximos_por_totem(totem_ids, raio_km, tipo, limite)
+        gerador = exportar_async if self.assincrono else exportar
+        return gerador(linhas, "ndjson", [], comprimir, tamanho_lote=1)
+
+    @operacao
+    def buscar_mais_proximos(
+        self,
+        latitude: float,
+        longitude: float,
+        k: int = 5,
+        tipo: Optional[str] = None,
+        aberto_agora: bool = False,
+        aberto_em: Optional[datetime] = None
+    ) -> List[ServicoResposta]:
+        """
+        Os k serviços ativos mais próximos da coordenada, a qualquer distância.
+        Só os candidatos do índice (em memória ou 2dsphere) têm a distância calculada.
+        """
+        minuto = _minuto_aberto(aberto_agora, aberto_em)
+        indice = obter_indice_servicos()
+        if indice:
+            return _respostas(indice.mais_proximos(latitude, longitude, k, tipo, minuto))
+        servicos = yield self.repo.get_mais_proximos(latitude, longitude, k, tipo, minuto)
+        return _ordenar_por_distancia(servicos, latitude, longitude)
+
+    @operacao
+    def buscar_por_texto(
+        self,
+        consulta: str,
+        tipo: Optional[str] = None,
+        limite: int = 20,
+        latitude: Optional[float] = None,
+        longitude: Optional[float] = None,
+        raio_km: float = 5.0
+    ) -> List[ServicoResposta]:
+        """
+        Busca por prefixo, sem acentos e sem diferenciar maiúsculas, em nome, endereço e
+        descrição: cada palavra da consulta precisa começar alguma palavra do serviço.
+        Com latitude/longitude, só serviços no raio, do mais próximo ao mais distante.
+        """
+        termos = termos_da_consulta(consulta)
+        if _sem_coordenadas(latitude, longitude):
+            return [ServicoResposta(**servico) for servico in (yield self.repo.buscar_por_termos(termos, tipo, limite))]
+        servicos = yield self.repo.buscar_por_termos(termos, tipo, limite, latitude, longitude, raio_km)
+        return _filtrar_por_distancia(servicos, latitude, longitude, raio_km)
 
-    def buscar_proximos_por_totem_id(self, totem_id: str, raio_km: float = 5.0) -> List[ServicoResposta]:
+    @operacao
+    def buscar_proximos_por_totem_id(
+        self,
+        totem_id: str,
+        raio_km: float = 5.0,
+        tipo: Optional[str] = None,
+        limite: Optional[int] = None,
+        aberto_agora: bool = False,
+        aberto_em: Optional[datetime] = None
+    ) -> List[ServicoResposta]:
         """
         Busca serviços próximos a um totem usando o ID do totem.
-        Busca as coordenadas do totem e depois os serviços próximos.
+        Lê da tabela materializada totem -> serviços quando o raio cabe nela;
+        senão busca as coordenadas do totem e depois os serviços próximos.
+        O filtro de aberto não existe na tabela: com ele, a busca é feita na hora.
         """
-        from core.repositories.totem_repo import TotemRepository
+        from core.repositories.totem_repo import TotemRepository, TotemRepositoryAsync
         
-        totem_repo = TotemRepository()
-        totem = totem_repo.get_by_totem_id(totem_id)
+        filtra_aberto = _minuto_aberto(aberto_agora, aberto_em) is not None
+        pares = None if filtra_aberto else (yield self.proximidade.buscar(totem_id, raio_km, tipo, limite))
+        if pares:
+            return [ServicoResposta(**par) for par in pares]
+
+        # Sem pares: totem inexistente, sem serviços no raio ou tabela desativada
+        totem_repo = TotemRepositoryAsync() if self.assincrono else TotemRepository()
+        totem = yield totem_repo.get_by_id(totem_id)
         
         if not totem:
             raise ValueError(f"Totem {totem_id} não encontrado")
+        if pares is not None:
+            return []
         
-        return self.buscar_proximos_ao_totem(
+        return (yield self.buscar_proximos_ao_totem(
             totem_latitude=totem["latitude"],
             totem_longitude=totem["longitude"],
-            raio_km=raio_km
-        )
+            raio_km=raio_km,
+            tipo=tipo,
+            limite=limite,
+            aberto_agora=aberto_agora,
+            aberto_em=aberto_em
+        ))
 
+    @operacao
     def atualizar_servico(self, servico_id: str, campos: dict) -> dict:
         """
         Atualiza campos específicos de um serviço
         """
-        if not self.repo.exists(servico_id):
+        if not (yield self.repo.exists(servico_id)):
             raise ValueError("Serviço não encontrado")
         
         # Remove campos que não devem ser atualizados
         campos_proibidos = ["servico_id", "data_criacao"]
         for campo in campos_proibidos:
             campos.pop(campo, None)
+        _validar_coordenadas(campos)
         
-        sucesso = self.repo.update_partial(servico_id, campos)
+        sucesso = yield self.repo.update_partial(servico_id, campos)
         
         if not sucesso:
             raise ValueError("Falha ao atualizar serviço")
+        yield self.proximidade.recalcular_servico(servico_id)
         
         return {
             "mensagem": "Serviço atualizado com sucesso",
@@ -151,47 +248,52 @@ class ServicoService:
             "campos_atualizados": list(campos.keys())
         }
 
+    @operacao
     def excluir_servico(self, servico_id: str, soft_delete: bool = True) -> dict:
         """
         Exclui um serviço (soft delete por padrão)
         """
-        if not self.repo.exists(servico_id):
+        if not (yield self.repo.exists(servico_id)):
             raise ValueError("Serviço não encontrado")
         
         if soft_delete:
-            self.repo.desativar(servico_id)
+            yield self.repo.desativar(servico_id)
             mensagem = "Serviço desativado com sucesso"
         else:
-            self.repo.delete(servico_id)
+            yield self.repo.delete(servico_id)
             mensagem = "Serviço removido permanentemente"
+        yield self.proximidade.remover_servico(servico_id)
         
         return {
             "mensagem": mensagem,
             "servico_id": servico_id
         }
 
+    @operacao
     def reativar_servico(self, servico_id: str) -> dict:
         """
         Reativa um serviço desativado
         """
-        if not self.repo.exists(servico_id):
+        if not (yield self.repo.exists(servico_id)):
             raise ValueError("Serviço não encontrado")
         
-        self.repo.ativar(servico_id)
+        yield self.repo.ativar(servico_id)
+        yield self.proximidade.recalcular_servico(servico_id)
         
         return {
             "mensagem": "Serviço reativado com sucesso",
             "servico_id": servico_id
         }
 
+    @operacao
     def obter_estatisticas(self) -> dict:
         """
         Retorna estatísticas sobre os serviços cadastrados
         """
-        total = self.repo.count_total()
-        ativos = self.repo.count_ativos()
+        total = yield self.repo.count_total()
+        ativos = yield self.repo.count_ativos()
         inativos = total - ativos
-        por_tipo = self.repo.count_por_tipo()
+        por_tipo = yield self.repo.count_por_tipo()
         
         return {
             "total_servicos": total,
@@ -201,15 +303,171 @@ class ServicoService:
             "servicos_por_tipo": por_tipo
         }
 
+    @operacao
     def listar_tipos_disponiveis(self) -> List[str]:
         """
         Retorna lista de tipos de serviços cadastrados
         """
-        por_tipo = self.repo.count_por_tipo()
+        por_tipo = yield self.repo.count_por_tipo()
         return list(por_tipo.keys())
 
+    @operacao
     def existe_servico(self, servico_id: str) -> bool:
         """
         Verifica se um serviço existe
         """
-        return self.repo.exists(servico_id)
\ No newline at end of file
+        return (yield self.repo.exists(servico_id))
+
+    @operacao
+    def reconstruir_proximidade(self) -> dict:
+        """
+        Recria a tabela materializada totem -> serviços próximos.
+        """
+        return (yield self.proximidade.reconstruir())
+
+class ServicoServiceAsync(ServicoService):
+    """
+    Versão assíncrona do ServicoService (usada com MONGODB_ASYNC=true).
+    """
+    assincrono = True
+
+
+def _filtrar_por_distancia(
+    servicos: List[dict],
+    latitude: float,
+    longitude: float,
+    raio_km: float
+) -> List[ServicoResposta]:
+    """
+    Calcula a distância (Haversine, 2 casas) dos serviços vindos do $geoNear numa
+    passada vetorizada e descarta os que passam do raio após o arredondamento.
+    Compartilhado entre as versões síncrona e assíncrona do service.
+    """
+    coordenadas = Coordenadas(
+        [servico["latitude"] for servico in servicos],
+        [servico["longitude"] for servico in servicos]
+    )
+    # Mesma ordem de antes (distância arredondada); o $geoNear já entrega quase ordenado
+    pares = coordenadas.no_raio(latitude, longitude, raio_km)
+    return _respostas((distancia, servicos[indice]) for distancia, indice in pares)
+
+
+def _ordenar_por_distancia(servicos: List[dict], latitude: float, longitude: float) -> List[ServicoResposta]:
+    """
+    Distâncias (Haversine, 2 casas) dos k serviços vindos do $geoNear, do mais próximo
+    ao mais distante.
+    """
+    if not servicos:
+        return []
+    coordenadas = Coordenadas(
+        [servico["latitude"] for servico in servicos],
+        [servico["longitude"] for servico in servicos]
+    )
+    distancias = coordenadas.arredondar(
+        coordenadas.distancias_km(latitude, longitude), range(len(servicos)), latitude, longitude
+    )
+    return _respostas(sorted(zip(distancias, servicos), key=lambda par: par[0]))
+
+
+def _respostas(itens) -> List[ServicoResposta]:
+    """
+    Converte pares (distancia_km, servico) em ServicoResposta.
+    """
+    return [ServicoResposta(**servico, distancia_km=distancia) for distancia, servico in itens]
+
+
+def _minuto_aberto(aberto_agora: bool, aberto_em: Optional[datetime]) -> Optional[int]:
+    """
+    Minuto da semana do filtro de aberto (None sem filtro).
+    """
+    if aberto_agora and aberto_em is not None:
+        raise ValueError("Use aberto_agora ou aberto_em, não os dois")
+    if aberto_em is not None:
+        return minuto_da_semana(aberto_em)
+    return minuto_da_semana() if aberto_agora else None
+
+
+def _sem_coordenadas(latitude: Optional[float], longitude: Optional[float]) -> bool:
+    """
+    True sem filtro de proximidade; latitude e longitude vêm juntas ou não vêm.
+    """
+    if (latitude is None) != (longitude is None):
+        raise ValueError("Informe latitude e longitude juntas para filtrar por proximidade")
+    return latitude is None
+
+
+def _validar_coordenadas(campos: dict) -> None:
+    """
+    Garante latitude/longitude numéricas e dentro dos limites antes de gravar
+    (o ponto GeoJSON do índice 2dsphere é derivado delas).
+    """
+    for campo, limite in (("latitude", 90), ("longitude", 180)):
+        if campo not in campos:
+            continue
+        try:
+            campos[campo] = float(campos[campo])
+        except (TypeError, ValueError):
+            raise ValueError(f"{campo} inválida")
+        if not -limite <= campos[campo] <= limite:
+            raise ValueError(f"{campo} fora do intervalo [-{limite}, {limite}]")
+
+
+def _novo_servico(dados: ServicoCreate) -> Servico:
+    return Servico(
+        servico_id=Servico.gerar_id(nome=dados.nome, latitude=dados.latitude, longitude=dados.longitude),
+        nome=dados.nome,
+        tipo=dados.tipo,
+        latitude=dados.latitude,
+        longitude=dados.longitude,
+        endereco=dados.endereco,
+        telefone=dados.telefone,
+        horario_funcionamento=dados.horario_funcionamento,
+        descricao=dados.descricao
+    )
+
+
+def _novo_resumo_importacao() -> dict:
+    return {"total_linhas": 0, "inseridos": 0, "atualizados": 0, "inalterados": 0, "erros": []}
+
+
+def _preparar_lote_importacao(lote, resumo: dict, vistos: Optional[set] = None):
+    """
+    Valida as linhas do lote; as inválidas vão para os erros do resumo.
+    Retorna os serviços válidos e o número da linha de cada um.
+    """
+    servicos = []
+    numeros = []
+    for numero, linha in lote:
+        resumo["total_linhas"] += 1
+        try:
+            servicos.append(_novo_servico(validar_linha(linha)))
+            numeros.append(numero)
+        except ValidationError as e:
+            resumo["erros"].append(_erro_importacao(numero, linha.get("nome"), mensagem_validacao(e)))
+        except ValueError as e:
+            resumo["erros"].append(_erro_importacao(numero, linha.get("nome"), str(e)))
+    if vistos is not None:
+        vistos.update(servico.servico_id for servico in servicos)
+    return servicos, numeros
+
+
+def _registrar_lote_importacao(resumo: dict, servicos, numeros, status) -> List[dict]:
+    """
+    Contabiliza o resultado do bulk_write e retorna os documentos gravados
+    (os inalterados não são regravados nem recalculados).
+    """
+    gravados = []
+    for servico, numero, item in zip(servicos, numeros, status):
+        if item["status"] == "erro":
+            resumo["erros"].append(_erro_importacao(numero, servico.nome, item["erro"]))
+            continue
+        if item["status"] == "inalterado":
+            resumo["inalterados"] += 1
+            continue
+        resumo["inseridos" if item["status"] == "inserido" else "atualizados"] += 1
+        gravados.append(servico.model_dump(mode='json'))
+    return gravados
+
+
+def _erro_importacao(numero: int, nome, erro: str) -> dict:
+    return {"linha": numero, "nome": nome if nome not in (None, "") else "N/A", "erro": erro}
@@ -1,12 +1,19 @@
-from core.repositories.thanos_repo import ThanosRepository
+from core.execucao import operacao
+from core.repositories.thanos_repo import ThanosRepository, ThanosRepositoryAsync
 
 class ThanosService:
+    assincrono = False
+
     def __init__(self):
-        self.repo = ThanosRepository()
+        self.repo = ThanosRepositoryAsync() if self.assincrono else ThanosRepository()
 
+    @operacao
     def estalar_dedos(self):
         """
         Remove todos os dados do sistema, simbolizando o "estalo" do Thanos.
         """
-        self.repo.delete_all_data()
-        return {"mensagem": "Todos os dados foram removidos com sucesso"}
\ No newline at end of file
+        yield self.repo.delete_all_data()
+        return {"mensagem": "Todos os dados foram removidos com sucesso"}
+
+class ThanosServiceAsync(ThanosService):
+    assincrono = True
@@ -1,21 +1,78 @@
-from core.repositories.totem_repo import TotemRepository
+from datetime import datetime
+
+from core.execucao import operacao
+from core.repositories.totem_repo import TotemRepository, TotemRepositoryAsync
+from core.repositories.interacao_repo import InteracaoRepository, InteracaoRepositoryAsync
+from core.services.proximidade_service import ProximidadeService, ProximidadeServiceAsync
 from models.totem import Totem
 
 class TotemService:
+    assincrono = False
+
     def __init__(self):
-        self.repo = TotemRepository()
+        if self.assincrono:
+            self.repo = TotemRepositoryAsync()
+            self.interacao_repo = InteracaoRepositoryAsync()
+            self.proximidade = ProximidadeServiceAsync()
+        else:
+            self.repo = TotemRepository()
+            self.interacao_repo = InteracaoRepository()
+            self.proximidade = ProximidadeService()
 
+    @operacao
     def criar_totem(self, latitude, longitude):
         totem = Totem(latitude, longitude)
-        self.repo.save(totem)
+        yield self.repo.save(totem)
+        yield self.proximidade.recalcular_totem(totem.totem_id)
         return totem.to_dict()
 
-    def listar_totens(self):
-        return self.repo.get_all()
+    @operacao
+    def listar_totens(self, limite=None, cursor=None, campos=None):
+        return (yield self.repo.listar(limite, cursor, campos))
 
+    @operacao
     def buscar_totem(self, totem_id):
-        return self.repo.get_by_id(totem_id)
+        return (yield self.repo.get_by_id(totem_id))
 
+    @operacao
     def excluir_totem(self, totem_id):
-        self.repo.delete(totem_id)
+        yield self.repo.delete(totem_id)
+        yield self.proximidade.remover_totem(totem_id)
         return {"mensagem": "Totem removido com sucesso"}
+
+    @operacao
+    def obter_mapa_satisfacao(self, pergunta_id=None, desde=None):
+        """
+        Coordenadas de cada totem com as contagens de sim/nao por pergunta,
+        lidas dos contadores por totem. Com `desde`, só os totens alterados.
+        """
+        gerado_em = datetime.utcnow()
+        contagens = yield self.interacao_repo.contagens_por_totem(pergunta_id, desde)
+        totem_ids = {contagem["totem_id"] for contagem in contagens} if desde else None
+        totens = (yield self.repo.get_coordenadas(totem_ids)) if totem_ids != set() else []
+        return _montar_mapa(totens, contagens, gerado_em)
+
+
+class TotemServiceAsync(TotemService):
+    assincrono = True
+
+
+def _montar_mapa(totens, contagens, gerado_em):
+    """
+    Junta as coordenadas dos totens com os contadores por pergunta.
+    """
+    por_totem = {}
+    for contagem in contagens:
+        sim, nao = contagem.get("sim", 0), contagem.get("nao", 0)
+        por_totem.setdefault(contagem["totem_id"], {})[contagem["pergunta_id"]] = {
+            "sim": sim, "nao": nao, "total": sim + nao
+        }
+
+    itens = []
+    for totem in totens:
+        perguntas = por_totem.get(totem["totem_id"], {})
+        sim = sum(item["sim"] for item in perguntas.values())
+        nao = sum(item["nao"] for item in perguntas.values())
+        itens.append({**totem, "sim": sim, "nao": nao, "total": sim + nao, "perguntas": perguntas})
+
+    return {"gerado_em": gerado_em.isoformat(), "totens": itens}
@@ -1,50 +1,43 @@
-from core.repositories.usuario_repo import UsuarioRepository
+from core.execucao import operacao
+from core.repositories.usuario_repo import UsuarioRepository, UsuarioRepositoryAsync, FAIXAS_IDADE, estatisticas_cache
+from core.cache import CacheTTL
+from core import config
 from models.usuario import Usuario, UsuarioCadastro, UsuarioResposta
 from datetime import date, datetime
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Union
 
 class UsuarioService:
+    assincrono = False
+
     def __init__(self):
-        self.repo = UsuarioRepository()
+        self.repo = UsuarioRepositoryAsync() if self.assincrono else UsuarioRepository()
+        self.cache_estatisticas = CacheTTL(config.USUARIOS_ESTATISTICAS_CACHE_TTL_S)
 
+    @operacao
     def criar_usuario(self, vem_hash: str) -> dict:
         """
         Cria um novo usuário apenas com o hash (cadastro inicial via QR Code)
         """
         usuario = Usuario(vem_hash=vem_hash)
-        self.repo.save(usuario)
+        yield self.repo.save(usuario)
         return usuario.model_dump()
 
+    @operacao
     def verificar_usuario(self, vem_hash: str) -> UsuarioResposta:
         """
         Verifica se o usuário existe pelo hash do QR Code.
         Se não existir, cria um usuário temporário.
         Retorna dados do usuário indicando se precisa completar cadastro.
         """
-        usuario_dict = self.repo.get_by_vem_hash(vem_hash)
-        
-        if not usuario_dict:
-            # Cria usuário temporário apenas com hash
-            usuario = Usuario(vem_hash=vem_hash)
-            self.repo.save(usuario)
-            usuario_dict = usuario.model_dump()
-        
-        # Converte dict para objeto Usuario para usar métodos
-        usuario = Usuario(**usuario_dict)
-        
-        return UsuarioResposta(
-            vem_hash=usuario.vem_hash,
-            nome=usuario.nome,
-            pontuacao=usuario.pontuacao,
-            cadastro_completo=usuario.cadastro_completo,
-            idade=usuario.calcular_idade()
-        )
+        # Busca ou cria numa única ida ao banco (upsert com $setOnInsert)
+        return _montar_resposta((yield self.repo.get_or_create(vem_hash)))
 
+    @operacao
     def completar_cadastro(self, dados: UsuarioCadastro) -> UsuarioResposta:
         """
         Completa o cadastro do usuário com nome, email e data de nascimento
         """
-        usuario_dict = self.repo.get_by_vem_hash(dados.vem_hash)
+        usuario_dict = yield self.repo.get_by_vem_hash(dados.vem_hash)
         
         if not usuario_dict:
             raise ValueError("Usuário não encontrado. Escaneie o QR Code primeiro.")
@@ -63,7 +56,7 @@ class UsuarioService:
         )
         
         # Salva no repositório
-        self.repo.update(dados.vem_hash, usuario.model_dump(mode='json'))
+        yield self.repo.update(dados.vem_hash, usuario.model_dump(mode='json'))
         
         return UsuarioResposta(
             vem_hash=usuario.vem_hash,
@@ -73,23 +66,32 @@ class UsuarioService:
             idade=usuario.calcular_idade()
         )
 
-    def listar_usuarios(self) -> List[dict]:
+    @operacao
+    def listar_usuarios(
+        self,
+        limite: Optional[int] = None,
+        cursor: Optional[str] = None,
+        campos: Optional[str] = None
+    ) -> Union[List[dict], dict]:
         """
-        Lista todos os usuários do sistema
+        Lista todos os usuários do sistema.
+        Com `limite`/`cursor`, retorna uma página (paginação por keyset).
         """
-        return self.repo.get_all()
+        return (yield self.repo.listar(limite, cursor, campos))
 
+    @operacao
     def buscar_usuario(self, vem_hash: str) -> Optional[dict]:
         """
         Busca um usuário específico pelo hash
         """
-        return self.repo.get_by_vem_hash(vem_hash)
+        return (yield self.repo.get_by_vem_hash(vem_hash))
     
+    @operacao
     def buscar_usuario_detalhado(self, vem_hash: str) -> Optional[UsuarioResposta]:
         """
         Busca um usuário e retorna no formato de resposta padronizado
         """
-        usuario_dict = self.repo.get_by_vem_hash(vem_hash)
+        usuario_dict = yield self.repo.get_by_vem_hash(vem_hash)
         
         if not usuario_dict:
             return None
@@ -104,23 +106,25 @@ class UsuarioService:
             idade=usuario.calcular_idade()
         )
 
+    @operacao
     def excluir_usuario(self, vem_hash: str) -> dict:
         """
         Remove um usuário do sistema
         """
         # Verifica se usuário existe antes de deletar
-        if not self.repo.exists(vem_hash):
+        if not (yield self.repo.exists(vem_hash)):
             raise ValueError("Usuário não encontrado")
         
-        self.repo.delete(vem_hash)
+        yield self.repo.delete(vem_hash)
         return {"mensagem": "Usuário removido com sucesso", "vem_hash": vem_hash}
     
+    @operacao
     def atualizar_pontuacao(self, vem_hash: str, pontos: int) -> Optional[dict]:
         """
         Atualiza a pontuação de um usuário (adiciona ou subtrai pontos)
         Versão otimizada usando operação atômica do MongoDB
         """
-        nova_pontuacao = self.repo.increment_points(vem_hash, pontos)
+        nova_pontuacao = yield self.repo.increment_points(vem_hash, pontos)
         
         if nova_pontuacao is None:
             return None
@@ -131,12 +135,13 @@ class UsuarioService:
             "pontos_adicionados": pontos
         }
     
+    @operacao
     def adicionar_pontos_por_voto(self, vem_hash: str, pontos: int = 10) -> dict:
         """
         Adiciona pontos ao usuário após registrar um voto.
         Método específico para o fluxo de votação.
         """
-        resultado = self.atualizar_pontuacao(vem_hash, pontos)
+        resultado = yield self.atualizar_pontuacao(vem_hash, pontos)
         if not resultado:
             raise ValueError("Usuário não encontrado")
         
@@ -147,6 +152,7 @@ class UsuarioService:
             "pontos_ganhos": pontos
         }
     
+    @operacao
     def atualizar_dados_parcial(self, vem_hash: str, campos: dict) -> dict:
         """
         Atualiza campos específicos de um usuário sem afetar outros dados.
@@ -154,7 +160,7 @@ class UsuarioService:
         
         Exemplo: atualizar_dados_parcial("hash123", {"nome": "João Silva"})
         """
-        if not self.repo.exists(vem_hash):
+        if not (yield self.repo.exists(vem_hash)):
             raise ValueError("Usuário não encontrado")
         
         # Remove campos que não devem ser atualizados diretamente
@@ -162,7 +168,7 @@ class UsuarioService:
         for campo in campos_proibidos:
             campos.pop(campo, None)
         
-        sucesso = self.repo.update_partial(vem_hash, campos)
+        sucesso = yield self.repo.update_partial(vem_hash, campos)
         
         if not sucesso:
             raise ValueError("Falha ao atualizar usuário")
@@ -173,65 +179,28 @@ class UsuarioService:
             "campos_atualizados": list(campos.keys())
         }
     
+    @operacao
     def obter_estatisticas_idade(self) -> dict:
         """
         Retorna estatísticas sobre a idade dos usuários cadastrados
         Útil para análise demográfica
         """
-        usuarios = self.repo.get_all()
-        idades = []
-        
-        for usuario_dict in usuarios:
-            if usuario_dict.get('data_nascimento'):
-                try:
-                    usuario = Usuario(**usuario_dict)
-                    idade = usuario.calcular_idade()
-                    if idade:
-                        idades.append(idade)
-                except Exception:
-                    # Ignora usuários com dados inválidos
-                    continue
-        
-        if not idades:
-            return {
-                "total_usuarios_com_idade": 0,
-                "idade_media": None,
-                "idade_minima": None,
-                "idade_maxima": None
-            }
-        
-        return {
-            "total_usuarios_com_idade": len(idades),
-            "idade_media": round(sum(idades) / len(idades), 2),
-            "idade_minima": min(idades),
-            "idade_maxima": max(idades)
-        }
+        return (yield self.obter_estatisticas_gerais())["estatisticas_idade"]
     
+    @operacao
     def obter_estatisticas_gerais(self) -> dict:
         """
-        Retorna estatísticas gerais sobre os usuários
+        Retorna estatísticas gerais sobre os usuários.
+        Calculadas no banco numa única agregação ($facet), com cache opcional
+        (USUARIOS_ESTATISTICAS_CACHE_TTL_S).
         """
-        total_usuarios = self.repo.count_total()
-        cadastros_completos = self.repo.count_cadastros_completos()
-        cadastros_incompletos = total_usuarios - cadastros_completos
-        
-        # Calcula pontuação total e média
-        usuarios = self.repo.get_all()
-        pontuacoes = [u.get('pontuacao', 0) for u in usuarios]
-        pontuacao_total = sum(pontuacoes)
-        pontuacao_media = round(pontuacao_total / total_usuarios, 2) if total_usuarios > 0 else 0
-        
-        return {
-            "total_usuarios": total_usuarios,
-            "cadastros_completos": cadastros_completos,
-            "cadastros_incompletos": cadastros_incompletos,
-            "percentual_cadastros_completos": round((cadastros_completos / total_usuarios * 100), 2) if total_usuarios > 0 else 0,
-            "pontuacao_total": pontuacao_total,
-            "pontuacao_media": pontuacao_media,
-            "pontuacao_maxima": max(pontuacoes) if pontuacoes else 0,
-            "estatisticas_idade": self.obter_estatisticas_idade()
-        }
+        estatisticas = self.cache_estatisticas.obter("gerais")
+        if estatisticas is None:
+            estatisticas = _formatar_estatisticas((yield self.repo.get_statistics(date.today())))
+            self.cache_estatisticas.guardar("gerais", estatisticas)
+        return estatisticas
     
+    @operacao
     def listar_usuarios_por_pontuacao(self, limite: int = 10, ordem: str = "desc") -> List[dict]:
         """
         Lista usuários ordenados por pontuação (ranking)
@@ -240,20 +209,116 @@ class UsuarioService:
             limite: Número máximo de usuários a retornar
             ordem: "desc" para maior pontuação primeiro, "asc" para menor
         """
-        usuarios = self.repo.get_all()
-        
-        # Ordena por pontuação
-        reverse = (ordem == "desc")
-        usuarios_ordenados = sorted(
-            usuarios, 
-            key=lambda x: x.get('pontuacao', 0), 
-            reverse=reverse
-        )
-        
-        return usuarios_ordenados[:limite]
+        return (yield self.repo.get_ranking(limite, ordem))
+
+    def obter_estatisticas_cache(self) -> dict:
+        """
+        Acertos/faltas/remoções do cache de usuários deste processo.
+        """
+        return estatisticas_cache()
+
+    @operacao
+    def listar_ranking(self, limite: int = 10, cursor: Optional[str] = None) -> dict:
+        """
+        Página do ranking com a posição de cada usuário (paginação por cursor).
+        """
+        return (yield self.repo.get_ranking_page(limite, cursor))
+
+    @operacao
+    def obter_posicao(self, vem_hash: str) -> Optional[dict]:
+        """
+        Posição do usuário no ranking. Usa o ranking em memória quando carregado
+        (O(log P), só com um worker); caso contrário, conta pelo índice de pontuação (O(posição)).
+        """
+        posicao = yield self.repo.get_rank(vem_hash)
+        if posicao is None:
+            return None
+        return {"vem_hash": vem_hash, **posicao}
     
+    @operacao
     def existe_usuario(self, vem_hash: str) -> bool:
         """
         Verifica se um usuário existe no sistema
         """
-        return self.repo.exists(vem_hash)
\ No newline at end of file
+        return (yield self.repo.exists(vem_hash))
+
+
+class UsuarioServiceAsync(UsuarioService):
+    """
+    Versão assíncrona do UsuarioService (usada com MONGODB_ASYNC=true).
+    """
+    assincrono = True
+
+
+def _montar_resposta(usuario_dict: dict) -> UsuarioResposta:
+    """
+    Monta UsuarioResposta direto da projeção do banco, sem validar o documento
+    inteiro num Usuario.
+    """
+    data_nascimento = usuario_dict.get("data_nascimento")
+    if isinstance(data_nascimento, str):
+        data_nascimento = date.fromisoformat(data_nascimento)
+
+    return UsuarioResposta(
+        vem_hash=usuario_dict["vem_hash"],
+        nome=usuario_dict.get("nome"),
+        pontuacao=usuario_dict.get("pontuacao", 0),
+        cadastro_completo=usuario_dict.get("cadastro_completo", False),
+        idade=Usuario.idade_em_anos(data_nascimento)
+    )
+
+
+def _formatar_estatisticas(resultado: dict) -> dict:
+    """
+    Converte o resultado do $facet no formato de resposta de /usuarios/estatisticas.
+    Compartilhado entre as versões síncrona e assíncrona do service.
+    """
+    geral = (resultado.get("geral") or [{}])[0]
+    total_usuarios = geral.get("total_usuarios", 0)
+    cadastros_completos = geral.get("cadastros_completos", 0)
+    pontuacao_total = geral.get("pontuacao_total", 0)
+
+    return {
+        "total_usuarios": total_usuarios,
+        "cadastros_completos": cadastros_completos,
+        "cadastros_incompletos": total_usuarios - cadastros_completos,
+        "percentual_cadastros_completos": round((cadastros_completos / total_usuarios * 100), 2) if total_usuarios > 0 else 0,
+        "pontuacao_total": pontuacao_total,
+        "pontuacao_media": round(pontuacao_total / total_usuarios, 2) if total_usuarios > 0 else 0,
+        "pontuacao_maxima": geral.get("pontuacao_maxima") or 0,
+        "estatisticas_idade": _formatar_idade(resultado)
+    }
+
+
+def _formatar_idade(resultado: dict) -> dict:
+    idade = (resultado.get("idade") or [{}])[0]
+    if not idade.get("total_usuarios_com_idade"):
+        return {
+            "total_usuarios_com_idade": 0,
+            "idade_media": None,
+            "idade_minima": None,
+            "idade_maxima": None,
+            "histograma": _histograma({})
+        }
+
+    por_faixa = {item["_id"]: item["total"] for item in resultado.get("histograma_idade", [])}
+    return {
+        "total_usuarios_com_idade": idade["total_usuarios_com_idade"],
+        "idade_media": round(idade["idade_media"], 2),
+        "idade_minima": idade["idade_minima"],
+        "idade_maxima": idade["idade_maxima"],
+        "histograma": _histograma(por_faixa)
+    }
+
+
+def _histograma(por_faixa: dict) -> List[dict]:
+    faixas = []
+    for posicao, inicio in enumerate(FAIXAS_IDADE):
+        if posicao + 1 < len(FAIXAS_IDADE):
+            rotulo = f"{inicio}-{FAIXAS_IDADE[posicao + 1] - 1}"
+            total = por_faixa.get(inicio, 0)
+        else:
+            rotulo = f"{inicio}+"
+            total = por_faixa.get("ultima", 0)
+        faixas.append({"faixa": rotulo, "total": total})
+    return faixas
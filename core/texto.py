@@ -0,0 +1,54 @@
+import re
+import unicodedata
+from typing import List
+
+# Normalização de texto para a busca de serviços: sem acentos e sem diferença entre
+# maiúsculas e minúsculas ("Restauração" -> "restauracao"). Os termos de nome, endereço
+# e descrição ficam gravados no campo "termos" do serviço, já normalizados, e a busca
+# por prefixo usa o índice desse campo (regex ancorada em ^ vira faixa no índice).
+
+_PALAVRA = re.compile(r"\w+")
+
+# Campos do serviço que entram na busca por texto
+CAMPOS_BUSCA = ("nome", "endereco", "descricao")
+
+# Termos da consulta considerados (o resto é ignorado)
+MAX_TERMOS_CONSULTA = 8
+
+
+def normalizar(texto: str) -> str:
+    """
+    Remove acentos e converte para minúsculas (casefold).
+    """
+    decomposto = unicodedata.normalize("NFKD", texto)
+    return "".join(c for c in decomposto if not unicodedata.combining(c)).casefold()
+
+
+def termos(*textos) -> List[str]:
+    """
+    Palavras normalizadas e sem repetição dos textos (None é ignorado), em ordem.
+    """
+    encontrados = set()
+    for texto in textos:
+        if texto:
+            encontrados.update(_PALAVRA.findall(normalizar(str(texto))))
+    return sorted(encontrados)
+
+
+def termos_do_servico(servico: dict) -> List[str]:
+    return termos(*(servico.get(campo) for campo in CAMPOS_BUSCA))
+
+
+def termos_da_consulta(consulta: str) -> List[str]:
+    """
+    Termos da busca, na ordem digitada (ValueError se não houver nenhuma palavra).
+    Termos que são prefixo de outro termo da consulta são redundantes e saem.
+    """
+    vistos = []
+    for termo in _PALAVRA.findall(normalizar(consulta or "")):
+        if termo not in vistos:
+            vistos.append(termo)
+    if not vistos:
+        raise ValueError("Informe ao menos uma palavra em 'q'")
+    vistos = vistos[:MAX_TERMOS_CONSULTA]
+    return [t for t in vistos if not any(o != t and o.startswith(t) for o in vistos)]
@@ -1,3 +1,7 @@
+from datetime import datetime
+
+from pydantic import BaseModel
+
 class Interacao:
     def __init__(self, vem_hash: str, pergunta_id: str, totem_id: str, resposta: str):
         if resposta not in ["sim", "nao"]:
@@ -7,11 +11,24 @@ class Interacao:
         self.pergunta_id = pergunta_id
         self.totem_id = totem_id
         self.resposta = resposta
+        # UTC, como datetime nativo do BSON (usado nos rollups por hora/dia)
+        self.data_criacao = datetime.utcnow()
+        self.ultima_atualizacao = self.data_criacao
 
     def to_dict(self):
         return {
             "vem_hash": self.vem_hash,
             "pergunta_id": self.pergunta_id,
             "totem_id": self.totem_id,
-            "resposta": self.resposta
+            "resposta": self.resposta,
+            "data_criacao": self.data_criacao,
+            "ultima_atualizacao": self.ultima_atualizacao
         }
+
+
+class InteracaoEntrada(BaseModel):
+    """Schema de um voto enviado no corpo da requisição (ex.: lote de votos offline)"""
+    vem_hash: str
+    pergunta_id: str
+    totem_id: str
+    resposta: str
@@ -2,6 +2,35 @@ from datetime import datetime, date
 from typing import Optional
 from pydantic import BaseModel, Field
 import hashlib
+import json
+from math import radians, sin, cos, sqrt, atan2
+
+# Raio da Terra em km usado no cálculo de distâncias (Haversine)
+RAIO_TERRA_KM = 6371.0
+
+# Campos cadastrais do serviço (os que vêm da planilha de importação)
+CAMPOS_CONTEUDO = (
+    "nome", "tipo", "latitude", "longitude", "endereco", "telefone", "horario_funcionamento", "descricao"
+)
+
+
+def distancia_haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """
+    Distância em km entre dois pontos (fórmula de Haversine), arredondada em 2 casas
+    """
+    lat1 = radians(lat1)
+    lon1 = radians(lon1)
+    lat2 = radians(lat2)
+    lon2 = radians(lon2)
+
+    dlon = lon2 - lon1
+    dlat = lat2 - lat1
+
+    a = sin(dlat / 2)**2 + cos(lat1) * cos(lat2) * sin(dlon / 2)**2
+    c = 2 * atan2(sqrt(a), sqrt(1 - a))
+
+    distancia = RAIO_TERRA_KM * c
+    return round(distancia, 2)
 
 class Servico(BaseModel):
     """
@@ -11,8 +40,8 @@ class Servico(BaseModel):
     servico_id: str = Field(..., description="ID único do serviço")
     nome: str = Field(..., min_length=2, max_length=200, description="Nome do serviço")
     tipo: str = Field(..., description="Tipo do serviço (Saúde, Transporte, Educação, etc)")
-    latitude: float = Field(..., description="Latitude da localização")
-    longitude: float = Field(..., description="Longitude da localização")
+    latitude: float = Field(..., ge=-90, le=90, description="Latitude da localização")
+    longitude: float = Field(..., ge=-180, le=180, description="Longitude da localização")
     endereco: Optional[str] = Field(None, max_length=300, description="Endereço completo")
     telefone: Optional[str] = Field(None, max_length=20, description="Telefone de contato")
     horario_funcionamento: Optional[str] = Field(None, max_length=100, description="Horário de funcionamento")
@@ -26,29 +55,18 @@ class Servico(BaseModel):
         """Gera um ID único baseado no nome e coordenadas"""
         dados = f"{nome}_{latitude}_{longitude}"
         return hashlib.md5(dados.encode()).hexdigest()[:12]
+
+    @staticmethod
+    def gerar_hash_conteudo(dados: dict) -> str:
+        """Hash dos campos cadastrais (sem datas e status), para detectar mudanças na importação"""
+        valores = json.dumps([dados.get(campo) for campo in CAMPOS_CONTEUDO], ensure_ascii=False)
+        return hashlib.md5(valores.encode()).hexdigest()
     
     def calcular_distancia(self, lat: float, lon: float) -> float:
         """
         Calcula a distância em km entre o serviço e um ponto (usando fórmula de Haversine)
         """
-        from math import radians, sin, cos, sqrt, atan2
-        
-        # Raio da Terra em km
-        R = 6371.0
-        
-        lat1 = radians(self.latitude)
-        lon1 = radians(self.longitude)
-        lat2 = radians(lat)
-        lon2 = radians(lon)
-        
-        dlon = lon2 - lon1
-        dlat = lat2 - lat1
-        
-        a = sin(dlat / 2)**2 + cos(lat1) * cos(lat2) * sin(dlon / 2)**2
-        c = 2 * atan2(sqrt(a), sqrt(1 - a))
-        
-        distancia = R * c
-        return round(distancia, 2)
+        return distancia_haversine(self.latitude, self.longitude, lat, lon)
     
     class Config:
         json_encoders = {
@@ -60,8 +78,8 @@ class ServicoCreate(BaseModel):
     """Schema para criar um novo serviço"""
     nome: str = Field(..., min_length=2, max_length=200)
     tipo: str
-    latitude: float
-    longitude: float
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
     endereco: Optional[str] = None
     telefone: Optional[str] = None
     horario_funcionamento: Optional[str] = None
@@ -75,12 +93,16 @@ class ServicoResposta(BaseModel):
     tipo: str
     latitude: float
     longitude: float
-    endereco: Optional[str]
-    telefone: Optional[str]
-    horario_funcionamento: Optional[str]
-    descricao: Optional[str]
+    endereco: Optional[str] = None
+    telefone: Optional[str] = None
+    horario_funcionamento: Optional[str] = None
+    descricao: Optional[str] = None
     ativo: bool
     distancia_km: Optional[float] = None  # Distância do totem (quando aplicável)
     
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+# Campos do serviço copiados para as respostas de proximidade (tudo menos a distância)
+CAMPOS_RESPOSTA = tuple(campo for campo in ServicoResposta.model_fields if campo != "distancia_km")
\ No newline at end of file
@@ -31,12 +31,17 @@ class Usuario(BaseModel):
     
     def calcular_idade(self) -> Optional[int]:
         """Retorna a idade do usuário em anos"""
-        if not self.data_nascimento:
+        return self.idade_em_anos(self.data_nascimento)
+
+    @staticmethod
+    def idade_em_anos(data_nascimento: Optional[date]) -> Optional[int]:
+        """Idade em anos completos a partir da data de nascimento (None se não informada)"""
+        if not data_nascimento:
             return None
         hoje = date.today()
-        idade = hoje.year - self.data_nascimento.year
+        idade = hoje.year - data_nascimento.year
         # Ajusta se ainda não fez aniversário este ano
-        if (hoje.month, hoje.day) < (self.data_nascimento.month, self.data_nascimento.day):
+        if (hoje.month, hoje.day) < (data_nascimento.month, data_nascimento.day):
             idade -= 1
         return idade
     
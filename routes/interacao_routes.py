@@ -1,5 +1,13 @@
-from fastapi import APIRouter, Query, HTTPException
-from core.services.interacao_service import InteracaoService
+from fastapi import APIRouter, Query, HTTPException, Body
+from core.services.interacao_service import InteracaoService, InteracaoServiceAsync
+from core.execucao import executar
+from core.buffer_interacoes import BufferCheio
+from core import config
+from models.interacao import InteracaoEntrada
+from core.exportacao import nome_arquivo, tipo_conteudo
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
+from datetime import datetime
 
 router = APIRouter(
     prefix="/interacoes",
@@ -9,13 +17,13 @@ router = APIRouter(
         422: {"description": "Dados inválidos"}
     }
 )
-service = InteracaoService()
+service = InteracaoServiceAsync() if config.MONGODB_ASYNC else InteracaoService()
 
 @router.post("/", 
     summary="Registrar nova interação",
     description="Registra uma nova interação de um usuário respondendo uma pergunta em um totem específico.",
     response_description="Interação registrada com sucesso")
-def criar_interacao(
+async def criar_interacao(
     vem_hash: str = Query(..., description="Hash único do usuário", example="user123"),
     pergunta_id: str = Query(..., description="ID da pergunta respondida", example="pergunta001"),
     totem_id: str = Query(..., description="ID do totem onde ocorreu a interação", example="totem001"),
@@ -43,7 +51,9 @@ def criar_interacao(
         "vem_hash": "user123",
         "pergunta_id": "pergunta001",
         "totem_id": "totem001",
-        "resposta": "sim"
+        "resposta": "sim",
+        "data_criacao": "2025-01-02T14:03:12.512000",
+        "ultima_atualizacao": "2025-01-02T14:03:12.512000"
     }
     ```
     
@@ -52,7 +62,114 @@ def criar_interacao(
     - O usuário, pergunta e totem devem existir no sistema
     """
     try:
-        return service.registrar_interacao(vem_hash, pergunta_id, totem_id, resposta)
+        return await executar(service.registrar_interacao, vem_hash, pergunta_id, totem_id, resposta)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except BufferCheio as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+@router.post("/votar",
+    summary="Registrar voto com pontuação",
+    description="Registra a interação e concede os pontos de gamificação numa única chamada (idempotente).",
+    response_description="Voto registrado e pontuação do usuário")
+async def registrar_voto(
+    vem_hash: str = Query(..., description="Hash único do usuário", example="user123"),
+    pergunta_id: str = Query(..., description="ID da pergunta respondida", example="pergunta001"),
+    totem_id: str = Query(..., description="ID do totem onde ocorreu a interação", example="totem001"),
+    resposta: str = Query(..., description="Resposta do usuário (sim ou nao)", example="sim")
+):
+    """
+    ## 🗳️ Registrar Voto com Pontuação
+    
+    Substitui a sequência `POST /interacoes/` + `POST /usuarios/{vem_hash}/votar`:
+    grava o voto e soma os pontos (`PONTOS_POR_VOTO`) numa única requisição.
+    
+    ### Parâmetros:
+    - **vem_hash** (string): Hash único do usuário
+    - **pergunta_id** (string): ID da pergunta respondida
+    - **totem_id** (string): ID do totem onde ocorreu a interação
+    - **resposta** (string): Resposta do usuário ("sim" ou "nao")
+    
+    ### Exemplo de uso:
+    ```
+    POST /interacoes/votar?vem_hash=user123&pergunta_id=pergunta001&totem_id=totem001&resposta=sim
+    ```
+    
+    ### Resposta:
+    ```json
+    {
+        "mensagem": "Voto registrado com sucesso!",
+        "interacao": {
+            "vem_hash": "user123",
+            "pergunta_id": "pergunta001",
+            "totem_id": "totem001",
+            "resposta": "sim",
+            "data_criacao": "2025-01-02T14:03:12.512000",
+            "ultima_atualizacao": "2025-01-02T14:03:12.512000"
+        },
+        "pontos_ganhos": 10,
+        "pontuacao_atual": 60,
+        "primeiro_voto_na_pergunta": true
+    }
+    ```
+    
+    ### Idempotência:
+    - Os pontos são concedidos apenas no primeiro voto do usuário em cada pergunta
+    - Reenviar o voto (ex.: retry após timeout) ou trocar a resposta retorna `pontos_ganhos: 0`
+    - O usuário precisa existir para pontuar (404 caso contrário; o voto fica gravado, como em `POST /interacoes/`)
+    """
+    try:
+        resultado = await executar(service.registrar_voto, vem_hash, pergunta_id, totem_id, resposta)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except BufferCheio as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    if resultado is None:
+        raise HTTPException(status_code=404, detail="Usuário não encontrado")
+    return resultado
+
+@router.post("/lote",
+    summary="Registrar lote de interações",
+    description="Registra vários votos de uma vez (ex.: votos acumulados offline pelo totem) com uma única escrita em massa.",
+    response_description="Resultado de cada interação do lote")
+async def criar_interacoes_lote(interacoes: List[InteracaoEntrada] = Body(...)):
+    """
+    ## 📦 Registrar Lote de Interações
+    
+    Recebe uma lista de votos e grava todos com um único `bulk_write` não ordenado.
+    Ideal para totens com conexão instável que acumulam votos e reenviam depois.
+    
+    ### Body (JSON):
+    ```json
+    [
+        {"vem_hash": "user123", "pergunta_id": "pergunta001", "totem_id": "totem001", "resposta": "sim"},
+        {"vem_hash": "user456", "pergunta_id": "pergunta001", "totem_id": "totem001", "resposta": "nao"}
+    ]
+    ```
+    
+    ### Resposta:
+    ```json
+    {
+        "total": 2,
+        "inseridas": 1,
+        "atualizadas": 1,
+        "substituidas": 0,
+        "erros": 0,
+        "resultados": [
+            {"indice": 0, "status": "inserida"},
+            {"indice": 1, "status": "atualizada"}
+        ]
+    }
+    ```
+    
+    ### Status por item:
+    - **inserida**: voto novo
+    - **atualizada**: voto já existia e foi atualizado
+    - **substituida**: voto repetido no mesmo lote (vale o último)
+    - **erro**: item inválido ou falha de escrita (campo `erro` traz o motivo)
+    """
+    try:
+        return await executar(service.registrar_lote, interacoes)
     except ValueError as e:
         raise HTTPException(status_code=422, detail=str(e))
 
@@ -60,7 +177,11 @@ def criar_interacao(
     summary="Listar todas as interações",
     description="Retorna uma lista com todas as interações registradas no sistema.",
     response_description="Lista de interações")
-def listar_interacoes():
+async def listar_interacoes(
+    limite: Optional[int] = Query(None, ge=1, description="Itens por página (ativa a paginação por cursor)"),
+    cursor: Optional[str] = Query(None, description="Valor de 'proximo_cursor' da página anterior"),
+    campos: Optional[str] = Query(None, description="Campos a retornar, separados por vírgula")
+):
     """
     ## 📋 Listar Todas as Interações
     
@@ -84,14 +205,214 @@ def listar_interacoes():
     - Análise geográfica
     - Análise temporal
     - Dashboards de Big Data
+    
+    ### Paginação (opcional):
+    - **limite** (int): Itens por página. Sem `limite`/`cursor`, retorna a lista completa
+    - **cursor** (string): `proximo_cursor` da página anterior
+    - **campos** (string): Projeção, ex.: `campos=pergunta_id,resposta`
+    
+    Com paginação, a resposta vira `{"itens": [...], "proximo_cursor": "..."}`
+    (`proximo_cursor` é `null` na última página).
+    """
+    try:
+        return await executar(service.listar_interacoes, limite, cursor, campos)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+@router.get("/exportar",
+    summary="Exportar interações (streaming)",
+    description="Exporta as interações em NDJSON ou CSV via streaming, com filtros e gzip opcional.",
+    response_description="Arquivo NDJSON/CSV transmitido em partes")
+async def exportar_interacoes(
+    formato: str = Query("ndjson", description="Formato do arquivo: ndjson ou csv"),
+    gzip: bool = Query(False, description="Comprimir a saída com gzip"),
+    pergunta_id: Optional[str] = Query(None, description="Filtrar por pergunta"),
+    totem_id: Optional[str] = Query(None, description="Filtrar por totem"),
+    inicio: Optional[datetime] = Query(None, description="Início do intervalo (UTC, inclusivo)"),
+    fim: Optional[datetime] = Query(None, description="Fim do intervalo (UTC, exclusivo)")
+):
+    """
+    ## 📤 Exportar Interações (Streaming)
+    
+    Exporta as interações sem carregar a coleção inteira em memória: o cursor do MongoDB
+    é percorrido em lotes e cada lote é enviado assim que serializado.
+    Indicado para volumes grandes (milhões de votos), no lugar de `GET /interacoes/`.
+    
+    ### Parâmetros:
+    - **formato** (string): `ndjson` (um JSON por linha) ou `csv`
+    - **gzip** (bool): Se True, retorna o arquivo comprimido (`.gz`)
+    - **pergunta_id** / **totem_id** (string): Filtros opcionais
+    - **inicio** / **fim** (datetime): Intervalo de criação das interações (UTC)
+    
+    ### Exemplo de uso:
+    ```
+    GET /interacoes/exportar?formato=csv&gzip=true&pergunta_id=pergunta001&inicio=2025-01-01T00:00:00
+    ```
+    
+    ### Resposta (NDJSON):
+    ```
+    {"vem_hash": "user123", "pergunta_id": "pergunta001", "totem_id": "totem001", "resposta": "sim", "data_criacao": "2025-01-02 14:03:12.512000", ...}
+    {"vem_hash": "user456", "pergunta_id": "pergunta001", "totem_id": "totem001", "resposta": "nao", "data_criacao": "2025-01-02 14:05:40.081000", ...}
+    ```
+    """
+    try:
+        conteudo = await executar(service.exportar_interacoes, formato, gzip, pergunta_id, totem_id, inicio, fim)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    return StreamingResponse(
+        conteudo,
+        media_type=tipo_conteudo(formato, gzip),
+        headers={"Content-Disposition": f'attachment; filename="{nome_arquivo("interacoes", formato, gzip)}"'}
+    )
+
+@router.get("/buffer/metricas",
+    summary="Métricas do buffer de votos",
+    description="Retorna profundidade da fila e latência dos flushes do buffer write-behind de votos.",
+    response_description="Métricas do buffer")
+async def metricas_buffer():
+    """
+    ## 📈 Métricas do Buffer de Votos
+    
+    Com `BUFFER_INTERACOES_ATIVO=true`, os votos de `POST /interacoes/` são acumulados
+    em memória e gravados em lote. Este endpoint mostra o estado do buffer.
+    
+    ### Resposta:
+    ```json
+    {
+        "modo": "rapido",
+        "profundidade_fila": 12,
+        "capacidade": 10000,
+        "enfileiradas": 15230,
+        "rejeitadas": 0,
+        "gravadas": 15218,
+        "com_erro": 0,
+        "flushes": 320,
+        "ultimo_lote": 48,
+        "ultimo_flush_ms": 6.1,
+        "flush_medio_ms": 5.4,
+        "flush_max_ms": 31.7
+    }
+    ```
+    """
+    metricas = await executar(service.obter_metricas_buffer)
+    if metricas is None:
+        raise HTTPException(status_code=404, detail="Buffer de votos desativado (BUFFER_INTERACOES_ATIVO=false)")
+    return metricas
+
+@router.get("/serie-temporal",
+    summary="Série temporal de votos",
+    description="Retorna os votos agregados por hora ou por dia, lidos dos rollups pré-calculados.",
+    response_description="Lista de buckets com contagem de sim/nao")
+async def serie_temporal(
+    granularidade: str = Query("hora", description="Tamanho do bucket: hora ou dia"),
+    pergunta_id: Optional[str] = Query(None, description="Filtrar por pergunta"),
+    totem_id: Optional[str] = Query(None, description="Filtrar por totem"),
+    inicio: Optional[datetime] = Query(None, description="Início do intervalo (UTC, inclusivo)"),
+    fim: Optional[datetime] = Query(None, description="Fim do intervalo (UTC, exclusivo)")
+):
+    """
+    ## 📆 Série Temporal de Votos
+    
+    Base da análise temporal: votos por hora ou por dia (UTC), pela data de criação do voto.
+    Os dados vêm das coleções `interacoes_por_hora` / `interacoes_por_dia`, atualizadas
+    de forma incremental (a cada `ROLLUPS_INTERVALO_S` segundos ou via
+    `POST /interacoes/rollups/atualizar`), sem varrer as interações brutas.
+    
+    ### Parâmetros:
+    - **granularidade** (string): `hora` ou `dia`
+    - **pergunta_id** / **totem_id** (string): Filtros opcionais; sem `totem_id`, soma todos os totens
+    - **inicio** / **fim** (datetime): Intervalo dos buckets (UTC)
+    
+    ### Exemplo de uso:
+    ```
+    GET /interacoes/serie-temporal?granularidade=dia&pergunta_id=pergunta001&inicio=2025-01-01T00:00:00
+    ```
+    
+    ### Resposta:
+    ```json
+    [
+        {"inicio": "2025-01-01T00:00:00", "sim": 120, "nao": 45, "total": 165},
+        {"inicio": "2025-01-02T00:00:00", "sim": 98, "nao": 51, "total": 149}
+    ]
+    ```
+    
+    ### Observações:
+    - Votos recentes aparecem após a próxima atualização dos rollups
+    - Uma troca de resposta continua contando no bucket em que o voto foi criado
     """
-    return service.listar_interacoes()
+    try:
+        return await executar(service.obter_serie_temporal, granularidade, pergunta_id, totem_id, inicio, fim)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+@router.post("/rollups/atualizar",
+    summary="Atualizar rollups temporais",
+    description="Recalcula os buckets por hora/dia afetados por votos novos ou alterados desde a última execução.",
+    response_description="Resumo da atualização")
+async def atualizar_rollups(
+    completo: bool = Query(False, description="Reconstruir todos os buckets a partir das interações")
+):
+    """
+    ## 🧮 Atualizar Rollups Temporais
+    
+    Executa a mesma atualização incremental feita periodicamente pela API:
+    só os buckets com votos criados ou alterados desde a última execução
+    são recalculados (`$group` + `$merge`).
+    
+    ### Parâmetros:
+    - **completo** (bool): Se True, reconstrói todos os buckets (varre todas as interações)
+    
+    ### Resposta:
+    ```json
+    {
+        "completo": false,
+        "horas_recalculadas": 3,
+        "dias_recalculados": 1,
+        "ate": "2025-01-02T14:05:00.123456"
+    }
+    ```
+    """
+    try:
+        return await executar(service.atualizar_rollups, completo)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao atualizar rollups: {str(e)}")
+
+@router.post("/contagens/reconciliar",
+    summary="Reconciliar contadores de votos",
+    description="Recalcula os contadores pré-agregados de votos por pergunta a partir das interações.",
+    response_description="Resumo da reconciliação")
+async def reconciliar_contagens():
+    """
+    ## 🔁 Reconciliar Contadores de Votos
+    
+    O score (`GET /interacoes/score/{pergunta_id}`) é lido da coleção
+    `contagens_perguntas`, atualizada com `$inc` a cada voto. Este endpoint
+    reconstrói os contadores a partir das interações brutas, corrigindo
+    divergências (ex.: processo interrompido entre o voto e o contador).
+    
+    ### Resposta:
+    ```json
+    {
+        "perguntas_reconciliadas": 42,
+        "contadores_removidos": 0
+    }
+    ```
+    
+    ### Observações:
+    - Varre toda a coleção de interações: use fora do horário de pico
+    - Contadores de perguntas sem interações são removidos
+    """
+    try:
+        return await executar(service.reconciliar_contagens)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao reconciliar contadores: {str(e)}")
 
 @router.delete("/pergunta/{pergunta_id}", 
     summary="Excluir interações por pergunta",
     description="Remove todas as interações associadas a uma pergunta específica.",
     response_description="Interações removidas com sucesso")
-def excluir_interacoes_por_pergunta(pergunta_id: str):
+async def excluir_interacoes_por_pergunta(pergunta_id: str):
     """
     ## 🗑️ Excluir Interações por Pergunta
 
@@ -113,7 +434,7 @@ def excluir_interacoes_por_pergunta(pergunta_id: str):
     ```
     """
     try:
-        return service.excluir_interacoes_por_pergunta(pergunta_id)
+        return await executar(service.excluir_interacoes_por_pergunta, pergunta_id)
     except ValueError as e:
         raise HTTPException(status_code=422, detail=str(e))
 
@@ -121,7 +442,7 @@ def excluir_interacoes_por_pergunta(pergunta_id: str):
     summary="Verificar interação do usuário",
     description="Verifica se um usuário já interagiu com uma pergunta específica.",
     response_description="Resultado da verificação")
-def verificar_interacao(
+async def verificar_interacao(
     vem_hash: str = Query(..., description="Hash único do usuário", example="user123"),
     pergunta_id: str = Query(..., description="ID da pergunta", example="pergunta001")
 ):
@@ -147,7 +468,7 @@ def verificar_interacao(
     ```
     """
     try:
-        interagiu = service.verificar_interacao(vem_hash, pergunta_id)
+        interagiu = await executar(service.verificar_interacao, vem_hash, pergunta_id)
         return {"interagiu": interagiu}
     except ValueError as e:
         raise HTTPException(status_code=422, detail=str(e))
@@ -156,7 +477,7 @@ def verificar_interacao(
     summary="Obter score de respostas para uma pergunta",
     description="Calcula o percentual de respostas 'sim' e 'nao' para uma pergunta específica.",
     response_description="Score de respostas")
-def obter_score(pergunta_id: str):
+async def obter_score(pergunta_id: str):
     """
     ## 📊 Obter Score de Respostas para uma Pergunta
 
@@ -179,6 +500,6 @@ def obter_score(pergunta_id: str):
     ```
     """
     try:
-        return service.obter_score(pergunta_id)
+        return await executar(service.obter_score, pergunta_id)
     except ValueError as e:
         raise HTTPException(status_code=422, detail=str(e))
@@ -1,6 +1,8 @@
 from fastapi import APIRouter, Query, HTTPException
-from core.services.pergunta_service import PerguntaService
-from typing import List, Dict, Any
+from core.services.pergunta_service import PerguntaService, PerguntaServiceAsync
+from core.execucao import executar
+from core import config
+from typing import List, Dict, Any, Optional
 
 router = APIRouter(
     prefix="/perguntas", 
@@ -10,13 +12,13 @@ router = APIRouter(
         422: {"description": "Dados inválidos"}
     }
 )
-service = PerguntaService()
+service = PerguntaServiceAsync() if config.MONGODB_ASYNC else PerguntaService()
 
 @router.post("/", 
     summary="Criar nova pergunta",
     description="Cria uma nova pergunta que pode ser respondida pelos usuários nos totens. O ID é gerado automaticamente.",
     response_description="Pergunta criada com sucesso")
-def criar_pergunta(
+async def criar_pergunta(
     texto: str = Query(..., description="Texto da pergunta", example="Você gostou do atendimento?")
 ):
     """
@@ -42,7 +44,7 @@ def criar_pergunta(
     }
     ```
     """
-    return service.criar_pergunta(texto)
+    return await executar(service.criar_pergunta, texto)
 
 @router.get(
     "/ultima",
@@ -50,7 +52,7 @@ def criar_pergunta(
     description="Retorna a última pergunta criada no sistema.",
     response_description="Dados da última pergunta"
 )
-def buscar_ultima_pergunta():
+async def buscar_ultima_pergunta():
     """
     ## 🕑 Obter Última Pergunta Criada
     
@@ -70,7 +72,7 @@ def buscar_ultima_pergunta():
     }
     ```
     """
-    pergunta = service.buscar_ultima_pergunta()
+    pergunta = await executar(service.buscar_ultima_pergunta)
     if not pergunta:
         raise HTTPException(status_code=404, detail="Nenhuma pergunta encontrada")
     return pergunta
@@ -79,7 +81,11 @@ def buscar_ultima_pergunta():
     summary="Listar todas as perguntas",
     description="Retorna uma lista com todas as perguntas cadastradas no sistema.",
     response_description="Lista de perguntas")
-def listar_perguntas():
+async def listar_perguntas(
+    limite: Optional[int] = Query(None, ge=1, description="Itens por página (ativa a paginação por cursor)"),
+    cursor: Optional[str] = Query(None, description="Valor de 'proximo_cursor' da página anterior"),
+    campos: Optional[str] = Query(None, description="Campos a retornar, separados por vírgula")
+):
     """
     ## 📋 Listar Todas as Perguntas
     
@@ -94,14 +100,25 @@ def listar_perguntas():
         }
     ]
     ```
+    
+    ### Paginação (opcional):
+    - **limite** (int): Itens por página. Sem `limite`/`cursor`, retorna a lista completa
+    - **cursor** (string): `proximo_cursor` da página anterior
+    - **campos** (string): Projeção, ex.: `campos=pergunta_id,texto`
+    
+    Com paginação, a resposta vira `{"itens": [...], "proximo_cursor": "..."}`
+    (`proximo_cursor` é `null` na última página).
     """
-    return service.listar_perguntas()
+    try:
+        return await executar(service.listar_perguntas, limite, cursor, campos)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
 
 @router.get("/{pergunta_id}", 
     summary="Buscar pergunta por ID",
     description="Busca uma pergunta específica usando seu identificador único.",
     response_description="Dados da pergunta encontrada")
-def buscar_pergunta(pergunta_id: str):
+async def buscar_pergunta(pergunta_id: str):
     """
     ## 🔍 Buscar Pergunta por ID
     
@@ -123,7 +140,7 @@ def buscar_pergunta(pergunta_id: str):
     }
     ```
     """
-    pergunta = service.buscar_pergunta(pergunta_id)
+    pergunta = await executar(service.buscar_pergunta, pergunta_id)
     if not pergunta:
         raise HTTPException(status_code=404, detail="Pergunta não encontrada")
     return pergunta
@@ -132,7 +149,7 @@ def buscar_pergunta(pergunta_id: str):
     summary="Excluir pergunta",
     description="Remove uma pergunta do sistema usando seu identificador único.",
     response_description="Confirmação de exclusão")
-def excluir_pergunta(pergunta_id: str):
+async def excluir_pergunta(pergunta_id: str):
     """
     ## 🗑️ Excluir Pergunta
     
@@ -153,4 +170,4 @@ def excluir_pergunta(pergunta_id: str):
     }
     ```
     """
-    return service.excluir_pergunta(pergunta_id)
+    return await executar(service.excluir_pergunta, pergunta_id)
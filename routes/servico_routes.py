@@ -1,10 +1,13 @@
-from fastapi import APIRouter, HTTPException, status, UploadFile, File
-from core.services.servico_service import ServicoService
+from fastapi import APIRouter, HTTPException, status, UploadFile, File, Query, Response, Body
+from fastapi.responses import StreamingResponse
+from core.services.servico_service import ServicoService, ServicoServiceAsync
+from core.services.importacao_service import ImportacaoService, ImportacaoServiceAsync
+from core.execucao import executar
+from core.exportacao import nome_arquivo, tipo_conteudo
+from core import config
 from models.servico import ServicoCreate, ServicoResposta
-from typing import List, Dict, Any
-import csv
-import io
-import openpyxl
+from typing import List, Dict, Any, Optional
+from datetime import datetime
 
 router = APIRouter(
     prefix="/servicos",
@@ -15,13 +18,21 @@ router = APIRouter(
     }
 )
 
-service = ServicoService()
+service = ServicoServiceAsync() if config.MONGODB_ASYNC else ServicoService()
+importacoes = ImportacaoServiceAsync() if config.MONGODB_ASYNC else ImportacaoService()
 
 @router.get("/",
     summary="Listar todos os serviços",
     description="Retorna lista de todos os serviços públicos cadastrados.",
     response_description="Lista de serviços")
-def listar_servicos(apenas_ativos: bool = True):
+async def listar_servicos(
+    apenas_ativos: bool = True,
+    limite: Optional[int] = Query(None, ge=1, description="Itens por página (ativa a paginação por cursor)"),
+    cursor: Optional[str] = Query(None, description="Valor de 'proximo_cursor' da página anterior"),
+    campos: Optional[str] = Query(None, description="Campos a retornar, separados por vírgula"),
+    aberto_agora: bool = Query(False, description="Só serviços abertos agora (horário de funcionamento)"),
+    aberto_em: Optional[datetime] = Query(None, description="Só serviços abertos neste momento (ISO 8601)")
+):
     """
     ## 📋 Listar Serviços Públicos
     
@@ -43,14 +54,37 @@ def listar_servicos(apenas_ativos: bool = True):
         }
     ]
 ```
+    
+    ### Paginação (opcional):
+    - **limite** (int): Itens por página. Sem `limite`/`cursor`, retorna a lista completa
+    - **cursor** (string): `proximo_cursor` da página anterior
+    - **campos** (string): Projeção, ex.: `campos=servico_id,nome,tipo`
+    
+    Com paginação, a resposta vira `{"itens": [...], "proximo_cursor": "..."}`
+    (`proximo_cursor` é `null` na última página).
+    
+    ### Abertos (opcional):
+    - **aberto_agora** (bool): Só serviços abertos agora
+    - **aberto_em** (datetime): Só serviços abertos no momento informado, ex.: `2025-03-10T14:30`
+      (sem fuso, vale o horário local de `SERVICOS_FUSO_HORARIO`)
+    
+    O horário de funcionamento é convertido em intervalos semanais ao gravar o serviço e o
+    filtro é uma comparação no índice `horarios_semana`. Serviços com horário em formato
+    não reconhecido ficam fora dos filtros de aberto.
     """
-    return service.listar_servicos(apenas_ativos=apenas_ativos)
+    try:
+        return await executar(service.listar_servicos, apenas_ativos, limite, cursor, campos, aberto_agora, aberto_em)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e)
+        )
 
 @router.get("/tipos",
     summary="Listar tipos de serviços",
     description="Retorna lista de tipos de serviços disponíveis.",
     response_description="Lista de tipos")
-def listar_tipos():
+async def listar_tipos():
     """
     ## 🏷️ Listar Tipos de Serviços
     
@@ -61,13 +95,13 @@ def listar_tipos():
     ["Transporte", "Saúde", "Educação", "Segurança"]
 ```
     """
-    return service.listar_tipos_disponiveis()
+    return await executar(service.listar_tipos_disponiveis)
 
 @router.get("/estatisticas",
     summary="Estatísticas dos serviços",
     description="Retorna estatísticas gerais sobre os serviços cadastrados.",
     response_description="Estatísticas")
-def obter_estatisticas():
+async def obter_estatisticas():
     """
     ## 📊 Estatísticas de Serviços
     
@@ -88,14 +122,97 @@ def obter_estatisticas():
     }
 ```
     """
-    return service.obter_estatisticas()
+    return await executar(service.obter_estatisticas)
+
+@router.post("/proximidade/reconstruir",
+    summary="Reconstruir tabela de proximidade",
+    description="Recalcula a tabela materializada de serviços próximos de cada totem.",
+    response_description="Resumo da reconstrução")
+async def reconstruir_proximidade():
+    """
+    ## 🔁 Reconstruir Tabela de Proximidade
+    
+    `GET /servicos/proximos-totem/{totem_id}` lê a coleção `totem_servicos_proximos`,
+    mantida a cada criação/alteração/exclusão de totem ou serviço. Este endpoint a
+    recalcula do zero (também feito automaticamente na inicialização quando
+    `PROXIMIDADE_RAIO_MAXIMO_KM` muda).
+    
+    ### Resposta:
+```json
+    {
+        "ativo": true,
+        "raio_maximo_km": 10.0,
+        "totens": 120,
+        "servicos_ativos": 4800,
+        "pares": 56320
+    }
+```
+    """
+    try:
+        return await executar(service.reconstruir_proximidade)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro ao reconstruir a tabela de proximidade: {str(e)}"
+        )
+
+@router.post("/proximos-totens",
+    summary="Serviços próximos de vários totens",
+    description="Serviços próximos de uma lista de totens (ou de todos) numa única chamada, em streaming NDJSON.",
+    response_description="Uma linha JSON por totem")
+async def buscar_proximos_totens(
+    totem_ids: Optional[List[str]] = Body(None, embed=True, description="Totens a consultar (todos se omitido)"),
+    raio_km: float = Query(5.0, gt=0, description="Raio de busca em km"),
+    tipo: Optional[str] = Query(None, description="Filtra por tipo de serviço"),
+    limite: Optional[int] = Query(None, ge=1, le=500, description="Máximo de serviços por totem"),
+    gzip: bool = Query(False, description="Comprimir a saída com gzip")
+):
+    """
+    ## 🗺️ Matriz de Proximidade Totem → Serviços
+    
+    Para o console de operações: em vez de uma chamada de `/proximos-totem/{totem_id}`
+    por totem, retorna todos de uma vez, em streaming (uma linha NDJSON por totem, na
+    ordem de `totem_id`).
+    
+    ### Corpo (opcional):
+```json
+    {"totem_ids": ["totem001", "totem002"]}
+```
+    Sem corpo (ou com `totem_ids` nulo), retorna todos os totens.
+    
+    ### Resposta (NDJSON):
+```
+    {"totem_id": "totem001", "latitude": -8.05, "longitude": -34.88, "total": 2, "por_tipo": {"Saúde": 1, "Transporte": 1}, "servicos": [{"servico_id": "...", "tipo": "Saúde", "distancia_km": 0.42, ...}, ...]}
+    {"totem_id": "totem002", "latitude": -8.06, "longitude": -34.90, "total": 0, "por_tipo": {}, "servicos": []}
+    {"totem_id": "totem999", "erro": "Totem não encontrado"}
+```
+    
+    ### Desempenho:
+    - Raio até `PROXIMIDADE_RAIO_MAXIMO_KM`: um único cursor na tabela materializada,
+      ordenado por (totem_id, distância) no índice `totem_distancia`
+    - Raio maior: os serviços ativos são lidos uma vez e as distâncias de todos os totens
+      calculadas numa matriz vetorizada (em blocos)
+    """
+    conteudo = await executar(service.exportar_proximos_totens, totem_ids, raio_km, tipo, limite, gzip)
+    return StreamingResponse(
+        conteudo,
+        media_type=tipo_conteudo("ndjson", gzip),
+        headers={"Content-Disposition": f'attachment; filename="{nome_arquivo("proximos_totens", "ndjson", gzip)}"'}
+    )
 
 @router.get("/proximos-totem/{totem_id}",
     response_model=List[ServicoResposta],
     summary="Buscar serviços próximos ao totem",
     description="Retorna serviços públicos próximos a um totem específico.",
     response_description="Lista de serviços próximos ordenados por distância")
-def buscar_proximos_totem(totem_id: str, raio_km: float = 5.0):
+async def buscar_proximos_totem(
+    totem_id: str,
+    raio_km: float = Query(5.0, gt=0, description="Raio de busca em km"),
+    tipo: Optional[str] = Query(None, description="Filtra por tipo de serviço"),
+    limite: Optional[int] = Query(None, ge=1, le=500, description="Máximo de serviços retornados"),
+    aberto_agora: bool = Query(False, description="Só serviços abertos agora (horário de funcionamento)"),
+    aberto_em: Optional[datetime] = Query(None, description="Só serviços abertos neste momento (ISO 8601)")
+):
     """
     ## 📍 Buscar Serviços Próximos ao Totem
     
@@ -105,10 +222,14 @@ def buscar_proximos_totem(totem_id: str, raio_km: float = 5.0):
     ### Parâmetros:
     - **totem_id** (string): ID do totem
     - **raio_km** (float): Raio de busca em km (padrão: 5.0 km)
+    - **tipo** (string, opcional): Apenas serviços deste tipo
+    - **limite** (int, opcional): Máximo de serviços (os mais próximos)
+    - **aberto_agora** / **aberto_em** (opcionais): Só serviços abertos agora ou no momento informado
     
     ### Exemplo de uso:
 ```
-    GET /servicos/proximos-totem/totem123?raio_km=3.0
+    GET /servicos/proximos-totem/totem123?raio_km=3.0&tipo=Saúde&limite=5
+    GET /servicos/proximos-totem/totem123?aberto_agora=true
 ```
     
     ### Resposta:
@@ -130,9 +251,19 @@ def buscar_proximos_totem(totem_id: str, raio_km: float = 5.0):
         }
     ]
 ```
+    
+    Com `raio_km` até `PROXIMIDADE_RAIO_MAXIMO_KM` a resposta é uma leitura indexada
+    da tabela materializada `totem_servicos_proximos`; raios maiores e os filtros de aberto
+    são calculados na hora.
     """
+    if aberto_agora and aberto_em is not None:
+        # Aqui ValueError do service vira 404 (totem inexistente): valida antes
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Use aberto_agora ou aberto_em, não os dois"
+        )
     try:
-        return service.buscar_proximos_por_totem_id(totem_id, raio_km)
+        return await executar(service.buscar_proximos_por_totem_id, totem_id, raio_km, tipo, limite, aberto_agora, aberto_em)
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -144,10 +275,14 @@ def buscar_proximos_totem(totem_id: str, raio_km: float = 5.0):
     summary="Buscar serviços próximos a coordenadas",
     description="Retorna serviços próximos a uma latitude/longitude específica.",
     response_description="Lista de serviços próximos")
-def buscar_proximos_coordenadas(
-    latitude: float,
-    longitude: float,
-    raio_km: float = 5.0
+async def buscar_proximos_coordenadas(
+    latitude: float = Query(..., ge=-90, le=90),
+    longitude: float = Query(..., ge=-180, le=180),
+    raio_km: float = Query(5.0, gt=0, description="Raio de busca em km"),
+    tipo: Optional[str] = Query(None, description="Filtra por tipo de serviço"),
+    limite: Optional[int] = Query(None, ge=1, le=500, description="Máximo de serviços retornados"),
+    aberto_agora: bool = Query(False, description="Só serviços abertos agora (horário de funcionamento)"),
+    aberto_em: Optional[datetime] = Query(None, description="Só serviços abertos neste momento (ISO 8601)")
 ):
     """
     ## 🗺️ Buscar Serviços por Coordenadas
@@ -158,19 +293,125 @@ def buscar_proximos_coordenadas(
     - **latitude** (float): Latitude do ponto
     - **longitude** (float): Longitude do ponto
     - **raio_km** (float): Raio de busca em km (padrão: 5.0)
+    - **tipo** (string, opcional): Apenas serviços deste tipo
+    - **limite** (int, opcional): Máximo de serviços (os mais próximos)
+    - **aberto_agora** / **aberto_em** (opcionais): Só serviços abertos agora ou no momento informado
     
     ### Exemplo:
 ```
     GET /servicos/proximos?latitude=-8.0476&longitude=-34.8770&raio_km=2.0
+    GET /servicos/proximos?latitude=-8.0476&longitude=-34.8770&aberto_em=2025-03-10T20:00
+```
+    
+    A busca usa `$geoNear` no índice 2dsphere do campo `location`: o custo
+    depende de quantos serviços estão no raio, não do tamanho do catálogo. O filtro
+    de aberto vai na própria consulta do `$geoNear`.
+    """
+    try:
+        return await executar(service.buscar_proximos_ao_totem, latitude, longitude, raio_km, tipo, limite, aberto_agora, aberto_em)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+@router.get("/mais-proximos",
+    response_model=List[ServicoResposta],
+    summary="Buscar os k serviços mais próximos",
+    description="Retorna os k serviços ativos mais próximos de uma coordenada, sem raio fixo.",
+    response_description="Lista dos k serviços mais próximos")
+async def buscar_mais_proximos(
+    latitude: float = Query(..., ge=-90, le=90),
+    longitude: float = Query(..., ge=-180, le=180),
+    k: int = Query(5, ge=1, le=100, description="Quantidade de serviços"),
+    tipo: Optional[str] = Query(None, description="Filtra por tipo de serviço"),
+    aberto_agora: bool = Query(False, description="Só serviços abertos agora (horário de funcionamento)"),
+    aberto_em: Optional[datetime] = Query(None, description="Só serviços abertos neste momento (ISO 8601)")
+):
+    """
+    ## 🎯 k Serviços Mais Próximos
+    
+    Em vez de "tudo dentro de `raio_km`", retorna sempre os `k` serviços ativos mais
+    próximos: funciona em bairros com poucos serviços (onde um raio fixo volta vazio) e em
+    áreas densas (onde o raio traria centenas de resultados).
+    
+    ### Parâmetros:
+    - **latitude** / **longitude** (float): Ponto de referência
+    - **k** (int): Quantos serviços retornar (padrão: 5, máximo: 100)
+    - **tipo** (string, opcional): Apenas serviços deste tipo
+    - **aberto_agora** / **aberto_em** (opcionais): Só serviços abertos agora ou no momento informado
+    
+    ### Exemplo:
+```
+    GET /servicos/mais-proximos?latitude=-8.0476&longitude=-34.8770&k=5&tipo=Saúde
+    GET /servicos/mais-proximos?latitude=-8.0476&longitude=-34.8770&k=3&aberto_agora=true
+```
+    
+    A busca é guiada pelo índice: `$geoNear` no índice 2dsphere com `$limit k` (ou, com o
+    índice em memória ativo, anéis de células da grade a partir do ponto). Não calcula a
+    distância de todos os serviços.
+    """
+    try:
+        return await executar(service.buscar_mais_proximos, latitude, longitude, k, tipo, aberto_agora, aberto_em)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+@router.get("/busca",
+    response_model=List[ServicoResposta],
+    summary="Buscar serviços por texto",
+    description="Busca por prefixo, sem acentos e sem diferenciar maiúsculas, em nome, endereço e descrição.",
+    response_description="Lista de serviços encontrados")
+async def buscar_servicos_texto(
+    q: str = Query(..., min_length=1, max_length=200, description="Palavras (ou começo delas) a buscar"),
+    tipo: Optional[str] = Query(None, description="Filtra por tipo de serviço"),
+    limite: int = Query(20, ge=1, le=100, description="Máximo de serviços retornados"),
+    latitude: Optional[float] = Query(None, ge=-90, le=90, description="Filtra por proximidade (com longitude)"),
+    longitude: Optional[float] = Query(None, ge=-180, le=180, description="Filtra por proximidade (com latitude)"),
+    raio_km: float = Query(5.0, gt=0, description="Raio de busca em km (com latitude/longitude)")
+):
+    """
+    ## 🔎 Buscar Serviços por Texto
+
+    Cada palavra de `q` precisa ser o começo de alguma palavra do nome, do endereço ou da
+    descrição do serviço, sem diferenciar acentos nem maiúsculas: `restauracao`, `Restaura`
+    e `hosp restaur` encontram o "Hospital da Restauração".
+
+    ### Parâmetros:
+    - **q** (string): Texto da busca
+    - **tipo** (string, opcional): Apenas serviços deste tipo
+    - **limite** (int): Máximo de serviços (padrão: 20, máximo: 100)
+    - **latitude** / **longitude** (float, opcionais): Só serviços dentro de `raio_km` do ponto
+    - **raio_km** (float): Raio de busca em km (padrão: 5.0)
+
+    ### Exemplos:
+```
+    GET /servicos/busca?q=restauracao
+    GET /servicos/busca?q=detran&latitude=-8.0476&longitude=-34.8770&raio_km=3
 ```
+
+    Sem coordenadas, a lista vem em ordem alfabética de nome; com coordenadas, do mais
+    próximo ao mais distante (com `distancia_km`).
+
+    As palavras normalizadas de cada serviço ficam no campo `termos`, mantido a cada
+    escrita e indexado: a busca por prefixo é uma faixa no índice, não uma varredura
+    da coleção. Com coordenadas, o filtro de texto vai dentro do `$geoNear`.
     """
-    return service.buscar_proximos_ao_totem(latitude, longitude, raio_km)
+    try:
+        return await executar(service.buscar_por_texto, q, tipo, limite, latitude, longitude, raio_km)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
 
 @router.get("/tipo/{tipo}",
     summary="Buscar serviços por tipo",
     description="Retorna todos os serviços de um tipo específico.",
     response_description="Lista de serviços do tipo")
-def buscar_por_tipo(tipo: str):
+async def buscar_por_tipo(tipo: str):
     """
     ## 🏷️ Buscar Serviços por Tipo
     
@@ -181,13 +422,13 @@ def buscar_por_tipo(tipo: str):
     GET /servicos/tipo/Saúde
 ```
     """
-    return service.buscar_por_tipo(tipo)
+    return await executar(service.buscar_por_tipo, tipo)
 
 @router.post("/",
     summary="Cadastrar novo serviço",
     description="Cadastra um novo serviço público no sistema.",
     response_description="Serviço criado com sucesso")
-def criar_servico(dados: ServicoCreate):
+async def criar_servico(dados: ServicoCreate):
     """
     ## ➕ Cadastrar Novo Serviço
     
@@ -214,7 +455,7 @@ def criar_servico(dados: ServicoCreate):
     - endereco, telefone, horario_funcionamento, descricao
     """
     try:
-        return service.criar_servico(dados)
+        return await executar(service.criar_servico, dados)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -223,13 +464,20 @@ def criar_servico(dados: ServicoCreate):
 
 @router.post("/importar-csv",
     summary="Importar serviços via CSV/Excel",
-    description="Importa múltiplos serviços de um arquivo CSV ou Excel.",
-    response_description="Resultado da importação")
-async def importar_servicos(arquivo: UploadFile = File(...)):
+    description="Importa múltiplos serviços de um arquivo CSV ou Excel em segundo plano.",
+    response_description="Job de importação criado (ou o resultado, com aguardar=true)")
+async def importar_servicos(
+    response: Response,
+    arquivo: UploadFile = File(...),
+    aguardar: bool = Query(False, description="Importa na própria requisição e retorna o resultado (arquivos pequenos)"),
+    desativar_ausentes: bool = Query(False, description="Desativa os serviços ativos que não estão no arquivo")
+):
     """
     ## 📤 Importar Serviços em Massa
     
-    Importa serviços de um arquivo CSV ou Excel (.xlsx).
+    Importa serviços de um arquivo CSV ou Excel (.xlsx) como um job em segundo plano:
+    a resposta (202) traz o `job_id`, e o progresso é consultado em
+    `GET /servicos/importacoes/{job_id}`.
     
     ### Formato do arquivo CSV:
 ```csv
@@ -244,128 +492,176 @@ async def importar_servicos(arquivo: UploadFile = File(...)):
     ### Campos obrigatórios:
     - nome, tipo, latitude, longitude
     
-    ### Resposta:
+    ### Desempenho:
+    - O arquivo é lido em streaming (CSV incremental, XLSX em modo `read_only`), sem carregar tudo na memória
+    - As linhas são validadas e gravadas em lotes (`IMPORTACAO_TAMANHO_LOTE`, padrão 1000), um `bulk_write` por lote
+    - No máximo `IMPORTACAO_MAX_CONCORRENTES` importações rodam ao mesmo tempo; as demais ficam na fila
+    - Serviço já existente (mesmo nome e coordenadas) só é regravado se algum campo mudou: o hash
+      do conteúdo da linha é comparado, lote a lote, com o gravado (`inalterados` no resultado)
+    - Regravar não muda a `data_criacao` do serviço
+    
+    ### Planilha completa da cidade (`desativar_ausentes=true`):
+    Ao fim da importação, os serviços ativos que não aparecem no arquivo são desativados
+    (soft delete, contados em `desativados`). Não acontece se o job for cancelado, se o
+    arquivo não tiver nenhuma linha válida ou se alguma linha tiver erro (`com_erros > 0`):
+    a linha rejeitada pode ser de um serviço que continua existindo.
+    
+    ### Resposta (202):
 ```json
     {
+        "job_id": "4f9c0e...",
+        "status": "na_fila",
+        "acompanhar": "/servicos/importacoes/4f9c0e...",
+        "erros": "/servicos/importacoes/4f9c0e.../erros"
+    }
+```
+    
+    ### Com `aguardar=true` (200):
+    A requisição espera a importação terminar; ela é registrada como um job e respeita o
+    mesmo limite de `IMPORTACAO_MAX_CONCORRENTES` (espera a vez na fila). `detalhes_erros`
+    traz só as primeiras `IMPORTACAO_ERROS_NO_RESUMO` linhas com erro (ordenadas pela linha);
+    a lista completa fica em `erros` (paginada).
+```json
+    {
+        "mensagem": "Importação concluída",
+        "job_id": "4f9c0e...",
+        "status": "concluida",
         "total_linhas": 10,
         "importados_com_sucesso": 9,
-        "erros": 1,
+        "inseridos": 2,
+        "atualizados": 1,
+        "inalterados": 6,
+        "desativados": 0,
+        "com_erros": 1,
+        "taxa_sucesso": 90.0,
         "detalhes_erros": [
-            {"linha": 5, "erro": "Latitude inválida"}
-        ]
+            {"linha": 5, "nome": "Posto X", "erro": "latitude: Input should be less than or equal to 90"}
+        ],
+        "erros": "/servicos/importacoes/4f9c0e.../erros"
     }
 ```
+    Arquivo em formato não suportado ou sem as colunas obrigatórias retorna 400.
     """
     try:
-        # Lê o conteúdo do arquivo
-        conteudo = await arquivo.read()
-        
-        servicos_criados = 0
-        erros = []
-        total_linhas = 0
-        
-        # Detecta o tipo de arquivo
-        if arquivo.filename.endswith('.csv'):
-            # Processa CSV
-            conteudo_str = conteudo.decode('utf-8')
-            reader = csv.DictReader(io.StringIO(conteudo_str))
-            
-            for idx, linha in enumerate(reader, start=2):  # Linha 2 porque linha 1 é cabeçalho
-                total_linhas += 1
-                try:
-                    # Validações básicas
-                    if not all(k in linha for k in ['nome', 'tipo', 'latitude', 'longitude']):
-                        raise ValueError("Campos obrigatórios faltando")
-                    
-                    # Cria objeto ServicoCreate
-                    servico_data = ServicoCreate(
-                        nome=linha['nome'].strip(),
-                        tipo=linha['tipo'].strip(),
-                        latitude=float(linha['latitude']),
-                        longitude=float(linha['longitude']),
-                        endereco=linha.get('endereco', '').strip() or None,
-                        telefone=linha.get('telefone', '').strip() or None,
-                        horario_funcionamento=linha.get('horario_funcionamento', '').strip() or None,
-                        descricao=linha.get('descricao', '').strip() or None
-                    )
-                    
-                    # Cria o serviço
-                    service.criar_servico(servico_data)
-                    servicos_criados += 1
-                    
-                except Exception as e:
-                    erros.append({
-                        "linha": idx,
-                        "nome": linha.get('nome', 'N/A'),
-                        "erro": str(e)
-                    })
-        
-        elif arquivo.filename.endswith(('.xlsx', '.xls')):
-            # Processa Excel
-            workbook = openpyxl.load_workbook(io.BytesIO(conteudo))
-            sheet = workbook.active
-            
-            # Pega cabeçalhos da primeira linha
-            headers = [cell.value for cell in sheet[1]]
-            
-            for idx, row in enumerate(sheet.iter_rows(min_row=2, values_only=True), start=2):
-                total_linhas += 1
-                try:
-                    # Cria dicionário da linha
-                    linha_dict = dict(zip(headers, row))
-                    
-                    # Validações
-                    if not all(k in linha_dict for k in ['nome', 'tipo', 'latitude', 'longitude']):
-                        raise ValueError("Campos obrigatórios faltando")
-                    
-                    # Cria objeto ServicoCreate
-                    servico_data = ServicoCreate(
-                        nome=str(linha_dict['nome']).strip(),
-                        tipo=str(linha_dict['tipo']).strip(),
-                        latitude=float(linha_dict['latitude']),
-                        longitude=float(linha_dict['longitude']),
-                        endereco=str(linha_dict.get('endereco', '')).strip() or None,
-                        telefone=str(linha_dict.get('telefone', '')).strip() or None,
-                        horario_funcionamento=str(linha_dict.get('horario_funcionamento', '')).strip() or None,
-                        descricao=str(linha_dict.get('descricao', '')).strip() or None
-                    )
-                    
-                    # Cria o serviço
-                    service.criar_servico(servico_data)
-                    servicos_criados += 1
-                    
-                except Exception as e:
-                    erros.append({
-                        "linha": idx,
-                        "nome": linha_dict.get('nome', 'N/A') if 'linha_dict' in locals() else 'N/A',
-                        "erro": str(e)
-                    })
-        else:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Formato de arquivo não suportado. Use .csv ou .xlsx"
-            )
-        
-        return {
-            "mensagem": "Importação concluída",
-            "total_linhas": total_linhas,
-            "importados_com_sucesso": servicos_criados,
-            "com_erros": len(erros),
-            "taxa_sucesso": round((servicos_criados / total_linhas * 100), 2) if total_linhas > 0 else 0,
-            "detalhes_erros": erros[:10]  # Mostra no máximo 10 erros
-        }
-        
+        if aguardar:
+            # O UploadFile já está num arquivo temporário: é lido em streaming, lote a lote
+            return await executar(importacoes.importar_agora, arquivo.file, arquivo.filename, desativar_ausentes)
+        response.status_code = status.HTTP_202_ACCEPTED
+        return await executar(importacoes.criar, arquivo.file, arquivo.filename, desativar_ausentes)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Erro ao processar arquivo: {str(e)}"
         )
 
+@router.get("/importacoes/{job_id}",
+    summary="Progresso de uma importação",
+    description="Retorna o status e os contadores de progresso de um job de importação.",
+    response_description="Estado do job")
+async def consultar_importacao(job_id: str):
+    """
+    ## ⏳ Progresso da Importação
+    
+    ### Status:
+    - `na_fila` → `executando` → `concluida` | `cancelada` | `falhou` | `interrompida`
+    - `interrompida`: a API foi encerrada (ou caiu) durante a importação (os lotes já gravados permanecem)
+    
+    ### Resposta:
+```json
+    {
+        "job_id": "4f9c0e...",
+        "status": "executando",
+        "arquivo": "servicos.xlsx",
+        "linhas_lidas": 120000,
+        "gravadas": 119950,
+        "inseridos": 1000,
+        "atualizados": 950,
+        "inalterados": 118000,
+        "desativados": 0,
+        "com_erros": 50,
+        "linhas_por_segundo": 8420.5,
+        "cancelamento_solicitado": false
+    }
+```
+    """
+    job = await executar(importacoes.consultar, job_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Importação não encontrada"
+        )
+    return job
+
+@router.get("/importacoes/{job_id}/erros",
+    summary="Linhas com erro de uma importação",
+    description="Lista paginada (por cursor) das linhas rejeitadas de um job de importação.",
+    response_description="Página de erros")
+async def listar_erros_importacao(
+    job_id: str,
+    limite: Optional[int] = Query(None, ge=1, description="Itens por página"),
+    cursor: Optional[str] = Query(None, description="Valor de 'proximo_cursor' da página anterior")
+):
+    """
+    ## ⚠️ Erros da Importação
+    
+    ### Resposta:
+```json
+    {
+        "itens": [{"linha": 5, "nome": "Posto X", "erro": "latitude: Input should be less than or equal to 90"}],
+        "proximo_cursor": null
+    }
+```
+    """
+    try:
+        pagina = await executar(importacoes.listar_erros, job_id, limite, cursor)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    if pagina is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Importação não encontrada"
+        )
+    return pagina
+
+@router.post("/importacoes/{job_id}/cancelar",
+    summary="Cancelar uma importação",
+    description="Cancela um job de importação na fila ou em execução.",
+    response_description="Estado do job")
+async def cancelar_importacao(job_id: str):
+    """
+    ## 🛑 Cancelar Importação
+    
+    - Na fila: o job é cancelado na hora
+    - Em execução: para ao fim do lote atual (`cancelamento_solicitado: true` até lá);
+      os lotes já gravados permanecem
+    - Já concluído, com falha ou interrompido: retorna 409
+    """
+    job = await executar(importacoes.cancelar, job_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Importação não encontrada"
+        )
+    if job["status"] in ("concluida", "falhou", "interrompida"):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Importação já finalizada (status: {job['status']})"
+        )
+    return job
+
 @router.get("/{servico_id}",
     summary="Buscar serviço por ID",
     description="Retorna detalhes de um serviço específico.",
     response_description="Dados do serviço")
-def buscar_servico(servico_id: str):
+async def buscar_servico(servico_id: str):
     """
     ## 🔍 Buscar Serviço por ID
     
@@ -376,7 +672,7 @@ def buscar_servico(servico_id: str):
     GET /servicos/abc123
 ```
     """
-    servico = service.buscar_servico(servico_id)
+    servico = await executar(service.buscar_servico, servico_id)
     if not servico:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -388,7 +684,7 @@ def buscar_servico(servico_id: str):
     summary="Atualizar serviço",
     description="Atualiza dados de um serviço específico.",
     response_description="Serviço atualizado")
-def atualizar_servico(servico_id: str, campos: Dict[str, Any]):
+async def atualizar_servico(servico_id: str, campos: Dict[str, Any]):
     """
     ## 🔄 Atualizar Serviço
     
@@ -403,7 +699,7 @@ def atualizar_servico(servico_id: str, campos: Dict[str, Any]):
 ```
     """
     try:
-        return service.atualizar_servico(servico_id, campos)
+        return await executar(service.atualizar_servico, servico_id, campos)
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -414,7 +710,7 @@ def atualizar_servico(servico_id: str, campos: Dict[str, Any]):
     summary="Excluir serviço",
     description="Remove um serviço do sistema.",
     response_description="Confirmação de exclusão")
-def excluir_servico(servico_id: str, permanente: bool = False):
+async def excluir_servico(servico_id: str, permanente: bool = False):
     """
     ## 🗑️ Excluir Serviço
     
@@ -424,7 +720,7 @@ def excluir_servico(servico_id: str, permanente: bool = False):
     - **permanente** (bool): Se True, deleta permanentemente. Se False, apenas desativa.
     """
     try:
-        return service.excluir_servico(servico_id, soft_delete=not permanente)
+        return await executar(service.excluir_servico, servico_id, soft_delete=not permanente)
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -435,14 +731,14 @@ def excluir_servico(servico_id: str, permanente: bool = False):
     summary="Reativar serviço",
     description="Reativa um serviço que foi desativado.",
     response_description="Confirmação de reativação")
-def reativar_servico(servico_id: str):
+async def reativar_servico(servico_id: str):
     """
     ## ♻️ Reativar Serviço
     
     Reativa um serviço que foi desativado anteriormente.
     """
     try:
-        return service.reativar_servico(servico_id)
+        return await executar(service.reativar_servico, servico_id)
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
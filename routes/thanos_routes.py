@@ -1,5 +1,7 @@
 from fastapi import APIRouter, Query, HTTPException
-from core.services.thanos_service import ThanosService
+from core.services.thanos_service import ThanosService, ThanosServiceAsync
+from core.execucao import executar
+from core import config
 
 from typing import List, Dict, Any
 # rota dar delete em todos os dados registrados no sistema
@@ -13,13 +15,13 @@ router = APIRouter(
     }
 )
 
-service = ThanosService()
+service = ThanosServiceAsync() if config.MONGODB_ASYNC else ThanosService()
 
 @router.delete("/estalar",
     summary="Estalar os dedos do Thanos",
     description="Remove todos os dados do sistema, simbolizando o 'estalo' do Thanos.",
     response_description="Todos os dados foram removidos com sucesso")
-def estalar_dedos():
+async def estalar_dedos():
     """
     ## 💀 Estalar os Dedos do Thanos
     Remove todos os dados do sistema, simbolizando o "estalo" do Thanos.
@@ -34,4 +36,4 @@ def estalar_dedos():
     }
     ```
     """
-    return service.estalar_dedos()
\ No newline at end of file
+    return await executar(service.estalar_dedos)
\ No newline at end of file
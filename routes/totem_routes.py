@@ -1,6 +1,9 @@
 from fastapi import APIRouter, Query, HTTPException
-from core.services.totem_service import TotemService
-from typing import List, Dict, Any
+from core.services.totem_service import TotemService, TotemServiceAsync
+from core.execucao import executar
+from core import config
+from typing import List, Dict, Any, Optional
+from datetime import datetime
 
 router = APIRouter(
     prefix="/totens", 
@@ -10,13 +13,13 @@ router = APIRouter(
         422: {"description": "Coordenadas inválidas"}
     }
 )
-service = TotemService()
+service = TotemServiceAsync() if config.MONGODB_ASYNC else TotemService()
 
 @router.post("/", 
     summary="Criar novo totem",
     description="Cria um novo totem com localização geográfica específica. O ID é gerado automaticamente.",
     response_description="Totem criado com sucesso")
-def criar_totem(
+async def criar_totem(
     latitude: float = Query(..., description="Latitude geográfica", example=-23.5505),
     longitude: float = Query(..., description="Longitude geográfica", example=-46.6333)
 ):
@@ -45,13 +48,17 @@ def criar_totem(
     }
     ```
     """
-    return service.criar_totem(latitude, longitude)
+    return await executar(service.criar_totem, latitude, longitude)
 
 @router.get("/", 
     summary="Listar todos os totens",
     description="Retorna uma lista com todos os totens cadastrados no sistema.",
     response_description="Lista de totens")
-def listar_totens():
+async def listar_totens(
+    limite: Optional[int] = Query(None, ge=1, description="Itens por página (ativa a paginação por cursor)"),
+    cursor: Optional[str] = Query(None, description="Valor de 'proximo_cursor' da página anterior"),
+    campos: Optional[str] = Query(None, description="Campos a retornar, separados por vírgula")
+):
     """
     ## 📋 Listar Todos os Totens
     
@@ -67,14 +74,77 @@ def listar_totens():
         }
     ]
     ```
+    
+    ### Paginação (opcional):
+    - **limite** (int): Itens por página. Sem `limite`/`cursor`, retorna a lista completa
+    - **cursor** (string): `proximo_cursor` da página anterior
+    - **campos** (string): Projeção, ex.: `campos=totem_id,latitude,longitude`
+    
+    Com paginação, a resposta vira `{"itens": [...], "proximo_cursor": "..."}`
+    (`proximo_cursor` é `null` na última página).
+    """
+    try:
+        return await executar(service.listar_totens, limite, cursor, campos)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+@router.get("/mapa",
+    summary="Mapa de satisfação por totem",
+    description="Retorna as coordenadas de cada totem com as contagens de sim/nao por pergunta.",
+    response_description="Totens com coordenadas e contagens de votos")
+async def mapa_satisfacao(
+    pergunta_id: Optional[str] = Query(None, description="Considerar apenas uma pergunta"),
+    desde: Optional[datetime] = Query(None, description="Retornar só os totens com votos alterados desde este instante (UTC)")
+):
+    """
+    ## 🗺️ Mapa de Satisfação por Totem
+    
+    Alimenta o mapa geográfico do dashboard sem baixar `/totens/` e `/interacoes/`
+    inteiros: as contagens vêm da coleção `contagens_totens`, atualizada com `$inc`
+    a cada voto, e são juntadas às coordenadas dos totens.
+    
+    ### Parâmetros:
+    - **pergunta_id** (string): Filtra as contagens de uma pergunta
+    - **desde** (datetime): Atualização incremental. Retorna apenas os totens com
+      contadores alterados a partir desse instante (com todas as suas perguntas)
+    
+    ### Exemplo de uso:
+    ```
+    GET /totens/mapa?pergunta_id=pergunta001
+    GET /totens/mapa?desde=2025-01-02T14:03:00
+    ```
+    
+    ### Resposta:
+    ```json
+    {
+        "gerado_em": "2025-01-02T14:03:05.120000",
+        "totens": [
+            {
+                "totem_id": "totem001",
+                "latitude": -8.0476,
+                "longitude": -34.8770,
+                "sim": 120,
+                "nao": 45,
+                "total": 165,
+                "perguntas": {
+                    "pergunta001": {"sim": 120, "nao": 45, "total": 165}
+                }
+            }
+        ]
+    }
+    ```
+    
+    ### Polling:
+    Faça a primeira chamada sem `desde` e, nas seguintes, envie o `gerado_em`
+    da resposta anterior: só os totens alterados são retornados.
     """
-    return service.listar_totens()
+    return await executar(service.obter_mapa_satisfacao, pergunta_id, desde)
 
 @router.get("/{totem_id}", 
     summary="Buscar totem por ID",
     description="Busca um totem específico usando seu identificador único.",
     response_description="Dados do totem encontrado")
-def buscar_totem(totem_id: str):
+async def buscar_totem(totem_id: str):
     """
     ## 🔍 Buscar Totem por ID
     
@@ -97,7 +167,7 @@ def buscar_totem(totem_id: str):
     }
     ```
     """
-    totem = service.buscar_totem(totem_id)
+    totem = await executar(service.buscar_totem, totem_id)
     if not totem:
         raise HTTPException(status_code=404, detail="Totem não encontrado")
     return totem
@@ -106,7 +176,7 @@ def buscar_totem(totem_id: str):
     summary="Excluir totem",
     description="Remove um totem do sistema usando seu identificador único.",
     response_description="Confirmação de exclusão")
-def excluir_totem(totem_id: str):
+async def excluir_totem(totem_id: str):
     """
     ## 🗑️ Excluir Totem
     
@@ -127,4 +197,4 @@ def excluir_totem(totem_id: str):
     }
     ```
     """
-    return service.excluir_totem(totem_id)
+    return await executar(service.excluir_totem, totem_id)
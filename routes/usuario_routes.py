@@ -1,7 +1,9 @@
-from fastapi import APIRouter, HTTPException, status, Body
-from core.services.usuario_service import UsuarioService
+from fastapi import APIRouter, HTTPException, status, Body, Query
+from core.services.usuario_service import UsuarioService, UsuarioServiceAsync
+from core.execucao import executar
+from core import config
 from models.usuario import UsuarioCadastro, UsuarioResposta
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 router = APIRouter(
     prefix="/usuarios", 
@@ -11,13 +13,17 @@ router = APIRouter(
         422: {"description": "Dados inválidos"}
     }
 )
-service = UsuarioService()
+service = UsuarioServiceAsync() if config.MONGODB_ASYNC else UsuarioService()
 
 @router.get("/", 
     summary="Listar todos os usuários",
     description="Retorna uma lista com todos os usuários cadastrados no sistema.",
     response_description="Lista de usuários")
-def listar_usuarios():
+async def listar_usuarios(
+    limite: Optional[int] = Query(None, ge=1, description="Itens por página (ativa a paginação por cursor)"),
+    cursor: Optional[str] = Query(None, description="Valor de 'proximo_cursor' da página anterior"),
+    campos: Optional[str] = Query(None, description="Campos a retornar, separados por vírgula")
+):
     """
     ## 📋 Listar Todos os Usuários
     
@@ -40,14 +46,28 @@ def listar_usuarios():
         }
     ]
 ```
+    
+    ### Paginação (opcional):
+    - **limite** (int): Itens por página. Sem `limite`/`cursor`, retorna a lista completa
+    - **cursor** (string): `proximo_cursor` da página anterior
+    - **campos** (string): Projeção, ex.: `campos=vem_hash,nome,pontuacao`
+    
+    Com paginação, a resposta vira `{"itens": [...], "proximo_cursor": "..."}`
+    (`proximo_cursor` é `null` na última página).
     """
-    return service.listar_usuarios()
+    try:
+        return await executar(service.listar_usuarios, limite, cursor, campos)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e)
+        )
 
 @router.get("/ranking", 
     summary="Ranking de usuários por pontuação",
     description="Retorna os usuários ordenados por pontuação (maior para menor).",
     response_description="Lista de usuários ordenada por pontuação")
-def ranking_usuarios(limite: int = 10, ordem: str = "desc"):
+async def ranking_usuarios(limite: int = 10, ordem: str = "desc"):
     """
     ## 🏆 Ranking de Usuários
     
@@ -70,6 +90,9 @@ def ranking_usuarios(limite: int = 10, ordem: str = "desc"):
         {"vem_hash": "user3", "nome": "Pedro", "pontuacao": 100}
     ]
 ```
+    
+    A ordenação usa o índice `ranking` (pontuação, vem_hash): só os `limite`
+    primeiros usuários são lidos do banco.
     """
     if limite < 1 or limite > 100:
         raise HTTPException(
@@ -83,13 +106,59 @@ def ranking_usuarios(limite: int = 10, ordem: str = "desc"):
             detail="Ordem deve ser 'asc' ou 'desc'"
         )
     
-    return service.listar_usuarios_por_pontuacao(limite=limite, ordem=ordem)
+    return await executar(service.listar_usuarios_por_pontuacao, limite=limite, ordem=ordem)
+
+@router.get("/ranking/posicoes",
+    summary="Ranking paginado com posições",
+    description="Retorna o ranking completo em páginas, com a posição de cada usuário.",
+    response_description="Página do ranking")
+async def ranking_paginado(
+    limite: int = Query(10, ge=1, le=100, description="Usuários por página"),
+    cursor: Optional[str] = Query(None, description="Valor de 'proximo_cursor' da página anterior")
+):
+    """
+    ## 🥇 Ranking Paginado
+    
+    Percorre o ranking inteiro (maior pontuação primeiro) em páginas, numerando
+    as posições. Empates dividem a posição (1, 2, 2, 4...).
+    
+    ### Parâmetros:
+    - **limite** (int): Usuários por página (1 a 100, padrão: 10)
+    - **cursor** (string): `proximo_cursor` da página anterior
+    
+    ### Exemplo de uso:
+```
+    GET /usuarios/ranking/posicoes?limite=3
+```
+    
+    ### Resposta:
+```json
+    {
+        "itens": [
+            {"posicao": 1, "vem_hash": "user1", "nome": "João", "pontuacao": 150},
+            {"posicao": 2, "vem_hash": "user2", "nome": "Maria", "pontuacao": 120},
+            {"posicao": 2, "vem_hash": "user3", "nome": "Pedro", "pontuacao": 120}
+        ],
+        "proximo_cursor": "eyJ2IjogeyJwIjogMTIwfX0"
+    }
+```
+    
+    A paginação é por cursor (keyset no índice `ranking`), então a página 1000
+    custa o mesmo que a primeira.
+    """
+    try:
+        return await executar(service.listar_ranking, limite, cursor)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e)
+        )
 
 @router.get("/estatisticas",
     summary="Estatísticas gerais dos usuários",
     description="Retorna estatísticas completas sobre usuários, cadastros e pontuações.",
     response_description="Estatísticas do sistema")
-def obter_estatisticas():
+async def obter_estatisticas():
     """
     ## 📊 Estatísticas Gerais
     
@@ -106,21 +175,64 @@ def obter_estatisticas():
         "pontuacao_media": 33.33,
         "pontuacao_maxima": 200,
         "estatisticas_idade": {
+            "total_usuarios_com_idade": 110,
             "idade_media": 28.5,
             "idade_minima": 18,
-            "idade_maxima": 65
+            "idade_maxima": 65,
+            "histograma": [
+                {"faixa": "13-17", "total": 4},
+                {"faixa": "18-24", "total": 38},
+                {"faixa": "25-34", "total": 41},
+                {"faixa": "35-44", "total": 15},
+                {"faixa": "45-59", "total": 9},
+                {"faixa": "60+", "total": 3}
+            ]
         }
     }
 ```
+    
+    Tudo é calculado no MongoDB numa única agregação (`$facet`). Com
+    `USUARIOS_ESTATISTICAS_CACHE_TTL_S` > 0 o resultado fica em cache por esse tempo.
     """
-    return service.obter_estatisticas_gerais()
+    return await executar(service.obter_estatisticas_gerais)
+
+@router.get("/cache/estatisticas",
+    summary="Estatísticas do cache de usuários",
+    description="Retorna acertos, faltas e remoções do cache LRU de usuários por vem_hash.",
+    response_description="Contadores do cache")
+async def estatisticas_cache():
+    """
+    ## 🧠 Cache de Usuários
+    
+    Contadores do cache em memória que fica na frente da busca por `vem_hash`
+    (usada por `GET /usuarios/{vem_hash}`, cadastro e votos). Os valores são
+    do processo que atendeu a requisição.
+    
+    ### Resposta:
+```json
+    {
+        "ativo": true,
+        "capacidade": 10000,
+        "ttl_s": 30.0,
+        "entradas": 812,
+        "acertos": 15230,
+        "faltas": 1904,
+        "remocoes": 0,
+        "taxa_acerto": 0.8889
+    }
+```
+    
+    Ative com `USUARIOS_CACHE_CAPACIDADE` > 0. Qualquer escrita no usuário
+    (pontos, cadastro, atualização, exclusão) invalida a entrada.
+    """
+    return service.obter_estatisticas_cache()
 
 @router.post("/verificar/{vem_hash}",
     response_model=UsuarioResposta,
     summary="Verificar usuário por QR Code",
     description="Verifica se o usuário existe pelo hash do QR Code. Se não existir, cria automaticamente.",
     response_description="Dados do usuário e status de cadastro")
-def verificar_usuario(vem_hash: str):
+async def verificar_usuario(vem_hash: str):
     """
     ## 🔍 Verificar Usuário (Fluxo do QR Code)
     
@@ -163,7 +275,7 @@ def verificar_usuario(vem_hash: str):
 ```
     """
     try:
-        return service.verificar_usuario(vem_hash)
+        return await executar(service.verificar_usuario, vem_hash)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -175,7 +287,7 @@ def verificar_usuario(vem_hash: str):
     summary="Completar cadastro do usuário",
     description="Completa o cadastro com nome, email e data de nascimento.",
     response_description="Dados do usuário cadastrado")
-def cadastrar_usuario(dados: UsuarioCadastro):
+async def cadastrar_usuario(dados: UsuarioCadastro):
     """
     ## ✍️ Completar Cadastro
     
@@ -209,7 +321,7 @@ def cadastrar_usuario(dados: UsuarioCadastro):
 ```
     """
     try:
-        return service.completar_cadastro(dados)
+        return await executar(service.completar_cadastro, dados)
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -226,7 +338,7 @@ def cadastrar_usuario(dados: UsuarioCadastro):
     description="Cria um novo usuário manualmente apenas com o hash. Use /verificar para o fluxo normal.",
     response_description="Usuário criado com sucesso",
     deprecated=True)
-def criar_usuario(vem_hash: str):
+async def criar_usuario(vem_hash: str):
     """
     ## 📝 Criar Novo Usuário (Manual)
     
@@ -244,18 +356,18 @@ def criar_usuario(vem_hash: str):
 ```
     """
     # Verifica se o usuário já existe
-    if service.existe_usuario(vem_hash):
+    if await executar(service.existe_usuario, vem_hash):
         raise HTTPException(
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
             detail="Usuário já existe"
         )
-    return service.criar_usuario(vem_hash)
+    return await executar(service.criar_usuario, vem_hash)
 
 @router.get("/{vem_hash}", 
     summary="Buscar usuário por hash",
     description="Busca um usuário específico usando seu hash único.",
     response_description="Dados do usuário encontrado")
-def buscar_usuario(vem_hash: str):
+async def buscar_usuario(vem_hash: str):
     """
     ## 🔍 Buscar Usuário por Hash
     
@@ -281,7 +393,7 @@ def buscar_usuario(vem_hash: str):
     }
 ```
     """
-    usuario = service.buscar_usuario(vem_hash)
+    usuario = await executar(service.buscar_usuario, vem_hash)
     if not usuario:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -293,7 +405,7 @@ def buscar_usuario(vem_hash: str):
     summary="Excluir usuário",
     description="Remove um usuário do sistema usando seu hash único.",
     response_description="Confirmação de exclusão")
-def excluir_usuario(vem_hash: str):
+async def excluir_usuario(vem_hash: str):
     """
     ## 🗑️ Excluir Usuário
     
@@ -316,18 +428,60 @@ def excluir_usuario(vem_hash: str):
 ```
     """
     try:
-        return service.excluir_usuario(vem_hash)
+        return await executar(service.excluir_usuario, vem_hash)
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=str(e)
         )
 
+@router.get("/{vem_hash}/posicao",
+    summary="Posição do usuário no ranking",
+    description="Retorna a posição do usuário no ranking de pontuação.",
+    response_description="Posição do usuário")
+async def posicao_usuario(vem_hash: str):
+    """
+    ## 📍 Posição no Ranking
+    
+    Responde "qual a minha posição?" sem ordenar todos os usuários.
+    
+    ### Parâmetros:
+    - **vem_hash** (string): Hash único do usuário
+    
+    ### Exemplo de uso:
+```
+    GET /usuarios/abc123xyz/posicao
+```
+    
+    ### Resposta:
+```json
+    {
+        "vem_hash": "abc123xyz",
+        "pontuacao": 120,
+        "posicao": 2,
+        "total_usuarios": 5230,
+        "fonte": "memoria"
+    }
+```
+    
+    ### Fonte:
+    - **memoria**: ranking em memória (`RANKING_MEMORIA_ATIVO=true` com um único worker), O(log P)
+    - **indice**: contagem de usuários com pontuação maior pelo índice `ranking`, O(posição);
+      é a fonte sempre que `WEB_CONCURRENCY` > 1
+    """
+    resultado = await executar(service.obter_posicao, vem_hash)
+    if not resultado:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Usuário não encontrado"
+        )
+    return resultado
+
 @router.patch("/{vem_hash}/pontuacao/{pontos}",
     summary="Atualizar pontuação do usuário",
     description="Adiciona ou remove pontos de um usuário.",
     response_description="Pontuação atualizada com sucesso")
-def atualizar_pontuacao(vem_hash: str, pontos: int):
+async def atualizar_pontuacao(vem_hash: str, pontos: int):
     """
     ## ⚙️ Atualizar Pontuação do Usuário
     
@@ -351,7 +505,7 @@ def atualizar_pontuacao(vem_hash: str, pontos: int):
     }
 ```
     """
-    resultado = service.atualizar_pontuacao(vem_hash, pontos)
+    resultado = await executar(service.atualizar_pontuacao, vem_hash, pontos)
     if not resultado:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -363,7 +517,7 @@ def atualizar_pontuacao(vem_hash: str, pontos: int):
     summary="Registrar voto e adicionar pontos",
     description="Registra um voto do usuário e adiciona pontos de gamificação.",
     response_description="Voto registrado e pontos adicionados")
-def registrar_voto(vem_hash: str, pontos: int = 10):
+async def registrar_voto(vem_hash: str, pontos: int = 10):
     """
     ## 🗳️ Registrar Voto (Gamificação)
     
@@ -390,7 +544,7 @@ def registrar_voto(vem_hash: str, pontos: int = 10):
 ```
     """
     try:
-        return service.adicionar_pontos_por_voto(vem_hash, pontos)
+        return await executar(service.adicionar_pontos_por_voto, vem_hash, pontos)
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -401,7 +555,7 @@ def registrar_voto(vem_hash: str, pontos: int = 10):
     summary="Atualizar dados do usuário",
     description="Atualiza campos específicos de um usuário sem afetar outros dados.",
     response_description="Dados atualizados com sucesso")
-def atualizar_dados(vem_hash: str, campos: Dict[str, Any] = Body(...)):
+async def atualizar_dados(vem_hash: str, campos: Dict[str, Any] = Body(...)):
     """
     ## 🔄 Atualizar Dados Parcialmente
     
@@ -442,7 +596,7 @@ def atualizar_dados(vem_hash: str, campos: Dict[str, Any] = Body(...)):
 ```
     """
     try:
-        return service.atualizar_dados_parcial(vem_hash, campos)
+        return await executar(service.atualizar_dados_parcial, vem_hash, campos)
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -0,0 +1,152 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from core import config
+from core.buffer_interacoes import BufferCheio, BufferInteracoes, BufferInteracoesAsync, _deduplicar
+from models.interacao import Interacao
+
+# Buffer write-behind dos votos (BUFFER_INTERACOES_*): deduplicação do lote, flush por
+# quantidade e no shutdown, backpressure e confirmação no modo durável. Repositório falso.
+
+
+class _Repo:
+    def __init__(self, erros=(), falhar=False, segurar=None):
+        self.lotes = []
+        self.erros = set(erros)
+        self.falhar = falhar
+        self.segurar = segurar
+
+    def save_many(self, interacoes):
+        if self.segurar is not None:
+            self.segurar.wait(5)
+        if self.falhar:
+            raise RuntimeError("MongoDB indisponível")
+        self.lotes.append(list(interacoes))
+        return [
+            {"status": "erro", "erro": "rejeitado"} if interacao.vem_hash in self.erros else {"status": "inserida"}
+            for interacao in interacoes
+        ]
+
+
+class _RepoAsync(_Repo):
+    async def save_many(self, interacoes):
+        return _Repo.save_many(self, interacoes)
+
+
+@pytest.fixture
+def configurar(monkeypatch):
+    def _configurar(**valores):
+        for nome, valor in valores.items():
+            monkeypatch.setattr(config, f"BUFFER_INTERACOES_{nome}", valor)
+    return _configurar
+
+
+def _voto(vem_hash, resposta="sim", pergunta_id="p1"):
+    return Interacao(vem_hash, pergunta_id, "t1", resposta)
+
+
+def test_lote_fica_com_o_ultimo_voto_de_cada_chave():
+    lote = [(_voto("u1", "sim"), None), (_voto("u2"), None), (_voto("u1", "nao"), None), (_voto("u1", pergunta_id="p2"), None)]
+    votos = _deduplicar(lote)
+    assert [(voto.vem_hash, voto.pergunta_id, voto.resposta) for voto in votos] == [
+        ("u1", "p1", "nao"), ("u2", "p1", "sim"), ("u1", "p2", "sim")
+    ]
+
+
+def test_flush_ao_atingir_o_maximo_de_itens(configurar):
+    repo = _Repo()
+    configurar(MODO="rapido", INTERVALO_MS=10_000, MAX_ITENS=3, CAPACIDADE=100)
+    buffer = BufferInteracoes(repo)
+    for i in range(3):
+        buffer.enfileirar(_voto(f"u{i}"))
+    # Com intervalo de 10 s, só o tamanho do lote explica um flush antes do parar()
+    for _ in range(100):
+        if repo.lotes:
+            break
+        time.sleep(0.01)
+    assert [len(lote) for lote in repo.lotes] == [3]
+    buffer.parar()
+
+
+def test_parar_grava_o_que_esta_na_fila(configurar):
+    repo = _Repo()
+    configurar(MODO="rapido", INTERVALO_MS=10_000, MAX_ITENS=100, CAPACIDADE=100)
+    buffer = BufferInteracoes(repo)
+    for i in range(5):
+        buffer.enfileirar(_voto(f"u{i}"))
+    buffer.parar()
+    assert sum(len(lote) for lote in repo.lotes) == 5
+    metricas = buffer.obter_metricas()
+    assert metricas["enfileiradas"] == 5 and metricas["gravadas"] == 5
+    assert metricas["profundidade_fila"] == 0
+
+
+def test_fila_cheia_rejeita_depois_do_timeout(configurar):
+    segurar = threading.Event()
+    repo = _Repo(segurar=segurar)
+    configurar(MODO="rapido", INTERVALO_MS=0, MAX_ITENS=1, CAPACIDADE=1, TIMEOUT_S=0.05)
+    buffer = BufferInteracoes(repo)
+    buffer.enfileirar(_voto("u1"))  # vai para o flush, que fica preso em `segurar`
+    while buffer.fila.qsize():
+        time.sleep(0.01)
+    buffer.enfileirar(_voto("u2"))  # ocupa a única vaga da fila
+    try:
+        buffer.enfileirar(_voto("u3"))
+    except BufferCheio:
+        pass
+    else:
+        raise AssertionError("fila cheia deveria gerar BufferCheio")
+    segurar.set()
+    buffer.parar()
+    assert buffer.obter_metricas()["rejeitadas"] == 1
+    assert [voto.vem_hash for lote in repo.lotes for voto in lote] == ["u1", "u2"]
+
+
+def test_modo_duravel_devolve_o_erro_de_cada_voto(configurar):
+    repo = _Repo(erros={"u2"})
+    configurar(MODO="duravel", INTERVALO_MS=0, MAX_ITENS=10, CAPACIDADE=10)
+    buffer = BufferInteracoes(repo)
+    buffer.enfileirar(_voto("u1"))
+    try:
+        buffer.enfileirar(_voto("u2"))
+    except RuntimeError as e:
+        assert str(e) == "rejeitado"
+    else:
+        raise AssertionError("o voto rejeitado no flush deveria falhar na requisição")
+    buffer.parar()
+    assert buffer.obter_metricas()["com_erro"] == 1
+
+
+def test_modo_duravel_falha_do_flush_chega_a_todos(configurar):
+    repo = _Repo(falhar=True)
+    configurar(MODO="duravel", INTERVALO_MS=0, MAX_ITENS=10, CAPACIDADE=10)
+    buffer = BufferInteracoes(repo)
+    try:
+        buffer.enfileirar(_voto("u1"))
+    except RuntimeError as e:
+        assert "indisponível" in str(e)
+    else:
+        raise AssertionError("a falha do bulk_write deveria chegar à requisição")
+    buffer.parar()
+
+
+def test_buffer_async_agrupa_os_votos_concorrentes(configurar):
+    repo = _RepoAsync()
+
+    async def cenario():
+        buffer = BufferInteracoesAsync(repo)
+        await asyncio.gather(*(buffer.enfileirar(_voto(f"u{i}")) for i in range(4)))
+        await buffer.parar()
+        return buffer
+
+    configurar(MODO="duravel", INTERVALO_MS=50, MAX_ITENS=10, CAPACIDADE=10)
+    buffer = asyncio.run(cenario())
+    assert [len(lote) for lote in repo.lotes] == [4]
+    assert buffer.obter_metricas()["flushes"] == 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,110 @@
+import pytest
+
+from conftest import Resultado
+from core import cache
+from core.cache import CacheLRU, CanalInvalidacao
+from core.repositories import usuario_repo
+from core.repositories.usuario_repo import UsuarioRepository
+from models.usuario import Usuario
+
+# Cache LRU de usuários (get_by_vem_hash): cada caminho de escrita do UsuarioRepository
+# invalida a entrada do hash, e uma leitura que cruzou com uma escrita não grava valor
+# velho no cache. Coleção falsa em memória (sem MongoDB).
+
+
+class _ColecaoUsuarios:
+    def __init__(self):
+        self.documentos = {"u1": {"vem_hash": "u1", "pontuacao": 10}, "u2": {"vem_hash": "u2", "pontuacao": 3}}
+        self.leituras = 0
+        self.durante_leitura = None
+
+    def find_one(self, filtro, projecao=None):
+        self.leituras += 1
+        documento = self.documentos.get(filtro["vem_hash"])
+        documento = dict(documento) if documento else None
+        if self.durante_leitura:
+            self.durante_leitura()
+            self.durante_leitura = None
+        return documento
+
+    def update_one(self, filtro, atualizacao, upsert=False):
+        self.documentos.setdefault(filtro["vem_hash"], {}).update(atualizacao["$set"])
+        return Resultado(modified_count=1)
+
+    def delete_one(self, filtro):
+        self.documentos.pop(filtro["vem_hash"], None)
+        return Resultado(deleted_count=1)
+
+    def find_one_and_update(self, filtro, atualizacao, projection=None, return_document=None, upsert=False):
+        documento = self.documentos[filtro["vem_hash"]]
+        antes = {"pontuacao": documento["pontuacao"], "perguntas_pontuadas": []}
+        if isinstance(atualizacao, list):
+            # Pipeline dos pontos do voto: devolve o documento de antes
+            documento["pontuacao"] += 5
+            return antes
+        documento["pontuacao"] += atualizacao["$inc"]["pontuacao"]
+        return {"pontuacao": documento["pontuacao"]}
+
+
+@pytest.fixture
+def repo(monkeypatch):
+    cache_usuarios = CacheLRU(100)
+    canal = CanalInvalidacao()
+    canal.assinar("usuarios", cache_usuarios.invalidar)
+    monkeypatch.setattr(usuario_repo, "_cache", cache_usuarios)
+    monkeypatch.setattr(cache, "_canal", canal)
+    repo = UsuarioRepository.__new__(UsuarioRepository)
+    repo.collection = _ColecaoUsuarios()
+    return repo
+
+
+ESCRITAS = {
+    "save": lambda repo: repo.save(Usuario(vem_hash="u1", pontuacao=50)),
+    "delete": lambda repo: repo.delete("u1"),
+    "set_points": lambda repo: repo.set_points("u1", 50),
+    "update": lambda repo: repo.update("u1", {"nome": "Ana"}),
+    "update_timestamp": lambda repo: repo.update_timestamp("u1"),
+    "update_partial": lambda repo: repo.update_partial("u1", {"nome": "Ana"}),
+    "increment_points": lambda repo: repo.increment_points("u1", 5),
+    "award_vote_points": lambda repo: repo.award_vote_points("u1", "p1", 5),
+}
+
+
+def test_leitura_repetida_vem_do_cache(repo):
+    assert repo.get_by_vem_hash("u1")["pontuacao"] == 10
+    assert repo.get_by_vem_hash("u1")["pontuacao"] == 10
+    assert repo.collection.leituras == 1
+
+
+@pytest.mark.parametrize("escrita", ESCRITAS.values(), ids=ESCRITAS.keys())
+def test_toda_escrita_invalida_o_usuario(repo, escrita):
+    repo.get_by_vem_hash("u1")
+    repo.get_by_vem_hash("u2")
+    escrita(repo)
+    assert usuario_repo._cache.obter("u1") is None
+    # Só o hash escrito sai do cache
+    assert usuario_repo._cache.obter("u2") is not None
+
+    # A próxima leitura vai ao banco e vê o valor novo
+    leituras = repo.collection.leituras
+    assert repo.get_by_vem_hash("u1") == repo.collection.documentos.get("u1")
+    assert repo.collection.leituras == leituras + 1
+
+
+def test_leitura_que_cruzou_uma_escrita_nao_fica_no_cache(repo):
+    # A escrita acontece depois de a leitura buscar o documento e antes de guardá-lo
+    repo.collection.durante_leitura = lambda: repo.set_points("u1", 99)
+    assert repo.get_by_vem_hash("u1")["pontuacao"] == 10
+    assert usuario_repo._cache.obter("u1") is None
+    assert repo.get_by_vem_hash("u1")["pontuacao"] == 99
+
+
+def test_voto_repetido_nao_invalida(repo):
+    repo.collection.find_one_and_update = lambda *args, **kwargs: {"pontuacao": 10, "perguntas_pontuadas": ["p1"]}
+    repo.get_by_vem_hash("u1")
+    assert repo.award_vote_points("u1", "p1", 5) == {"pontuacao": 10, "concedido": False}
+    assert usuario_repo._cache.obter("u1") is not None
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-v"]))
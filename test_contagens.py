@@ -0,0 +1,152 @@
+import pytest
+from pymongo.errors import BulkWriteError
+
+from conftest import ColecaoContadores, Cursor, Resultado
+
+from core.repositories.interacao_repo import (
+    InteracaoRepository,
+    _calcular_score,
+    _chave_pergunta,
+    _operacoes_contagem,
+    _status_por_operacao,
+)
+from models.interacao import Interacao
+
+# Contadores pré-agregados (contagens_perguntas / contagens_totens): o delta de cada voto
+# e o compare-and-set do save_many, sem MongoDB (coleções falsas em memória).
+
+
+class _ColecaoVotos:
+    """
+    Guarda os votos por (vem_hash, pergunta_id, totem_id). `interferir` é chamado entre a
+    leitura e o bulk_write para simular outra escrita concorrente.
+    """
+    def __init__(self, votos=None, interferir=None):
+        self.votos = dict(votos or {})
+        self.interferir = interferir
+        self.escritas = 0
+
+    def find(self, filtro, projecao):
+        documentos = [
+            {"vem_hash": v, "pergunta_id": p, "totem_id": t, "resposta": resposta}
+            for (v, p, t), resposta in self.votos.items()
+        ]
+        return Cursor(documentos)
+
+    def bulk_write(self, operacoes, ordered):
+        if self.interferir:
+            self.interferir(self)
+            self.interferir = None
+        self.escritas += 1
+        inseridos, erros = {}, []
+        for indice, operacao in enumerate(operacoes):
+            filtro = operacao._filter
+            chave = (filtro["vem_hash"], filtro["pergunta_id"], filtro["totem_id"])
+            gravada = self.votos.get(chave)
+            esperada = filtro["resposta"]
+            if esperada == {"$exists": False}:
+                casou = gravada is None
+            else:
+                casou = gravada == esperada
+            if not casou:
+                # O upsert tentaria inserir outro voto com a mesma chave
+                erros.append({"index": indice, "code": 11000, "errmsg": "E11000 duplicate key"})
+                continue
+            if gravada is None:
+                inseridos[indice] = indice
+            self.votos[chave] = operacao._doc["$set"]["resposta"]
+        if erros:
+            raise BulkWriteError({"writeErrors": erros, "upserted": [{"index": i} for i in inseridos]})
+        return Resultado(inseridos)
+
+
+def _repo(votos=None, interferir=None):
+    repo = InteracaoRepository.__new__(InteracaoRepository)
+    repo.collection = _ColecaoVotos(votos, interferir)
+    repo.contagens = ColecaoContadores()
+    repo.contagens_totens = ColecaoContadores()
+    return repo
+
+
+def _contador(repo, pergunta_id):
+    return repo.contagens.contadores.get((("pergunta_id", pergunta_id),), {"sim": 0, "nao": 0})
+
+
+def _incrementos(operacoes):
+    return {tuple(op._filter.items()): op._doc["$inc"] for op in operacoes}
+
+
+def test_voto_novo_soma_um():
+    mudancas = [(Interacao("u1", "p1", "t1", "sim"), None)]
+    assert _incrementos(_operacoes_contagem(mudancas, _chave_pergunta)) == {(("pergunta_id", "p1"),): {"sim": 1}}
+
+
+def test_troca_de_resposta_move_o_voto():
+    mudancas = [(Interacao("u1", "p1", "t1", "sim"), "nao")]
+    assert _incrementos(_operacoes_contagem(mudancas, _chave_pergunta)) == {(("pergunta_id", "p1"),): {"sim": 1, "nao": -1}}
+
+
+def test_reenvio_da_mesma_resposta_nao_gera_operacao():
+    mudancas = [(Interacao("u1", "p1", "t1", "sim"), "sim")]
+    assert _operacoes_contagem(mudancas, _chave_pergunta) == []
+
+
+def test_deltas_que_se_anulam_nao_geram_operacao():
+    mudancas = [(Interacao("u1", "p1", "t1", "sim"), "nao"), (Interacao("u2", "p1", "t1", "nao"), "sim")]
+    assert _operacoes_contagem(mudancas, _chave_pergunta) == []
+
+
+def test_chave_duplicada_vira_conflito():
+    detalhes = {"upserted": [{"index": 1}], "writeErrors": [
+        {"index": 0, "code": 11000, "errmsg": "E11000"},
+        {"index": 2, "code": 121, "errmsg": "validação"},
+    ]}
+    status = _status_por_operacao(3, detalhes)
+    assert status[0]["conflito"] is True
+    assert status[1] == {"status": "inserida"}
+    assert status[2]["status"] == "erro" and status[2]["conflito"] is False
+
+
+def test_save_many_conta_votos_novos_e_trocas():
+    repo = _repo({("u1", "p1", "t1"): "nao"})
+    status = repo.save_many([Interacao("u1", "p1", "t1", "sim"), Interacao("u2", "p1", "t1", "sim")])
+    assert [item["status"] for item in status] == ["atualizada", "inserida"]
+    assert _contador(repo, "p1") == {"sim": 2, "nao": -1}
+
+
+def test_save_many_rele_o_voto_alterado_por_outra_escrita():
+    def outro_processo(colecao):
+        # Entre a leitura e o bulk_write, outro processo troca o voto para "sim"
+        colecao.votos[("u1", "p1", "t1")] = "sim"
+
+    repo = _repo({("u1", "p1", "t1"): "nao"}, interferir=outro_processo)
+    status = repo.save_many([Interacao("u1", "p1", "t1", "sim")])
+    assert status == [{"status": "atualizada"}]
+    assert repo.collection.escritas == 2
+    # A resposta relida já era "sim": nenhum delta (antes, o "nao" lido somaria +1/-1 a mais)
+    assert _contador(repo, "p1") == {"sim": 0, "nao": 0}
+
+
+def test_save_many_desiste_depois_das_tentativas():
+    class _SempreMuda(_ColecaoVotos):
+        def bulk_write(self, operacoes, ordered):
+            # Outro processo troca o voto antes de toda escrita
+            chave = ("u1", "p1", "t1")
+            self.votos[chave] = "sim" if self.votos[chave] == "nao" else "nao"
+            return super().bulk_write(operacoes, ordered)
+
+    repo = _repo()
+    repo.collection = _SempreMuda({("u1", "p1", "t1"): "nao"})
+    status = repo.save_many([Interacao("u1", "p1", "t1", "sim")])
+    assert status[0]["status"] == "erro"
+    assert "tente novamente" in status[0]["erro"]
+    assert repo.contagens.contadores == {}
+
+
+def test_score_sem_votos_nao_divide_por_zero():
+    assert _calcular_score(None) == {"sim": 0, "nao": 0}
+    assert _calcular_score({"sim": 1, "nao": 2}) == {"sim": 33.33, "nao": 66.67}
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-v"]))
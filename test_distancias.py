@@ -0,0 +1,73 @@
+import math
+import random
+
+import numpy as np
+import pytest
+
+from core.distancias import Coordenadas
+from models.servico import RAIO_TERRA_KM, distancia_haversine
+
+# Haversine vetorizado (core.distancias): as distâncias arredondadas saem idênticas às de
+# distancia_haversine, inclusive nos empates de arredondamento (x,xx5), onde o valor é
+# refeito no cálculo escalar.
+
+
+def _pontos(quantidade, semente=7):
+    gerador = random.Random(semente)
+    # Metade perto de Recife (distâncias curtas), metade espalhada pelo globo
+    perto = [(-8.05 + gerador.uniform(-0.5, 0.5), -34.9 + gerador.uniform(-0.5, 0.5)) for _ in range(quantidade // 2)]
+    longe = [(gerador.uniform(-89, 89), gerador.uniform(-179, 179)) for _ in range(quantidade - quantidade // 2)]
+    return perto + longe
+
+
+def _escalar(pontos, latitude, longitude):
+    return [distancia_haversine(lat, lon, latitude, longitude) for lat, lon in pontos]
+
+
+def test_distancias_identicas_ao_calculo_escalar():
+    pontos = _pontos(5000)
+    coordenadas = Coordenadas([p[0] for p in pontos], [p[1] for p in pontos])
+    for latitude, longitude in [(-8.05, -34.9), (-8.31, -35.02), (40.7, -74.0)]:
+        distancias = coordenadas.distancias_km(latitude, longitude)
+        assert coordenadas.arredondar(distancias, range(len(pontos)), latitude, longitude) == _escalar(pontos, latitude, longitude)
+
+
+def test_matriz_identica_ao_calculo_escalar():
+    pontos, origens = _pontos(500), _pontos(20, semente=11)
+    coordenadas = Coordenadas([p[0] for p in pontos], [p[1] for p in pontos])
+    matriz = coordenadas.matriz_km(Coordenadas([o[0] for o in origens], [o[1] for o in origens]))
+    for linha, (latitude, longitude) in zip(matriz, origens):
+        assert coordenadas.arredondar(linha, range(len(pontos)), latitude, longitude) == _escalar(pontos, latitude, longitude)
+
+
+def test_empates_de_arredondamento_batem_com_o_escalar():
+    # Pontos no mesmo meridiano a x,xx5 km da origem: o último bit decide o arredondamento
+    for latitude in (-8.05, 0.0, 45.3):
+        pontos = [
+            (latitude + math.degrees((centesimos / 100 + 0.005) / RAIO_TERRA_KM), -34.9)
+            for centesimos in range(0, 3000, 7)
+        ]
+        coordenadas = Coordenadas([p[0] for p in pontos], [p[1] for p in pontos])
+        distancias = coordenadas.distancias_km(latitude, -34.9)
+        fracao = distancias * 100 - np.floor(distancias * 100)
+        assert np.all(np.abs(fracao - 0.5) < 1e-6)
+        assert coordenadas.arredondar(distancias, range(len(pontos)), latitude, -34.9) == _escalar(pontos, latitude, -34.9)
+
+
+def test_so_os_valores_perto_do_empate_sao_refeitos_no_escalar():
+    coordenadas = Coordenadas([-8.06, -8.07], [-34.88, -34.88])
+    real = distancia_haversine(-8.07, -34.88, -8.05, -34.88)
+    # Valores forjados: o primeiro longe de um empate (usa o vetorizado), o segundo em cima
+    # de um (refeito a partir das coordenadas)
+    forjadas = np.array([1.2341, 9.875])
+    assert coordenadas.arredondar(forjadas, [0, 1], -8.05, -34.88) == [1.23, real]
+
+
+def test_raio_compara_o_valor_arredondado():
+    coordenadas = Coordenadas([-8.05 + math.degrees(1.004 / RAIO_TERRA_KM), -8.05 + math.degrees(1.006 / RAIO_TERRA_KM)], [-34.9, -34.9])
+    # 1,004 km arredonda para 1,00 (entra no raio de 1 km); 1,006 vira 1,01 (fica de fora)
+    assert [indice for _, indice in coordenadas.no_raio(-8.05, -34.9, 1)] == [0]
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,84 @@
+from datetime import date
+
+import pytest
+
+from core.cache import CacheTTL
+from core.repositories.usuario_repo import FAIXAS_IDADE, _pipeline_estatisticas
+from core.services.usuario_service import UsuarioService, _formatar_estatisticas
+
+# GET /usuarios/estatisticas: resultado do $facet (uma única agregação) convertido na
+# resposta da rota, e o cache com TTL na frente da agregação. Sem MongoDB.
+
+
+def _resultado_facet():
+    return {
+        "geral": [{"_id": None, "total_usuarios": 8, "cadastros_completos": 6, "pontuacao_total": 130, "pontuacao_maxima": 50}],
+        "idade": [{"_id": None, "total_usuarios_com_idade": 6, "idade_media": 31.6666, "idade_minima": 14, "idade_maxima": 72}],
+        "histograma_idade": [{"_id": 13, "total": 1}, {"_id": 25, "total": 3}, {"_id": "ultima", "total": 2}],
+    }
+
+
+def test_contagens_e_pontuacao():
+    estatisticas = _formatar_estatisticas(_resultado_facet())
+    assert estatisticas["total_usuarios"] == 8
+    assert estatisticas["cadastros_incompletos"] == 2
+    assert estatisticas["percentual_cadastros_completos"] == 75.0
+    assert estatisticas["pontuacao_media"] == 16.25
+    assert estatisticas["pontuacao_maxima"] == 50
+
+
+def test_histograma_tem_todas_as_faixas():
+    idade = _formatar_estatisticas(_resultado_facet())["estatisticas_idade"]
+    assert idade["idade_media"] == 31.67
+    assert idade["histograma"] == [
+        {"faixa": "13-17", "total": 1},
+        {"faixa": "18-24", "total": 0},
+        {"faixa": "25-34", "total": 3},
+        {"faixa": "35-44", "total": 0},
+        {"faixa": "45-59", "total": 0},
+        {"faixa": "60+", "total": 2},
+    ]
+
+
+def test_colecao_vazia_nao_divide_por_zero():
+    estatisticas = _formatar_estatisticas({"geral": [], "idade": [], "histograma_idade": []})
+    assert estatisticas["percentual_cadastros_completos"] == 0
+    assert estatisticas["pontuacao_media"] == 0
+    assert estatisticas["pontuacao_maxima"] == 0
+    idade = estatisticas["estatisticas_idade"]
+    assert idade["idade_media"] is None
+    assert [faixa["total"] for faixa in idade["histograma"]] == [0] * len(FAIXAS_IDADE)
+
+
+def test_uma_unica_agregacao_com_as_tres_facetas():
+    pipeline = _pipeline_estatisticas(date(2025, 3, 10))
+    assert len(pipeline) == 2
+    assert set(pipeline[1]["$facet"]) == {"geral", "idade", "histograma_idade"}
+    bucket = pipeline[1]["$facet"]["histograma_idade"][1]["$bucket"]
+    assert bucket["boundaries"] == FAIXAS_IDADE
+
+
+def test_cache_evita_agregar_de_novo():
+    class _Repo:
+        chamadas = 0
+
+        def get_statistics(self, hoje):
+            _Repo.chamadas += 1
+            return _resultado_facet()
+
+    service = UsuarioService.__new__(UsuarioService)
+    service.repo = _Repo()
+    service.cache_estatisticas = CacheTTL(60)
+    primeira = service.obter_estatisticas_gerais()
+    assert service.obter_estatisticas_idade() == primeira["estatisticas_idade"]
+    assert _Repo.chamadas == 1
+
+    # TTL 0 desativa o cache: toda chamada agrega
+    service.cache_estatisticas = CacheTTL(0)
+    service.obter_estatisticas_gerais()
+    service.obter_estatisticas_gerais()
+    assert _Repo.chamadas == 3
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-v"]))
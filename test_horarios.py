@@ -0,0 +1,91 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from core.horarios import MINUTOS_DIA, MINUTOS_SEMANA, aberto, filtro_aberto, intervalos_semanais, minuto_da_semana
+
+# Conversão do horario_funcionamento (texto livre) nos intervalos semanais do filtro
+# "aberto agora". Minutos contados a partir de segunda 00:00.
+
+SEG, TER, SAB, DOM = 0, 1, 5, 6
+
+
+def _minuto(dia, hora, minuto=0):
+    return dia * MINUTOS_DIA + hora * 60 + minuto
+
+
+def test_24_horas_cobre_a_semana_inteira():
+    assert intervalos_semanais("24 horas") == [{"inicio": 0, "fim": MINUTOS_SEMANA}]
+
+
+def test_faixa_de_dias_uteis():
+    horarios = intervalos_semanais("Seg-Sex: 8h-17h")
+    assert len(horarios) == 5
+    assert horarios[0] == {"inicio": _minuto(SEG, 8), "fim": _minuto(SEG, 17)}
+    assert not aberto(horarios, _minuto(SAB, 10))
+
+
+def test_turnos_e_dias_diferentes_no_mesmo_texto():
+    horarios = intervalos_semanais("Segunda a Sexta: 8h às 12h, 14h às 18h; Sáb: 8h-12h")
+    assert aberto(horarios, _minuto(TER, 9))
+    assert not aberto(horarios, _minuto(TER, 13))
+    assert aberto(horarios, _minuto(TER, 15))
+    assert aberto(horarios, _minuto(SAB, 11, 59))
+    assert not aberto(horarios, _minuto(SAB, 12))
+    assert not aberto(horarios, _minuto(DOM, 10))
+
+
+def test_minutos_e_sem_dias_vale_para_todos():
+    horarios = intervalos_semanais("07:30-19:00")
+    assert len(horarios) == 7
+    assert horarios[0] == {"inicio": _minuto(SEG, 7, 30), "fim": _minuto(SEG, 19)}
+
+
+def test_horario_que_passa_da_meia_noite():
+    horarios = intervalos_semanais("Todos os dias 18h-2h")
+    assert aberto(horarios, _minuto(TER, 1))
+    assert aberto(horarios, _minuto(TER, 23))
+    assert not aberto(horarios, _minuto(TER, 2))
+
+
+def test_domingo_a_noite_continua_na_segunda():
+    assert intervalos_semanais("Dom 22h-2h") == [
+        {"inicio": 0, "fim": _minuto(SEG, 2)},
+        {"inicio": _minuto(DOM, 22), "fim": MINUTOS_SEMANA},
+    ]
+
+
+def test_dias_fechados():
+    horarios = intervalos_semanais("Seg-Sex 8h-12h; Dom: fechado")
+    assert len(horarios) == 5
+    assert intervalos_semanais("Dom: fechado") == []
+
+
+def test_texto_nao_reconhecido_fica_sem_intervalos():
+    for texto in ("Sob agendamento", "Seg-Sex 25h-26h", "", None):
+        assert intervalos_semanais(texto) is None
+    assert not aberto(None, _minuto(SEG, 10))
+
+
+def test_intervalos_ordenados_e_sem_sobreposicao():
+    horarios = intervalos_semanais("Seg-Sex 8h-12h, 10h-14h")
+    assert horarios[0] == {"inicio": _minuto(SEG, 8), "fim": _minuto(SEG, 14)}
+    inicios = [intervalo["inicio"] for intervalo in horarios]
+    assert inicios == sorted(inicios)
+
+
+def test_minuto_da_semana_no_fuso_dos_servicos():
+    # Segunda 10:00 sem fuso já é local; 13:00 UTC é 10:00 em Recife (UTC-3)
+    assert minuto_da_semana(datetime(2025, 3, 10, 10, 0)) == _minuto(SEG, 10)
+    assert minuto_da_semana(datetime(2025, 3, 10, 13, 0, tzinfo=timezone.utc)) == _minuto(SEG, 10)
+    # 02:00 UTC de terça ainda é segunda 23:00 em Recife
+    assert minuto_da_semana(datetime(2025, 3, 11, 2, 0, tzinfo=timezone.utc)) == _minuto(SEG, 23)
+
+
+def test_filtro_do_banco_usa_a_mesma_regra():
+    filtro = filtro_aberto(600)
+    assert filtro == {"horarios": {"$elemMatch": {"inicio": {"$lte": 600}, "fim": {"$gt": 600}}}}
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,281 @@
+import io
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+
+from conftest import Resultado
+from core import config
+from core.importacao import em_lotes, ler_linhas
+from core.repositories.importacao_repo import ImportacaoRepository
+from core.services import importacao_service
+from core.services.importacao_service import ImportacaoService, _agendar, _importar, encerrar_importacoes
+
+# Importação de serviços (POST /servicos/importar-csv): leitura em lotes, erros gravados
+# lote a lote em "importacoes_erros" e resposta do aguardar=true com os erros limitados.
+# Repositório e ServicoService falsos em memória (sem MongoDB).
+
+
+class _RepoImportacao:
+    def __init__(self):
+        self.jobs = {}
+        self.erros = []
+        self.lotes = []
+        self.cancelar_no_lote = None
+        self.desativados = None
+
+    def criar(self, job):
+        self.jobs[job["job_id"]] = dict(job)
+
+    def get_by_id(self, job_id):
+        return dict(self.jobs[job_id])
+
+    def registrar_lote(self, job_id, incrementos, erros, linhas_por_segundo):
+        self.lotes.append(len(erros))
+        self.erros.extend(erros)
+        for campo, valor in incrementos.items():
+            self.jobs.setdefault(job_id, {}).setdefault(campo, 0)
+            self.jobs[job_id][campo] += valor
+        return len(self.lotes) == self.cancelar_no_lote
+
+    def registrar_desativados(self, job_id, desativados):
+        self.desativados = desativados
+
+    def listar_erros(self, job_id, limite=None, cursor=None):
+        erros = sorted(self.erros, key=lambda erro: erro["linha"])
+        return {"itens": erros[:limite], "proximo_cursor": "x" if len(erros) > limite else None}
+
+
+class _ServicosFalsos:
+    """
+    Cada lote tem 10 linhas: 8 gravadas e as demais com erro (`com_erro` por lote).
+    Os servico_id vistos são anotados.
+    """
+    lotes = 3
+    com_erro = 2
+    desativar_chamado = False
+
+    def importar_em_lotes(self, arquivo, nome_arquivo, vistos=None):
+        for lote in range(self.lotes):
+            if vistos is not None:
+                vistos.update(f"s{lote}_{i}" for i in range(8))
+            yield {
+                "total_linhas": 8 + self.com_erro, "inseridos": 8, "atualizados": 0, "inalterados": 0,
+                "erros": [{"linha": lote * 10 + i, "nome": "N/A", "erro": "inválida"} for i in range(2, 2 + self.com_erro)],
+            }
+
+    def desativar_ausentes(self, vistos):
+        _ServicosFalsos.desativar_chamado = True
+        return len(vistos)
+
+
+def _csv(validas, invalidas):
+    linhas = ["nome,tipo,latitude,longitude"]
+    linhas += [f"S{i},Saúde,-8.05,-34.88" for i in range(validas)]
+    linhas += [f"R{i},Saúde,abc,1" for i in range(invalidas)]
+    return io.BytesIO("\n".join(linhas).encode())
+
+
+def test_leitura_em_lotes_do_tamanho_configurado():
+    lotes = list(em_lotes(ler_linhas(_csv(25, 0), "a.csv"), 10))
+    assert [len(lote) for lote in lotes] == [10, 10, 5]
+    # Numeração pela linha do arquivo (a 1 é o cabeçalho)
+    assert lotes[0][0][0] == 2
+
+
+def test_cabecalho_sem_colunas_obrigatorias():
+    try:
+        ler_linhas(io.BytesIO(b"nome,tipo\nX,Y"), "a.csv")
+    except ValueError as e:
+        assert "latitude" in str(e)
+    else:
+        raise AssertionError("cabeçalho incompleto deveria gerar ValueError")
+
+
+def test_erros_sao_gravados_a_cada_lote(monkeypatch):
+    repo = _RepoImportacao()
+    monkeypatch.setattr(importacao_service, "ServicoService", _ServicosFalsos)
+    assert _importar(repo, "j1", None, "a.csv", False) == "concluida"
+    assert repo.lotes == [2, 2, 2]
+    assert repo.jobs["j1"]["com_erros"] == 6
+    assert repo.jobs["j1"]["gravadas"] == 24
+
+
+def test_cancelamento_para_entre_lotes_sem_desativar(monkeypatch):
+    monkeypatch.setattr(_ServicosFalsos, "desativar_chamado", False)
+    repo = _RepoImportacao()
+    repo.cancelar_no_lote = 2
+    monkeypatch.setattr(importacao_service, "ServicoService", _ServicosFalsos)
+    assert _importar(repo, "j1", None, "a.csv", True) == "cancelada"
+    assert repo.lotes == [2, 2]
+    assert not _ServicosFalsos.desativar_chamado
+    assert repo.desativados is None
+
+
+def test_desativa_ausentes_so_no_fim(monkeypatch):
+    repo = _RepoImportacao()
+    monkeypatch.setattr(importacao_service, "ServicoService", _ServicosFalsos)
+    monkeypatch.setattr(_ServicosFalsos, "com_erro", 0)
+    assert _importar(repo, "j1", None, "a.csv", True) == "concluida"
+    assert repo.desativados == 24
+
+
+def test_linha_com_erro_impede_a_desativacao(monkeypatch):
+    # A linha rejeitada pode ser de um serviço existente, que não entra em `vistos`
+    monkeypatch.setattr(_ServicosFalsos, "desativar_chamado", False)
+    repo = _RepoImportacao()
+    monkeypatch.setattr(importacao_service, "ServicoService", _ServicosFalsos)
+    assert _importar(repo, "j1", None, "a.csv", True) == "concluida"
+    assert repo.jobs["j1"]["com_erros"] == 6
+    assert not _ServicosFalsos.desativar_chamado
+    assert repo.desativados is None
+
+
+def test_aguardar_devolve_so_os_primeiros_erros(monkeypatch):
+    repo = _RepoImportacao()
+
+    def executar(job_id, arquivo, nome_arquivo, desativar_ausentes):
+        repo.jobs[job_id].update({"status": "concluida", "linhas_lidas": 300, "gravadas": 50, "inseridos": 50, "com_erros": 250})
+        repo.erros = [{"linha": linha, "nome": "N/A", "erro": "inválida"} for linha in range(300, 50, -1)]
+
+    service = ImportacaoService.__new__(ImportacaoService)
+    service.repo = repo
+    monkeypatch.setattr(importacao_service, "_executar_agora", executar)
+    monkeypatch.setattr(config, "IMPORTACAO_ERROS_NO_RESUMO", 100)
+    resumo = service.importar_agora(_csv(1, 0), "a.csv")
+    assert resumo["com_erros"] == 250
+    assert len(resumo["detalhes_erros"]) == 100
+    assert resumo["detalhes_erros"][0]["linha"] == 51
+    assert resumo["erros"] == f"/servicos/importacoes/{resumo['job_id']}/erros"
+    assert resumo["taxa_sucesso"] == round(50 / 300 * 100, 2)
+
+
+def test_aguardar_espera_a_vez_no_pool_de_importacoes(monkeypatch):
+    repo = _RepoImportacao()
+    executor = ThreadPoolExecutor(max_workers=1)
+    liberar, executou = threading.Event(), threading.Event()
+
+    def executar(job_id, arquivo, nome_arquivo, desativar_ausentes):
+        executou.set()
+        repo.jobs[job_id].update({"status": "concluida", "linhas_lidas": 1, "gravadas": 1, "inseridos": 1})
+
+    service = ImportacaoService.__new__(ImportacaoService)
+    service.repo = repo
+    monkeypatch.setattr(importacao_service, "_executor", executor)
+    monkeypatch.setattr(importacao_service, "_agendados", {})
+    monkeypatch.setattr(importacao_service, "_executar_agora", executar)
+    # Outra importação ocupa a única vaga (IMPORTACAO_MAX_CONCORRENTES=1)
+    executor.submit(liberar.wait, 5)
+    resultado = {}
+    requisicao = threading.Thread(target=lambda: resultado.update(service.importar_agora(_csv(1, 0), "a.csv")))
+    requisicao.start()
+    assert not executou.wait(0.2)
+    liberar.set()
+    requisicao.join(5)
+    executor.shutdown()
+    assert resultado["status"] == "concluida"
+
+
+def test_inicializacao_interrompe_jobs_deixados_por_uma_queda(monkeypatch):
+    class _Colecao:
+        def __init__(self, jobs):
+            self.jobs = jobs
+
+        def update_many(self, filtro, atualizacao):
+            pendentes = [job for job in self.jobs if job["status"] not in filtro["status"]["$nin"]]
+            for job in pendentes:
+                job.update(atualizacao["$set"])
+            return Resultado(modified_count=len(pendentes))
+
+    jobs = [{"status": status} for status in ("na_fila", "executando", "concluida", "cancelada")]
+    repo = ImportacaoRepository.__new__(ImportacaoRepository)
+    repo.collection = _Colecao(jobs)
+    monkeypatch.setattr(importacao_service, "ImportacaoRepository", lambda: repo)
+    assert importacao_service.recuperar_importacoes() == 2
+    assert [job["status"] for job in jobs] == ["interrompida", "interrompida", "concluida", "cancelada"]
+
+
+def test_aguardar_valida_o_arquivo_antes_de_criar_o_job():
+    service = ImportacaoService.__new__(ImportacaoService)
+    service.repo = _RepoImportacao()
+    try:
+        service.importar_agora(io.BytesIO(b"x"), "a.txt")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("formato inválido deveria gerar ValueError")
+    assert service.repo.jobs == {}
+
+
+
+class _RepoCompartilhado(_RepoImportacao):
+    """
+    Mesmo estado para todas as instâncias (os jobs criam o próprio repositório).
+    """
+    status = {}
+
+    def iniciar(self, job_id):
+        self.status[job_id] = "executando"
+        return True
+
+    def registrar_lote(self, job_id, incrementos, erros, linhas_por_segundo):
+        return False
+
+    def finalizar(self, job_id, status, erro=None):
+        if self.status.get(job_id) in (None, "executando"):
+            self.status[job_id] = status
+
+
+class _ServicosLentos:
+    """
+    O primeiro lote só sai quando `liberar` é sinalizado (job em execução no shutdown).
+    """
+    iniciou = threading.Event()
+    liberar = threading.Event()
+
+    def importar_em_lotes(self, arquivo, nome_arquivo, vistos=None):
+        for _ in range(3):
+            self.iniciou.set()
+            self.liberar.wait(5)
+            yield {"total_linhas": 1, "inseridos": 1, "atualizados": 0, "inalterados": 0, "erros": []}
+
+
+def _arquivo_temporario():
+    descritor, caminho = tempfile.mkstemp(prefix="importacao_teste_", suffix=".csv")
+    os.close(descritor)
+    return caminho
+
+
+def test_shutdown_espera_o_job_em_execucao_e_limpa_os_da_fila(monkeypatch):
+    _RepoCompartilhado.status = {}
+    executor = ThreadPoolExecutor(max_workers=1)
+    em_execucao, na_fila = _arquivo_temporario(), _arquivo_temporario()
+    monkeypatch.setattr(importacao_service, "_executor", executor)
+    monkeypatch.setattr(importacao_service, "_agendados", {})
+    monkeypatch.setattr(importacao_service, "_encerrando", threading.Event())
+    monkeypatch.setattr(importacao_service, "ImportacaoRepository", _RepoCompartilhado)
+    monkeypatch.setattr(importacao_service, "ServicoService", _ServicosLentos)
+    _agendar("j1", em_execucao, "a.csv", False)
+    _agendar("j2", na_fila, "b.csv", False)
+    assert _ServicosLentos.iniciou.wait(5)
+
+    encerramento = threading.Thread(target=encerrar_importacoes)
+    encerramento.start()
+    encerramento.join(0.2)
+    # O job em execução ainda não terminou o lote: ninguém marcou o status por ele
+    assert encerramento.is_alive()
+    assert _RepoCompartilhado.status["j1"] == "executando"
+
+    _ServicosLentos.liberar.set()
+    encerramento.join(5)
+    assert not encerramento.is_alive()
+
+    # O próprio job grava "interrompida" ao fim do lote; o da fila é marcado pelo shutdown
+    assert _RepoCompartilhado.status == {"j1": "interrompida", "j2": "interrompida"}
+    assert not os.path.exists(em_execucao)
+    assert not os.path.exists(na_fila)
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,109 @@
+import random
+
+import pytest
+
+from core.indice_espacial import IndiceEspacial
+from models.servico import distancia_haversine
+
+# Índice espacial em memória (grade de células): k mais próximos e busca no raio conferidos
+# contra a força bruta, e o critério de parada dos anéis (não visita células que não podem
+# ter serviço mais perto que os k já encontrados).
+
+
+def _servicos(quantidade, centro, espalhamento, semente, tipos=("Saúde", "Educação")):
+    gerador = random.Random(semente)
+    return [
+        {
+            "servico_id": f"s{semente}_{i}",
+            "nome": f"Serviço {i}",
+            "tipo": gerador.choice(tipos),
+            "latitude": centro[0] + gerador.uniform(-espalhamento, espalhamento),
+            "longitude": centro[1] + gerador.uniform(-espalhamento, espalhamento),
+            "ativo": True,
+        }
+        for i in range(quantidade)
+    ]
+
+
+def _forca_bruta(servicos, latitude, longitude, tipo=None):
+    return sorted(
+        distancia_haversine(servico["latitude"], servico["longitude"], latitude, longitude)
+        for servico in servicos
+        if servico["ativo"] and (tipo is None or servico["tipo"] == tipo)
+    )
+
+
+def _indice(servicos):
+    indice = IndiceEspacial()
+    indice.carregar(servicos)
+    return indice
+
+
+@pytest.mark.parametrize("centro", [(-8.05, -34.9), (0.0, 179.95), (69.5, 18.9)])
+def test_mais_proximos_igual_a_forca_bruta(centro):
+    servicos = _servicos(800, centro, 0.3, semente=1) + _servicos(20, (centro[0] + 3, centro[1] - 2), 1.0, semente=2)
+    indice = _indice(servicos)
+    gerador = random.Random(3)
+    for _ in range(40):
+        latitude = centro[0] + gerador.uniform(-1, 1)
+        longitude = centro[1] + gerador.uniform(-1, 1)
+        esperado = _forca_bruta(servicos, latitude, longitude)
+        for k in (1, 5, 37):
+            assert [distancia for distancia, _ in indice.mais_proximos(latitude, longitude, k)] == esperado[:k]
+
+
+def test_mais_proximos_com_filtro_de_tipo():
+    servicos = _servicos(500, (-8.05, -34.9), 0.2, semente=4, tipos=("Saúde",) * 9 + ("CRAS",))
+    indice = _indice(servicos)
+    resultado = indice.mais_proximos(-8.05, -34.9, 10, tipo="CRAS")
+    assert all(servico["tipo"] == "CRAS" for _, servico in resultado)
+    assert [distancia for distancia, _ in resultado] == _forca_bruta(servicos, -8.05, -34.9, "CRAS")[:10]
+
+
+def test_mais_proximos_para_de_expandir_os_aneis(monkeypatch):
+    # Um serviço em cada célula perto do ponto e um bem distante: os 3 mais próximos saem
+    # dos primeiros anéis, e a célula distante nunca é lida
+    servicos = [
+        {"servico_id": f"p{i}{j}", "tipo": "Saúde", "latitude": -8.045 + i * 0.01, "longitude": -34.895 + j * 0.01, "ativo": True}
+        for i in range(-3, 4) for j in range(-3, 4)
+    ]
+    distante = {"servico_id": "longe", "tipo": "Saúde", "latitude": -7.0, "longitude": -34.9, "ativo": True}
+    indice = _indice(servicos + [distante])
+    visitadas = []
+    reunir = indice._reunir
+    monkeypatch.setattr(indice, "_reunir", lambda chaves: visitadas.extend(chaves) or reunir(chaves))
+
+    resultado = indice.mais_proximos(-8.045, -34.895, 3)
+    assert [distancia for distancia, _ in resultado] == _forca_bruta(servicos + [distante], -8.045, -34.895)[:3]
+    assert indice.servicos["longe"] not in visitadas
+    assert len(visitadas) < len(indice.celulas)
+
+
+def test_k_maior_que_o_total_devolve_todos():
+    servicos = _servicos(30, (-8.05, -34.9), 2.0, semente=5)
+    assert len(_indice(servicos).mais_proximos(-8.05, -34.9, 100)) == 30
+
+
+def test_no_raio_igual_a_forca_bruta():
+    servicos = _servicos(1000, (-8.05, -34.9), 0.3, semente=6)
+    indice = _indice(servicos)
+    for raio in (0.5, 3, 25):
+        esperado = [distancia for distancia in _forca_bruta(servicos, -8.1, -34.92) if distancia <= raio]
+        assert [distancia for distancia, _ in indice.no_raio(-8.1, -34.92, raio)] == esperado
+
+
+def test_atualizacoes_mantem_o_indice_coerente():
+    servicos = _servicos(200, (-8.05, -34.9), 0.1, semente=8)
+    indice = _indice(servicos)
+    movido = dict(servicos[0], latitude=-8.5)
+    desativado = dict(servicos[1], ativo=False)
+    indice.atualizar(movido)
+    indice.atualizar(desativado)
+    indice.remover(servicos[2]["servico_id"])
+    atuais = [movido] + servicos[3:]
+    assert [distancia for distancia, _ in indice.mais_proximos(-8.4, -34.9, 5)] == _forca_bruta(atuais, -8.4, -34.9)[:5]
+    assert servicos[1]["servico_id"] not in indice.servicos
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-v"]))
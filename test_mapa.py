@@ -0,0 +1,147 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import ColecaoContadores, Cursor
+from core.repositories.interacao_repo import InteracaoRepository
+from core.services.totem_service import TotemService
+from models.interacao import Interacao
+
+# Contadores por totem/pergunta (contagens_totens) e GET /totens/mapa: cada voto soma no
+# contador do próprio totem, e o mapa junta as coordenadas aos contadores, com `desde`
+# devolvendo só os totens alterados. Coleções falsas em memória (sem MongoDB).
+
+T = datetime(2025, 3, 10, 12, 0)
+
+
+class _ColecaoVotos:
+    def __init__(self):
+        self.votos = {}
+
+    def find_one_and_update(self, filtro, atualizacao, projection, upsert, return_document):
+        chave = (filtro["vem_hash"], filtro["pergunta_id"], filtro["totem_id"])
+        anterior = self.votos.get(chave)
+        self.votos[chave] = atualizacao["$set"]["resposta"]
+        return {"resposta": anterior} if anterior else None
+
+
+class _ColecaoContagensTotens:
+    def __init__(self, documentos):
+        self.documentos = documentos
+
+    def _filtrar(self, filtro):
+        def casa(documento):
+            for campo, condicao in filtro.items():
+                valor = documento.get(campo)
+                if isinstance(condicao, dict):
+                    if "$gte" in condicao and not valor >= condicao["$gte"]:
+                        return False
+                    if "$in" in condicao and valor not in condicao["$in"]:
+                        return False
+                elif valor != condicao:
+                    return False
+            return True
+        return [documento for documento in self.documentos if casa(documento)]
+
+    def distinct(self, campo, filtro):
+        return sorted({documento[campo] for documento in self._filtrar(filtro)})
+
+    def find(self, filtro, projecao):
+        return Cursor(self._filtrar(filtro))
+
+
+class _Totens:
+    def __init__(self, totens):
+        self.totens = totens
+        self.consultas = []
+
+    def get_coordenadas(self, totem_ids=None):
+        self.consultas.append(totem_ids)
+        return [totem for totem in self.totens if totem_ids is None or totem["totem_id"] in totem_ids]
+
+
+def _repo_votos():
+    repo = InteracaoRepository.__new__(InteracaoRepository)
+    repo.collection = _ColecaoVotos()
+    repo.contagens = ColecaoContadores()
+    repo.contagens_totens = ColecaoContadores()
+    return repo
+
+
+def _contador_totem(repo, totem_id, pergunta_id):
+    return repo.contagens_totens.contadores.get((("pergunta_id", pergunta_id), ("totem_id", totem_id)))
+
+
+def _contagem(totem_id, pergunta_id, sim, nao, atualizado_em=T):
+    return {"totem_id": totem_id, "pergunta_id": pergunta_id, "sim": sim, "nao": nao, "atualizado_em": atualizado_em}
+
+
+def _service(contagens, totens):
+    service = TotemService.__new__(TotemService)
+    service.interacao_repo = InteracaoRepository.__new__(InteracaoRepository)
+    service.interacao_repo.contagens_totens = _ColecaoContagensTotens(contagens)
+    service.repo = _Totens(totens)
+    return service
+
+
+def _totem(totem_id):
+    return {"totem_id": totem_id, "latitude": -8.05, "longitude": -34.88}
+
+
+def test_voto_soma_no_contador_do_proprio_totem():
+    repo = _repo_votos()
+    repo.save(Interacao("u1", "p1", "t1", "sim"))
+    repo.save(Interacao("u2", "p1", "t2", "nao"))
+    repo.save(Interacao("u1", "p1", "t1", "nao"))
+    assert _contador_totem(repo, "t1", "p1") == {"sim": 0, "nao": 1}
+    assert _contador_totem(repo, "t2", "p1") == {"sim": 0, "nao": 1}
+    # O contador por pergunta soma os dois totens
+    assert repo.contagens.contadores[(("pergunta_id", "p1"),)] == {"sim": 0, "nao": 2}
+
+
+def test_reenvio_do_mesmo_voto_nao_escreve_nos_contadores():
+    repo = _repo_votos()
+    repo.save(Interacao("u1", "p1", "t1", "sim"))
+    repo.save(Interacao("u1", "p1", "t1", "sim"))
+    assert len(repo.contagens_totens.lotes) == 1
+
+
+def test_mapa_soma_as_perguntas_de_cada_totem():
+    service = _service(
+        [_contagem("t1", "p1", 3, 1), _contagem("t1", "p2", 2, 0), _contagem("t2", "p1", 0, 4)],
+        [_totem("t1"), _totem("t2"), _totem("t3")],
+    )
+    mapa = {item["totem_id"]: item for item in service.obter_mapa_satisfacao()["totens"]}
+    assert (mapa["t1"]["sim"], mapa["t1"]["nao"], mapa["t1"]["total"]) == (5, 1, 6)
+    assert mapa["t1"]["perguntas"]["p2"] == {"sim": 2, "nao": 0, "total": 2}
+    # Totem sem votos aparece zerado
+    assert (mapa["t3"]["total"], mapa["t3"]["perguntas"]) == (0, {})
+    assert service.repo.consultas == [None]
+
+
+def test_mapa_filtrado_por_pergunta():
+    service = _service([_contagem("t1", "p1", 3, 1), _contagem("t1", "p2", 2, 0)], [_totem("t1")])
+    totem = service.obter_mapa_satisfacao(pergunta_id="p2")["totens"][0]
+    assert list(totem["perguntas"]) == ["p2"] and totem["total"] == 2
+
+
+def test_desde_devolve_os_totens_alterados_com_todas_as_perguntas():
+    service = _service(
+        [_contagem("t1", "p1", 3, 1, T - timedelta(hours=1)), _contagem("t1", "p2", 2, 0, T + timedelta(minutes=1)),
+         _contagem("t2", "p1", 0, 4, T - timedelta(hours=1))],
+        [_totem("t1"), _totem("t2")],
+    )
+    mapa = service.obter_mapa_satisfacao(desde=T)
+    assert [item["totem_id"] for item in mapa["totens"]] == ["t1"]
+    assert set(mapa["totens"][0]["perguntas"]) == {"p1", "p2"}
+    assert service.repo.consultas == [{"t1"}]
+
+
+def test_desde_sem_alteracoes_nao_le_os_totens():
+    service = _service([_contagem("t1", "p1", 3, 1, T - timedelta(hours=1))], [_totem("t1")])
+    assert service.obter_mapa_satisfacao(desde=T)["totens"] == []
+    assert service.repo.consultas == []
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-v"]))
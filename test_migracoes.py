@@ -0,0 +1,107 @@
+import pytest
+from pymongo.errors import OperationFailure
+
+from conftest import Cursor, Resultado
+from core.database import MongoConnection
+from core.migracoes import MIGRACOES, executar_migracoes
+from core.repositories.interacao_repo import InteracaoRepository
+
+# Migrações de dados (executar_migracoes): rodam uma vez, na ordem da lista, e cada uma
+# encontra os índices de que depende. O banco falso recusa o $merge sem o índice único
+# das chaves do `on`, como o MongoDB.
+
+
+class _Colecao:
+    def __init__(self, nome):
+        self.nome = nome
+        self.banco = None
+        self.indices = {}
+        self.documentos = []
+
+    def create_indexes(self, indices):
+        for indice in indices:
+            documento = indice.document
+            self.indices[documento["name"]] = (set(documento["key"]), documento.get("unique", False))
+        return [indice.document["name"] for indice in indices]
+
+    def aggregate(self, pipeline, allowDiskUse=False):
+        merge = pipeline[-1].get("$merge")
+        if merge:
+            on = merge["on"]
+            chaves = {on} if isinstance(on, str) else set(on)
+            destino = self.banco[merge["into"]]
+            if (chaves, True) not in destino.indices.values():
+                raise OperationFailure(f"$merge em {merge['into']} sem índice único em {sorted(chaves)}")
+        return Cursor()
+
+    def find(self, filtro=None, projecao=None):
+        return Cursor()
+
+    def find_one(self, filtro=None, projecao=None):
+        return None
+
+    def distinct(self, campo, filtro=None):
+        return []
+
+    def count_documents(self, filtro, **kwargs):
+        return sum(all(documento.get(campo) == valor for campo, valor in filtro.items()) for documento in self.documentos)
+
+    def insert_one(self, documento):
+        self.documentos.append(documento)
+
+    def update_one(self, filtro, atualizacao, upsert=False):
+        return Resultado()
+
+    def update_many(self, filtro, atualizacao):
+        return Resultado()
+
+    def delete_many(self, filtro):
+        return Resultado()
+
+
+class _Banco(dict):
+    """Faz o papel do MongoConnection (atributo `db` e get_collection) e do próprio banco."""
+    def __missing__(self, nome):
+        colecao = self[nome] = _Colecao(nome)
+        colecao.banco = self
+        return colecao
+
+    @property
+    def db(self):
+        return self
+
+    def get_collection(self, nome, assincrono=False):
+        return self[nome]
+
+
+@pytest.fixture
+def banco(monkeypatch):
+    banco = _Banco()
+    monkeypatch.setattr(MongoConnection, "_instance", banco)
+    return banco
+
+
+def test_migracoes_rodam_na_ordem_uma_unica_vez(banco):
+    resultado = executar_migracoes()
+    assert resultado["migracoes_executadas"] == [migracao_id for migracao_id, _ in MIGRACOES]
+    assert [documento["migracao_id"] for documento in banco["migracoes"].documentos] == resultado["migracoes_executadas"]
+    assert all(indice["ok"] for indice in resultado["indices"].values())
+
+    assert executar_migracoes()["migracoes_executadas"] == []
+
+
+def test_migracao_pendente_roda_depois_das_ja_executadas(banco):
+    for migracao_id, _ in MIGRACOES[:3]:
+        banco["migracoes"].insert_one({"migracao_id": migracao_id})
+    assert executar_migracoes()["migracoes_executadas"] == [migracao_id for migracao_id, _ in MIGRACOES[3:]]
+
+
+def test_reconciliacao_sem_os_indices_falha(banco):
+    # Garante que o banco falso pega o que a 0002 fazia antes de criar os dois índices
+    banco["contagens_perguntas"].create_indexes(InteracaoRepository.INDICES_CONTAGENS)
+    with pytest.raises(OperationFailure, match="contagens_totens"):
+        InteracaoRepository().reconciliar_contagens()
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-v"]))
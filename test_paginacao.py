@@ -0,0 +1,104 @@
+import pytest
+from bson import ObjectId
+
+from conftest import Cursor
+
+from core import config
+from core.execucao import conduzir
+from core.paginacao import _projecao, buscar_pagina, codificar_cursor, decodificar_cursor
+
+# Paginação por keyset (limite/cursor/campos) das listagens, com uma coleção falsa em
+# memória que aplica o filtro {chave: {"$gt": ...}}, a ordenação e o limite.
+
+
+class _Colecao:
+    def __init__(self, documentos):
+        self.documentos = documentos
+        self.consultas = []
+
+    def find(self, filtro, projecao):
+        self.consultas.append((filtro, projecao))
+        documentos = self.documentos
+        for chave, condicao in filtro.items():
+            documentos = [documento for documento in documentos if documento[chave] > condicao["$gt"]]
+        return Cursor(documentos)
+
+
+def _todas_as_paginas(colecao, chave, limite):
+    paginas, cursor = [], None
+    while True:
+        pagina = conduzir(buscar_pagina(colecao, {}, chave, limite, cursor))
+        paginas.append(pagina["itens"])
+        cursor = pagina["proximo_cursor"]
+        if cursor is None:
+            return paginas
+
+
+def test_cursor_ida_e_volta():
+    oid = ObjectId()
+    for valor in ("t-001", 42, oid):
+        assert decodificar_cursor(codificar_cursor(valor)) == valor
+
+
+def test_cursor_invalido():
+    for cursor in ("nao-e-base64!", codificar_cursor(1)[:-2], "e30"):
+        try:
+            decodificar_cursor(cursor)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"cursor {cursor!r} deveria gerar ValueError")
+
+
+def test_percorre_todas_as_paginas_sem_repetir():
+    documentos = [{"totem_id": f"t{i:03d}"} for i in range(25)]
+    colecao = _Colecao(list(reversed(documentos)))
+    paginas = _todas_as_paginas(colecao, "totem_id", 10)
+    assert [len(pagina) for pagina in paginas] == [10, 10, 5]
+    assert [item for pagina in paginas for item in pagina] == documentos
+    # Cada página busca só limite + 1 documentos a partir da chave anterior
+    assert colecao.consultas[1][0] == {"totem_id": {"$gt": "t009"}}
+
+
+def test_pagina_exata_nao_gera_cursor():
+    colecao = _Colecao([{"totem_id": f"t{i}"} for i in range(10)])
+    assert [len(pagina) for pagina in _todas_as_paginas(colecao, "totem_id", 10)] == [10]
+
+
+def test_paginacao_por_object_id_nao_devolve_o_id():
+    documentos = [{"_id": ObjectId(), "resposta": "sim"} for _ in range(3)]
+    paginas = _todas_as_paginas(_Colecao(documentos), "_id", 2)
+    assert paginas == [[{"resposta": "sim"}] * 2, [{"resposta": "sim"}]]
+
+
+def test_limite_fora_da_faixa():
+    for limite in (0, config.PAGINACAO_LIMITE_MAXIMO + 1):
+        try:
+            conduzir(buscar_pagina(_Colecao([]), {}, "totem_id", limite))
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"limite {limite} deveria gerar ValueError")
+
+
+def test_campos_reduzem_a_projecao():
+    colecao = _Colecao([])
+    conduzir(buscar_pagina(colecao, {}, "servico_id", 5, campos="nome, tipo,_id"))
+    assert colecao.consultas[0][1] == {"_id": 0, "nome": 1, "tipo": 1, "servico_id": 1}
+    try:
+        conduzir(buscar_pagina(colecao, {}, "servico_id", 5, campos="$where"))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("campo iniciado por $ deveria gerar ValueError")
+
+
+def test_campos_internos_so_saem_quando_pedidos():
+    assert _projecao("vem_hash", None, ("perguntas_pontuadas",)) == {"_id": 0, "perguntas_pontuadas": 0}
+    assert _projecao("vem_hash", ["perguntas_pontuadas"], ("perguntas_pontuadas",)) == {
+        "_id": 0, "perguntas_pontuadas": 1, "vem_hash": 1
+    }
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-v"]))
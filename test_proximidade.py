@@ -0,0 +1,220 @@
+import pytest
+
+from core import config
+from core.services.proximidade_service import ProximidadeService
+from models.servico import distancia_haversine
+
+# Tabela materializada totem -> serviços próximos: só os pares do totem/serviço alterado
+# são refeitos, e o resultado incremental bate com a reconstrução completa.
+# Repositórios falsos em memória (sem MongoDB); raio máximo de 10 km.
+
+RAIO_KM = 10
+
+
+class _Tabela:
+    def __init__(self):
+        self.pares = []
+        self.escritas = 0
+        self.raio_construido = None
+        self.falhar_na_reconstrucao = False
+
+    def substituir(self, campo, valor, pares):
+        self.substituir_varios(campo, [valor], pares)
+
+    def substituir_varios(self, campo, valores, pares):
+        self.escritas += 1
+        self.pares = [par for par in self.pares if par[campo] not in valores] + list(pares)
+
+    def remover(self, campo, valor):
+        self.substituir_varios(campo, [valor], [])
+
+    def reconstruir(self, pares):
+        if self.falhar_na_reconstrucao:
+            raise RuntimeError("processo interrompido")
+        self.pares = list(pares)
+
+    def get_raio_construido(self):
+        return self.raio_construido
+
+    def set_raio_construido(self, raio_maximo_km):
+        self.raio_construido = raio_maximo_km
+
+    def limpar_raio_construido(self):
+        self.raio_construido = None
+
+
+class _Servicos:
+    def __init__(self, servicos):
+        self.servicos = {servico["servico_id"]: servico for servico in servicos}
+
+    def get_by_id(self, servico_id):
+        return self.servicos.get(servico_id)
+
+    def get_ativos(self):
+        return [servico for servico in self.servicos.values() if servico["ativo"]]
+
+    def get_por_localizacao(self, latitude, longitude, raio_km):
+        return [
+            servico for servico in self.get_ativos()
+            if distancia_haversine(servico["latitude"], servico["longitude"], latitude, longitude) <= raio_km
+        ]
+
+
+class _Totens:
+    def __init__(self, totens):
+        self.totens = {totem["totem_id"]: totem for totem in totens}
+
+    def get_by_id(self, totem_id):
+        return self.totens.get(totem_id)
+
+    def get_coordenadas(self, totem_ids=None):
+        return [totem for totem in self.totens.values() if totem_ids is None or totem["totem_id"] in totem_ids]
+
+
+@pytest.fixture(autouse=True)
+def _raio_maximo(monkeypatch):
+    monkeypatch.setattr(config, "PROXIMIDADE_RAIO_MAXIMO_KM", RAIO_KM)
+
+
+def _servico(servico_id, latitude, longitude=-34.88, ativo=True):
+    return {"servico_id": servico_id, "nome": servico_id, "tipo": "Saúde", "latitude": latitude, "longitude": longitude, "ativo": ativo}
+
+
+def _totem(totem_id, latitude, longitude=-34.88):
+    return {"totem_id": totem_id, "latitude": latitude, "longitude": longitude}
+
+
+def _service(servicos=(), totens=()):
+    service = ProximidadeService.__new__(ProximidadeService)
+    service.repo = _Tabela()
+    service.servico_repo = _Servicos(servicos)
+    service.totem_repo = _Totens(totens)
+    return service
+
+
+def _pares(service):
+    return sorted((par["totem_id"], par["servico_id"], par["distancia_km"]) for par in service.repo.pares)
+
+
+def _cenario():
+    # t-sul fica ~31 km ao sul de t-centro: cada serviço só alcança um dos dois
+    return _service(
+        [_servico("s1", -8.06), _servico("s2", -8.30), _servico("s3", -8.07, ativo=False)],
+        [_totem("t-centro", -8.05), _totem("t-sul", -8.33)],
+    )
+
+
+def test_servico_novo_so_pareia_com_totens_no_raio():
+    service = _cenario()
+    service.recalcular_servico("s1")
+    assert _pares(service) == [("t-centro", "s1", distancia_haversine(-8.06, -34.88, -8.05, -34.88))]
+
+
+def test_servico_movido_troca_so_os_proprios_pares():
+    service = _cenario()
+    service.recalcular_servico("s1")
+    service.recalcular_servico("s2")
+    service.servico_repo.servicos["s1"]["latitude"] = -8.32
+    service.recalcular_servico("s1")
+    assert [(totem, servico) for totem, servico, _ in _pares(service)] == [("t-sul", "s1"), ("t-sul", "s2")]
+
+
+def test_servico_desativado_ou_excluido_sai_da_tabela():
+    service = _cenario()
+    service.recalcular_servico("s1")
+    service.recalcular_servico("s2")
+    service.servico_repo.servicos["s1"]["ativo"] = False
+    service.recalcular_servico("s1")
+    assert [servico for _, servico, _ in _pares(service)] == ["s2"]
+    service.remover_servico("s2")
+    assert service.repo.pares == []
+
+
+def test_totem_novo_recebe_os_servicos_do_raio():
+    service = _cenario()
+    service.reconstruir()
+    service.totem_repo.totens["t-novo"] = _totem("t-novo", -8.058)
+    service.recalcular_totem("t-novo")
+    novos = [par for par in service.repo.pares if par["totem_id"] == "t-novo"]
+    assert [par["servico_id"] for par in novos] == ["s1"]
+
+    del service.totem_repo.totens["t-novo"]
+    service.recalcular_totem("t-novo")
+    assert all(par["totem_id"] != "t-novo" for par in service.repo.pares)
+
+
+def test_lote_da_importacao_bate_com_o_calculo_um_a_um():
+    servicos = [_servico(f"s{i}", -8.0 - i * 0.01, -34.9 + i * 0.003, ativo=i % 7 != 0) for i in range(40)]
+    totens = [_totem(f"t{i}", -8.0 - i * 0.05, -34.88) for i in range(6)]
+    em_lote, um_a_um = _service(servicos, totens), _service(servicos, totens)
+    em_lote.recalcular_servicos(servicos)
+    for servico in servicos:
+        um_a_um.recalcular_servico(servico["servico_id"])
+    assert em_lote.repo.escritas == 1
+    assert _pares(em_lote) == _pares(um_a_um)
+    inativos = {servico["servico_id"] for servico in servicos if not servico["ativo"]}
+    assert not inativos & {servico_id for _, servico_id, _ in _pares(em_lote)}
+
+
+def test_desativados_na_importacao_saem_em_uma_escrita():
+    service = _cenario()
+    service.reconstruir()
+    escritas = service.repo.escritas
+    service.remover_servicos(["s1", "s2"])
+    service.remover_servicos([])
+    assert service.repo.pares == []
+    assert service.repo.escritas == escritas + 1
+
+
+def test_incremental_igual_a_reconstrucao():
+    service = _cenario()
+    for servico_id in ("s1", "s2", "s3"):
+        service.recalcular_servico(servico_id)
+    incremental = _pares(service)
+    resumo = service.reconstruir()
+    assert _pares(service) == incremental
+    assert resumo == {"ativo": True, "raio_maximo_km": RAIO_KM, "totens": 2, "servicos_ativos": 2, "pares": 2}
+
+
+def test_raio_maximo_mudado_reconstroi_na_inicializacao(monkeypatch):
+    service = _cenario()
+    service.garantir_tabela()
+    assert service.repo.raio_construido == RAIO_KM
+    monkeypatch.setattr(config, "PROXIMIDADE_RAIO_MAXIMO_KM", 40)
+    service.garantir_tabela()
+    assert service.repo.raio_construido == 40
+    # Com 40 km os dois serviços alcançam os dois totens
+    assert len(service.repo.pares) == 4
+
+
+def test_reconstrucao_interrompida_e_refeita_na_inicializacao():
+    service = _cenario()
+    service.garantir_tabela()
+    antes = _pares(service)
+    service.repo.falhar_na_reconstrucao = True
+    try:
+        service.reconstruir()
+    except RuntimeError:
+        pass
+    # A tabela em uso continua inteira, mas o raio registrado foi apagado
+    assert _pares(service) == antes
+    assert service.repo.raio_construido is None
+
+    service.repo.falhar_na_reconstrucao = False
+    service.garantir_tabela()
+    assert service.repo.raio_construido == RAIO_KM
+
+
+def test_tabela_desativada_nao_escreve(monkeypatch):
+    service = _cenario()
+    monkeypatch.setattr(config, "PROXIMIDADE_RAIO_MAXIMO_KM", 0)
+    service.recalcular_servico("s1")
+    service.recalcular_totem("t-centro")
+    service.remover_servicos(["s1"])
+    assert service.reconstruir() == {"ativo": False}
+    assert not service.cobre(1)
+    assert service.repo.escritas == 0 and service.repo.pares == []
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-v"]))
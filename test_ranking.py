@@ -0,0 +1,55 @@
+import random
+
+import pytest
+
+from core import config, ranking
+from core.ranking import RankingMemoria
+
+# Ranking em memória (árvore de Fenwick): a posição bate com a contagem direta de usuários
+# com pontuação maior, depois de atualizações que forçam reconstruções; e com vários
+# workers ele não é carregado (a posição fica com o índice de pontuação).
+
+
+def _posicao_direta(pontuacoes, vem_hash):
+    return 1 + sum(1 for pontuacao in pontuacoes.values() if pontuacao > pontuacoes[vem_hash])
+
+
+def test_posicao_igual_a_contagem_direta():
+    gerador = random.Random(5)
+    ranking_memoria = RankingMemoria()
+    pontuacoes = {f"u{i}": gerador.randint(0, 300) for i in range(500)}
+    ranking_memoria.carregar({"vem_hash": vem_hash, "pontuacao": p} for vem_hash, p in pontuacoes.items())
+    for _ in range(2000):
+        vem_hash = f"u{gerador.randrange(600)}"
+        # Inclui pontuações negativas e acima da árvore (reconstrução) e usuários novos
+        pontuacoes[vem_hash] = gerador.choice([gerador.randint(0, 300), gerador.randint(-50, 5000)])
+        ranking_memoria.atualizar(vem_hash, pontuacoes[vem_hash])
+    for vem_hash in gerador.sample(sorted(pontuacoes), 100):
+        posicao = ranking_memoria.posicao(vem_hash)
+        assert posicao["posicao"] == _posicao_direta(pontuacoes, vem_hash)
+        assert posicao["total_usuarios"] == len(pontuacoes)
+
+
+def test_empates_dividem_a_posicao_e_remocao_sai_da_contagem():
+    ranking_memoria = RankingMemoria()
+    ranking_memoria.carregar([{"vem_hash": "a", "pontuacao": 30}, {"vem_hash": "b", "pontuacao": 20},
+                              {"vem_hash": "c", "pontuacao": 20}, {"vem_hash": "d", "pontuacao": 10}])
+    assert [ranking_memoria.posicao(v)["posicao"] for v in "abcd"] == [1, 2, 2, 4]
+    ranking_memoria.remover("a")
+    assert ranking_memoria.posicao("d") == {"pontuacao": 10, "posicao": 3, "total_usuarios": 3}
+    assert ranking_memoria.posicao("a") is None
+
+
+def test_varios_workers_nao_carregam_o_ranking(monkeypatch):
+    def sem_banco():
+        raise AssertionError("o ranking não deveria ser lido do banco")
+
+    monkeypatch.setattr(ranking, "_ranking", RankingMemoria())
+    monkeypatch.setattr(ranking, "MongoConnection", sem_banco)
+    monkeypatch.setattr(config, "WEB_CONCURRENCY", 4)
+    ranking.carregar_ranking()
+    assert ranking.obter_ranking() is None
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-v"]))
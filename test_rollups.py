@@ -0,0 +1,176 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import Cursor, Resultado
+from core.repositories.rollup_repo import COLECOES, RollupRepository, _filtros_buckets
+
+# Rollups por hora/dia (RollupRepository.atualizar): a execução incremental recalcula só
+# os buckets com votos alterados desde a última marca (menos a margem) e chega ao mesmo
+# resultado da reconstrução completa. As coleções falsas interpretam os pipelines do
+# repositório ($match, $group por bucket e $merge) em memória.
+
+T = datetime(2025, 3, 10, 12, 0)
+
+
+def _truncar(data, com_hora):
+    return data.replace(minute=0, second=0, microsecond=0, **({} if com_hora else {"hour": 0}))
+
+
+def _bucket(expressao, documento):
+    partes = expressao["$dateFromParts"]
+    campo = partes["year"]["$year"][1:]
+    return _truncar(documento[campo], "hour" in partes)
+
+
+def _casa(documento, filtro):
+    for campo, condicao in filtro.items():
+        if campo == "$or":
+            if not any(_casa(documento, alternativa) for alternativa in condicao):
+                return False
+            continue
+        valor = documento.get(campo)
+        for operador, limite in condicao.items():
+            if operador == "$exists" and (valor is not None) != limite:
+                return False
+            if operador == "$gte" and not valor >= limite:
+                return False
+            if operador == "$lt" and not valor < limite:
+                return False
+    return True
+
+
+class _Colecao:
+    def __init__(self, banco, documentos=()):
+        self.banco = banco
+        self.documentos = list(documentos)
+        self.agregacoes = 0
+
+    def aggregate(self, pipeline, allowDiskUse=False):
+        self.agregacoes += 1
+        documentos = [documento for documento in self.documentos if _casa(documento, pipeline[0]["$match"])]
+        agrupamento = pipeline[1]["$group"]
+        if "$dateFromParts" in agrupamento["_id"]:
+            # Horas afetadas: só os inícios distintos
+            return Cursor({"_id": inicio} for inicio in {_bucket(agrupamento["_id"], documento) for documento in documentos})
+
+        buckets = {}
+        for documento in documentos:
+            chave = (documento["pergunta_id"], documento["totem_id"], _bucket(agrupamento["_id"]["inicio"], documento))
+            bucket = buckets.setdefault(chave, {"sim": 0, "nao": 0})
+            if "resposta" in documento:
+                bucket[documento["resposta"]] += 1
+            else:
+                bucket["sim"] += documento["sim"]
+                bucket["nao"] += documento["nao"]
+
+        destino = self.banco[pipeline[-1]["$merge"]["into"]]
+        for (pergunta_id, totem_id, inicio), bucket in buckets.items():
+            destino.documentos = [
+                documento for documento in destino.documentos
+                if (documento["pergunta_id"], documento["totem_id"], documento["inicio"]) != (pergunta_id, totem_id, inicio)
+            ]
+            destino.documentos.append({
+                "pergunta_id": pergunta_id, "totem_id": totem_id, "inicio": inicio,
+                **bucket, "total": bucket["sim"] + bucket["nao"],
+            })
+        return Cursor()
+
+    def find_one(self, filtro):
+        return next((documento for documento in self.documentos if documento["_id"] == filtro["_id"]), None)
+
+    def update_one(self, filtro, atualizacao, upsert=False):
+        self.documentos = [{**filtro, **atualizacao["$set"]}]
+        return Resultado(modified_count=1)
+
+
+def _repo(votos):
+    banco = {}
+    for nome in (*COLECOES.values(), "rollups_estado"):
+        banco[nome] = _Colecao(banco)
+    banco["interacoes"] = _Colecao(banco, votos)
+    repo = RollupRepository.__new__(RollupRepository)
+    repo.interacoes = banco["interacoes"]
+    repo.colecoes = {granularidade: banco[nome] for granularidade, nome in COLECOES.items()}
+    repo.estado = banco["rollups_estado"]
+    return repo
+
+
+def _voto(vem_hash, resposta, criado, alterado=None, pergunta_id="p1", totem_id="t1"):
+    return {
+        "vem_hash": vem_hash, "pergunta_id": pergunta_id, "totem_id": totem_id, "resposta": resposta,
+        "data_criacao": criado, "ultima_atualizacao": alterado or criado,
+    }
+
+
+def _rollups(repo):
+    chave = lambda documento: (documento["pergunta_id"], documento["totem_id"], documento["inicio"])
+    return {granularidade: sorted(colecao.documentos, key=chave) for granularidade, colecao in repo.colecoes.items()}
+
+
+def _historico():
+    return [
+        _voto("u1", "sim", T - timedelta(days=2)),
+        _voto("u2", "nao", T - timedelta(days=2, minutes=-5)),
+        _voto("u3", "sim", T - timedelta(days=1)),
+        _voto("u4", "sim", T - timedelta(hours=3), totem_id="t2"),
+    ]
+
+
+def test_incremental_so_recalcula_os_buckets_alterados_e_bate_com_o_completo():
+    repo = _repo(_historico())
+    repo.atualizar(completo=True)
+    repo.estado.update_one({"_id": "interacoes"}, {"$set": {"ate": T}})
+
+    votos = repo.interacoes.documentos
+    # Troca de resposta num voto antigo: o bucket de dois dias atrás muda
+    votos[0].update(resposta="nao", ultima_atualizacao=T + timedelta(minutes=5))
+    # Voto novo na hora corrente
+    votos.append(_voto("u5", "nao", T + timedelta(minutes=10)))
+    # Gravado 10 s antes da marca, mas só visível depois: a margem o recupera
+    votos.append(_voto("u6", "nao", T - timedelta(days=1, minutes=-20), T - timedelta(seconds=10)))
+
+    resumo = repo.atualizar()
+    assert resumo["completo"] is False
+    assert resumo["horas_recalculadas"] == 3
+    assert resumo["dias_recalculados"] == 3
+
+    completo = _repo(votos)
+    completo.atualizar(completo=True)
+    assert _rollups(repo) == _rollups(completo)
+    dia_alterado = next(d for d in repo.colecoes["dia"].documentos if d["inicio"] == _truncar(T - timedelta(days=2), False))
+    assert (dia_alterado["sim"], dia_alterado["nao"]) == (0, 2)
+
+
+def test_sem_votos_alterados_nao_recalcula_nada():
+    repo = _repo(_historico())
+    repo.atualizar(completo=True)
+    repo.estado.update_one({"_id": "interacoes"}, {"$set": {"ate": T}})
+    antes = _rollups(repo)
+    agregacoes = repo.interacoes.agregacoes
+
+    resumo = repo.atualizar()
+    assert (resumo["horas_recalculadas"], resumo["dias_recalculados"]) == (0, 0)
+    # Só a consulta das horas afetadas
+    assert repo.interacoes.agregacoes == agregacoes + 1
+    assert _rollups(repo) == antes
+
+
+def test_primeira_execucao_sem_marca_reconstroi_tudo():
+    repo = _repo(_historico())
+    resumo = repo.atualizar()
+    assert resumo["completo"] is True and resumo["horas_recalculadas"] is None
+    assert repo.estado.find_one({"_id": "interacoes"})["ate"] is not None
+    assert sum(documento["total"] for documento in repo.colecoes["dia"].documentos) == 4
+
+
+def test_buckets_afetados_sao_consultados_em_lotes(monkeypatch):
+    monkeypatch.setattr("core.repositories.rollup_repo._BUCKETS_POR_CONSULTA", 2)
+    horas = [T + timedelta(hours=i) for i in range(5)]
+    filtros = list(_filtros_buckets("data_criacao", horas, timedelta(hours=1)))
+    assert [len(filtro["$or"]) for filtro in filtros] == [2, 2, 1]
+    assert filtros[0]["$or"][1] == {"data_criacao": {"$gte": horas[1], "$lt": horas[1] + timedelta(hours=1)}}
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,194 @@
+import pytest
+
+from conftest import Cursor, Resultado
+from core.repositories.servico_repo import PIPELINE_LOCALIZACAO, ServicoRepository, _documento, _posicoes_alteradas, _upsert
+from core.services.servico_service import ServicoService
+from models.servico import Servico
+
+# Importação com delta (hash de conteúdo), desativação dos ausentes e atualização parcial
+# com os campos derivados, sem MongoDB: coleções e repositórios falsos em memória.
+
+
+class _ColecaoServicos:
+    def __init__(self, documentos=()):
+        self.documentos = {documento["servico_id"]: dict(documento) for documento in documentos}
+        self.escritos = []
+        self.desativacoes = []
+
+    def find(self, filtro, projecao):
+        if "servico_id" in filtro:
+            ids = set(filtro["servico_id"]["$in"])
+            return Cursor([d for d in self.documentos.values() if d["servico_id"] in ids])
+        return Cursor([d for d in self.documentos.values() if d.get("ativo")])
+
+    def bulk_write(self, operacoes, ordered):
+        inseridos = {}
+        for indice, operacao in enumerate(operacoes):
+            servico_id = operacao._filter["servico_id"]
+            self.escritos.append(servico_id)
+            if servico_id not in self.documentos:
+                inseridos[indice] = servico_id
+            self.documentos[servico_id] = {**self.documentos.get(servico_id, {}), **operacao._doc["$set"]}
+        return Resultado(inseridos)
+
+    def update_many(self, filtro, atualizacao):
+        ids = filtro["servico_id"]["$in"]
+        self.desativacoes.append(len(ids))
+        for servico_id in ids:
+            self.documentos[servico_id]["ativo"] = False
+        return Resultado(modified_count=len(ids))
+
+
+def _servico(nome, **campos):
+    dados = {"nome": nome, "tipo": "Saúde", "latitude": -8.05, "longitude": -34.88, **campos}
+    return Servico(servico_id=Servico.gerar_id(dados["nome"], dados["latitude"], dados["longitude"]), **dados)
+
+
+def _repo(gravados=()):
+    repo = ServicoRepository.__new__(ServicoRepository)
+    repo.collection = _ColecaoServicos(_documento(servico) for servico in gravados)
+    return repo
+
+
+def test_so_novos_alterados_e_inativos_sao_regravados():
+    igual, alterado, inativo, novo = _servico("Posto A"), _servico("Posto B"), _servico("Posto C"), _servico("Posto D")
+    gravados = [
+        _documento(igual),
+        {**_documento(alterado), "hash_conteudo": "antigo"},
+        {**_documento(inativo), "ativo": False},
+    ]
+    documentos = [_documento(servico) for servico in (igual, alterado, inativo, novo)]
+    assert _posicoes_alteradas(documentos, gravados) == [1, 2, 3]
+
+
+def test_regravar_nao_muda_a_data_de_criacao():
+    documento = _documento(_servico("Posto A"))
+    atualizacao = _upsert(documento)
+    assert "data_criacao" not in atualizacao["$set"]
+    assert atualizacao["$setOnInsert"] == {"data_criacao": documento["data_criacao"]}
+
+
+def test_save_many_grava_so_o_delta():
+    igual, alterado = _servico("Posto A"), _servico("Posto B", telefone="1111")
+    repo = _repo([igual, alterado])
+    novo = _servico("Posto C")
+    status = repo.save_many([_servico("Posto A"), _servico("Posto B", telefone="2222"), novo])
+    assert [item["status"] for item in status] == ["inalterado", "atualizado", "inserido"]
+    assert repo.collection.escritos == [alterado.servico_id, novo.servico_id]
+
+
+def test_save_many_sem_mudancas_nao_escreve():
+    repo = _repo([_servico("Posto A"), _servico("Posto B")])
+    status = repo.save_many([_servico("Posto A"), _servico("Posto B")])
+    assert [item["status"] for item in status] == ["inalterado", "inalterado"]
+    assert repo.collection.escritos == []
+
+
+def test_desativa_so_os_ativos_fora_do_arquivo():
+    servicos = [_servico(f"S{i}") for i in range(5)]
+    repo = _repo(servicos)
+    vistos = {servico.servico_id for servico in servicos[:3]}
+    ausentes = repo.desativar_ausentes(vistos)
+    assert sorted(ausentes) == sorted(servico.servico_id for servico in servicos[3:])
+    assert all(not repo.collection.documentos[servico_id]["ativo"] for servico_id in ausentes)
+    assert all(repo.collection.documentos[servico_id]["ativo"] for servico_id in vistos)
+
+
+def test_arquivo_sem_linhas_validas_nao_desativa_nada():
+    class _Falha:
+        def __getattr__(self, nome):
+            raise AssertionError("nenhuma escrita era esperada")
+
+    service = ServicoService.__new__(ServicoService)
+    service.repo = _Falha()
+    service.proximidade = _Falha()
+    assert service.desativar_ausentes(set()) == 0
+
+
+def test_lote_importado_so_recalcula_a_proximidade_dos_gravados():
+    class _Proximidade:
+        def __init__(self):
+            self.recalculados = None
+
+        def recalcular_servicos(self, servicos):
+            self.recalculados = [servico["nome"] for servico in servicos]
+
+    service = ServicoService.__new__(ServicoService)
+    service.repo = _repo([_servico("Igual")])
+    service.proximidade = _Proximidade()
+    lote = [
+        (2, {"nome": "Igual", "tipo": "Saúde", "latitude": "-8.05", "longitude": "-34.88"}),
+        (3, {"nome": "Novo", "tipo": "Saúde", "latitude": "-8.05", "longitude": "-34.88"}),
+        (4, {"nome": "Ruim", "tipo": "Saúde", "latitude": "abc", "longitude": "1"}),
+    ]
+    vistos = set()
+    resumo = service._importar_lote(lote, vistos)
+    assert (resumo["total_linhas"], resumo["inseridos"], resumo["inalterados"]) == (3, 1, 1)
+    assert [erro["linha"] for erro in resumo["erros"]] == [4]
+    assert service.proximidade.recalculados == ["Novo"]
+    assert len(vistos) == 2
+
+
+class _ColecaoAtualizacao:
+    """
+    Um serviço gravado; update_one aplica o $set com $literal do pipeline se o filtro casar.
+    `interferir` é chamado uma vez antes do update_one (outra escrita concorrente).
+    """
+    def __init__(self, documento, interferir=None):
+        self.documento = documento
+        self.interferir = interferir
+        self.leituras = 0
+        self.pipelines = []
+
+    def find_one(self, filtro, projecao):
+        self.leituras += 1
+        return {campo: valor for campo, valor in self.documento.items() if projecao.get(campo)}
+
+    def update_one(self, filtro, pipeline):
+        if self.interferir:
+            self.interferir(self.documento)
+            self.interferir = None
+        self.pipelines.append(pipeline)
+        casou = all(self.documento.get(campo) == valor for campo, valor in filtro.items())
+        if casou:
+            self.documento.update({campo: valor["$literal"] for campo, valor in pipeline[0]["$set"].items()})
+        return Resultado(modified_count=int(casou))
+
+
+def _repo_atualizacao(interferir=None):
+    repo = ServicoRepository.__new__(ServicoRepository)
+    repo.collection = _ColecaoAtualizacao(_documento(_servico("Posto A", telefone="1111")), interferir)
+    return repo
+
+
+def test_atualizacao_parcial_recalcula_os_derivados_do_documento_mesclado():
+    repo = _repo_atualizacao()
+    assert repo.update_partial(_servico("Posto A").servico_id, {"nome": "Posto Central", "horario_funcionamento": "24 horas"})
+    documento = repo.collection.documento
+    assert len(repo.collection.pipelines) == 1
+    assert documento["hash_conteudo"] == _documento(_servico("Posto Central", telefone="1111", horario_funcionamento="24 horas"))["hash_conteudo"]
+    assert "central" in documento["termos"]
+    assert documento["horarios"] == [{"inicio": 0, "fim": 7 * 24 * 60}]
+
+
+def test_atualizacao_parcial_com_movimento_recalcula_o_ponto_no_pipeline():
+    repo = _repo_atualizacao()
+    repo.update_partial(_servico("Posto A").servico_id, {"latitude": -8.06})
+    assert repo.collection.pipelines[0][1:] == PIPELINE_LOCALIZACAO
+
+
+def test_atualizacao_parcial_rele_se_outra_escrita_mudou_o_servico():
+    def outra_escrita(documento):
+        documento.update({"telefone": "2222", "hash_conteudo": "outro"})
+
+    repo = _repo_atualizacao(outra_escrita)
+    assert repo.update_partial(_servico("Posto A").servico_id, {"descricao": "Vacinação"})
+    documento = repo.collection.documento
+    assert repo.collection.leituras == 2
+    # O hash final considera o telefone gravado pela outra escrita
+    esperado = _documento(_servico("Posto A", telefone="2222", descricao="Vacinação"))["hash_conteudo"]
+    assert documento["telefone"] == "2222" and documento["hash_conteudo"] == esperado
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,137 @@
+import pytest
+
+from conftest import ColecaoLotes
+from core import config
+from core.migracoes import _perguntas_pontuadas
+from core.repositories import usuario_repo
+from core.services.interacao_service import InteracaoService, _preparar_lote
+from models.interacao import InteracaoEntrada
+
+# POST /interacoes/votar: o voto é gravado antes dos pontos, e os pontos só saem no
+# primeiro voto do usuário em cada pergunta. Repositórios falsos em memória (sem MongoDB).
+
+
+class _Usuarios:
+    def __init__(self, eventos, usuarios):
+        self.eventos = eventos
+        self.usuarios = usuarios
+
+    def award_vote_points(self, vem_hash, pergunta_id, pontos):
+        self.eventos.append("pontos")
+        usuario = self.usuarios.get(vem_hash)
+        if usuario is None:
+            return None
+        if pergunta_id in usuario["perguntas"]:
+            return {"pontuacao": usuario["pontuacao"], "concedido": False}
+        usuario["perguntas"].add(pergunta_id)
+        usuario["pontuacao"] += pontos
+        return {"pontuacao": usuario["pontuacao"], "concedido": True}
+
+
+class _Interacoes:
+    def __init__(self, eventos, falhar=False):
+        self.eventos = eventos
+        self.falhar = falhar
+        self.votos = []
+
+    def save(self, interacao):
+        if self.falhar:
+            raise RuntimeError("MongoDB indisponível")
+        self.eventos.append("voto")
+        self.votos.append(interacao)
+
+
+def _service(usuarios, falhar=False):
+    eventos = []
+    service = InteracaoService.__new__(InteracaoService)
+    service.usuario_repo = _Usuarios(eventos, usuarios)
+    service.repo = _Interacoes(eventos, falhar)
+    service.buffer = None
+    return service, eventos
+
+
+def _usuario(pontuacao=0, perguntas=()):
+    return {"pontuacao": pontuacao, "perguntas": set(perguntas)}
+
+
+def test_primeiro_voto_grava_e_depois_pontua():
+    usuarios = {"u1": _usuario()}
+    service, eventos = _service(usuarios)
+    resultado = service.registrar_voto("u1", "p1", "t1", "sim")
+    assert eventos == ["voto", "pontos"]
+    assert resultado["primeiro_voto_na_pergunta"] is True
+    assert resultado["pontos_ganhos"] == config.PONTOS_POR_VOTO
+    assert resultado["pontuacao_atual"] == config.PONTOS_POR_VOTO
+
+
+def test_reenvio_grava_o_voto_sem_pontuar():
+    usuarios = {"u1": _usuario(10, ["p1"])}
+    service, eventos = _service(usuarios)
+    resultado = service.registrar_voto("u1", "p1", "t1", "nao")
+    assert eventos == ["voto", "pontos"]
+    assert resultado["pontos_ganhos"] == 0
+    assert resultado["pontuacao_atual"] == 10
+    assert service.repo.votos[0].resposta == "nao"
+
+
+def test_falha_ao_gravar_o_voto_nao_concede_pontos():
+    usuarios = {"u1": _usuario()}
+    service, eventos = _service(usuarios, falhar=True)
+    try:
+        service.registrar_voto("u1", "p1", "t1", "sim")
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("a falha da gravação deveria chegar à rota")
+    assert eventos == []
+    assert usuarios["u1"] == _usuario()
+
+    # O reenvio, com o banco de volta, grava e pontua uma vez
+    service.repo.falhar = False
+    assert service.registrar_voto("u1", "p1", "t1", "sim")["pontos_ganhos"] == config.PONTOS_POR_VOTO
+
+
+def test_usuario_inexistente_grava_o_voto_sem_pontuar():
+    # Sem leitura prévia do usuário: o voto fica gravado (como no POST /interacoes/)
+    # e a rota responde 404
+    service, eventos = _service({})
+    assert service.registrar_voto("zz", "p1", "t1", "sim") is None
+    assert eventos == ["voto", "pontos"]
+
+
+def test_resposta_invalida():
+    service, eventos = _service({"u1": _usuario()})
+    try:
+        service.registrar_voto("u1", "p1", "t1", "talvez")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("resposta inválida deveria gerar ValueError")
+    assert eventos == []
+
+
+def test_lote_usa_a_mesma_validacao_do_voto():
+    itens = [InteracaoEntrada(vem_hash="u1", pergunta_id="p1", totem_id="t1", resposta="talvez")]
+    _, _, resultados = _preparar_lote(itens)
+    assert resultados[0]["erro"] == "Resposta inválida, deve ser 'sim' ou 'nao'"
+
+
+def test_migracao_preenche_perguntas_pontuadas_por_usuario():
+    grupos = [{"_id": f"u{i}", "perguntas": ["p1", "p2"]} for i in range(1001)]
+    db = {"interacoes": ColecaoLotes(grupos), "usuarios": ColecaoLotes()}
+    assert _perguntas_pontuadas(db) == {"usuarios_atualizados": 1001}
+    assert [len(lote) for lote in db["usuarios"].lotes] == [1000, 1]
+    operacao = db["usuarios"].lotes[0][0]
+    assert operacao._filter == {"vem_hash": "u0"}
+    assert operacao._doc == {"$addToSet": {"perguntas_pontuadas": {"$each": ["p1", "p2"]}}}
+
+
+def test_leituras_de_usuario_ocultam_perguntas_pontuadas():
+    assert usuario_repo._PROJECAO["perguntas_pontuadas"] == 0
+    assert "perguntas_pontuadas" in usuario_repo._OCULTOS
+    assert "perguntas_pontuadas" not in usuario_repo._PROJECAO_RANKING
+    assert "perguntas_pontuadas" not in usuario_repo._PROJECAO_RESPOSTA
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-v"]))